@@ -0,0 +1,85 @@
+"""
+Time the construction of a templated plate workflow one step at a time
+(primitive_step) against constructing it from a table of parameter rows
+(primitive_steps).  As in the growth curve protocol, the samples of a plate
+are measured at each of `--gains` gains at each of `--time-points` time
+points, with the library primitive MeasureFluorescence called by name.  The
+two protocols are checked to serialize to the same triples.
+
+Usage:
+    python benchmarks/bench_bulk_construction.py [--time-points N] [--gains G]
+"""
+
+import argparse
+import time
+
+import sbol3
+import tyto
+
+import labop
+
+
+def measurement_rows(samples, time_points: int, gains: int):
+    return [
+        {
+            "samples": samples,
+            "excitationWavelength": sbol3.Measure(488, tyto.OM.nanometer),
+            "emissionWavelength": sbol3.Measure(530, tyto.OM.nanometer),
+            "emissionBandpassWidth": sbol3.Measure(20, tyto.OM.nanometer),
+            "numFlashes": 25,
+            "gain": 0.1 * (g + 1),
+        }
+        for _ in range(time_points)
+        for g in range(gains)
+    ]
+
+
+def build_protocol(time_points: int, gains: int, bulk: bool):
+    protocol, doc = labop.Protocol.initialize_protocol(display_id="plate_workflow")
+    plate = protocol.primitive_step(
+        "EmptyContainer",
+        specification=labop.ContainerSpec(
+            "plate",
+            name="measurement plate",
+            queryString="cont:Plate96Well",
+            prefixMap={
+                "cont": "https://sift.net/container-ontology/container-ontology#"
+            },
+        ),
+    )
+    # Copy the primitive into the document outside of the timed section
+    labop.Primitive.get_primitive(doc, "MeasureFluorescence")
+    rows = measurement_rows(plate.output_pin("samples"), time_points, gains)
+
+    start = time.perf_counter()
+    if bulk:
+        protocol.primitive_steps("MeasureFluorescence", rows)
+    else:
+        for row in rows:
+            protocol.primitive_step("MeasureFluorescence", **row)
+    return doc, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--time-points", type=int, default=100)
+    parser.add_argument("--gains", type=int, default=10)
+    args = parser.parse_args()
+    steps = args.time_points * args.gains
+
+    per_step_doc, per_step = build_protocol(args.time_points, args.gains, bulk=False)
+    bulk_doc, bulk = build_protocol(args.time_points, args.gains, bulk=True)
+    print(f"{steps} steps")
+    print(
+        f"primitive_step   {per_step:8.2f} s, {1e3 * per_step / steps:8.3f} ms / step"
+    )
+    print(f"primitive_steps  {bulk:8.2f} s, {1e3 * bulk / steps:8.3f} ms / step")
+    print(f"speedup          {per_step / bulk:8.2f}x")
+    same = sorted(
+        per_step_doc.write_string(sbol3.SORTED_NTRIPLES).splitlines()
+    ) == sorted(bulk_doc.write_string(sbol3.SORTED_NTRIPLES).splitlines())
+    print(f"same triples     {same}")
+
+
+if __name__ == "__main__":
+    main()
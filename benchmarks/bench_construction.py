@@ -0,0 +1,80 @@
+"""
+Time the programmatic construction of a large protocol.  Each step calls a
+primitive with the value of the previous step (use_value), and every
+`--fan-out-every` steps the value is also used by `--fan-out` more steps, so
+that ForkNodes are injected (deconflict_objectflow_sources).  The time per
+step is reported for each quarter of the construction, so that growth of the
+cost per step with the size of the protocol is visible, followed by the time
+to validate the protocol, to remove duplicate nodes, and to look up the
+incoming and outgoing edges of every node.
+
+Usage:
+    python benchmarks/bench_construction.py [--steps N] [--fan-out-every K] [--fan-out F]
+"""
+
+import argparse
+import time
+
+import labop
+
+INTEGER = "http://www.w3.org/2001/XMLSchema#integer"
+
+
+def build_protocol(steps: int, fan_out_every: int, fan_out: int):
+    protocol, doc = labop.Protocol.initialize_protocol()
+    compute = labop.Primitive("Compute")
+    compute.add_input("value", INTEGER, optional=True)
+    compute.add_output("value", INTEGER)
+    doc.add(compute)
+
+    quarters = []
+    start = time.perf_counter()
+    previous = protocol.primitive_step(compute)
+    for step in range(1, steps):
+        previous = protocol.primitive_step(compute, value=previous.output_pin("value"))
+        if step % fan_out_every == 0:
+            for _ in range(fan_out):
+                protocol.primitive_step(compute, value=previous.output_pin("value"))
+        if (step + 1) % max(1, steps // 4) == 0 and len(quarters) < 4:
+            quarters.append(time.perf_counter() - start)
+            start = time.perf_counter()
+    return protocol, quarters
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--steps", type=int, default=10000)
+    parser.add_argument("--fan-out-every", type=int, default=10)
+    parser.add_argument("--fan-out", type=int, default=2)
+    args = parser.parse_args()
+
+    protocol, quarters = build_protocol(args.steps, args.fan_out_every, args.fan_out)
+    quarter_steps = max(1, args.steps // 4)
+    print(
+        f"{len(protocol.nodes)} nodes, {len(protocol.edges)} edges, "
+        f"{sum(quarters):.2f} s to construct"
+    )
+    for i, seconds in enumerate(quarters):
+        print(f"  quarter {i + 1}: {1e3 * seconds / quarter_steps:8.3f} ms / step")
+
+    seconds, report = timed(protocol.validate)
+    print(f"validate            {seconds:8.2f} s, {len(report)} issues")
+    seconds, _ = timed(protocol.remove_duplicates)
+    print(f"remove_duplicates   {seconds:8.2f} s")
+    seconds, _ = timed(
+        lambda: [
+            (protocol.incoming_edges(n), protocol.outgoing_edges(n))
+            for n in protocol.nodes
+        ]
+    )
+    print(f"edges of each node  {seconds:8.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Compare DecisionNode evaluation by scanning edges and tokens with compiled
+DecisionDispatch lookups, for a protocol that loops through a DecisionNode
+and a MergeNode until a primitive returns True.
+
+Usage:
+    python benchmarks/bench_decisions.py [--iterations N] [--calls C]
+"""
+
+import argparse
+import time
+
+import sbol3
+
+import labop
+import uml
+from labop.execution.execution_engine import ExecutionEngine
+from labop.execution.instrumentation import ExecutionProfiler
+
+
+def build_loop_protocol(iterations: int) -> labop.Protocol:
+    protocol, doc = labop.Protocol.initialize_protocol()
+    count = {"iterations": 0}
+
+    loop_done = labop.Primitive("LoopDone")
+    loop_done.add_output("return", "http://www.w3.org/2001/XMLSchema#boolean")
+    doc.add(loop_done)
+
+    def loop_done_compute_output(inputs, parameter, sample_format, record_hash, engine):
+        count["iterations"] += 1
+        return count["iterations"] >= iterations
+
+    loop_done.compute_output = loop_done_compute_output
+
+    merge = uml.MergeNode()
+    protocol.nodes.append(merge)
+    protocol.edges.append(uml.ControlFlow(source=protocol.initial(), target=merge))
+    decision = protocol.make_decision_node(merge, decision_input_behavior=loop_done)
+    decision.add_decision_output(protocol, True, protocol.final())
+    decision.add_decision_output(protocol, False, merge)
+    return protocol
+
+
+def execute(protocol: labop.Protocol, **engine_args):
+    profiler = ExecutionProfiler(trace_memory=True)
+    ee = ExecutionEngine(
+        use_ordinal_time=True,
+        track_samples=False,
+        failsafe=False,
+        evaluate_guards=True,
+        instruments=[profiler],
+        **engine_args,
+    )
+    start = time.perf_counter()
+    ex = ee.execute(
+        protocol,
+        sbol3.Agent("benchmark_agent"),
+        parameter_values=[],
+        id="benchmark_execution",
+    )
+    return ee, ex, time.perf_counter() - start, profiler.report()
+
+
+def time_calls(fn, calls: int) -> float:
+    """Mean seconds per call of fn"""
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--calls", type=int, default=10000)
+    args = parser.parse_args()
+
+    for label, engine_args in [
+        ("scanned guards", {"compile_decisions": False}),
+        ("compiled guards", {}),
+        ("compiled, compacted", {"compact_loops": True}),
+    ]:
+        protocol = build_loop_protocol(args.iterations)
+        ee, ex, elapsed, report = execute(protocol, **engine_args)
+        decisions = report["phases"]["next_tokens"]["DecisionNode"]
+        print(
+            f"{label:20s} {elapsed:8.2f} s, "
+            f"{1e6 * decisions['seconds'] / decisions['count']:8.1f} us / decision, "
+            f"{len(ex.executions)} records, "
+            f"{report['peak_bytes'] / 2**20:8.1f} MiB peak"
+        )
+
+    # Choose the outgoing edge for a recorded decision, without the rest of the engine
+    record = next(
+        r for r in ex.executions if isinstance(r.get_node(), uml.DecisionNode)
+    )
+    node = record.get_node()
+    out_edges = sorted(protocol.outgoing_edges(node), key=lambda e: e.identity)
+    scanning = ExecutionEngine(compile_decisions=False)
+    tokens = [f.lookup() for f in record.incoming_flows]
+    dispatch = node.compile_dispatch()
+    scanned = time_calls(
+        lambda: node.next_tokens_callback(record, scanning, out_edges, None),
+        args.calls,
+    )
+    compiled = time_calls(lambda: dispatch.decide(tokens), args.calls)
+    print(f"{'scanned decide':20s} {1e6 * scanned:8.1f} us / call")
+    print(f"{'compiled decide':20s} {1e6 * compiled:8.1f} us / call")
+
+
+if __name__ == "__main__":
+    main()
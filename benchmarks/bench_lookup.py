@@ -0,0 +1,78 @@
+"""
+Profile the share of execution time spent resolving references with lookup(),
+with and without the ExecutionEngine's ReferenceResolver.
+
+Usage:
+    python benchmarks/bench_lookup.py [--steps N]
+"""
+
+import argparse
+import cProfile
+import pstats
+
+import sbol3
+
+import labop
+from labop.execution.execution_engine import ExecutionEngine
+
+
+def build_protocol(steps: int) -> labop.Protocol:
+    sbol3.set_namespace("https://bioprotocols.org/benchmark/")
+    doc = sbol3.Document()
+    protocol = labop.Protocol("lookup_benchmark")
+    primitive = labop.Primitive("benchmark_primitive")
+    doc.add(protocol)
+    doc.add(primitive)
+    for _ in range(steps):
+        protocol.primitive_step(primitive)
+    return protocol
+
+
+def lookup_share(stats: pstats.Stats):
+    """Cumulative time in ReferencedURI.lookup() and the total profiled time."""
+    lookup_time = sum(
+        cumtime
+        for (filename, _, name), (_, _, _, cumtime, _) in stats.stats.items()
+        if name == "lookup" and filename.endswith("refobj_property.py")
+    )
+    return lookup_time, stats.total_tt
+
+
+def profile_execution(steps: int, cache_references: bool):
+    protocol = build_protocol(steps)
+    ee = ExecutionEngine(
+        use_ordinal_time=True,
+        track_samples=False,
+        cache_references=cache_references,
+    )
+    profiler = cProfile.Profile()
+    profiler.enable()
+    ee.execute(
+        protocol,
+        sbol3.Agent("benchmark_agent"),
+        parameter_values=[],
+        id="benchmark_execution",
+    )
+    profiler.disable()
+    return pstats.Stats(profiler), ee.references
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--steps", type=int, default=50)
+    args = parser.parse_args()
+
+    for cache_references in [False, True]:
+        stats, references = profile_execution(args.steps, cache_references)
+        lookup_time, total = lookup_share(stats)
+        label = "resolver" if cache_references else "document.find"
+        print(
+            f"{label:15s} total {total:8.2f} s  lookup {lookup_time:8.2f} s "
+            f"({100 * lookup_time / total:5.1f}%)"
+        )
+        if references is not None:
+            print(f"{'':15s} cache hits {references.hits}, misses {references.misses}")
+
+
+if __name__ == "__main__":
+    main()
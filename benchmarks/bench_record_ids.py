@@ -0,0 +1,75 @@
+"""
+Benchmark record-creation throughput with the ExecutionEngine identity allocators.
+
+Usage:
+    python benchmarks/bench_record_ids.py [--records N] [--threads T]
+"""
+
+import argparse
+import threading
+import time
+
+import sbol3
+
+from labop import BehaviorExecution
+from labop.execution.id_allocator import IdAllocator, UUIDAllocator
+
+
+def time_it(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def allocate_ids(allocator: IdAllocator, n: int):
+    for _ in range(n):
+        allocator.next_display_id()
+
+
+def allocate_ids_threaded(allocator: IdAllocator, n: int, threads: int):
+    workers = [
+        threading.Thread(target=allocate_ids, args=(allocator, n // threads))
+        for _ in range(threads)
+    ]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+
+def allocate_uuid_ids(allocator: UUIDAllocator, n: int):
+    for _ in range(n):
+        allocator.next_display_id()
+
+
+def create_records(allocator: IdAllocator, n: int):
+    doc = sbol3.Document()
+    for _ in range(n):
+        doc.add(BehaviorExecution(allocator.next_display_id()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    sbol3.set_namespace("https://bioprotocols.org/benchmark/")
+    n = args.records
+    results = {
+        "counter ids": time_it(allocate_ids, IdAllocator("execute"), n),
+        f"counter ids ({args.threads} threads)": time_it(
+            allocate_ids_threaded, IdAllocator("execute"), n, args.threads
+        ),
+        "uuid ids": time_it(allocate_uuid_ids, UUIDAllocator(), n),
+        "BehaviorExecution records": time_it(
+            create_records, IdAllocator("execute"), n // 100
+        ),
+    }
+    counts = {k: (n // 100 if "records" in k else n) for k in results}
+    for k, elapsed in results.items():
+        print(f"{k:40s} {counts[k] / elapsed:12.0f} / s")
+
+
+if __name__ == "__main__":
+    main()
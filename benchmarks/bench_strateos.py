@@ -0,0 +1,79 @@
+"""
+Time the requests that the autoprotocol specialization makes to Strateos,
+against a local MockStrateosServer that delays each response by
+`--latency` seconds.  Resolving `--resources` resources is timed with one
+request at a time, with concurrent requests, and from the response cache,
+followed by making a container (launching, polling, and submitting
+MakeContainers), which previously waited a fixed 30 seconds for the launch
+request.
+
+Usage:
+    python benchmarks/bench_strateos.py [--resources N] [--latency SECONDS] [--launch-polls P]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import sbol3
+
+import labop
+from labop_convert.autoprotocol.strateos_api import StrateosAPI, StrateosClient
+from labop_convert.autoprotocol.strateos_mock import MockStrateosServer
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--resources", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--launch-polls", type=int, default=3)
+    args = parser.parse_args()
+
+    names = [f"reagent{i}" for i in range(args.resources)]
+    resources = [
+        sbol3.Component(f"https://bioprotocols.org/demo/{name}", sbol3.SBO_DNA)
+        for name in names
+    ]
+    out_dir = tempfile.mkdtemp()
+    with MockStrateosServer(
+        resources={name: [{"id": f"rs_{name}"}] for name in names},
+        latency=args.latency,
+        launch_polls=args.launch_polls,
+    ) as server:
+        cfg = server.config()
+        serial = StrateosAPI(
+            out_dir=out_dir, cfg=cfg, client=StrateosClient(cfg, pool_size=1)
+        )
+        seconds, _ = timed(lambda: serial.resolve_resources(resources))
+        print(f"{args.resources} resources, {1e3 * args.latency:.0f} ms latency")
+        print(f"resolve, serial      {seconds:8.2f} s")
+
+        api = StrateosAPI(
+            out_dir=out_dir,
+            cfg=cfg,
+            cache_path=os.path.join(out_dir, "strateos_responses.json"),
+            poll_interval=args.latency,
+        )
+        seconds, _ = timed(lambda: api.resolve_resources(resources))
+        print(f"resolve, concurrent  {seconds:8.2f} s")
+        seconds, _ = timed(lambda: api.resolve_resources(resources))
+        print(f"resolve, cached      {seconds:8.2f} s")
+
+        seconds, _ = timed(
+            lambda: api.make_containers([{"name": "plate", "cont_type": "96-flat"}])
+        )
+        print(
+            f"make_containers      {seconds:8.2f} s, "
+            f"{server.requests['launch_request']} polls of the launch request"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Time the execution of a protocol that calls the same subprotocol `--calls`
+times, as the iGEM examples do.  Each subprotocol has `--steps` steps that
+each use the value of the previous step.  The time per call is reported
+with the number of node executions, which is `--steps` + 2 per call when
+every call executes the whole subprotocol.
+
+Usage:
+    python benchmarks/bench_subprotocols.py [--calls N] [--steps S]
+"""
+
+import argparse
+import time
+
+import sbol3
+
+import labop
+from labop.execution.execution_engine import ExecutionEngine
+
+INTEGER = "http://www.w3.org/2001/XMLSchema#integer"
+
+
+def build_protocol(calls: int, steps: int):
+    protocol, doc = labop.Protocol.initialize_protocol(display_id="repeated")
+    compute = labop.Primitive("Compute")
+    compute.add_input("value", INTEGER, optional=True)
+    compute.add_output("result", INTEGER)
+    doc.add(compute)
+
+    subprotocol = labop.Protocol.create_protocol(display_id="sub", name="sub")
+    doc.add(subprotocol)
+    previous = subprotocol.primitive_step(compute)
+    for _ in range(steps - 1):
+        previous = subprotocol.primitive_step(
+            compute, value=previous.output_pin("result")
+        )
+    for _ in range(calls):
+        protocol.primitive_step(subprotocol)
+    return protocol
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--steps", type=int, default=10)
+    args = parser.parse_args()
+
+    protocol = build_protocol(args.calls, args.steps)
+    engine = ExecutionEngine(use_ordinal_time=True, track_samples=False)
+    start = time.perf_counter()
+    ex = engine.execute(
+        protocol, sbol3.Agent("agent"), id="execution", parameter_values=[]
+    )
+    seconds = time.perf_counter() - start
+    print(f"{args.calls} calls of {args.steps} steps")
+    print(
+        f"execute          {seconds:8.2f} s, {1e3 * seconds / args.calls:8.1f} ms / call"
+    )
+    print(f"node executions  {len(ex.executions):8d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""
+Time protocol construction, serialization, execution, diagrams, provenance tracking,
+scheduling, and specialization for generated protocols, and append the results to a JSON
+history so that commits can be compared.
+
+Each case is a ProtocolShape (see protocol_generator.py); the suite runs every
+combination of the shape parameters given on the command line.  The
+autoprotocol specialization requests Strateos resources from a local
+MockStrateosServer.  Stages that need an uninstalled package are recorded as
+skipped, and stages that fail are recorded with their error instead of a time.
+
+Usage:
+    python benchmarks/bench_suite.py [--plates 1 2] [--wells 24 96]
+        [--dilution-depth 2] [--fork-width 2] [--nesting 0 1] [--repeat 1]
+        [--stages construction execution ...] [--history FILE] [--label TEXT]
+"""
+
+import argparse
+import atexit
+import datetime
+import itertools
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import traceback
+from typing import Callable, Dict, List, Optional
+
+import sbol3
+from protocol_generator import ProtocolShape, generate_protocol
+
+from labop.execution.execution_engine import ExecutionEngine
+from labop.strings import Strings
+
+HISTORY_FILE = os.path.join(os.path.dirname(__file__), "results", "history.json")
+
+
+def markdown_specialization(out_dir: str):
+    from labop_convert.markdown.markdown_specialization import MarkdownSpecialization
+
+    return MarkdownSpecialization(
+        os.path.join(out_dir, "benchmark.md"), sample_format=Strings.XARRAY
+    )
+
+
+def opentrons_specialization(out_dir: str):
+    from labop_convert.opentrons.opentrons_specialization import OT2Specialization
+
+    return OT2Specialization(os.path.join(out_dir, "benchmark_ot2.py"))
+
+
+def ecl_specialization(out_dir: str):
+    from labop_convert.emeraldcloud.ecl_specialization import ECLSpecialization
+
+    return ECLSpecialization(os.path.join(out_dir, "benchmark_ecl.txt"))
+
+
+def pylabrobot_specialization(out_dir: str):
+    from labop_convert.pylabrobot.pylabrobot_specialization import (
+        PylabrobotSpecialization,
+    )
+
+    return PylabrobotSpecialization(os.path.join(out_dir, "benchmark_plr.py"))
+
+
+_strateos_server = None
+
+
+def strateos_server():
+    """A MockStrateosServer, started when first used and stopped on exit"""
+    global _strateos_server
+    if _strateos_server is None:
+        from labop_convert.autoprotocol.strateos_mock import MockStrateosServer
+
+        _strateos_server = MockStrateosServer().start()
+        atexit.register(_strateos_server.stop)
+    return _strateos_server
+
+
+def autoprotocol_specialization(out_dir: str):
+    try:
+        import autoprotocol
+    except ImportError:
+        raise SkipStage("requires autoprotocol")
+    from labop_convert.autoprotocol.autoprotocol_specialization import (
+        AutoprotocolSpecialization,
+    )
+    from labop_convert.autoprotocol.strateos_api import StrateosAPI
+
+    api = StrateosAPI(
+        out_dir=out_dir,
+        cfg=strateos_server().config(),
+        cache_path=None,
+        poll_interval=0.0,
+    )
+    return AutoprotocolSpecialization(
+        os.path.join(out_dir, "benchmark_autoprotocol.json"), api=api
+    )
+
+
+SPECIALIZATIONS: Dict[str, Callable] = {
+    "markdown": markdown_specialization,
+    "opentrons": opentrons_specialization,
+    "ecl": ecl_specialization,
+    "pylabrobot": pylabrobot_specialization,
+    "autoprotocol": autoprotocol_specialization,
+}
+
+
+class SkipStage(Exception):
+    pass
+
+
+def execute(protocol, out_dir: str, **engine_args):
+    engine_args = {
+        "use_ordinal_time": True,
+        "track_samples": False,
+        "out_dir": out_dir,
+        **engine_args,
+    }
+    ee = ExecutionEngine(**engine_args)
+    return ee.execute(
+        protocol,
+        sbol3.Agent("benchmark_agent"),
+        parameter_values=[],
+        id="benchmark_execution",
+    )
+
+
+def timed(fn: Callable) -> Dict:
+    """Run fn, and return its wall clock time or the reason that it did not complete"""
+    start = time.perf_counter()
+    try:
+        metrics = fn() or {}
+    except SkipStage as e:
+        return {"status": "skipped", "reason": str(e)}
+    except Exception as e:
+        return {
+            "status": "error",
+            "seconds": time.perf_counter() - start,
+            "exception": f"{e.__class__.__name__}: {e}",
+            "traceback": traceback.format_exc(limit=3),
+        }
+    return {"status": "pass", "seconds": time.perf_counter() - start, **metrics}
+
+
+def run_stages(shape: ProtocolShape, stages: List[str], out_dir: str) -> Dict:
+    results = {}
+
+    def construction():
+        protocol, _ = generate_protocol(shape)
+        return {"nodes": len(protocol.nodes), "edges": len(protocol.edges)}
+
+    def protocol_ntriples():
+        _, doc = generate_protocol(shape)
+        start = time.perf_counter()
+        ntriples = doc.write_string(sbol3.SORTED_NTRIPLES)
+        return {
+            "seconds_serialize": time.perf_counter() - start,
+            "bytes": len(ntriples),
+        }
+
+    def execution(**engine_args):
+        protocol, _ = generate_protocol(shape)
+        start = time.perf_counter()
+        ex = execute(protocol, out_dir, **engine_args)
+        return {
+            "seconds_execute": time.perf_counter() - start,
+            "executions": len(ex.executions),
+        }
+
+    def execution_ntriples():
+        protocol, doc = generate_protocol(shape)
+        execute(protocol, out_dir)
+        start = time.perf_counter()
+        ntriples = doc.write_string(sbol3.SORTED_NTRIPLES)
+        return {
+            "seconds_serialize": time.perf_counter() - start,
+            "bytes": len(ntriples),
+        }
+
+    def protocol_diagram():
+        protocol, _ = generate_protocol(shape)
+        start = time.perf_counter()
+        source = protocol.to_dot().source
+        return {"seconds_draw": time.perf_counter() - start, "bytes": len(source)}
+
+    def execution_diagram():
+        protocol, _ = generate_protocol(shape)
+        ex = execute(protocol, out_dir)
+        start = time.perf_counter()
+        source = ex.to_dot().source
+        return {"seconds_draw": time.perf_counter() - start, "bytes": len(source)}
+
+    def schedule():
+        import labop_time as labopt
+
+        protocol, _ = generate_protocol(shape)
+        start = time.perf_counter()
+        schedule = labopt.ProtocolScheduler(
+            labopt.DurationModel(default=(10.0, 60.0))
+        ).schedule(protocol)
+        return {
+            "seconds_schedule": time.perf_counter() - start,
+            "makespan": schedule.makespan,
+            "critical_path": len(schedule.critical_path),
+        }
+
+    stage_functions = {
+        "construction": construction,
+        "protocol_ntriples": protocol_ntriples,
+        "execution": execution,
+        "execution_ntriples": execution_ntriples,
+        "protocol_diagram": protocol_diagram,
+        "execution_diagram": execution_diagram,
+        "provenance": lambda: execution(
+            track_samples=True, sample_format=Strings.XARRAY
+        ),
+        "schedule": schedule,
+    }
+    for name, specialization in SPECIALIZATIONS.items():
+        stage_functions[
+            f"specialization.{name}"
+        ] = lambda specialization=specialization: execution(
+            specializations=[specialization(out_dir)]
+        )
+
+    for stage in stages:
+        results[stage] = timed(stage_functions[stage])
+    return results
+
+
+def best_of(runs: List[Dict]) -> Dict:
+    """The run with the least wall clock time, with the times of all runs"""
+    passed = [r for r in runs if r["status"] == "pass"]
+    if len(passed) == 0:
+        return runs[0]
+    best = dict(min(passed, key=lambda r: r["seconds"]))
+    best["runs"] = [r["seconds"] for r in passed]
+    return best
+
+
+def git_revision() -> Optional[Dict]:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=root, stderr=subprocess.DEVNULL
+        )
+        status = subprocess.check_output(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=root,
+            stderr=subprocess.DEVNULL,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return {"commit": commit.decode().strip(), "dirty": len(status.strip()) > 0}
+
+
+def load_history(filename: str) -> List[Dict]:
+    if not os.path.exists(filename):
+        return []
+    with open(filename) as f:
+        return json.load(f)
+
+
+def compare(previous: Dict, current: Dict) -> List[str]:
+    """Ratio of current to previous time for each case and stage run in both"""
+    lines = []
+    for case, stages in current["cases"].items():
+        for stage, result in stages["stages"].items():
+            before = previous["cases"].get(case, {}).get("stages", {}).get(stage)
+            if (
+                before is None
+                or before["status"] != "pass"
+                or result["status"] != "pass"
+            ):
+                continue
+            ratio = result["seconds"] / before["seconds"] if before["seconds"] else 0
+            lines.append(
+                f"{case:28s} {stage:32s} {before['seconds']:8.3f} s -> "
+                f"{result['seconds']:8.3f} s ({ratio:5.2f}x)"
+            )
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--plates", type=int, nargs="+", default=[1])
+    parser.add_argument("--wells", type=int, nargs="+", default=[24])
+    parser.add_argument("--dilution-depth", type=int, nargs="+", default=[2])
+    parser.add_argument("--fork-width", type=int, nargs="+", default=[2])
+    parser.add_argument("--nesting", type=int, nargs="+", default=[0, 1])
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument(
+        "--stages",
+        nargs="+",
+        default=[
+            "construction",
+            "protocol_ntriples",
+            "execution",
+            "execution_ntriples",
+            "protocol_diagram",
+            "execution_diagram",
+            "provenance",
+            "schedule",
+        ]
+        + [f"specialization.{s}" for s in SPECIALIZATIONS],
+    )
+    parser.add_argument("--history", default=HISTORY_FILE)
+    parser.add_argument("--label", default=None, help="Description of this run")
+    args = parser.parse_args()
+
+    shapes = [
+        ProtocolShape(*parameters)
+        for parameters in itertools.product(
+            args.plates, args.wells, args.dilution_depth, args.fork_width, args.nesting
+        )
+    ]
+
+    entry = {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "label": args.label,
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cases": {},
+    }
+    with tempfile.TemporaryDirectory() as out_dir:
+        for shape in shapes:
+            runs = [run_stages(shape, args.stages, out_dir) for _ in range(args.repeat)]
+            stages = {s: best_of([r[s] for r in runs]) for s in args.stages}
+            entry["cases"][shape.name] = {"shape": shape.to_dict(), "stages": stages}
+            for stage, result in stages.items():
+                time_str = (
+                    f"{result['seconds']:8.3f} s" if "seconds" in result else " " * 10
+                )
+                print(f"{shape.name:28s} {stage:32s} {time_str} {result['status']}")
+
+    history = load_history(args.history)
+    if len(history) > 0:
+        print("\nCompared with the previous run:")
+        print("\n".join(compare(history[-1], entry)))
+    history.append(entry)
+    os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+    with open(args.history, "w") as f:
+        json.dump(history, f, indent=4)
+    print(f"\nResults appended to {args.history}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Time the execution of one protocol with `--runs` combinations of volume and
+wavelength, first with a new ExecutionEngine.execute() of each combination
+in the protocol's document, and then with a ParameterSweep, which prepares
+the protocol once and removes each execution from the document after its
+results are collected.  The time per run is reported for the first and last
+runs of each, so that growth of the cost per run with the number of runs is
+visible.
+
+Usage:
+    python benchmarks/bench_sweep.py [--runs N] [--processes P]
+"""
+
+import argparse
+import time
+
+import sbol3
+import tyto
+
+import labop
+from labop.execution.execution_engine import ExecutionEngine
+from labop.execution.sweep import ParameterSweep, parameter_grid
+
+
+def build_protocol():
+    protocol, doc = labop.Protocol.initialize_protocol(display_id="sweep")
+    volume = protocol.input_value("volume", sbol3.OM_MEASURE)
+    wavelength = protocol.input_value("wavelength", sbol3.OM_MEASURE)
+    plate = protocol.primitive_step(
+        "EmptyContainer",
+        specification=labop.ContainerSpec(
+            "plate",
+            name="plate",
+            queryString="cont:Plate96Well",
+            prefixMap={
+                "cont": "https://sift.net/container-ontology/container-ontology#"
+            },
+        ),
+    )
+    wells = protocol.primitive_step(
+        "PlateCoordinates", source=plate.output_pin("samples"), coordinates="A1:B12"
+    )
+    water = sbol3.Component("water", sbol3.SBO_DNA)
+    doc.add(water)
+    protocol.primitive_step(
+        "Provision",
+        resource=water,
+        destination=wells.output_pin("samples"),
+        amount=volume,
+    )
+    measure = protocol.primitive_step(
+        "MeasureAbsorbance", samples=wells.output_pin("samples"), wavelength=wavelength
+    )
+    protocol.designate_output(
+        "absorbance",
+        "http://bioprotocols.org/labop#Dataset",
+        measure.output_pin("measurements"),
+    )
+    return protocol
+
+
+def grid(runs: int):
+    return parameter_grid(
+        volume=[sbol3.Measure(v, tyto.OM.microliter) for v in range(10, 10 + runs)],
+        wavelength=[sbol3.Measure(600, tyto.OM.nanometer)],
+    )
+
+
+def report(name: str, seconds):
+    print(
+        f"{name:16} {sum(seconds):8.2f} s, first {1e3 * seconds[0]:8.1f} ms, "
+        f"last {1e3 * seconds[-1]:8.1f} ms / run"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--processes", type=int, default=1)
+    args = parser.parse_args()
+
+    protocol = build_protocol()
+    sweep = ParameterSweep(protocol)
+    engine = ExecutionEngine(track_samples=False)
+    seconds = []
+    for i, parameterization in enumerate(grid(args.runs)):
+        start = time.perf_counter()
+        engine.execute(
+            protocol,
+            sweep.agent,
+            parameter_values=sweep.parameter_values(parameterization),
+            id=f"run_{i}",
+        )
+        seconds.append(time.perf_counter() - start)
+    report("execute", seconds)
+
+    protocol = build_protocol()
+    start = time.perf_counter()
+    results = ParameterSweep(protocol).run(grid(args.runs), processes=args.processes)
+    total = time.perf_counter() - start
+    report("ParameterSweep", results.columns["seconds"])
+    print(f"sweep wall time  {total:8.2f} s, {len(protocol.document.objects)} objects")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Compare memory per token and execution time for ActivityEdgeFlow tokens,
+transient Tokens, and executions that do not record the trace.
+
+Usage:
+    python benchmarks/bench_tokens.py [--tokens N] [--steps S]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import sbol3
+from bench_lookup import build_protocol
+
+import labop
+import uml
+from labop.execution.execution_engine import ExecutionEngine
+from labop.execution.transient_token import Token
+
+
+def allocated_bytes(fn, *args):
+    """Bytes still allocated after calling fn, and the result of fn"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = fn(*args)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+
+def control_flows(execution, edge, record, n):
+    flows = [
+        labop.ActivityEdgeFlow(
+            edge=edge, token_source=record, value=[uml.literal("uml.ControlFlow")]
+        )
+        for _ in range(n)
+    ]
+    execution.flows += flows
+    return flows
+
+
+def control_tokens(execution, edge, record, n):
+    return [
+        Token(
+            edge=edge,
+            token_source=record,
+            value=[uml.literal("uml.ControlFlow")],
+        )
+        for _ in range(n)
+    ]
+
+
+def execution_time(steps, **engine_args):
+    protocol = build_protocol(steps)
+    ee = ExecutionEngine(use_ordinal_time=True, track_samples=False, **engine_args)
+    start = time.perf_counter()
+    ex = ee.execute(
+        protocol,
+        sbol3.Agent("benchmark_agent"),
+        parameter_values=[],
+        id="benchmark_execution",
+    )
+    return time.perf_counter() - start, len(ex.flows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--steps", type=int, default=40)
+    args = parser.parse_args()
+
+    protocol = build_protocol(1)
+    doc = protocol.document
+    execution = labop.ProtocolExecution("token_benchmark", protocol=protocol)
+    doc.add(execution)
+    record = labop.ActivityNodeExecution(node=protocol.initial())
+    execution.executions.append(record)
+    edge = protocol.edges[0]
+
+    for label, fn in [
+        ("ActivityEdgeFlow", control_flows),
+        ("Token", control_tokens),
+    ]:
+        size, _ = allocated_bytes(fn, execution, edge, record, args.tokens)
+        print(f"{label:20s} {size / args.tokens:10.0f} bytes / token")
+
+    for label, engine_args in [
+        ("eager flows", {}),
+        ("transient tokens", {"transient_tokens": True}),
+        ("no trace", {"record_trace": False}),
+    ]:
+        elapsed, flows = execution_time(args.steps, **engine_args)
+        print(f"{label:20s} {elapsed:10.2f} s, {flows} flows recorded")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Generate liquid handling protocols of a given shape for benchmarks.
+
+Each plate is prepared by its own sequence of steps: an EmptyContainer, a
+Provision of reagent into the wells, a chain of column-to-column Transfers
+(a serial dilution), and a set of Vortex steps that all use the same samples
+(a fork).  The steps for a plate are optionally nested in subprotocols.
+"""
+
+from typing import Dict, Tuple
+
+import sbol3
+import tyto
+
+import labop
+from labop.constants import PREFIX_MAP
+
+NAMESPACE = "https://bioprotocols.org/benchmark/"
+LIBRARIES = ["liquid_handling", "plate_handling", "sample_arrays", "spectrophotometry"]
+PLATE_QUERY = (
+    "https://sift.net/container-ontology/container-ontology#Corning96WellPlate360uLFlat"
+)
+ROWS = "ABCDEFGH"
+
+_libraries_imported = False
+
+
+def import_libraries():
+    global _libraries_imported
+    if not _libraries_imported:
+        for library in LIBRARIES:
+            labop.import_library(library)
+        _libraries_imported = True
+
+
+class ProtocolShape(object):
+    """
+    Parameters of a generated protocol.
+
+    plates : number of plates
+    wells : wells used on each plate (at most 96)
+    dilution_depth : column-to-column transfers on each plate (at most columns - 1)
+    fork_width : steps that use the samples of each plate
+    nesting : depth of subprotocols that contain the steps for each plate
+    """
+
+    def __init__(
+        self,
+        plates: int = 1,
+        wells: int = 24,
+        dilution_depth: int = 2,
+        fork_width: int = 2,
+        nesting: int = 0,
+    ):
+        self.plates = plates
+        self.wells = max(1, min(96, wells))
+        self.rows = max(1, min(len(ROWS), -(-self.wells // 12)))
+        self.columns = max(1, min(12, -(-self.wells // self.rows)))
+        self.dilution_depth = max(0, min(dilution_depth, self.columns - 1))
+        self.fork_width = fork_width
+        self.nesting = nesting
+
+    @property
+    def name(self) -> str:
+        return (
+            f"p{self.plates}_w{self.wells}_d{self.dilution_depth}"
+            f"_f{self.fork_width}_n{self.nesting}"
+        )
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "plates": self.plates,
+            "wells": self.wells,
+            "dilution_depth": self.dilution_depth,
+            "fork_width": self.fork_width,
+            "nesting": self.nesting,
+        }
+
+    def column(self, column: int) -> str:
+        return f"A{column}:{ROWS[self.rows - 1]}{column}"
+
+    def all_wells(self) -> str:
+        return f"A1:{ROWS[self.rows - 1]}{self.columns}"
+
+
+def add_plate_steps(
+    protocol: labop.Protocol,
+    shape: ProtocolShape,
+    plate_index: int,
+    reagent: sbol3.Component,
+):
+    spec = labop.ContainerSpec(
+        f"plate_{plate_index}",
+        name=f"plate {plate_index}",
+        queryString=PLATE_QUERY,
+        prefixMap=PREFIX_MAP,
+    )
+    plate = protocol.primitive_step("EmptyContainer", specification=spec)
+
+    def coordinates(rect: str):
+        return protocol.primitive_step(
+            "PlateCoordinates", source=plate.output_pin("samples"), coordinates=rect
+        ).output_pin("samples")
+
+    samples = coordinates(shape.all_wells())
+    protocol.primitive_step(
+        "Provision",
+        resource=reagent,
+        destination=samples,
+        amount=sbol3.Measure(100, tyto.OM.microliter),
+    )
+    for column in range(1, shape.dilution_depth + 1):
+        protocol.primitive_step(
+            "Transfer",
+            source=coordinates(shape.column(column)),
+            destination=coordinates(shape.column(column + 1)),
+            amount=sbol3.Measure(50, tyto.OM.microliter),
+        )
+    for _ in range(shape.fork_width):
+        protocol.primitive_step(
+            "Vortex", samples=samples, duration=sbol3.Measure(10, tyto.OM.second)
+        )
+
+
+def generate_protocol(
+    shape: ProtocolShape, name: str = "benchmark_protocol"
+) -> Tuple[labop.Protocol, sbol3.Document]:
+    import_libraries()
+    sbol3.set_namespace(NAMESPACE)
+    doc = sbol3.Document()
+    protocol = labop.Protocol(name)
+    doc.add(protocol)
+    reagent = sbol3.Component(
+        "reagent", "https://identifiers.org/pubchem.substance:24901740"
+    )
+    doc.add(reagent)
+
+    for p in range(shape.plates):
+        levels = [labop.Protocol(f"plate_{p}_level_{n}") for n in range(shape.nesting)]
+        for level in levels:
+            doc.add(level)
+        add_plate_steps(levels[-1] if levels else protocol, shape, p, reagent)
+        for outer, inner in zip(levels, levels[1:]):
+            outer.primitive_step(inner)
+        if levels:
+            protocol.primitive_step(levels[0])
+    return protocol, doc
@@ -1107,6 +1107,7 @@ def enablePrint():
 
 if __name__ == "__main__":
     harness = ProtocolHarness(
+        use_cache=True,
         entry_point=generate_protocol,
         artifacts=[
             ProtocolSpecialization(
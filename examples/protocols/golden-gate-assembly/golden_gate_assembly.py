@@ -131,6 +131,7 @@ def generate_protocol(
 
 if __name__ == "__main__":
     harness = ProtocolHarness(
+        use_cache=True,
         entry_point=generate_protocol,
         artifacts=[
             ProtocolSpecialization(
@@ -384,9 +384,10 @@ def generate_protocol(doc, protocol: labop.Protocol) -> labop.Protocol:
     # input_plate = labop.Container(name='497943_4_UWBF_to_stratoes', type=tyto.NCIT.Microplate, max_coordinate='H12')
 
     print("Validating document")
-    for e in doc.validate().errors:
+    report = doc.validate()
+    for e in report.errors:
         print(e)
-    for w in doc.validate().warnings:
+    for w in report.warnings:
         print(w)
 
     print("Writing document")
@@ -399,6 +400,7 @@ def generate_protocol(doc, protocol: labop.Protocol) -> labop.Protocol:
 
 if __name__ == "__main__":
     harness = ProtocolHarness(
+        use_cache=True,
         entry_point=generate_protocol,
         artifacts=[
             ProtocolSpecialization(
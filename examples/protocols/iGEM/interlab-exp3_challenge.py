@@ -707,6 +707,7 @@ class InterlabCustomSpecialization(labop.execution.harness.ProtocolSpecializatio
 
 if __name__ == "__main__":
     harness = labop.execution.harness.ProtocolHarness(
+        use_cache=True,
         protocol_name="interlab",
         clean_output=True,
         base_dir=os.path.join(os.path.dirname(__file__), "out", "out_igem_example3"),
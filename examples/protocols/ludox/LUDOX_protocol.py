@@ -135,6 +135,7 @@ def ludox_protocol(doc: Document, protocol: labop.Protocol) -> labop.Protocol:
 
 if __name__ == "__main__":
     harness = labop.execution.harness.ProtocolHarness(
+        use_cache=True,
         base_dir=os.path.dirname(__file__),
         entry_point=ludox_protocol,
         artifacts=[
@@ -127,6 +127,7 @@ def generate_protocol(doc: sbol3.Document, activity: Protocol) -> Protocol:
 
 if __name__ == "__main__":
     harness = ProtocolHarness(
+        use_cache=True,
         entry_point=generate_protocol,
         artifacts=[
             ProtocolSpecialization(
@@ -307,6 +307,7 @@ def create_protocol(doc, activity: labop.Protocol) -> labop.Protocol:
 
 if __name__ == "__main__":
     harness = labop.execution.harness.ProtocolHarness(
+        use_cache=True,
         base_dir=os.path.dirname(__file__),
         entry_point=create_protocol,
         artifacts=[
@@ -119,6 +119,7 @@ def opentrons_toy_protocol(doc: sbol3.Document, protocol: Protocol) -> Protocol:
 
 if __name__ == "__main__":
     harness = ProtocolHarness(
+        use_cache=True,
         entry_point=opentrons_toy_protocol,
         artifacts=[
             ProtocolSpecialization(
@@ -508,6 +508,7 @@ def generate_protocol(doc, protocol: labop.Protocol) -> labop.Protocol:
 if __name__ == "__main__":
     protocol_name = "PCR_purification"
     harness = labop.execution.harness.ProtocolHarness(
+        use_cache=True,
         base_dir=os.path.dirname(__file__),
         entry_point=generate_protocol,
         artifacts=[
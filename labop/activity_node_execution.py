@@ -2,7 +2,7 @@
 The ActivityNodeExecution class defines the functions corresponding to the dynamically generated labop class ActivityNodeExecution
 """
 
-from typing import Callable, List
+from typing import Callable, List, Optional
 
 from uml import (
     ActivityNode,
@@ -17,6 +17,9 @@ from . import inner
 
 
 class ActivityNodeExecution(inner.ActivityNodeExecution):
+    # Tokens consumed by the record, if its execution does not record flows
+    _incoming_tokens: Optional[List["Token"]] = None
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -26,7 +29,18 @@ class ActivityNodeExecution(inner.ActivityNodeExecution):
     def get_node(self) -> ActivityNode:
         return self.node.lookup()
 
+    def get_incoming_tokens(self) -> Optional[List["Token"]]:
+        """The Tokens consumed by the record, if its execution does not record flows"""
+        return self._incoming_tokens
+
+    def set_incoming_tokens(self, tokens: List["Token"]):
+        """Hold the Tokens consumed by the record in place of recorded flows"""
+        self._incoming_tokens = tokens
+
     def get_incoming_flows(self) -> List["ActivityEdgeFlow"]:
+        # Records of executions that do not record flows hold their Tokens instead
+        if self._incoming_tokens is not None:
+            return list(self._incoming_tokens)
         return [flow.lookup() for flow in self.incoming_flows]
 
     def check_next_tokens(
@@ -1,4 +1,15 @@
-from .execution_engine import *
+from .activity_template import *
+from .artifact_cache import *
+from .artifact_scheduler import *
 from .execution_context import *
+from .execution_engine import *
 from .execution_engine_utils import *
 from .harness import *
+from .id_allocator import *
+from .instrumentation import *
+from .loop_compaction import *
+from .reference_resolver import *
+from .sweep import *
+from .trace_commit import *
+from .transient_token import *
+from .validation import *
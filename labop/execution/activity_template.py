@@ -0,0 +1,138 @@
+"""
+Compiled templates of the ExecutionContexts of an Activity.
+
+Each invocation of a subprotocol creates an ExecutionContext for the invoked
+Activity, which needs the nodes and pins of the activity, the incoming edges
+of each of them (to hold the tokens that arrive on each edge), and the
+ActivityParameterNodes that receive the inputs and return the outputs of the
+call.  Protocols such as the iGEM examples call the same subprotocols many
+times, so an ActivityTemplate collects these once per Activity, and each
+invocation only makes a new (empty) map of tokens from the template.
+
+A template is kept by its Activity and is rebuilt if nodes or edges are
+added to, removed from, or replaced in the activity.  Changes to existing
+nodes and edges (e.g., a pin added to an action, or an edge given a new
+target) are counted by revisions shared by every activity, so they rebuild
+the templates of every activity when next invoked.
+"""
+
+import logging
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from uml import Action, Activity, ActivityEdge, ActivityNode, ActivityParameterNode
+from uml.control_flow import ControlFlow
+from uml.utils import NameIndexedMixin
+
+l: logging.Logger = logging.getLogger(__file__)
+
+
+class ActivityTemplate(object):
+    """
+    The parts of an Activity that each ExecutionContext invoking it uses.
+
+    Attributes
+    ----------
+    nodes : List[ActivityNode]
+        The nodes of the activity, followed by the pins of its actions
+    node_set : FrozenSet[ActivityNode]
+        The nodes and pins, for membership tests
+    incoming : List[Tuple[ActivityNode, List[ActivityEdge]]]
+        Each node and pin of the activity, with the edges of the activity that
+        target it
+    input_nodes : Dict[str, ActivityParameterNode]
+        The input ActivityParameterNode of each parameter name
+    output_nodes : Dict[str, ActivityParameterNode]
+        The output ActivityParameterNode of each parameter name
+    """
+
+    def __init__(self, activity: Activity):
+        self.activity = activity
+        self.initial = activity.initial()
+        self.final = activity.final()
+        self.nodes: List[ActivityNode] = list(activity.nodes) + [
+            p
+            for n in activity.nodes
+            if isinstance(n, Action)
+            for p in list(n.get_inputs()) + list(n.get_outputs())
+        ]
+        self.node_set: FrozenSet[ActivityNode] = frozenset(self.nodes)
+        initialized = list(activity.nodes)
+        initialized += [
+            o for n in activity.nodes if hasattr(n, "outputs") for o in n.outputs
+        ]
+        initialized += [
+            i for n in activity.nodes if hasattr(n, "inputs") for i in n.inputs
+        ]
+        targets = activity._edge_index()["targets"]
+        self.incoming: List[Tuple[ActivityNode, List[ActivityEdge]]] = [
+            (node, list(targets.get(node.identity, []))) for node in initialized
+        ]
+        self.input_nodes: Dict[str, ActivityParameterNode] = {}
+        self.output_nodes: Dict[str, ActivityParameterNode] = {}
+        for node in activity.nodes:
+            if isinstance(node, ActivityParameterNode):
+                nodes = self.input_nodes if node.is_input() else self.output_nodes
+                nodes.setdefault(node.get_parameter().name, node)
+        self.stamp = _stamp(activity)
+
+    def incoming_edge_tokens(self) -> Dict[ActivityNode, Dict[ActivityEdge, List]]:
+        """A new map from each node to each of its incoming edges to the (no) tokens on the edge"""
+        return {node: {e: [] for e in edges} for node, edges in self.incoming}
+
+    def input_node(self, name: str) -> ActivityParameterNode:
+        try:
+            return self.input_nodes[name]
+        except KeyError:
+            raise Exception(
+                f"Could not find ActivityNodeParameter {name} in {self.activity}"
+            )
+
+    def output_node(self, name: str) -> ActivityParameterNode:
+        try:
+            return self.output_nodes[name]
+        except KeyError:
+            raise Exception(
+                f"Could not find ActivityNodeParameter {name} in {self.activity}"
+            )
+
+
+def activity_template(activity: Activity) -> ActivityTemplate:
+    """
+    The ActivityTemplate of an activity, built when the activity is first
+    invoked or after it has been modified.  The activity's final node is
+    ordered after its last step (if present), or else after its initial
+    node, if it is not already.
+    """
+    source = (
+        activity.last_step if hasattr(activity, "last_step") else activity.initial()
+    )
+    final = activity.final()
+    if not any(
+        isinstance(e, ControlFlow) and str(e.target) == final.identity
+        for e in activity._edge_index()["sources"].get(source.identity, [])
+    ):
+        activity.order(source, final)
+
+    template: Optional[ActivityTemplate] = activity.__dict__.get("_execution_template")
+    if template is None or template.stamp != _stamp(activity):
+        template = ActivityTemplate(activity)
+        activity.__dict__["_execution_template"] = template
+    return template
+
+
+def _stamp(activity: Activity) -> Tuple:
+    """
+    Changes if nodes or edges are added to, removed from, or replaced in the
+    activity, or if pins, parameter names, or edge ends change (in any activity)
+    """
+    nodes = activity.nodes
+    edges = activity.edges
+    return (
+        activity.identity,
+        len(nodes),
+        nodes[-1] if len(nodes) else None,
+        len(edges),
+        edges[-1] if len(edges) else None,
+        ActivityNode.structure_revision,
+        NameIndexedMixin.revision,
+    )
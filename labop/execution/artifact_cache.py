@@ -0,0 +1,258 @@
+"""
+Content-hash caching of harness artifacts.
+
+Each artifact generated by a ProtocolHarness is keyed by a hash of its inputs:
+the sources of the module that defines the protocol entry point and of the
+local modules that it imports (e.g., a helper module next to an example), the
+library
+TTL files, the parameter values, the harness configuration, the LabOP sources
+that generate the artifact, and the artifact's own configuration.  An artifact
+whose key matches the key recorded by a previous run, and whose output files
+still exist, is up to date and is not generated again.  As with make, an
+artifact that depends upon a regenerated artifact is also regenerated.
+
+Only the artifacts of a ProtocolHarness(use_cache=True) are cached.  The
+example scripts build and run their harnesses only when run as scripts, so
+the cache speeds up reruns of the examples, but not of test/test_examples.py,
+which imports them.
+"""
+
+import ast
+import functools
+import glob
+import hashlib
+import inspect
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import sbol3
+
+from labop.library import library_filename
+from labop.utils.sbol_properties import owned_objects, property_values
+
+l: logging.Logger = logging.getLogger(__file__)
+
+# Packages whose sources determine the contents of artifacts
+TOOLCHAIN_PACKAGES = ["labop", "uml", "labop_convert"]
+
+
+def file_digest(filename: str) -> str:
+    """sha256 of a file's contents, or of its name if it does not exist"""
+    h = hashlib.sha256()
+    if os.path.isfile(filename):
+        with open(filename, "rb") as f:
+            h.update(f.read())
+    else:
+        h.update(f"missing:{filename}".encode())
+    return h.hexdigest()
+
+
+def text_digest(*values: Any) -> str:
+    h = hashlib.sha256()
+    for v in values:
+        h.update(str(v).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def toolchain_digest() -> str:
+    """Digest of the Python and TTL sources of the packages in TOOLCHAIN_PACKAGES"""
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+    files = []
+    for package in TOOLCHAIN_PACKAGES:
+        for extension in ["py", "ttl"]:
+            files += glob.glob(
+                os.path.join(root, package, "**", f"*.{extension}"), recursive=True
+            )
+    return text_digest(
+        *[f"{os.path.relpath(f, root)}:{file_digest(f)}" for f in sorted(files)]
+    )
+
+
+def local_imports(filename: str) -> List[str]:
+    """
+    The files of a module and of the modules that it imports from its own
+    directory (or, with relative imports, from its package), recursively.
+    """
+    files = []
+    pending = [os.path.realpath(filename)]
+    while pending:
+        current = pending.pop()
+        if current in files:
+            continue
+        files.append(current)
+        try:
+            with open(current) as f:
+                tree = ast.parse(f.read(), current)
+        except (OSError, SyntaxError, ValueError) as e:
+            l.warning(f"Cannot find the imports of {current}: {e}")
+            continue
+        directory = os.path.dirname(current)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                candidates = [(directory, a.name.split(".")) for a in node.names]
+            elif isinstance(node, ast.ImportFrom):
+                base = directory
+                for _ in range(node.level - 1):
+                    base = os.path.dirname(base)
+                module = node.module.split(".") if node.module else []
+                # The imported names may be modules of a package, too
+                candidates = [(base, module)] + [
+                    (base, module + [a.name]) for a in node.names
+                ]
+            else:
+                continue
+            for base, parts in candidates:
+                if not parts:
+                    continue
+                path = os.path.join(base, *parts)
+                for module_file in [f"{path}.py", os.path.join(path, "__init__.py")]:
+                    if os.path.isfile(module_file):
+                        pending.append(os.path.realpath(module_file))
+    return files
+
+
+def entry_point_digest(entry_point: Callable) -> str:
+    """
+    Digest of the module source that defines the entry point, and of the local
+    modules that it imports.  A ProtocolLoader entry point is keyed by the file
+    that it loads.
+    """
+    loader = getattr(entry_point, "__self__", None)
+    filename = getattr(loader, "filename", None)
+    if filename is None:
+        try:
+            filename = inspect.getsourcefile(entry_point)
+        except TypeError:
+            filename = None
+    if filename is not None and os.path.isfile(filename):
+        directory = os.path.dirname(os.path.realpath(filename))
+        return text_digest(
+            *[
+                f"{os.path.relpath(f, directory)}:{file_digest(f)}"
+                for f in local_imports(filename)
+            ]
+        )
+    try:
+        return text_digest(inspect.getsource(entry_point))
+    except (OSError, TypeError):
+        l.warning(
+            f"Cannot find the source of {entry_point}, artifacts will not be cached"
+        )
+        return text_digest(id(entry_point))
+
+
+def library_digest(libraries: Iterable[str]) -> str:
+    return text_digest(
+        *[
+            f"{library}:{file_digest(library_filename(library))}"
+            for library in libraries
+        ]
+    )
+
+
+def fingerprint(value: Any) -> Any:
+    """
+    A JSON-serializable representation of a value, such as a ParameterValue,
+    that does not depend upon generated identities.
+    """
+    if isinstance(value, sbol3.Identified):
+        properties = {
+            k: [str(v) for v in vs]
+            for k, vs in property_values(value).items()
+            if k != sbol3.SBOL_DISPLAY_ID and vs
+        }
+        children = {
+            k: [fingerprint(child) for child in children]
+            for k, children in owned_objects(value).items()
+            if children
+        }
+        return {"type": value.type_uri, "properties": properties, "children": children}
+    if isinstance(value, dict):
+        return {str(k): fingerprint(v) for k, v in sorted(value.items(), key=str)}
+    if isinstance(value, (list, tuple, set)):
+        return [fingerprint(v) for v in value]
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return repr(value)
+
+
+class ArtifactCache(object):
+    """
+    The keys and results of the artifacts generated in one output directory.
+    The manifest of keys is stored in `manifest_filename`.
+    """
+
+    manifest_filename = "harness.cache.json"
+
+    def __init__(self, output_dir: str, inputs: Dict[str, Any]):
+        self.filename = os.path.join(output_dir, self.manifest_filename)
+        self.inputs_digest = text_digest(
+            json.dumps(fingerprint(inputs), sort_keys=True)
+        )
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.inputs_match = False
+        self.load()
+
+    def load(self):
+        self.entries = {}
+        self.inputs_match = False
+        if not os.path.isfile(self.filename):
+            return
+        try:
+            with open(self.filename) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            l.warning(f"Ignoring unreadable artifact cache {self.filename}: {e}")
+            return
+        self.inputs_match = manifest.get("inputs") == self.inputs_digest
+        if self.inputs_match:
+            self.entries = manifest.get("artifacts", {})
+
+    def save(self):
+        with open(self.filename, "w") as f:
+            json.dump(
+                {"inputs": self.inputs_digest, "artifacts": self.entries},
+                f,
+                indent=4,
+                sort_keys=True,
+            )
+
+    def key(self, configuration: Dict[str, Any], dependency_keys: List[str]) -> str:
+        return text_digest(
+            self.inputs_digest,
+            json.dumps(fingerprint(configuration), sort_keys=True),
+            *dependency_keys,
+        )
+
+    def lookup(self, label: str, key: str) -> Optional[Dict[str, Any]]:
+        """The cached entry for an artifact, if it is up to date"""
+        entry = self.entries.get(label)
+        if entry is None or entry["key"] != key:
+            return None
+        if not all(os.path.exists(o) for o in entry["outputs"]):
+            return None
+        return entry
+
+    def store(
+        self,
+        label: str,
+        key: str,
+        status: str,
+        results: Dict[str, Any],
+        filename: Optional[str],
+        outputs: List[str],
+    ):
+        self.entries[label] = {
+            "key": key,
+            "status": status,
+            "results": results,
+            "filename": filename,
+            "outputs": outputs,
+        }
+
+    def discard(self, label: str):
+        self.entries.pop(label, None)
@@ -0,0 +1,117 @@
+"""
+Dependency-ordered, concurrent generation of harness artifacts.
+
+The ProtocolHarness describes its artifacts as a DAG: each artifact lists the
+artifacts whose outputs it reads (e.g., a ProtocolDiagram reads the protocol
+generated by ProtocolNTuples).  The ArtifactScheduler runs an artifact once all
+of its dependencies have completed, using a pool of worker threads.  Artifacts
+that modify the shared SBOL document are exclusive, and run while no other
+artifact is running.  Rendering with Graphviz invokes the `dot` executable in a
+subprocess, so diagrams render in parallel.
+"""
+
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Hashable, List, Set
+
+l: logging.Logger = logging.getLogger(__file__)
+
+
+class ArtifactScheduler(object):
+    def __init__(self, max_workers: int = 1):
+        if max_workers < 1:
+            raise ValueError(f"max_workers must be positive: {max_workers}")
+        self.max_workers = max_workers
+
+    def run(
+        self,
+        artifacts: List[Hashable],
+        dependencies: Dict[Hashable, List[Hashable]],
+        exclusive: Set[Hashable],
+        task: Callable[[Hashable], None],
+    ) -> Dict[Hashable, float]:
+        """
+        Run task on each artifact, after the artifacts it depends upon.
+
+        Parameters
+        ----------
+        artifacts : List
+            Artifacts in priority order.  When several artifacts are ready, they
+            start in this order, so a single worker reproduces the order exactly.
+        dependencies : Dict
+            The artifacts that must complete before each artifact starts.
+            Dependencies that are not in `artifacts` are ignored.
+        exclusive : Set
+            Artifacts that must not run concurrently with any other artifact.
+        task : Callable
+            Function that generates one artifact.
+
+        Returns
+        -------
+        Dict
+            Wall clock seconds taken by each artifact.
+
+        Raises
+        ------
+        Exception
+            The first exception raised by task, in priority order, after
+            running artifacts have completed.  No further artifacts are started
+            once an artifact has raised an exception.
+        """
+        scheduled = set(artifacts)
+        waiting_on = {
+            a: {d for d in dependencies.get(a, []) if d in scheduled and d is not a}
+            for a in artifacts
+        }
+        pending = list(artifacts)
+        running: Dict[Future, Hashable] = {}
+        timings: Dict[Hashable, float] = {}
+        errors: Dict[Hashable, Exception] = {}
+
+        def timed(artifact):
+            start = time.perf_counter()
+            try:
+                task(artifact)
+            finally:
+                timings[artifact] = time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                if not errors:
+                    for artifact in list(pending):
+                        if len(running) >= self.max_workers:
+                            break
+                        if waiting_on[artifact]:
+                            continue
+                        running_exclusive = any(
+                            a in exclusive for a in running.values()
+                        )
+                        if running_exclusive or (artifact in exclusive and running):
+                            break
+                        pending.remove(artifact)
+                        running[pool.submit(timed, artifact)] = artifact
+                        if artifact in exclusive:
+                            break
+                    if not running:
+                        unresolved = [a for a in pending if waiting_on[a]]
+                        raise ValueError(
+                            f"Artifact dependencies cannot be satisfied: {unresolved}"
+                        )
+                elif not running:
+                    break
+
+                done, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    artifact = running.pop(future)
+                    exception = future.exception()
+                    if exception is not None:
+                        errors[artifact] = exception
+                        continue
+                    for a in pending:
+                        waiting_on[a].discard(artifact)
+
+        if errors:
+            first = next(a for a in artifacts if a in errors)
+            raise errors[first]
+        return timings
@@ -0,0 +1,313 @@
+"""
+Run many protocols through their ProtocolHarnesses, one worker process per protocol.
+
+sbol3.set_namespace() and labop.library.loaded_libraries are process globals,
+so harnesses cannot safely share a process.  The BatchRunner imports LabOP and
+loads the libraries once, then forks a worker process for each protocol, so
+that every protocol starts from the same warmed state and cannot affect the
+others.  Each worker runs the protocol's module as __main__, runs any
+ProtocolHarness that the module creates but does not run, and reports the
+status, results, and generation time of each artifact, the wall clock time,
+and the peak resident memory of the worker.
+"""
+
+import argparse
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import re
+import runpy
+import sys
+import time
+import traceback
+from multiprocessing.connection import wait
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from labop.library import import_library
+
+from .harness import ProtocolArtifactStatus, ProtocolHarness
+
+l: logging.Logger = logging.getLogger(__file__)
+
+DEFAULT_LIBRARIES = [
+    "liquid_handling",
+    "plate_handling",
+    "spectrophotometry",
+    "sample_arrays",
+    "culturing",
+]
+
+
+class ProtocolRunStatus:
+    """The status of a protocol in a batch"""
+
+    PASS = ProtocolArtifactStatus.PASS
+    FAIL = ProtocolArtifactStatus.FAIL
+    ERROR = "error"
+    TIMEOUT = "timeout"
+
+
+def discover_example_protocols(example_directory: str) -> List[str]:
+    """Python files under example_directory that create a Protocol"""
+    candidate_protocols = glob.glob(f"{example_directory}/**/*py", recursive=True)
+    actual_protocols = []
+    for p in candidate_protocols:
+        with open(p, "r") as f:
+            lines = f.readlines()
+            try:
+                if next(l for l in lines if re.match(r".*Protocol\(.*\)", l)):
+                    actual_protocols.append(p)
+            except:
+                # Cannot find a Protocol
+                continue
+    return actual_protocols
+
+
+def peak_memory_kb() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # bytes on macOS
+
+
+def harness_report(harness) -> Dict[str, Any]:
+    artifacts = []
+    for a in harness.all_artifacts:
+        label = harness.artifact_label(a)
+        artifacts.append(
+            {
+                "label": label,
+                "artifact": a.__class__.__name__,
+                "status": a.status,
+                "seconds": harness.timings.get(label),
+                "results": a.results,
+            }
+        )
+    failed = [a for a in artifacts if a["status"] == ProtocolArtifactStatus.FAIL]
+    return {
+        "protocol_name": harness.protocol_name,
+        "output_dir": os.path.abspath(harness.full_output_dir),
+        "status": ProtocolArtifactStatus.FAIL
+        if failed
+        else ProtocolArtifactStatus.PASS,
+        "artifacts": artifacts,
+    }
+
+
+def run_protocol(filename: str, output_dir: str) -> Dict[str, Any]:
+    """
+    Run the module in filename as __main__ from output_dir, and then run each
+    ProtocolHarness in the module that has not been run.
+    """
+    filename = os.path.abspath(filename)
+    os.makedirs(output_dir, exist_ok=True)
+    os.chdir(output_dir)
+    sys.argv = [filename]
+    sys.path.insert(0, os.path.dirname(filename))
+
+    module_globals = runpy.run_path(filename, run_name="__main__")
+    harnesses = {
+        name: h for name, h in module_globals.items() if isinstance(h, ProtocolHarness)
+    }
+    for name, harness in harnesses.items():
+        if all(
+            a.status == ProtocolArtifactStatus.PENDING for a in harness.all_artifacts
+        ):
+            l.info(f"Running ProtocolHarness '{name}' ...")
+            harness.run()
+    return {name: harness_report(h) for name, h in harnesses.items()}
+
+
+def _worker(filename: str, output_dir: str, connection):
+    start = time.perf_counter()
+    report: Dict[str, Any] = {"filename": filename, "output_dir": output_dir}
+    try:
+        report["harnesses"] = run_protocol(filename, output_dir)
+        failed = any(
+            h["status"] == ProtocolRunStatus.FAIL for h in report["harnesses"].values()
+        )
+        report["status"] = ProtocolRunStatus.FAIL if failed else ProtocolRunStatus.PASS
+    except BaseException as e:
+        report["status"] = ProtocolRunStatus.ERROR
+        report["exception"] = f"{e.__class__.__name__}: {e}"
+        report["traceback"] = traceback.format_exc()
+    report["seconds"] = time.perf_counter() - start
+    report["peak_memory_kb"] = peak_memory_kb()
+    connection.send(json.dumps(report, default=str))
+    connection.close()
+
+
+class BatchRunner(object):
+    """
+    Runs protocols in worker processes.
+
+    Parameters
+    ----------
+    output_dir : str
+        Directory under which each protocol runs, in a subdirectory named for
+        the protocol file.
+    max_workers : int
+        Number of protocols to run at once.
+    timeout : float
+        Seconds after which a protocol's worker is terminated, or None.
+    libraries : List[str]
+        Libraries to load before forking workers.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        max_workers: int = 1,
+        timeout: Optional[float] = None,
+        libraries: List[str] = DEFAULT_LIBRARIES,
+    ):
+        self.output_dir = os.path.abspath(output_dir)
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.libraries = libraries
+        # Forked workers inherit the imports and libraries loaded by warm()
+        methods = multiprocessing.get_all_start_methods()
+        self.context = multiprocessing.get_context(
+            "fork" if "fork" in methods else None
+        )
+
+    def warm(self):
+        import labop_convert  # noqa: F401
+
+        if self.context.get_start_method() == "fork":
+            for library in self.libraries:
+                import_library(library)
+
+    def protocol_output_dir(self, filename: str, base: str) -> str:
+        relative = os.path.relpath(os.path.abspath(filename), base)
+        return os.path.join(self.output_dir, os.path.splitext(relative)[0])
+
+    def run(self, filenames: List[str], base: str = None) -> Dict[str, Any]:
+        """Run each protocol file, and return the batch report"""
+        base = (
+            os.path.commonpath([os.path.dirname(os.path.abspath(f)) for f in filenames])
+            if base is None and len(filenames) > 0
+            else base
+        )
+        self.warm()
+        start = time.perf_counter()
+        pending = list(filenames)
+        running = {}  # sentinel -> (filename, process, connection, start time)
+        reports = {}
+
+        while pending or running:
+            while pending and len(running) < self.max_workers:
+                filename = pending.pop(0)
+                receiver, sender = self.context.Pipe(duplex=False)
+                process = self.context.Process(
+                    target=_worker,
+                    args=(filename, self.protocol_output_dir(filename, base), sender),
+                )
+                process.start()
+                sender.close()
+                running[process.sentinel] = (
+                    filename,
+                    process,
+                    receiver,
+                    time.perf_counter(),
+                )
+                l.info(f"Started {filename}")
+
+            timeout = None
+            if self.timeout is not None:
+                timeout = max(
+                    0.0,
+                    min(s + self.timeout for _, _, _, s in running.values())
+                    - time.perf_counter(),
+                )
+            ready = wait(
+                [c for _, _, c, _ in running.values()] + list(running.keys()),
+                timeout=timeout,
+            )
+
+            for sentinel, (filename, process, receiver, started) in list(
+                running.items()
+            ):
+                elapsed = time.perf_counter() - started
+                report = None
+                if receiver in ready or sentinel in ready:
+                    try:
+                        report = json.loads(receiver.recv())
+                    except EOFError:
+                        process.join()
+                        report = {
+                            "filename": filename,
+                            "status": ProtocolRunStatus.ERROR,
+                            "exception": f"Worker exited with code {process.exitcode}",
+                            "seconds": elapsed,
+                            "peak_memory_kb": None,
+                        }
+                elif self.timeout is not None and elapsed >= self.timeout:
+                    process.terminate()
+                    report = {
+                        "filename": filename,
+                        "status": ProtocolRunStatus.TIMEOUT,
+                        "exception": f"Timed out after {self.timeout} s",
+                        "seconds": elapsed,
+                        "peak_memory_kb": None,
+                    }
+                if report is not None:
+                    process.join()
+                    receiver.close()
+                    del running[sentinel]
+                    reports[filename] = report
+                    l.info(f"Finished {filename}: {report['status']}")
+
+        protocols = [reports[f] for f in filenames]
+        statuses = [p["status"] for p in protocols]
+        return {
+            "output_dir": self.output_dir,
+            "max_workers": self.max_workers,
+            "seconds": time.perf_counter() - start,
+            "summary": {s: statuses.count(s) for s in sorted(set(statuses))},
+            "protocols": protocols,
+        }
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(
+        description="Run protocols through their ProtocolHarnesses in worker processes"
+    )
+    parser.add_argument(
+        "paths", nargs="+", help="Protocol files, or directories to search"
+    )
+    parser.add_argument("--output-dir", "-o", default="batch_out")
+    parser.add_argument("--report", "-r", default=None, help="Report file (JSON)")
+    parser.add_argument("--workers", "-j", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--timeout", type=float, default=None)
+    args = parser.parse_args(argv)
+
+    filenames = []
+    for path in args.paths:
+        filenames += (
+            sorted(discover_example_protocols(path)) if os.path.isdir(path) else [path]
+        )
+
+    runner = BatchRunner(
+        args.output_dir, max_workers=args.workers, timeout=args.timeout
+    )
+    report = runner.run(filenames)
+    report_file = (
+        args.report if args.report else os.path.join(args.output_dir, "batch.json")
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(report_file)), exist_ok=True)
+    with open(report_file, "w") as f:
+        json.dump(report, f, indent=4, default=str)
+    print(f"{report['summary']} in {report['seconds']:.1f} s, report: {report_file}")
+    return 0 if set(report["summary"].keys()) <= {ProtocolRunStatus.PASS} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
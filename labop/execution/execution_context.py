@@ -5,7 +5,6 @@ import sbol3
 from labop.call_behavior_execution import CallBehaviorExecution
 from labop.parameter_value import ParameterValue
 from uml import (
-    Action,
     Activity,
     ActivityEdge,
     ActivityNode,
@@ -25,6 +24,8 @@ from uml.behavior import Behavior
 from uml.final_node import FinalNode
 from uml.initial_node import InitialNode
 
+from .activity_template import activity_template
+
 
 class ExecutionContext(object):
     """
@@ -53,12 +54,17 @@ class ExecutionContext(object):
         """Reference to the shared execution_trace """
         self.execution_trace = execution_trace
         self.call_pins = []  # FIXME remove?
-
-        nodes_to_initialize: List[ActivityNode] = []
+        # Edges of the execution trace between this context and its
+        # invocations, by source and by target identity
+        self.call_edges: Dict[str, Dict[str, List[ActivityEdge]]] = {
+            "sources": {},
+            "targets": {},
+        }
 
         if parent_context is None:
             self.execution_trace.execution_context = self  # Needed for to_dot()
             self.activity = None
+            self.template = None
             # If there is no parent context, then initialize a CallBehaviorAction that is calling the Activity
             # This CallBehaviorAction will later be expanded into a new ExecutionContext that includes the Activity ActivityNodes with ExecutionContext.invoke_activity.
             self.initial_node = InitialNode()
@@ -68,13 +74,13 @@ class ExecutionContext(object):
             execution_trace.activity_call_node.append(self.initial_node)
             execution_trace.activity_call_node.append(self.final_node)
 
-            self.execution_trace.activity_call_edge.append(
+            self.add_call_edge(
                 ControlFlow(source=self.initial_node, target=self.invoke_activity_node)
             )
-            self.execution_trace.activity_call_edge.append(
+            self.add_call_edge(
                 ControlFlow(source=self.invoke_activity_node, target=self.final_node)
             )
-            self.execution_trace.activity_call_edge.append(
+            self.add_call_edge(
                 ControlFlow(source=self.initial_node, target=self.final_node)
             )
 
@@ -87,47 +93,26 @@ class ExecutionContext(object):
             # # execution_trace.executions.append(ActivityNodeExecution(node=self.call_protocol_node))
             self.create_invocation_pins(activity)
             self.ready.append(self.initial_node)
-            nodes_to_initialize += execution_trace.activity_call_node
-            nodes_to_initialize += self.call_pins
             self.nodes = [
                 self.initial_node,
                 self.final_node,
                 self.invoke_activity_node,
             ] + self.call_pins
+
+            # Setup incoming edge map for each node
+            for node in list(execution_trace.activity_call_node) + self.call_pins:
+                self.incoming_edge_tokens[node] = {}
+                for e in self.incoming_edges(node):
+                    self.incoming_edge_tokens[node][e] = []
+            self.node_set = set(self.nodes)
         else:
+            # The nodes and incoming edges of each invocation of an activity
+            # are the same, so they are collected once in its template
             self.activity = activity
-            nodes_to_initialize += self.activity.nodes
-            nodes_to_initialize += [
-                o
-                for n in self.activity.nodes
-                if hasattr(n, "outputs")
-                for o in n.outputs
-            ]
-            nodes_to_initialize += [
-                i for n in self.activity.nodes if hasattr(n, "inputs") for i in n.inputs
-            ]
-            self.nodes = list(self.activity.nodes) + [
-                p
-                for n in [cba for cba in self.activity.nodes if isinstance(cba, Action)]
-                for p in list(n.get_inputs()) + list(n.get_outputs())
-            ]
-
-        # Setup incoming edge map for each node
-        for node in nodes_to_initialize:
-            self.incoming_edge_tokens[node] = {}
-            for e in self.incoming_edges(node):
-                self.incoming_edge_tokens[node][e] = []
-            # if isinstance(node, ActivityParameterNode) and node.is_input():
-            #     # if matching input parameters, then add dummy edge value
-            #     param_values = [
-            #         pv
-            #         for pv in self.parameter_values
-            #         if pv.get_parameter() == node.get_parameter()
-            #     ]
-            #     for pv in param_values:
-            #         self.incoming_edge_tokens[node][
-            #             pv.get_parameter()
-            #         ] = pv.value()
+            self.template = activity_template(activity)
+            self.nodes = self.template.nodes
+            self.node_set = self.template.node_set
+            self.incoming_edge_tokens = self.template.incoming_edge_tokens()
 
     def create_invocation_pins(self, activity: Behavior):
         # Make pins for the activity
@@ -162,7 +147,7 @@ class ExecutionContext(object):
                     input = ObjectFlow(
                         source=value_pin, target=self.invoke_activity_node
                     )
-                    self.execution_trace.activity_call_edge.append(input)
+                    self.add_call_edge(input)
                     self.input_edges.append(input)  # FIXME remove?
         for o in activity.get_parameters(output_only=True):
             output_pin = OutputPin(
@@ -175,17 +160,25 @@ class ExecutionContext(object):
 
             # Connect to CallBehaviorAction
             end = ObjectFlow(source=self.invoke_activity_node, target=output_pin)
-            self.execution_trace.activity_call_edge.append(end)
+            self.add_call_edge(end)
             self.output_edges.append(end)  # FIXME remove?
 
+    def add_call_edge(self, edge: ActivityEdge, *contexts: "ExecutionContext"):
+        """Add an edge to the execution trace that connects the nodes of this context (and of `contexts`)"""
+        self.execution_trace.activity_call_edge.append(edge)
+        for context in (self,) + contexts:
+            context.call_edges["sources"].setdefault(str(edge.source), []).append(edge)
+            context.call_edges["targets"].setdefault(str(edge.target), []).append(edge)
+
+    def has_node(self, node: ActivityNode) -> bool:
+        return node in self.node_set
+
     def outgoing_edges(self, node):
         out_edges = []
         # if node in self.activity.nodes:
         if self.activity:
             out_edges += self.activity.outgoing_edges(node)
-        out_edges += [
-            e for e in self.execution_trace.activity_call_edge if e.get_source() == node
-        ]
+        out_edges += self.call_edges["sources"].get(node.identity, [])
         return out_edges
 
     def incoming_edges(self, node):
@@ -193,21 +186,23 @@ class ExecutionContext(object):
         # if node in self.activity.nodes:
         if self.activity:
             in_edges += self.activity.incoming_edges(node)
-        in_edges += [
-            e for e in self.execution_trace.activity_call_edge if e.get_target() == node
-        ]
+        in_edges += self.call_edges["targets"].get(node.identity, [])
         return in_edges
 
+    def invoked_by_execution(self) -> bool:
+        """Whether this is the context of the protocol that the execution
+        invokes, rather than of a subprotocol"""
+        return (
+            self.parent_context is not None
+            and self.parent_context.parent_context is None
+        )
+
     def get_invocation_edge(self, source: ActivityNode, target: ActivityNode):
         try:
             return next(
-                iter(
-                    [
-                        e
-                        for e in self.execution_trace.activity_call_edge
-                        if e.get_source() == source and e.get_target() == target
-                    ]
-                )
+                e
+                for e in self.call_edges["targets"].get(target.identity, [])
+                if str(e.source) == source.identity
             )
         except StopIteration:
             raise Exception(f"Could not find invocation edge from {source} to {target}")
@@ -254,13 +249,6 @@ class ExecutionContext(object):
             ParameterValue
         ] = call_behavior_execution.get_call().parameter_values
         call_behavior_action = call_behavior_execution.get_node()
-        # Ensure that the behavior has an initial and final node
-        # Order the final node after the last_step (if present)
-        activity.initial()
-        if hasattr(activity, "last_step"):
-            activity.order(activity.last_step, activity.final())
-        else:
-            activity.order(activity.initial(), activity.final())
 
         activity_context = ExecutionContext(
             self.execution_trace,
@@ -268,6 +256,7 @@ class ExecutionContext(object):
             parameter_values,
             parent_context=self,
         )
+        template = activity_context.template
 
         # # Make an invocation node for the activity
         # activity_context.invoke_activity_node = CallBehaviorAction(behavior=behavior)
@@ -283,39 +272,23 @@ class ExecutionContext(object):
         # However, connect each ObjectFlow to the corresponding ActivityParameterNode
         for edge in self.incoming_edges(call_behavior_action):
             if isinstance(edge, ObjectFlow):
-                try:
-                    activity_parameter_node = next(
-                        iter(
-                            [
-                                n
-                                for n in activity.get_nodes(
-                                    name=edge.get_source().name,
-                                    node_type=ActivityParameterNode,
-                                )
-                                if n.is_input()
-                            ]
-                        )
-                    )
-                except StopIteration:
-                    raise Exception(
-                        f"Could not find ActivityNodeParameter {edge.get_source().name} in {activity}"
-                    )
+                activity_parameter_node = template.input_node(edge.get_source().name)
                 input_flow = ObjectFlow(
                     source=edge.get_source(), target=activity_parameter_node
                 )
-                self.execution_trace.activity_call_edge.append(input_flow)
+                self.add_call_edge(input_flow, activity_context)
                 activity_context.incoming_edge_tokens[activity_parameter_node][
                     input_flow
                 ] = []
                 self.input_edges.append(input_flow)
 
         # parent.CBA -> child.InitialNode
-        init = activity_context.activity.initial()
+        init = template.initial
         start = ControlFlow(
             source=call_behavior_action,
             target=init,
         )
-        activity_context.execution_trace.activity_call_edge.append(start)
+        self.add_call_edge(start, activity_context)
         activity_context.incoming_edge_tokens[init][start] = []
 
         # Control edges with call_behavior_action as source are replicated with the activity_context.activity as source
@@ -324,34 +297,18 @@ class ExecutionContext(object):
                 t = edge.get_target()
                 # if isinstance(t, FinalNode):
                 # child.FinalNode -> parent.cba.controlflow.target
-                if t in self.get_nodes():
+                if self.has_node(t):
                     end = ControlFlow(
-                        source=activity_context.activity.final(),
+                        source=template.final,
                         target=t,
                     )
-                    activity_context.execution_trace.activity_call_edge.append(end)
+                    self.add_call_edge(end, activity_context)
                     if t not in self.incoming_edge_tokens:
                         self.incoming_edge_tokens[t] = {}
                     self.incoming_edge_tokens[t][end] = []
 
             elif isinstance(edge, ObjectFlow):
-                try:
-                    activity_parameter_node = next(
-                        iter(
-                            [
-                                n
-                                for n in activity.get_nodes(
-                                    name=edge.get_target().name,
-                                    node_type=ActivityParameterNode,
-                                )
-                                if n.is_output()
-                            ]
-                        )
-                    )
-                except StopIteration:
-                    raise Exception(
-                        f"Could not find ActivityNodeParameter {edge.get_source().name} in {activity}"
-                    )
+                activity_parameter_node = template.output_node(edge.get_target().name)
 
                 output = ObjectFlow(
                     source=activity_parameter_node,
@@ -359,7 +316,7 @@ class ExecutionContext(object):
                         activity_parameter_node.get_parameter().name
                     ),
                 )
-                self.execution_trace.activity_call_edge.append(output)
+                self.add_call_edge(output, activity_context)
                 self.incoming_edge_tokens[output.get_target()][output] = []
                 self.output_edges.append(output)
         return activity_context
@@ -1,14 +1,12 @@
 import datetime
-import hashlib
+import html
 import logging
 import os
 import types
-import uuid
 from abc import ABC
 from typing import Callable, Dict, List, Optional, Tuple, Union
 
 import graphviz
-import pandas as pd
 import sbol3
 from numpy import record
 
@@ -23,34 +21,40 @@ from labop.protocol import Protocol
 from labop.protocol_execution import ProtocolExecution
 from labop.sample_data import SampleData
 from labop.strings import Strings
-from uml import ActivityNode, CallBehaviorAction
+from uml import ActivityNode, CallBehaviorAction, DotStream
 from uml.action import Action
 from uml.activity import Activity
 from uml.activity_edge import ActivityEdge
 from uml.activity_parameter_node import ActivityParameterNode
+from uml.decision_node import DecisionDispatch, DecisionNode
 from uml.fork_node import ForkNode
+from uml.literal_identified import LiteralIdentified
 from uml.literal_specification import LiteralSpecification
 from uml.object_flow import ObjectFlow
 from uml.output_pin import OutputPin
 from uml.parameter import Parameter
 from uml.pin import Pin
 from uml.utils import WellFormednessIssue, WellformednessLevels, literal
+from uml.value_pin import ValuePin
 
 from .behavior_dynamics import SampleProvenanceObserver
 from .execution_context import ExecutionContext
+from .id_allocator import IdAllocator, UUIDAllocator
+from .instrumentation import (
+    NO_INSTRUMENTS,
+    ExecutionInstrument,
+    behavior_key,
+    instrument,
+)
+from .loop_compaction import LoopCompactor, find_loops
 from .primitive_execution import primitive_to_output_function
+from .reference_resolver import ReferenceResolver
+from .trace_commit import TraceCommitter
+from .transient_token import CONTROL_TOKEN_VALUE, Token, control_value, token_literal
 
 l: logging.Logger = logging.getLogger(__file__)
 l.setLevel(logging.ERROR)
 
-UUID_SEED = "LabOP"
-m = hashlib.md5()
-
-
-def new_uuid():
-    m.update(UUID_SEED.encode("utf-8"))
-    return uuid.UUID(m.hexdigest())
-
 
 class ExecutionError(Exception):
     pass
@@ -78,9 +82,24 @@ class ExecutionEngine(ABC):
         out_dir: str = "out",
         dataset_file: str = None,  # type: ignore
         track_samples=True,
+        bulk_commit: bool = True,
+        cache_references: bool = True,
+        transient_tokens: bool = False,
+        record_trace: bool = True,
+        instruments: Optional[List[ExecutionInstrument]] = None,
+        evaluate_guards: bool = False,
+        compact_loops: bool = False,
+        loop_sample_every: Optional[int] = None,
+        compile_decisions: bool = True,
     ):
-        self.exec_counter = 0
-        self.variable_counter = 0
+        # Identities for execution records are allocated deterministically
+        # (see id_allocator.py).  They are deterministic as long as one thread
+        # executes the protocol, and unique if several threads share them.
+        # The record allocators are replaced for each execution (see
+        # initialize()).
+        self.record_ids = IdAllocator("execute")
+        self.variable_ids = IdAllocator("var")
+        self.execution_ids = UUIDAllocator()
 
         # Remove circular import with labop_convert
         self.specializations = specializations
@@ -127,6 +146,32 @@ class ExecutionEngine(ABC):
         self.data_id_map = {}
         self.candidate_clusters = {}
         self.track_samples = track_samples
+        self.bulk_commit = (
+            bulk_commit  # Attach records and flows to the trace in batches
+        )
+        self.trace = None
+        self.cache_references = cache_references  # Resolve lookup() through a ReferenceResolver while executing
+        self.references = None
+        # Represent in-flight tokens as Tokens, materialized as ActivityEdgeFlows only
+        # when recorded.  Without recording the trace, flows are never materialized.
+        self.record_trace = record_trace
+        self.transient_tokens = transient_tokens or not record_trace
+        # Measure each phase of executing a node (see instrumentation.py)
+        self.instruments = instruments if instruments is not None else []
+        # Follow only the outgoing edges of a DecisionNode whose guards are
+        # satisfied.  Without it, every edge of a DecisionNode gets a token, so
+        # a protocol with a loop does not terminate.
+        self.evaluate_guards = evaluate_guards or compact_loops
+        # Remove loop iterations from the trace, retaining the first, the latest,
+        # and every loop_sample_every-th iteration (see loop_compaction.py).
+        # Loops are only followed by evaluating guards, so this implies
+        # evaluate_guards.
+        self.compact_loops = compact_loops
+        self.loop_sample_every = loop_sample_every
+        self.loop_compactor = None
+        # Resolve DecisionNode edge roles and guards once (see DecisionDispatch)
+        self.compile_decisions = compile_decisions
+        self.decision_dispatches: Dict[str, DecisionDispatch] = {}
 
         self.prov_observer = (
             SampleProvenanceObserver(self.out_dir) if self.track_samples else None
@@ -154,14 +199,13 @@ class ExecutionEngine(ABC):
             self.track_samples = False
 
     def next_id(self):
-        next = self.exec_counter
-        self.exec_counter += 1
-        return next
+        return self.record_ids.next_index()
 
     def next_variable(self):
-        variable = f"var_{self.variable_counter}"
-        self.variable_counter += 1
-        return variable
+        return self.variable_ids.next_display_id()
+
+    def next_execution_id(self):
+        return self.execution_ids.next_display_id()
 
     def init_time(self, start_time):
         self.wall_clock_start_time = datetime.datetime.now()
@@ -202,26 +246,44 @@ class ExecutionEngine(ABC):
         self,
         protocol: Protocol,
         agent: sbol3.Agent,
-        id: str = new_uuid(),
+        id: str = None,
         parameter_values: List[ParameterValue] = {},
         overwrite_execution: bool = False,
+        prepared: bool = False,
     ):
         # Record in the document containing the protocol
         doc = protocol.document
+        id = self.next_execution_id() if id is None else id
 
         # setup possible issues
         self.issues[id] = []
 
-        if self.use_defined_primitives:
+        if self.use_defined_primitives and not prepared:
             # Define the compute_output function for known primitives
             self.initialize_primitive_compute_output(doc)
 
         # First, set up the record for the protocol and parameter values
         if self.ex is not None and overwrite_execution:
-            del self.document.objects[self.document.objects.index(self.ex)]
+            doc.remove_object(self.ex)
 
         self.ex = ProtocolExecution(id, protocol=protocol)
         doc.add(self.ex)
+        self.record_ids = IdAllocator.for_document("execute", doc)
+        self.variable_ids = IdAllocator.for_document("var", doc)
+        self.trace = TraceCommitter(
+            self.ex,
+            bulk=self.bulk_commit,
+            transient_tokens=self.transient_tokens,
+            record_flows=self.record_trace,
+        )
+        if not prepared:
+            if self.cache_references:
+                self.references = ReferenceResolver(doc).attach()
+            self.compile_protocol(protocol)
+        if self.compact_loops:
+            self.loop_compactor = LoopCompactor(
+                self.trace, sample_every=self.loop_sample_every
+            )
 
         self.ex.association.append(sbol3.Association(agent=agent, plan=protocol))
         self.ex.parameter_values = parameter_values
@@ -231,11 +293,17 @@ class ExecutionEngine(ABC):
             specialization.initialize_protocol(self.ex, out_dir=self.out_dir)
             specialization.on_begin(self.ex)
 
+        for i in self.instruments:
+            i.on_begin(self.ex)
+
     def finalize(
         self,
         protocol: Protocol,
         execution_context: ExecutionContext,
     ):
+        if self.loop_compactor is not None:
+            self.loop_compactor.finish()
+        self.trace.flush()
         self.ex.end_time = self.get_current_time()
 
         self.ex.parameter_values += [
@@ -256,15 +324,55 @@ class ExecutionEngine(ABC):
         for specialization in self.specializations:
             specialization.on_end(self.ex)
 
+        for i in self.instruments:
+            i.on_end(self.ex)
+
+    def prepare(self, protocol: Protocol):
+        """Do the work of executing a protocol that does not depend on its parameter values,
+        so that it can be executed many times with `execute(..., prepared=True)`
+
+        The protocol is checked once, the compute_output() of the primitives in
+        its document are defined once, its DecisionNodes are compiled once, and
+        a ReferenceResolver with the objects of its document stays attached to
+        the document until release().  The protocol must not be modified while
+        it is prepared.
+        """
+        protocol.remove_duplicates()  # FIXME needed because reading nt files with sbol3 results in duplicate initial and final nodes
+        issues = protocol.is_well_formed()
+        if len(issues) > 0:
+            self.report_well_formedness_issues(issues)
+        doc = protocol.document
+        if self.use_defined_primitives:
+            self.initialize_primitive_compute_output(doc)
+        if self.cache_references:
+            self.references = ReferenceResolver(doc).attach()
+            for obj in doc.objects:
+                self.references.register(obj)
+        self.compile_protocol(protocol)
+
+    def release(self):
+        """Detach the ReferenceResolver attached by prepare()"""
+        if self.references is not None:
+            self.references.detach()
+            self.references = None
+
+    def compile_protocol(self, protocol: Protocol):
+        """Compile the control structure of the protocol (the dispatch of its DecisionNodes)"""
+        self.decision_dispatches = {}
+        for node in protocol.nodes:
+            if isinstance(node, DecisionNode):
+                self.decision_dispatch(node)
+
     def execute(
         self,
         protocol: Protocol,
         agent: sbol3.Agent,
         parameter_values: List[ParameterValue] = {},
-        id: str = new_uuid(),
+        id: str = None,
         start_time: datetime.datetime = None,
         execution_context=None,
         overwrite_execution=False,  # When True, remove old execution if it exists
+        prepared: bool = False,
     ) -> ProtocolExecution:
         """Execute the given protocol against the provided parameters
 
@@ -273,31 +381,46 @@ class ExecutionEngine(ABC):
         protocol: Protocol to execute
         agent: Agent that is executing this protocol
         parameter_values: List of all input parameter values (if any)
-        id: display_id or URI to be used as the name of this execution; defaults to a UUID display_id
+        id: display_id or URI to be used as the name of this execution; defaults to a deterministic UUID-based display_id
         start_time: Start time for the execution
+        prepared: True if prepare() has been called for the protocol, and its work is reused
 
         Returns
         -------
         ProtocolExecution containing a record of the execution
         """
-        protocol.remove_duplicates()  # FIXME needed because reading nt files with sbol3 results in duplicate initial and final nodes
-        issues = protocol.is_well_formed()
-        if len(issues) > 0:
-            self.report_well_formedness_issues(issues)
+        if not prepared:
+            protocol.remove_duplicates()  # FIXME needed because reading nt files with sbol3 results in duplicate initial and final nodes
+            issues = protocol.is_well_formed()
+            if len(issues) > 0:
+                self.report_well_formedness_issues(issues)
+        if not self.evaluate_guards and find_loops(protocol):
+            raise Exception(
+                f"{protocol.identity} has a loop, which can only be executed with evaluate_guards=True"
+            )
 
-        self.initialize(
-            protocol,
-            agent,
-            id,
-            parameter_values=parameter_values,
-            overwrite_execution=overwrite_execution,
-        )
+        try:
+            self.initialize(
+                protocol,
+                agent,
+                id,
+                parameter_values=parameter_values,
+                overwrite_execution=overwrite_execution,
+                prepared=prepared,
+            )
 
-        if execution_context is None:
-            execution_context = ExecutionContext(self.ex, protocol, parameter_values)
+            if execution_context is None:
+                execution_context = ExecutionContext(
+                    self.ex, protocol, parameter_values
+                )
 
-        self.run(execution_context, start_time=start_time)
-        self.finalize(protocol, execution_context)
+            self.run(execution_context, start_time=start_time)
+            self.finalize(protocol, execution_context)
+        finally:
+            for i in self.instruments:
+                i.close()
+            if self.references is not None and not prepared:
+                self.references.detach()
 
         return self.ex
 
@@ -371,11 +494,12 @@ class ExecutionEngine(ABC):
             ]:
                 self.current_node = node
                 try:
-                    (
-                        tokens_created,
-                        tokens_consumed,
-                        new_execution_context,
-                    ) = self.execute_node(ec, node, node_outputs)
+                    with self.instrument("execute_node", node):
+                        (
+                            tokens_created,
+                            tokens_consumed,
+                            new_execution_context,
+                        ) = self.execute_node(ec, node, node_outputs)
 
                     ec.tokens = [t for t in ec.tokens if t not in tokens_consumed[ec]]
 
@@ -419,33 +543,45 @@ class ExecutionEngine(ABC):
             ActivityEdge, List[ActivityEdgeFlow]
         ] = execution_context.incoming_edge_tokens[node]
 
-        tokens_consumed: Dict[
-            ExecutionContext, List[ActivityEdgeFlow]
-        ] = self.consume_tokens(execution_context, node, supporting_tokens)
+        with self.instrument("consume_tokens", node):
+            tokens_consumed: Dict[
+                ExecutionContext, List[ActivityEdgeFlow]
+            ] = self.consume_tokens(execution_context, node, supporting_tokens)
 
         # Create execution record
-        record = self.create_record(node, tokens_consumed[execution_context])
-        self.ex.executions.append(record)
+        incoming_flows = self.trace.consume(tokens_consumed[execution_context])
+        record = self.create_record(node, incoming_flows)
+        self.trace.commit_records([record])
+        self.register_references(record, *incoming_flows)
 
         # from ActivityNode.execute()
-        tokens_created: Dict[
-            ExecutionContext, List[ActivityEdgeFlow]
-        ] = self.next_tokens(execution_context, record, node_outputs)
-
-        for _, created in tokens_created.items():
-            self.ex.flows += created
+        with self.instrument("next_tokens", node):
+            tokens_created: Dict[
+                ExecutionContext, List[ActivityEdgeFlow]
+            ] = self.next_tokens(execution_context, record, node_outputs)
 
         # from ActivityNode.next_tokens()
         all_tokens_created = [t for _, ts in tokens_created.items() for t in ts]
-        record.check_next_tokens(
-            all_tokens_created,
-            node_outputs,
-            self.sample_format,
-            self.permissive,
-        )
+        self.trace.commit_flows(all_tokens_created)
+        self.register_references(*all_tokens_created)
+
+        with self.instrument("check_next_tokens", node):
+            record.check_next_tokens(
+                all_tokens_created,
+                node_outputs,
+                self.sample_format,
+                self.permissive,
+            )
 
         # Side Effects / Bookkeeping
-        self.post_process(execution_context, record, tokens_created[execution_context])
+        with self.instrument("post_process", node):
+            self.post_process(
+                execution_context, record, tokens_created[execution_context]
+            )
+        if self.loop_compactor is not None:
+            self.loop_compactor.record(
+                record, tokens_consumed[execution_context], all_tokens_created
+            )
 
         new_ecs = [ec for ec in tokens_created.keys() if ec != execution_context]
         if new_ecs is not None and len(new_ecs) == 1:
@@ -459,6 +595,42 @@ class ExecutionEngine(ABC):
 
         return tokens_created, tokens_consumed, new_execution_context
 
+    def instrument(self, phase: str, node: ActivityNode):
+        """Context manager that measures a phase of executing node with the instruments"""
+        if not self.instruments:
+            return NO_INSTRUMENTS
+        return instrument(self.instruments, phase, behavior_key(node))
+
+    def register_references(self, *objects: sbol3.Identified):
+        if self.references is not None:
+            for obj in objects:
+                if isinstance(obj, sbol3.Identified):  # Skip transient Tokens
+                    self.references.register(obj)
+
+    def new_token(
+        self,
+        edge: ActivityEdge = None,
+        token_source: ActivityNodeExecution = None,
+        value: List[LiteralSpecification] = None,
+    ) -> Union[ActivityEdgeFlow, Token]:
+        # Tokens carrying owned objects (e.g., computed Datasets) are recorded
+        # immediately, because the objects take their identities from the flow.
+        if self.transient_tokens and not any(
+            isinstance(v, LiteralIdentified) for v in (value if value else [])
+        ):
+            return Token(
+                edge=edge,
+                token_source=token_source,
+                value=value,
+            )
+        return ActivityEdgeFlow(edge=edge, token_source=token_source, value=value)
+
+    def control_value(self) -> List[LiteralSpecification]:
+        """The value of a new control token; transient Tokens share one value"""
+        if self.transient_tokens:
+            return CONTROL_TOKEN_VALUE
+        return control_value()
+
     def next_tokens(
         self,
         execution_context: ExecutionContext,
@@ -477,11 +649,15 @@ class ExecutionEngine(ABC):
         node = record.get_node()
         outgoing_edges = execution_context.outgoing_edges(node)
         outgoing_edges.sort(key=lambda x: x.identity)
+        if self.evaluate_guards and isinstance(node, DecisionNode):
+            outgoing_edges = self.decision_edges(
+                node, record, outgoing_edges, node_outputs
+            )
         parameter_value_map = record.parameter_value_map()
         invocation_hash = hash(record)
         new_tokens: Dict[ExecutionContext, List[ActivityEdgeFlow]] = {
             execution_context: [
-                ActivityEdgeFlow(
+                self.new_token(
                     edge=edge,
                     token_source=record,
                     value=self.get_value(
@@ -491,10 +667,11 @@ class ExecutionEngine(ABC):
                         node_outputs,
                         self.sample_format,
                         invocation_hash,
+                        execution_context=execution_context,
                     ),
                 )
                 for edge in outgoing_edges
-                if edge.get_target() in execution_context.nodes
+                if execution_context.has_node(edge.get_target())
                 # Do not create normal object flow for CBA to output pins
                 and (
                     not isinstance(edge.get_target(), OutputPin)
@@ -505,13 +682,13 @@ class ExecutionEngine(ABC):
         }
         # If CallBehaviorAction.behavior is an Activity, then the output parameters will define the values of the CallBehaviorAction output pins.  Any tokens flowing to the output pins from the CallBehaviorAction will be control tokens instead of object tokens.  This code below adds these control tokens.
         new_tokens[execution_context] += [
-            ActivityEdgeFlow(
+            self.new_token(
                 edge=edge,
                 token_source=record,
-                value=[literal("uml.ControlFlow")],
+                value=self.control_value(),
             )
             for edge in outgoing_edges
-            if edge.get_target() in execution_context.nodes
+            if execution_context.has_node(edge.get_target())
             and isinstance(edge, ObjectFlow)
             and isinstance(node, CallBehaviorAction)
             and isinstance(node.get_behavior(), Activity)
@@ -519,7 +696,7 @@ class ExecutionEngine(ABC):
         if execution_context.parent_context:
             # Handle return values
             parent_tokens = [
-                ActivityEdgeFlow(
+                self.new_token(
                     edge=edge,
                     token_source=record,
                     value=self.get_value(
@@ -529,11 +706,12 @@ class ExecutionEngine(ABC):
                         node_outputs,
                         self.sample_format,
                         invocation_hash,
+                        execution_context=execution_context,
                     ),
                 )
                 for edge in outgoing_edges
                 if execution_context.parent_context
-                and edge.get_target() in execution_context.parent_context.nodes
+                and execution_context.parent_context.has_node(edge.get_target())
             ]
             if len(parent_tokens) > 0:
                 new_tokens[execution_context.parent_context] = parent_tokens
@@ -549,34 +727,77 @@ class ExecutionEngine(ABC):
                 #  - parent input/value pin to child activity parameter node
                 #  - parent call_behavior_action to child initial
                 new_tokens[new_execution_context] = [
-                    ActivityEdgeFlow(
+                    self.new_token(
                         edge=new_execution_context.get_invocation_edge(
                             token_consumed.get_edge().get_source(),
                             activity_parameter_node,
                         ),
-                        token_source=token_consumed.token_source,
+                        token_source=token_consumed.get_source(),
                         value=[
                             literal(v, reference=True) for v in token_consumed.value
                         ],
                     )
                     for token_consumed in record.get_incoming_flows()
                     if isinstance(token_consumed.get_edge().get_source(), Pin)
-                    for activity_parameter_node in behavior.get_nodes(
-                        name=token_consumed.get_edge().get_source().name,
-                        node_type=ActivityParameterNode,
-                    )
+                    for activity_parameter_node in [
+                        new_execution_context.template.input_node(
+                            token_consumed.get_edge().get_source().name
+                        )
+                    ]
                 ] + [
-                    ActivityEdgeFlow(
+                    self.new_token(
                         edge=new_execution_context.get_invocation_edge(
-                            node, behavior.initial()
+                            node, new_execution_context.template.initial
                         ),
                         token_source=record,
                         value=[literal("uml.ControlFlow", reference=True)],
                     )
                 ]
+                # The parameter values of the executed protocol are held by
+                # ValuePins, which have no token, so their values cross directly
+                if execution_context.parent_context is None:
+                    new_tokens[new_execution_context] += [
+                        self.new_token(
+                            edge=new_execution_context.get_invocation_edge(
+                                pin, new_execution_context.template.input_node(pin.name)
+                            ),
+                            token_source=record,
+                            value=[literal(pin.value, reference=True)],
+                        )
+                        for edge in execution_context.incoming_edges(node)
+                        if isinstance(edge, ObjectFlow)
+                        for pin in [edge.get_source()]
+                        if isinstance(pin, ValuePin)
+                    ]
 
         return new_tokens
 
+    def decision_dispatch(self, node: DecisionNode) -> Optional[DecisionDispatch]:
+        """The compiled dispatch of a DecisionNode, or None if decisions are not compiled"""
+        if not self.compile_decisions:
+            return None
+        dispatch = self.decision_dispatches.get(node.identity)
+        if dispatch is None:
+            dispatch = node.compile_dispatch()
+            self.decision_dispatches[node.identity] = dispatch
+        return dispatch
+
+    def decision_edges(
+        self,
+        node: DecisionNode,
+        record: ActivityNodeExecution,
+        outgoing_edges: List[ActivityEdge],
+        node_outputs: Callable,
+    ) -> List[ActivityEdge]:
+        """The outgoing edges of a DecisionNode whose guards the record's tokens satisfy"""
+        active_edges = {
+            edge.identity
+            for edge, _, _ in node.next_tokens_callback(
+                record, self, outgoing_edges, node_outputs
+            )
+        }
+        return [edge for edge in outgoing_edges if edge.identity in active_edges]
+
     def get_value(
         self,
         node: ActivityNode,
@@ -585,6 +806,7 @@ class ExecutionEngine(ABC):
         node_outputs: Callable,
         sample_format: str,
         invocation_hash: int,
+        execution_context: Optional[ExecutionContext] = None,
     ):
         value = ""
         reference = False
@@ -592,7 +814,7 @@ class ExecutionEngine(ABC):
         from uml.object_flow import ObjectFlow
 
         if isinstance(edge, ControlFlow):
-            value = ["uml.ControlFlow"]
+            return self.control_value()
         elif isinstance(edge, ObjectFlow):
             if isinstance(node, Pin):
                 value = self.get_pin_value(
@@ -620,6 +842,7 @@ class ExecutionEngine(ABC):
                     node_outputs,
                     sample_format,
                     invocation_hash,
+                    execution_context=execution_context,
                 )
             elif isinstance(node, Action):
                 value = self.get_action_value(
@@ -631,6 +854,10 @@ class ExecutionEngine(ABC):
                     invocation_hash,
                 )
 
+        if self.transient_tokens:
+            if isinstance(value, list):
+                return [token_literal(v) for v in value]
+            return [token_literal(value)]
         reference = lambda v: (isinstance(v, sbol3.Identified) and v.identity != None)
         if isinstance(value, list):
             value = [literal(v, reference=reference(v)) for v in value]
@@ -673,9 +900,13 @@ class ExecutionEngine(ABC):
         node_outputs: Callable,
         sample_format: str,
         invocation_hash: int,
+        execution_context: Optional[ExecutionContext] = None,
     ):
         if node.is_output():
             value = parameter_value_map[node.name]
+        elif execution_context is not None and execution_context.invoked_by_execution():
+            # A parameter value of the executed protocol
+            value = parameter_value_map.get(node.name, "")
         else:
             value = ""
         return value
@@ -735,8 +966,10 @@ class ExecutionEngine(ABC):
         sample_format: str,
         invocation_hash: int,
     ):
-        if node_outputs:
-            value = node_outputs(self, parameter)
+        # Outputs of a manually executed node (see ManualExecutionEngine.next())
+        node_output = node_outputs.get(call_behavior_action) if node_outputs else None
+        if node_output:
+            value = node_output(self, parameter)
         elif hasattr(call_behavior_action.get_behavior(), "compute_output"):
             value = call_behavior_action.get_behavior().compute_output(
                 parameter_value_map,
@@ -765,6 +998,7 @@ class ExecutionEngine(ABC):
         node: ActivityNode,
         consumed_tokens: List[ActivityEdgeFlow],
     ) -> ActivityNodeExecution:
+        incoming_flows = consumed_tokens if self.record_trace else []
         if isinstance(node, CallBehaviorAction):
             call = BehaviorExecution(
                 f"execute_{self.next_id()}",
@@ -775,13 +1009,32 @@ class ExecutionEngine(ABC):
                 consumed_material=[],
             )  # FIXME handle materials
             record = CallBehaviorExecution(
-                node=node, incoming_flows=consumed_tokens, call=call
+                node=node, incoming_flows=incoming_flows, call=call
             )
-            self.ex.document.add(call)
+            self.add_call(call)
+            self.register_references(call)
         else:
-            record = ActivityNodeExecution(node=node, incoming_flows=consumed_tokens)
+            record = ActivityNodeExecution(node=node, incoming_flows=incoming_flows)
+        if not self.record_trace:
+            # Unrecorded tokens are held by the record instead
+            record.set_incoming_tokens(consumed_tokens)
         return record
 
+    def add_call(self, call: BehaviorExecution):
+        """
+        Add a BehaviorExecution to the document.  Document.add() searches every
+        object in the document, including the whole trace, for a duplicate
+        identity.  The call's identity is a new top-level URI, which no child
+        object can have, so only the top-level objects are checked.
+        """
+        document = self.ex.document
+        if any(o.identity == call.identity for o in document.objects):
+            raise ValueError(
+                f'An entity with identity "{call.identity}" already exists in document'
+            )
+        document.objects.append(call)
+        call.traverse(lambda o: setattr(o, "document", document))
+
     def record_parameter_values(
         self,
         node: CallBehaviorAction,
@@ -895,7 +1148,7 @@ class ExecutionEngine(ABC):
 
         # clear candidate clusters for enabled nodes
         for n in enabled_nodes:
-            self.candidate_clusters[n.identity] = []
+            execution_context.candidate_clusters[n.identity] = []
 
         enabled_nodes.sort(
             key=lambda x: x.identity
@@ -933,7 +1186,10 @@ class ExecutionEngine(ABC):
 
         for specialization in self.specializations:
             try:
-                specialization.process(record, self.ex)
+                with self.instrument(
+                    f"specialization.{specialization.__class__.__name__}", node
+                ):
+                    specialization.process(record, self.ex)
             except Exception as e:
                 if not self.failsafe:
                     raise e
@@ -941,7 +1197,11 @@ class ExecutionEngine(ABC):
                     f"Could Not Process {record.name if record.name else record.identity}: {e}"
                 )
         if self.track_samples and isinstance(record.node.lookup(), CallBehaviorAction):
-            self.prov_observer.update(record)
+            updater = self.prov_observer.handlers.get(str(node.behavior))
+            with self.instrument(
+                f"provenance.{updater.__name__ if updater else 'unhandled'}", node
+            ):
+                self.prov_observer.update(record)
 
     def write_data_templates(
         self,
@@ -964,8 +1224,7 @@ class ExecutionEngine(ABC):
             val.get_value()
             for token in new_tokens
             for val in token.get_value()
-            if token.token_source == record.identity
-            and isinstance(val.get_value(), Dataset)
+            if token.get_source() is record and isinstance(val.get_value(), Dataset)
         ]
         sample_data = [
             dataset.data for dataset in datasets if isinstance(dataset.data, SampleData)
@@ -987,31 +1246,101 @@ class ExecutionEngine(ABC):
 
 
 class ManualExecutionEngine(ExecutionEngine):
+    """
+    Execute a protocol one step at a time, stopping at each node that needs
+    manual input (see ActivityNode.auto_advance()).  run() and next() return
+    the nodes that are ready to execute, an HTML table of them, and a graph
+    of the state of the execution.
+
+    The set of executed nodes and the rows of the ready table are kept up to
+    date as nodes execute, rather than recomputed from the whole execution
+    at each step.  The graph only shows the nodes within `frontier_radius`
+    edges of the ready nodes; with `frontier_radius=None` it shows the whole
+    execution (see ProtocolExecution.to_dot()).
+    """
+
+    def __init__(self, *args, frontier_radius: Optional[int] = 1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.frontier_radius = frontier_radius
+        self.execution_contexts: List[ExecutionContext] = []
+        self.parameter_values: List[ParameterValue] = []
+        self.done = set([])  # Nodes that have executed
+        self.ready_rows: Dict[str, str] = {}  # node identity -> table cells
+        self.neighbors: Dict[str, Dict[ActivityNode, set]] = {}
+
+    def initialize(
+        self,
+        protocol: Protocol,
+        agent: sbol3.Agent,
+        id: str = None,
+        parameter_values: List[ParameterValue] = {},
+        overwrite_execution: bool = False,
+        prepared: bool = False,
+    ):
+        super().initialize(
+            protocol,
+            agent,
+            id=id,
+            parameter_values=parameter_values,
+            overwrite_execution=overwrite_execution,
+            prepared=prepared,
+        )
+        self.parameter_values = parameter_values
+        self.execution_contexts = []
+        self.done = set([])
+        self.ready_rows = {}
+        self.neighbors = {}
+
+    def execute_node(
+        self,
+        execution_context: ExecutionContext,
+        node: ActivityNode,
+        node_outputs: Dict[ActivityNode, Callable] = {},
+    ):
+        results = super().execute_node(execution_context, node, node_outputs)
+        self.done.add(node)
+        return results
+
     def run(self, protocol: Protocol, start_time: datetime.datetime = None):
         self.init_time(start_time)
         self.ex.start_time = (
             self.start_time
         )  # TODO: remove str wrapper after sbol_factory #22 fixed
-        ready = protocol.initiating_nodes()
-        ready = self.advance(ready)
+        self.execution_contexts = [
+            ExecutionContext(self.ex, protocol, self.parameter_values)
+        ]
+        ready = self.advance()
         choices = self.ready_message(ready)
-        graph = self.ex.to_dot(
-            ready=ready, done=self.ex.backtrace()[0], out_dir=self.out_dir
-        )
+        graph = self.frontier_to_dot(ready)
         return ready, choices, graph
 
-    def advance(self, ready: List[ActivityNode]):
-        auto_advance_nodes = [r for r in ready if r.auto_advance()]
+    def ready_nodes(self) -> List[ActivityNode]:
+        return [n for ec in self.execution_contexts for n in ec.ready]
 
+    def step_nodes(
+        self,
+        nodes: List[ActivityNode],
+        node_outputs: Dict[ActivityNode, Callable] = {},
+    ):
+        """Execute the ready nodes in nodes, holding back the other ready nodes"""
+        held = {}
+        for ec in self.execution_contexts:
+            held[ec] = [n for n in ec.ready if n not in nodes]
+            ec.ready = [n for n in ec.ready if n in nodes]
+        self.execution_contexts = self.step(self.execution_contexts, node_outputs)
+        for ec in self.execution_contexts:
+            waiting = held.get(ec, [])
+            ec.ready = waiting + [n for n in ec.ready if n not in waiting]
+
+    def advance(self) -> List[ActivityNode]:
+        """Execute ready nodes until only nodes that need manual input are ready"""
+        auto_advance_nodes = [r for r in self.ready_nodes() if r.auto_advance()]
         while len(auto_advance_nodes) > 0:
-            ready = self.step(auto_advance_nodes)
-            auto_advance_nodes = [r for r in ready if r.auto_advance()]
-
-        return self.executable_activity_nodes()
+            self.step_nodes(auto_advance_nodes)
+            auto_advance_nodes = [r for r in self.ready_nodes() if r.auto_advance()]
+        return self.ready_nodes()
 
     def ready_message(self, ready: List[ActivityNode]) -> str:
-        msg = "Activities Ready to Execute:\n"
-
         def activity_name(a):
             return a.display_id
 
@@ -1021,28 +1350,85 @@ class ManualExecutionEngine(ExecutionEngine):
         def decision_name(a):
             return a.identity
 
-        activities = [activity_name(r.protocol()) for r in ready]
-        behaviors = [
-            behavior_name(r.behavior.lookup())
-            if isinstance(r, CallBehaviorAction)
-            else decision_name(r)
-            for r in ready
-        ]
-        identities = [r.identity for r in ready]
-        choices = pd.DataFrame(
-            {
-                "Activity": activities,
-                "Behavior": behaviors,
-                "Identity": identities,
-            }
+        # Rows are rendered once per node, while the node is ready
+        ready_identities = {r.identity for r in ready}
+        for identity in [i for i in self.ready_rows if i not in ready_identities]:
+            del self.ready_rows[identity]
+        for r in ready:
+            if r.identity not in self.ready_rows:
+                cells = [
+                    activity_name(r.get_parent()),
+                    behavior_name(r.behavior.lookup())
+                    if isinstance(r, CallBehaviorAction)
+                    else decision_name(r),
+                    r.identity,
+                ]
+                self.ready_rows[r.identity] = "".join(
+                    f"<td>{html.escape(c)}</td>" for c in cells
+                )
+
+        header = "".join(
+            f"<th>{c}</th>" for c in ["", "Activity", "Behavior", "Identity"]
+        )
+        rows = "".join(
+            f"<tr><th>{idx}</th>{self.ready_rows[r.identity]}</tr>"
+            for idx, r in enumerate(ready)
         )
-        # ready_nodes = "\n".join([f"{idx}: {r.behavior}" for idx, r in enumerate(ready)])
         return (
             "<div style='height: 200px; overflow: auto; width: fit-content'>"
-            + choices.to_html()
+            + f"<table border='1' class='dataframe'><thead><tr>{header}</tr></thead>"
+            + f"<tbody>{rows}</tbody></table>"
             + "</div>"
         )
-        # return choices #f"{msg}{ready_nodes}"
+
+    def frontier(self, ready: List[ActivityNode]) -> Dict[Activity, set]:
+        """
+        The nodes within frontier_radius edges of the ready nodes, by Activity.
+        Pins are replaced by their Actions.
+        """
+        frontier = {}
+        for node in ready:
+            node = node.pin_owner()
+            activity = node.get_parent()
+            if not isinstance(activity, Activity):
+                continue
+            neighbors = self.activity_neighbors(activity)
+            nodes = frontier.setdefault(activity, set([]))
+            visit = [node]
+            nodes.add(node)
+            for _ in range(self.frontier_radius):
+                visit = [
+                    m for n in visit for m in neighbors.get(n, []) if m not in nodes
+                ]
+                nodes.update(visit)
+        return frontier
+
+    def activity_neighbors(self, activity: Activity) -> Dict[ActivityNode, set]:
+        """Nodes of an Activity that share an edge, ignoring direction"""
+        if activity.identity not in self.neighbors:
+            neighbors = {}
+            for edge in activity.edges:
+                source = edge.get_source().pin_owner()
+                target = edge.get_target().pin_owner()
+                neighbors.setdefault(source, set([])).add(target)
+                neighbors.setdefault(target, set([])).add(source)
+            self.neighbors[activity.identity] = neighbors
+        return self.neighbors[activity.identity]
+
+    def frontier_to_dot(self, ready: List[ActivityNode]) -> graphviz.Digraph:
+        if self.frontier_radius is None:
+            return self.ex.to_dot(ready=ready, done=self.done, out_dir=self.out_dir)
+        dot = DotStream(
+            name=f"cluster_{self.ex.identity}", graph_attr={"label": self.ex.identity}
+        )
+        for activity, nodes in sorted(
+            self.frontier(ready).items(), key=lambda x: x[0].identity
+        ):
+            with dot.subgraph(name="_root"):
+                activity.write_dot(
+                    dot, ready=ready, done=self.done, nodes=nodes, depth=0
+                )
+        return dot.to_digraph()
 
     def next(
         self, activity_node: ActivityNode, node_output: callable
@@ -1056,10 +1442,8 @@ class ManualExecutionEngine(ExecutionEngine):
         Returns:
             Tuple[List[ActivityNode], List[str], graphviz.Graph]: Summary of the next possible execution steps, including the executable ActivityNodes, Activities, and a graphical depiction of the execution state.
         """
-        successors = self.step(
-            [activity_node], node_outputs={activity_node: node_output}
-        )
-        ready = self.advance(successors)
+        self.step_nodes([activity_node], node_outputs={activity_node: node_output})
+        ready = self.advance()
         choices = self.ready_message(ready)
-        graph = self.ex.to_dot(ready=ready, done=self.ex.backtrace()[0])
+        graph = self.frontier_to_dot(ready)
         return ready, choices, graph
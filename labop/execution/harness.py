@@ -20,6 +20,17 @@ from labop.protocol import Protocol
 from labop.utils.helpers import file_diff, prepare_document
 from labop_convert import BehaviorSpecialization
 
+from .artifact_cache import (
+    ArtifactCache,
+    entry_point_digest,
+    file_digest,
+    library_digest,
+    toolchain_digest,
+)
+from .artifact_scheduler import ArtifactScheduler
+from .instrumentation import ExecutionProfiler
+from .validation import document_validator
+
 l = logging.Logger(__file__)
 l.setLevel(logging.INFO)
 ConsoleOutputHandler = logging.StreamHandler()
@@ -36,12 +47,27 @@ class ProtocolArtifact(ABC):
     results: Dict[str, Any] = None
     status: str = None
     filename: str = None
+    exclusive: bool = (
+        False  # True if generating the artifact modifies the shared document
+    )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args)
         self.status = ProtocolArtifactStatus.PENDING
         self.results = {}
 
+    def dependencies(self, harness: "ProtocolHarness") -> List["ProtocolArtifact"]:
+        """Artifacts that must be generated before this artifact"""
+        return []
+
+    def cache_configuration(self, harness: "ProtocolHarness") -> Dict[str, Any]:
+        """Configuration that, with the harness inputs, determines the artifact"""
+        return {"artifact": self.__class__.__name__}
+
+    def outputs(self) -> List[str]:
+        """Files that the artifact generates"""
+        return [self.filename] if self.filename else []
+
     def results_summary(self) -> str:
         return f"{json.dumps(self.results, indent=4)}"
 
@@ -50,6 +76,7 @@ class ProtocolArtifact(ABC):
 
 
 class ProtocolNTuples(ProtocolArtifact):
+    exclusive: bool = True
     cached_protocol_file: Optional[str] = None
     namespace: str
     protocol_name: str
@@ -94,6 +121,18 @@ class ProtocolNTuples(ProtocolArtifact):
             import_library(library)
             self.results["libraries"].append(library)
 
+    def cache_configuration(self, harness: "ProtocolHarness") -> Dict[str, Any]:
+        return {
+            "artifact": self.__class__.__name__,
+            "namespace": self.namespace,
+            "protocol_name": self.protocol_name,
+            "cached_protocol_file": (
+                file_digest(self.cached_protocol_file)
+                if self.cached_protocol_file
+                else None
+            ),
+        }
+
     def generate_protocol(self, harness: "ProtocolHarness") -> Protocol:
         self.import_libraries(harness.libraries)
         entry_point = harness.entry_point
@@ -108,7 +147,7 @@ class ProtocolNTuples(ProtocolArtifact):
         self._doc.add(self._protocol)
         self._protocol = entry_point(self._doc, self._protocol)
         l.info("Validating and writing protocol")
-        v = self._doc.validate()
+        v = document_validator(self._doc).validate()
 
         if len(v) > 0:
             self.results["protocol"]["validation"] = "".join(f"\n {e}" for e in v)
@@ -169,6 +208,9 @@ class ProtocolDownstreamArtifact(ProtocolArtifact):
             kwargs["protocol_artifact"] if "protocol_artifact" in kwargs else None
         )
 
+    def dependencies(self, harness: "ProtocolHarness") -> List[ProtocolArtifact]:
+        return [self.protocol_artifact] if self.protocol_artifact else []
+
     def protocol(self):
         return self.protocol_artifact._protocol
 
@@ -177,9 +219,14 @@ class ProtocolDownstreamArtifact(ProtocolArtifact):
 
 
 class ProtocolDiagram(ProtocolDownstreamArtifact):
+    rendered_filename: str = None
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
+    def outputs(self) -> List[str]:
+        return [self.rendered_filename] if self.rendered_filename else []
+
     def diagram_filename(self, filename_prefix: str) -> str:
         return filename_prefix + ".diagram"
 
@@ -193,8 +240,10 @@ class ProtocolDiagram(ProtocolDownstreamArtifact):
             else self.filename
         )
         try:
-            self.protocol().to_dot().render(
-                self.filename, cleanup=True, overwrite_source=True
+            self.rendered_filename = (
+                self.protocol()
+                .to_dot()
+                .render(self.filename, cleanup=True, overwrite_source=True)
             )
             self.results["filename"] = self.filename
             self.status = ProtocolArtifactStatus.PASS
@@ -210,6 +259,12 @@ class ProtocolRubric(ProtocolDownstreamArtifact):
         super().__init__(*args, **kwargs)
         self.filename = filename
 
+    def cache_configuration(self, harness: "ProtocolHarness") -> Dict[str, Any]:
+        return {
+            "artifact": self.__class__.__name__,
+            "rubric": file_digest(self.filename),
+        }
+
     def generate_artifact(self, harness: "ProtocolHarness"):
         # diff = ""
         try:
@@ -227,12 +282,14 @@ class ProtocolRubric(ProtocolDownstreamArtifact):
 
 
 class ProtocolExecutionNTuples(ProtocolDownstreamArtifact):
+    exclusive: bool = True
     agent: Union[sbol3.Agent, str] = None
     execution: ProtocolExecution = None
     execution_id: str = None
     parameter_values: List[ParameterValue] = None
     execution_engine: ExecutionEngine = None
     specializations: List[BehaviorSpecialization] = None
+    profiles: List["ProtocolExecutionProfile"] = None
     dataset_filename: str = None
     execution_kwargs: Dict[str, Any] = None
 
@@ -263,11 +320,26 @@ class ProtocolExecutionNTuples(ProtocolDownstreamArtifact):
             if "specializations" in kwargs
             else self.specializations
         )
+        self.profiles = kwargs["profiles"] if "profiles" in kwargs else []
         self.execution_kwargs = (
             kwargs["execution_kwargs"] if "execution_kwargs" in kwargs else {}
         )
         self.execution_engine = None
 
+    def cache_configuration(self, harness: "ProtocolHarness") -> Dict[str, Any]:
+        return {
+            "artifact": self.__class__.__name__,
+            "agent": self.agent.identity,
+            "execution_id": self.execution_id,
+            "parameter_values": self.parameter_values,
+            "dataset_filename": os.path.basename(self.dataset_filename),
+            "execution_kwargs": self.execution_kwargs,
+            "specializations": [
+                s.cache_configuration(harness) for s in self.specializations
+            ],
+            "profiles": [p.cache_configuration(harness) for p in self.profiles],
+        }
+
     def _execution_engine(self, output_dir) -> ExecutionEngine:
         specializations = [s.specialization for s in self.specializations]
         kwargs = {
@@ -278,6 +350,10 @@ class ProtocolExecutionNTuples(ProtocolDownstreamArtifact):
             "dataset_file": self.dataset_filename,
         }
         kwargs.update(self.execution_kwargs)
+        if len(self.profiles) > 0:
+            kwargs["instruments"] = kwargs.get("instruments", []) + [
+                p.profiler for p in self.profiles
+            ]
 
         return ExecutionEngine(**kwargs)
 
@@ -336,6 +412,13 @@ class ProtocolExecutionDownstreamArtifact(ProtocolDownstreamArtifact):
             else None
         )
 
+    def dependencies(self, harness: "ProtocolHarness") -> List[ProtocolArtifact]:
+        return (
+            [self.protocol_execution_artifact]
+            if self.protocol_execution_artifact
+            else []
+        )
+
 
 class ProtocolExecutionRubric(ProtocolExecutionDownstreamArtifact):
     filename: str = None
@@ -351,6 +434,13 @@ class ProtocolExecutionRubric(ProtocolExecutionDownstreamArtifact):
             else self.overwrite_rubric
         )
 
+    def cache_configuration(self, harness: "ProtocolHarness") -> Dict[str, Any]:
+        return {
+            "artifact": self.__class__.__name__,
+            "rubric": file_digest(self.filename),
+            "overwrite_rubric": self.overwrite_rubric,
+        }
+
     def generate_artifact(self, harness: "ProtocolHarness"):
         diff = ""
         try:
@@ -377,9 +467,14 @@ class ProtocolExecutionRubric(ProtocolExecutionDownstreamArtifact):
 
 
 class ProtocolExecutionDiagram(ProtocolExecutionDownstreamArtifact):
+    rendered_filename: str = None
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
+    def outputs(self) -> List[str]:
+        return [self.rendered_filename] if self.rendered_filename else []
+
     def diagram_filename(self, filename_prefix: str) -> str:
         return filename_prefix + ".execution.diagram"
 
@@ -396,10 +491,12 @@ class ProtocolExecutionDiagram(ProtocolExecutionDownstreamArtifact):
             else self.filename
         )
         try:
-            self.protocol_execution_artifact.execution.to_dot().render(
-                self.filename,
-                cleanup=True,
-                overwrite_source=True,
+            self.rendered_filename = (
+                self.protocol_execution_artifact.execution.to_dot().render(
+                    self.filename,
+                    cleanup=True,
+                    overwrite_source=True,
+                )
             )
             self.results["filename"] = self.filename
             self.status = ProtocolArtifactStatus.PASS
@@ -429,6 +526,47 @@ class ProtocolSampleTrace(ProtocolExecutionDownstreamArtifact):
             l.exception(f"Protocol Sample Trace failed: {e}")
 
 
+class ProtocolExecutionProfile(ProtocolExecutionDownstreamArtifact):
+    """
+    Time and memory used by each phase of the execution, by behavior, as
+    JSON and as folded stacks for flame graph tools.
+    """
+
+    profiler: ExecutionProfiler = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.profiler = ExecutionProfiler(
+            trace_memory=kwargs["trace_memory"] if "trace_memory" in kwargs else True
+        )
+
+    def cache_configuration(self, harness: "ProtocolHarness") -> Dict[str, Any]:
+        return {
+            "artifact": self.__class__.__name__,
+            "trace_memory": self.profiler.trace_memory,
+        }
+
+    def profile_filename(self, filename_prefix: str) -> str:
+        return filename_prefix + ".profile.json"
+
+    def outputs(self) -> List[str]:
+        return [self.filename, os.path.splitext(self.filename)[0] + ".folded"]
+
+    def generate_artifact(self, harness: "ProtocolHarness"):
+        self.filename = os.path.join(
+            harness.full_output_dir,
+            self.profile_filename(harness.filename_prefix()),
+        )
+        try:
+            self.profiler.write_json(self.filename)
+            self.profiler.write_folded(self.outputs()[1])
+            self.results["filename"] = self.filename
+            self.status = ProtocolArtifactStatus.PASS
+        except Exception as e:
+            self.status = ProtocolArtifactStatus.FAIL
+            self.results["exception"] = str(e)
+
+
 class ProtocolSpecialization(ProtocolArtifact):
     specialization: BehaviorSpecialization
 
@@ -436,6 +574,21 @@ class ProtocolSpecialization(ProtocolArtifact):
         super().__init__()
         self.specialization = specialization
 
+    def dependencies(self, harness: "ProtocolHarness") -> List[ProtocolArtifact]:
+        # Specialization data is collected while the protocol executes
+        return harness.artifacts_of_type(ProtocolExecutionNTuples)
+
+    def cache_configuration(self, harness: "ProtocolHarness") -> Dict[str, Any]:
+        return {
+            "artifact": self.__class__.__name__,
+            "specialization": self.specialization.__class__.__name__,
+            "options": {
+                k: v
+                for k, v in vars(self.specialization).items()
+                if isinstance(v, (bool, int, float, str))
+            },
+        }
+
     def write_output(self, filename_prefix: str):
         pass
 
@@ -483,6 +636,11 @@ class ProtocolHarness:
     execution_kwargs: Dict[str, Any] = None
     _results: Dict[str, Any] = None
     clean_output: bool = False
+    max_workers: int = 1  # Artifacts generated concurrently; 1 keeps the serial order
+    timings: Dict[str, float] = None
+    use_cache: bool = False
+    cache: ArtifactCache = None
+    up_to_date: List[str] = None
 
     def __init__(self, *args, **kwargs):
         self.namespace = (
@@ -516,6 +674,14 @@ class ProtocolHarness:
             kwargs["execution_kwargs"] if "execution_kwargs" in kwargs else {}
         )
 
+        self.max_workers = (
+            kwargs["max_workers"] if "max_workers" in kwargs else self.max_workers
+        )
+
+        self.use_cache = (
+            kwargs["use_cache"] if "use_cache" in kwargs else self.use_cache
+        )
+
         self.base_dir = kwargs["base_dir"] if "base_dir" in kwargs else "."
         self.output_dir = (
             kwargs["output_dir"]
@@ -569,6 +735,9 @@ class ProtocolHarness:
             specializations = [
                 a for a in self.artifacts if isinstance(a, ProtocolSpecialization)
             ]
+            profiles = [
+                a for a in self.artifacts if isinstance(a, ProtocolExecutionProfile)
+            ]
 
             protocol_execution_artifact = ProtocolExecutionNTuples(
                 protocol_artifact=protocol_artifact,
@@ -576,6 +745,7 @@ class ProtocolHarness:
                 execution_id=self.execution_id,
                 parameter_values=self.parameter_values,
                 specializations=specializations,
+                profiles=profiles,
                 dataset_filename=dataset_filename,
                 execution_kwargs=self.execution_kwargs,
             )
@@ -605,11 +775,13 @@ class ProtocolHarness:
                 if isinstance(a, ProtocolRubric):
                     a.protocol_artifact = protocol_artifact
             for a in self.artifacts:
-                if isinstance(a, ProtocolExecutionRubric):
+                if isinstance(a, (ProtocolExecutionRubric, ProtocolExecutionProfile)):
                     a.protocol_execution_artifact = protocol_execution_artifact
 
         self.all_artifacts = self.base_artifacts + self.artifacts
         self._results = {}
+        self.timings = {}
+        self.up_to_date = []
 
     def filename_prefix(self) -> str:
         return self.protocol_name
@@ -668,8 +840,31 @@ class ProtocolHarness:
         self.main(verbose=verbose)
         self.finalize(verbose=verbose)
 
+    def cache_inputs(self) -> Dict[str, Any]:
+        """Inputs that determine every artifact generated by the harness"""
+        return {
+            "entry_point": entry_point_digest(self.entry_point),
+            "libraries": library_digest(self.libraries),
+            "parameter_values": self.parameter_values,
+            "toolchain": toolchain_digest(),
+            "harness": {
+                "namespace": self.namespace,
+                "protocol_name": self.protocol_name,
+                "protocol_long_name": self.protocol_long_name,
+                "protocol_version": self.protocol_version,
+                "protocol_description": self.protocol_description,
+                "artifacts": [a.__class__.__name__ for a in self.all_artifacts],
+            },
+        }
+
     def initialize(self, verbose=False):
-        if self.clean_output:
+        if self.use_cache:
+            self.cache = ArtifactCache(self.full_output_dir, self.cache_inputs())
+        if self.clean_output and self.use_cache and self.cache.inputs_match:
+            l.info(
+                f"Inputs are unchanged, keeping contents of output directory: {self.full_output_dir}"
+            )
+        elif self.clean_output:
             l.warn(f"Deleting contents of output directory: {self.full_output_dir}")
             for root, dirs, files in os.walk(self.full_output_dir):
                 for f in files:
@@ -692,12 +887,108 @@ class ProtocolHarness:
             ProtocolExecutionRubric,
             ProtocolExecutionDiagram,
             ProtocolSampleTrace,
+            ProtocolExecutionProfile,
             ProtocolSpecialization,
         ]
-        for a_type in artifact_order:
-            for a in self.artifacts_of_type(a_type):
+        # Artifacts start in artifact_order when ready, and run concurrently
+        # unless they depend upon one another or modify the shared document.
+        artifacts = [
+            a for a_type in artifact_order for a in self.artifacts_of_type(a_type)
+        ]
+        dependencies = {a: a.dependencies(self) for a in artifacts}
+        keys, cached = self.plan_artifacts(artifacts, dependencies)
+        self.up_to_date = [self.artifact_label(a) for a in artifacts if a in cached]
+        if len(self.up_to_date) > 0:
+            l.info(f"Artifacts are up to date: {self.up_to_date}")
+
+        def generate(a: ProtocolArtifact):
+            if a in cached:
+                self.load_cached_artifact(a, cached[a])
+            else:
                 a.generate_artifact(self)
 
+        timings = ArtifactScheduler(max_workers=self.max_workers).run(
+            artifacts,
+            dependencies,
+            {a for a in artifacts if a.exclusive},
+            generate,
+        )
+        self.timings = {
+            self.artifact_label(a): timings[a]
+            for a in self.all_artifacts
+            if a in timings
+        }
+
+        if self.use_cache:
+            for a in artifacts:
+                if a in cached:
+                    continue
+                label = self.artifact_label(a)
+                if a.status == ProtocolArtifactStatus.PASS:
+                    self.cache.store(
+                        label, keys[a], a.status, a.results, a.filename, a.outputs()
+                    )
+                else:
+                    self.cache.discard(label)
+            self.cache.save()
+
+    def plan_artifacts(
+        self,
+        artifacts: List[ProtocolArtifact],
+        dependencies: Dict[ProtocolArtifact, List[ProtocolArtifact]],
+    ):
+        """
+        Find the artifacts that are up to date.  An artifact is up to date if
+        its key matches the cache, it passed, its outputs exist, and the
+        artifacts it depends upon are up to date.  Artifacts are only held in
+        memory while the harness runs, so the artifacts that a regenerated
+        artifact depends upon are also regenerated.
+
+        Returns the key of each artifact and the cache entries of the up to
+        date artifacts.
+        """
+        if not self.use_cache:
+            return {}, {}
+
+        keys = {}
+        cached = {}
+        for a in artifacts:  # artifacts follow their dependencies
+            keys[a] = self.cache.key(
+                a.cache_configuration(self),
+                [keys[d] for d in dependencies[a] if d in keys],
+            )
+            entry = self.cache.lookup(self.artifact_label(a), keys[a])
+            if entry is not None and entry["status"] == ProtocolArtifactStatus.PASS:
+                cached[a] = entry
+
+        changed = True
+        while changed:
+            changed = False
+            for a in artifacts:
+                if a in cached and any(d not in cached for d in dependencies[a]):
+                    del cached[a]
+                    changed = True
+                elif a not in cached:
+                    for d in dependencies[a]:
+                        if d in cached:
+                            del cached[d]
+                            changed = True
+        return keys, cached
+
+    def load_cached_artifact(self, artifact: ProtocolArtifact, entry: Dict[str, Any]):
+        artifact.filename = entry["filename"]
+        artifact.status = entry["status"]
+        artifact.results = entry["results"]
+
+    def artifact_label(self, artifact: ProtocolArtifact) -> str:
+        return f"{self.all_artifacts.index(artifact)}_{artifact.__class__.__name__}"
+
+    def timings_summary(self) -> str:
+        return "\n".join(
+            f"    {label:60s} {seconds:8.2f} s"
+            for label, seconds in self.timings.items()
+        )
+
     def finalize(self, verbose=False):
         summary = self.artifacts_results_summary(verbose=verbose)
 
@@ -706,6 +997,12 @@ class ProtocolHarness:
         with open(results_file, "w") as f:
             f.write(self.artifacts_results_summary(verbose=True))
 
+        # Timings vary between runs, so they are kept out of harness.out
+        l.info(f"Artifact generation times:\n{self.timings_summary()}")
+        timings_file = os.path.join(self.full_output_dir, "harness.timings.json")
+        with open(timings_file, "w") as f:
+            json.dump(self.timings, f, indent=4)
+
 
 class ProtocolLoader:
     filename: str = None
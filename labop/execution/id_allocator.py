@@ -0,0 +1,131 @@
+"""
+Deterministic identity allocation for execution records.
+
+The ExecutionEngine names the records it creates (BehaviorExecutions, variables,
+and ProtocolExecutions without an explicit id).  Identities are drawn from
+counters rather than hashes so that they are compact, always valid SBOL
+display_ids, and a pure function of the allocation order.  The engine makes
+new record allocators for each execution, starting after the records already
+in the execution's document.
+"""
+
+import hashlib
+import re
+import threading
+import uuid
+from typing import Iterator
+
+import sbol3
+
+UUID_SEED = "LabOP"
+DEFAULT_BLOCK_SIZE = 256
+
+DISPLAY_ID_PATTERN = re.compile(r"^[a-zA-Z_]\w*$")
+
+
+class IdAllocator(object):
+    """
+    Allocates display_ids of the form `<prefix>_<index>`.
+
+    Indices are reserved from a shared counter in blocks of `block_size`.  Each
+    thread draws from its own reserved block, so the shared lock is only taken
+    once per block.
+
+    Identities are only deterministic when a single thread allocates them:
+    indices are then consecutive and start at `start`, which keeps identities
+    stable across runs.  An ExecutionEngine executes on the thread that calls
+    it, so the records of an execution are named deterministically.  With
+    several threads, indices are unique, but which thread receives which block
+    depends on scheduling, so identities may differ between runs.
+    """
+
+    def __init__(
+        self,
+        prefix: str,
+        start: int = 0,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+    ):
+        if not DISPLAY_ID_PATTERN.match(prefix):
+            raise ValueError(
+                f"IdAllocator prefix '{prefix}' is not a valid SBOL display_id"
+            )
+        if block_size < 1:
+            raise ValueError(f"IdAllocator block_size must be positive: {block_size}")
+        self.prefix = prefix
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next_block_start = start
+        self._local = threading.local()
+
+    @classmethod
+    def for_document(
+        cls,
+        prefix: str,
+        document: sbol3.Document,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+    ) -> "IdAllocator":
+        """
+        An allocator whose indices start after the largest index of the
+        `<prefix>_<index>` top-level objects already in the document, so that
+        the identities of an execution depend only on the execution and the
+        document that records it.
+        """
+        pattern = re.compile(rf"^{re.escape(prefix)}_(\d+)$")
+        indices = [
+            int(match.group(1))
+            for o in document.objects
+            for match in [pattern.match(o.display_id or "")]
+            if match
+        ]
+        return cls(
+            prefix, start=max(indices) + 1 if indices else 0, block_size=block_size
+        )
+
+    def _reserve_block(self) -> Iterator[int]:
+        with self._lock:
+            block_start = self._next_block_start
+            self._next_block_start += self.block_size
+        return iter(range(block_start, block_start + self.block_size))
+
+    def next_index(self) -> int:
+        block = getattr(self._local, "block", None)
+        if block is not None:
+            index = next(block, None)
+            if index is not None:
+                return index
+        self._local.block = self._reserve_block()
+        return next(self._local.block)
+
+    def next_display_id(self) -> str:
+        return f"{self.prefix}_{self.next_index()}"
+
+    def allocated(self) -> int:
+        """Upper bound on the number of indices handed out or reserved so far."""
+        with self._lock:
+            return self._next_block_start
+
+
+class UUIDAllocator(object):
+    """
+    Thread-safe, deterministic sequence of UUIDs derived from a seed.
+
+    The n-th UUID is the MD5 digest of the seed repeated n times, which
+    matches the sequence historically produced by the engine's module-level
+    MD5 object.  Each call extends a private digest, so no prior input is
+    rehashed.
+    """
+
+    def __init__(self, seed: str = UUID_SEED):
+        self.seed = seed.encode("utf-8")
+        self._lock = threading.Lock()
+        self._md5 = hashlib.md5()
+
+    def next_uuid(self) -> uuid.UUID:
+        with self._lock:
+            self._md5.update(self.seed)
+            digest = self._md5.hexdigest()
+        return uuid.UUID(digest)
+
+    def next_display_id(self, prefix: str = "execution") -> str:
+        """UUID rendered as a valid SBOL display_id (hyphens removed, prefixed)."""
+        return f"{prefix}_{self.next_uuid().hex}"
@@ -0,0 +1,160 @@
+"""
+Instrumentation hooks for the ExecutionEngine.
+
+The ExecutionEngine measures each phase of executing a node (execute_node,
+consume_tokens, next_tokens, check_next_tokens, post_process, each
+BehaviorSpecialization.process call, and each SampleProvenanceObserver
+updater) with the ExecutionInstruments passed as its `instruments`.  The
+ExecutionProfiler records the count, wall time, and net allocation of each
+phase, keyed by the behavior URI of the node (or the node type for control
+nodes), and exports them as JSON or as folded stacks for flame graph tools.
+"""
+
+import json
+import time
+import tracemalloc
+from abc import ABC
+from contextlib import ExitStack, contextmanager, nullcontext
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from uml import ActivityNode, CallBehaviorAction
+
+NO_INSTRUMENTS = nullcontext()
+
+
+def behavior_key(node: ActivityNode) -> str:
+    """Behavior URI of a CallBehaviorAction, or the type of a control node"""
+    if isinstance(node, CallBehaviorAction):
+        return str(node.behavior)
+    return node.__class__.__name__
+
+
+class ExecutionInstrument(ABC):
+    """
+    Base class for instruments.  The engine calls on_begin() and on_end()
+    around each execution, and enters measure() around each phase.  It calls
+    close() after each execution, including one that failed before on_end().
+    """
+
+    def on_begin(self, execution):
+        pass
+
+    def on_end(self, execution):
+        pass
+
+    def close(self):
+        """Release anything acquired by on_begin()"""
+        pass
+
+    def measure(self, phase: str, key: str):
+        return nullcontext()
+
+
+def instrument(instruments: List[ExecutionInstrument], phase: str, key: str):
+    """Context manager that measures a phase with each of the instruments"""
+    if not instruments:
+        return NO_INSTRUMENTS
+    if len(instruments) == 1:
+        return instruments[0].measure(phase, key)
+    stack = ExitStack()
+    for i in instruments:
+        stack.enter_context(i.measure(phase, key))
+    return stack
+
+
+class PhaseStatistics(object):
+    __slots__ = ("count", "seconds", "self_seconds", "allocated_bytes")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.self_seconds = 0.0
+        self.allocated_bytes = 0
+
+    def to_dict(self) -> Dict:
+        return {s: getattr(self, s) for s in self.__slots__}
+
+
+class ExecutionProfiler(ExecutionInstrument):
+    """
+    Records the count, wall time (total and excluding nested phases), and net
+    bytes allocated (if `trace_memory`) for each phase and behavior, and for
+    each stack of nested phases.
+    """
+
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.phases: Dict[Tuple[str, str], PhaseStatistics] = {}
+        self.stacks: Dict[Tuple[str, ...], float] = {}
+        self.peak_bytes: Optional[int] = None
+        self._stack: List[str] = []
+        self._child_seconds: List[float] = []
+        self._started_tracing = False
+
+    def on_begin(self, execution):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def on_end(self, execution):
+        if self.trace_memory and tracemalloc.is_tracing():
+            self.peak_bytes = max(
+                self.peak_bytes or 0, tracemalloc.get_traced_memory()[1]
+            )
+        self.close()
+
+    def close(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextmanager
+    def measure(self, phase: str, key: str) -> Iterator[None]:
+        frame = f"{phase}[{key}]" if phase == "execute_node" else phase
+        self._stack.append(frame)
+        self._child_seconds.append(0.0)
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        allocated = tracemalloc.get_traced_memory()[0] if tracing else 0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            if tracing:
+                allocated = tracemalloc.get_traced_memory()[0] - allocated
+            child_seconds = self._child_seconds.pop()
+            stack = tuple(self._stack)
+            self._stack.pop()
+            if self._child_seconds:
+                self._child_seconds[-1] += seconds
+
+            stats = self.phases.get((phase, key))
+            if stats is None:
+                stats = self.phases[(phase, key)] = PhaseStatistics()
+            stats.count += 1
+            stats.seconds += seconds
+            stats.self_seconds += seconds - child_seconds
+            stats.allocated_bytes += allocated
+            self.stacks[stack] = self.stacks.get(stack, 0.0) + seconds - child_seconds
+
+    def report(self) -> Dict:
+        """Statistics for each phase, by behavior"""
+        phases = {}
+        for (phase, key), stats in sorted(self.phases.items()):
+            phases.setdefault(phase, {})[key] = stats.to_dict()
+        return {"peak_bytes": self.peak_bytes, "phases": phases}
+
+    def folded_stacks(self) -> List[str]:
+        """Self time of each stack of phases, in microseconds, as folded stacks"""
+        return [
+            f"{';'.join(stack)} {round(seconds * 1e6)}"
+            for stack, seconds in sorted(self.stacks.items())
+        ]
+
+    def write_json(self, filename: str):
+        with open(filename, "w") as f:
+            json.dump(self.report(), f, indent=4)
+
+    def write_folded(self, filename: str):
+        with open(filename, "w") as f:
+            f.write("\n".join(self.folded_stacks()) + "\n")
@@ -0,0 +1,291 @@
+"""
+Loop-aware compaction of execution traces.
+
+An Activity that loops through a DecisionNode and a MergeNode (e.g., until a
+pH reaches its target) adds records and flows to the ProtocolExecution for
+every iteration, so the trace of a long running loop grows without bound.
+With `ExecutionEngine(compact_loops=True)`, a LoopCompactor follows the loops
+of each Activity and removes the records and flows of iterations that are
+neither the first, nor the last, nor sampled (every `sample_every`-th
+iteration), so that the trace holds a bounded number of iterations of each
+loop.  A LoopSummary reports the number of iterations of each loop and the
+first and last records.
+
+Loops are found from the back-edges of a depth-first search of the Activity,
+starting at its initial nodes.  The natural loop of a back-edge is the set of
+nodes that reach the source of the back-edge without passing through its
+target (the loop header).  An iteration ends when a token is created on a
+back-edge.  A finished iteration is removed only if it is self-contained:
+every token it created was consumed by its own records, except for the token
+on the back-edge.  When an iteration is removed, that back-edge token takes
+the place of the back-edge token that entered the iteration, so the records
+that remain in the trace are still connected by flows.
+
+Only the innermost loop of each node is compacted.  Specializations and the
+sample provenance observer still see every record as it executes.
+"""
+
+import logging
+from typing import Dict, List, NamedTuple, Optional, Set
+
+import sbol3
+
+from uml.action import Action
+from uml.activity import Activity
+from uml.activity_node import ActivityNode
+from uml.initial_node import InitialNode
+
+from .trace_commit import TraceCommitter
+from .transient_token import Token
+
+l = logging.getLogger(__file__)
+l.setLevel(logging.WARN)
+
+
+class ActivityLoop(NamedTuple):
+    """A loop of an Activity, given by node and edge identities"""
+
+    header: str
+    back_edges: Set[str]
+    body: Set[str]
+
+
+def find_loops(activity: Activity) -> List[ActivityLoop]:
+    """
+    Find the loops of an Activity.  Pins are linked to their Actions, so that
+    a loop that passes through an Action includes the Action and its pins.
+    Loops with the same header are merged.
+    """
+    successors: Dict[str, list] = {}
+    predecessors: Dict[str, List[str]] = {}
+
+    def link(source: ActivityNode, target: ActivityNode, edge=None):
+        successors.setdefault(source.identity, []).append((target.identity, edge))
+        predecessors.setdefault(target.identity, []).append(source.identity)
+
+    for edge in activity.edges:
+        link(edge.get_source(), edge.get_target(), edge.identity)
+    for node in activity.nodes:
+        if isinstance(node, Action):
+            for pin in node.get_inputs():
+                link(pin, node)
+            for pin in node.get_outputs():
+                link(node, pin)
+
+    roots = [n.identity for n in activity.nodes if isinstance(n, InitialNode)]
+    roots += sorted(set(successors) - set(roots))
+
+    loops: Dict[str, ActivityLoop] = {}
+    state: Dict[str, bool] = {}  # False while on the search path, True when done
+    for root in roots:
+        if root in state:
+            continue
+        state[root] = False
+        path = [root]
+        entered_by = [None]  # edges that entered each node on the path
+        remaining = [iter(successors.get(root, []))]
+        while remaining:
+            for target, edge in remaining[-1]:
+                if target not in state:
+                    state[target] = False
+                    path.append(target)
+                    entered_by.append(edge)
+                    remaining.append(iter(successors.get(target, [])))
+                    break
+                if state[target] is False:
+                    # A cycle closed at target.  If it is closed by a pin's
+                    # link to its Action, the back-edge is the last edge on
+                    # the path into the cycle.
+                    start = path.index(target)
+                    back_edge = edge or next(
+                        (e for e in reversed(entered_by[start + 1 :]) if e), None
+                    )
+                    if back_edge is None:
+                        continue
+                    body = {target}
+                    work = [path[-1]]
+                    while work:
+                        node = work.pop()
+                        if node not in body:
+                            body.add(node)
+                            work += predecessors.get(node, [])
+                    loop = loops.get(target, ActivityLoop(target, set(), set()))
+                    loop.back_edges.add(back_edge)
+                    loop.body.update(body)
+                    loops[target] = loop
+            else:
+                state[path.pop()] = True
+                entered_by.pop()
+                remaining.pop()
+    return list(loops.values())
+
+
+class LoopSummary(object):
+    """The iterations of one execution of a loop"""
+
+    def __init__(self, loop: ActivityLoop):
+        self.loop = loop
+        self.iterations = 0
+        self.retained: List[int] = []  # iterations (from 1) remaining in the trace
+        self.first_records: List["ActivityNodeExecution"] = []
+        self.last_records: List["ActivityNodeExecution"] = []
+
+    @property
+    def compacted(self) -> int:
+        """Number of iterations removed from the trace"""
+        return self.iterations - len(self.retained)
+
+    def __repr__(self):
+        return f"LoopSummary(header={self.loop.header}, iterations={self.iterations}, retained={self.retained})"
+
+
+class _Iteration(object):
+    def __init__(self, number: int, entering=None):
+        self.number = number
+        self.entering = entering  # back-edge token that started the iteration
+        self.exit = None  # back-edge token that ended the iteration
+        self.records: List["ActivityNodeExecution"] = []
+        self.produced: Dict[int, object] = {}
+        self.consumed: Set[int] = set()
+
+
+class _LoopState(object):
+    def __init__(self, loop: ActivityLoop):
+        self.summary = LoopSummary(loop)
+        self.previous: Optional[_Iteration] = None
+        self.current: Optional[_Iteration] = None
+
+
+class LoopCompactor(object):
+    """
+    Follows the records created by an ExecutionEngine and removes the
+    iterations of loops that are not retained from the trace.
+    """
+
+    def __init__(
+        self,
+        trace: TraceCommitter,
+        sample_every: Optional[int] = None,
+    ):
+        self.trace = trace
+        self.document = trace.execution.document
+        self.sample_every = sample_every
+        self._loops: Dict[str, Dict[str, ActivityLoop]] = {}  # activity -> node -> loop
+        self._states: Dict[str, _LoopState] = {}  # loop header -> state
+        self._summaries: List[LoopSummary] = []
+
+    def summaries(self) -> List[LoopSummary]:
+        return list(self._summaries)
+
+    def innermost_loop(self, node: ActivityNode) -> Optional[ActivityLoop]:
+        activity = node.get_parent()
+        while activity is not None and not isinstance(activity, Activity):
+            activity = activity.get_parent()
+        if activity is None:
+            return None
+        if activity.identity not in self._loops:
+            node_loops = {}
+            for loop in sorted(find_loops(activity), key=lambda lp: -len(lp.body)):
+                node_loops.update({n: loop for n in loop.body})
+            self._loops[activity.identity] = node_loops
+        return self._loops[activity.identity].get(node.identity)
+
+    def record(
+        self,
+        record: "ActivityNodeExecution",
+        consumed: List[object],
+        produced: List[object],
+    ):
+        """Follow a record that consumed and produced the tokens"""
+        loop = self.innermost_loop(record.get_node())
+        if loop is None:
+            return
+        state = self._states.get(loop.header)
+        entered_by_back_edge = any(
+            _edge_identity(t) in loop.back_edges for t in consumed
+        )
+        if state is None or (
+            record.get_node().identity == loop.header and not entered_by_back_edge
+        ):
+            # A new execution of the loop
+            state = _LoopState(loop)
+            self._states[loop.header] = state
+            self._summaries.append(state.summary)
+            self._start_iteration(state, None)
+
+        iteration = state.current
+        iteration.records.append(record)
+        iteration.consumed.update(id(t) for t in consumed)
+        iteration.produced.update((id(t), t) for t in produced)
+        state.summary.last_records = iteration.records
+
+        back_edge_token = next(
+            (t for t in produced if _edge_identity(t) in loop.back_edges), None
+        )
+        if back_edge_token is not None:
+            iteration.exit = back_edge_token
+            if state.previous is not None:
+                self._compact(state, state.previous)
+            state.previous = iteration
+            self._start_iteration(state, back_edge_token)
+
+    def finish(self):
+        """Compact the iterations before the last iteration of each loop"""
+        for state in self._states.values():
+            if state.previous is not None:
+                self._compact(state, state.previous)
+                state.previous = None
+
+    def _start_iteration(self, state: _LoopState, entering):
+        summary = state.summary
+        summary.iterations += 1
+        summary.retained.append(summary.iterations)
+        state.current = _Iteration(summary.iterations, entering)
+        if summary.iterations == 1:
+            summary.first_records = state.current.records
+
+    def _compact(self, state: _LoopState, iteration: _Iteration):
+        """Remove a finished iteration from the trace, if it is not retained"""
+        if iteration.number == 1 or (
+            self.sample_every and iteration.number % self.sample_every == 0
+        ):
+            return
+        entering, exit = iteration.entering, iteration.exit
+        if entering is None or _edge_identity(entering) != _edge_identity(exit):
+            return
+        removed_tokens = [t for i, t in iteration.produced.items() if t is not exit] + [
+            entering
+        ]
+        if any(
+            id(t) not in iteration.consumed for t in removed_tokens
+        ) or iteration.consumed & set(state.current.produced):
+            return  # Not self-contained
+
+        # The exit token now continues from the source of the entering token
+        source = entering.get_source()
+        exit.token_source = source
+        if isinstance(exit, Token) and exit.flow is not None:
+            exit.flow.token_source = source
+
+        flows = [_flow(t) for t in removed_tokens]
+        flows = [f for f in flows if f is not None]
+        records = iteration.records
+        calls = [r.call.lookup() for r in records if hasattr(r, "call") and r.call]
+        self.trace.remove(records=records, flows=flows)
+        for call in calls:
+            self.document.remove_object(call)
+            call.traverse(lambda o: setattr(o, "document", None))
+        state.summary.retained.remove(iteration.number)
+
+
+def _edge_identity(token) -> Optional[str]:
+    # Tokens refer to their edge, ActivityEdgeFlows to its identity
+    edge = token.edge
+    if edge is None:
+        return None
+    return edge.identity if isinstance(edge, sbol3.Identified) else str(edge)
+
+
+def _flow(token) -> Optional["ActivityEdgeFlow"]:
+    """The ActivityEdgeFlow recording a token, if it was recorded"""
+    return token.flow if isinstance(token, Token) else token
@@ -0,0 +1,135 @@
+"""
+Execution-scoped resolution of SBOL references.
+
+`ReferencedURI.lookup()` resolves a URI with `Document.find()`, which walks every
+object in the document.  Execution records call `lookup()` for each node, edge,
+pin, and parameter they touch, so a long execution spends most of its time
+walking the document.  While an ExecutionEngine runs, the protocol objects do
+not change, and the only new objects are the records that the engine creates.
+The ReferenceResolver caches the result of each `find()` and the records that
+the engine registers, so that repeated lookups are dictionary hits.
+"""
+
+import logging
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import sbol3
+
+l: logging.Logger = logging.getLogger(__file__)
+
+
+class ReferenceResolver(object):
+    """
+    Caches URI to object resolution for one Document.
+
+    While attached, the resolver takes the place of the document's `find()`
+    method, so every `lookup()` of a reference owned by an object in the
+    document goes through the cache.  A cached object is only returned if it
+    still has the requested identity and still belongs to the document;
+    otherwise the document is searched again.  Display_id searches are passed
+    through to the document without caching.
+
+    While attached, the resolver also takes the place of the document's
+    `remove_object()` method (which `Document.remove()` calls), so a removed
+    top-level object and its children are unregistered.  A child removed from
+    its parent by an OwnedObjectAppender no longer belongs to the document, so
+    it is not returned from the cache either.
+    """
+
+    def __init__(self, document: sbol3.Document):
+        self.document = document
+        self.hits = 0
+        self.misses = 0
+        self._objects: Dict[str, sbol3.Identified] = {}
+        self._document_find = None
+        self._document_remove_object = None
+
+    @property
+    def attached(self) -> bool:
+        return self.document.__dict__.get("find") == self.find
+
+    def attach(self) -> "ReferenceResolver":
+        if self.attached:
+            return self
+        if "find" in self.document.__dict__:
+            l.warning(
+                "Document %s already has a reference resolver attached, not caching references",
+                self.document,
+            )
+            return self
+        self._document_find = self.document.find
+        self._document_remove_object = self.document.remove_object
+        self.document.find = self.find
+        self.document.remove_object = self.remove_object
+        return self
+
+    def detach(self):
+        if self.attached:
+            del self.document.find
+            del self.document.remove_object
+        self._document_find = None
+        self._document_remove_object = None
+        self._objects = {}
+
+    def __enter__(self) -> "ReferenceResolver":
+        return self.attach()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.detach()
+
+    def register(self, obj: sbol3.Identified):
+        """Cache a newly created object, and its children, by identity."""
+
+        def _register(o: sbol3.Identified):
+            self._objects[o.identity] = o
+
+        obj.traverse(_register)
+
+    def unregister(self, obj: sbol3.Identified):
+        """Forget an object removed from the document, and its children."""
+
+        def _unregister(o: sbol3.Identified):
+            if self._objects.get(o.identity) is o:
+                del self._objects[o.identity]
+
+        obj.traverse(_unregister)
+
+    def remove_object(self, top_level: sbol3.TopLevel):
+        """Remove a top-level object from the document, and forget it and its children."""
+        self._document_remove_object(top_level)
+        self.unregister(top_level)
+
+    def find(self, search_string: str) -> Optional[sbol3.Identified]:
+        search_string = str(search_string)  # ReferencedURIs are not hashable
+        obj = self._objects.get(search_string)
+        if (
+            obj is not None
+            and obj.identity == search_string
+            and obj.document is self.document
+        ):
+            self.hits += 1
+            return obj
+
+        self.misses += 1
+        find = self._document_find if self._document_find else self.document.find
+        obj = find(search_string)
+        if obj is not None and obj.identity == search_string:
+            self._objects[search_string] = obj
+        return obj
+
+
+@contextmanager
+def resolved_references(document: Optional[sbol3.Document]):
+    """
+    Cache reference resolution for the document within a `with` block, unless
+    a ReferenceResolver is already attached to it (e.g., by an ExecutionEngine).
+    The objects of the document are registered up front, in one traversal.
+    """
+    if document is None or "find" in document.__dict__:
+        yield None
+        return
+    with ReferenceResolver(document) as resolver:
+        for obj in document.objects:
+            resolver.register(obj)
+        yield resolver
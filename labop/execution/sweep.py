@@ -0,0 +1,243 @@
+"""
+Execution of one Protocol with many combinations of parameter values.
+
+Comparing plans means executing the same protocol with many parameter values
+(volumes, wavelengths, dilution factors).  Each ExecutionEngine.execute()
+checks the protocol, looks up and defines the compute_output() of every
+known primitive, compiles the DecisionNodes, and resolves references with a
+new ReferenceResolver, and each ProtocolExecution that it adds makes the
+next execution's searches of the document slower.
+
+A ParameterSweep prepares the protocol once (ExecutionEngine.prepare()) and
+executes each parameterization with that work reused.  By default each
+execution is removed from the document once its results are collected, so
+that the document does not grow with the number of runs.  Runs can be spread
+over forked worker processes, each of which inherits the prepared protocol.
+The results are columns of plain values, one row per run.
+"""
+
+import copy
+import itertools
+import logging
+import multiprocessing
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import sbol3
+
+from labop.parameter_value import ParameterValue
+from labop.protocol import Protocol
+from labop.protocol_execution import ProtocolExecution
+from uml.literal_specification import LiteralSpecification
+from uml.utils import literal
+
+from .execution_engine import ExecutionEngine
+
+l: logging.Logger = logging.getLogger(__file__)
+
+_sweep: Optional["ParameterSweep"] = None  # The sweep run by forked workers
+
+
+def parameter_grid(**axes: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Every combination of the values of each named parameter, varying the last parameter fastest"""
+    names = list(axes)
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*(list(axes[n]) for n in names))
+    ]
+
+
+class SweepResults(object):
+    """
+    The results of a ParameterSweep, as columns of equal length with one row
+    per run.  The columns are `run` (the index of the parameterization),
+    `execution` (the display_id of its ProtocolExecution), a column for each
+    input and output parameter value, `completed_normally`, `calls` (the
+    number of node executions), `seconds`, and `error` (the exception raised
+    by a failed run, or None).  A Measure value is split into a column of
+    its value and a `<name>_unit` column of its unit.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        names = []
+        for row in rows:
+            names += [n for n in row if n not in names]
+        self.columns: Dict[str, List[Any]] = {
+            n: [row.get(n) for row in rows] for n in names
+        }
+
+    def __len__(self) -> int:
+        return len(self.columns.get("run", []))
+
+    def rows(self) -> List[Dict[str, Any]]:
+        return [
+            {n: column[i] for n, column in self.columns.items()}
+            for i in range(len(self))
+        ]
+
+    def to_dataframe(self):
+        import pandas as pd
+
+        return pd.DataFrame(self.columns)
+
+
+def _cells(name: str, value: Any) -> Dict[str, Any]:
+    """Plain values for the columns of a parameter value"""
+    if isinstance(value, list):
+        cells = [_cells(name, v) for v in value]
+        return {n: [c.get(n) for c in cells] for n in cells[0]} if cells else {}
+    if isinstance(value, LiteralSpecification):
+        value = value.get_value()
+    if isinstance(value, sbol3.Measure):
+        return {name: value.value, f"{name}_unit": value.unit}
+    if isinstance(value, sbol3.Identified):
+        return {name: value.identity}
+    return {name: value}
+
+
+class ParameterSweep(object):
+    """
+    Executes a Protocol once for each of a list of parameterizations, maps of
+    input parameter names to values, e.g., from parameter_grid().  The values
+    may be anything that uml.literal() accepts; an SBOL value (e.g., a
+    Measure) is copied for each run, so that one value can be used by many
+    parameterizations.
+
+    Parameters
+    ----------
+    protocol : Protocol
+        The protocol to execute.  It must not be modified during a run().
+    agent : sbol3.Agent
+        The agent of each execution.
+    engine : ExecutionEngine
+        The engine that executes each run; by default, one that does not
+        track samples.
+    keep_executions : bool
+        Keep the ProtocolExecution of each run in the protocol's document
+        (only for runs in this process).
+    id_prefix : str
+        Prefix of the display_id of each run's ProtocolExecution, followed
+        by the index of the run.
+    """
+
+    def __init__(
+        self,
+        protocol: Protocol,
+        agent: Optional[sbol3.Agent] = None,
+        engine: Optional[ExecutionEngine] = None,
+        keep_executions: bool = False,
+        id_prefix: str = "sweep_",
+    ):
+        self.protocol = protocol
+        self.agent = agent if agent is not None else sbol3.Agent("sweep_agent")
+        self.engine = (
+            engine if engine is not None else ExecutionEngine(track_samples=False)
+        )
+        self.keep_executions = keep_executions
+        self.id_prefix = id_prefix
+        self.executions: List[ProtocolExecution] = []
+        self._parameterizations: List[Dict[str, Any]] = []
+        self._inputs = {
+            p.property_value.name: p
+            for p in protocol.get_parameters(ordered=True, input_only=True)
+        }
+
+    def run(
+        self, parameterizations: Iterable[Dict[str, Any]], processes: int = 1
+    ) -> SweepResults:
+        """
+        Execute the protocol with each parameterization, in `processes`
+        forked worker processes, and return the results in the order of the
+        parameterizations.
+        """
+        global _sweep
+        self._parameterizations = list(parameterizations)
+        for parameterization in self._parameterizations:
+            unknown = [n for n in parameterization if n not in self._inputs]
+            if unknown:
+                raise ValueError(
+                    f"Protocol {self.protocol.identity} has no input parameters named {unknown}"
+                )
+        indices = list(range(len(self._parameterizations)))
+
+        self.engine.prepare(self.protocol)
+        try:
+            if processes > 1 and "fork" not in multiprocessing.get_all_start_methods():
+                l.warning("Worker processes need fork, running the sweep serially")
+                processes = 1
+            if processes > 1 and len(indices) > 1:
+                chunks = [indices[i::processes] for i in range(processes)]
+                _sweep = self
+                try:
+                    with multiprocessing.get_context("fork").Pool(processes) as pool:
+                        rows = [
+                            r for chunk in pool.map(_run_chunk, chunks) for r in chunk
+                        ]
+                finally:
+                    _sweep = None
+                rows.sort(key=lambda r: r["run"])
+            else:
+                rows = self.run_chunk(indices)
+        finally:
+            self.engine.release()
+        return SweepResults(rows)
+
+    def run_chunk(self, indices: List[int]) -> List[Dict[str, Any]]:
+        return [self.run_one(i) for i in indices]
+
+    def parameter_values(
+        self, parameterization: Dict[str, Any]
+    ) -> List[ParameterValue]:
+        return [
+            ParameterValue(parameter=self._inputs[name], value=literal(_copy(value)))
+            for name, value in parameterization.items()
+        ]
+
+    def run_one(self, index: int) -> Dict[str, Any]:
+        """Execute the protocol with one parameterization, and return the row of its results"""
+        parameterization = self._parameterizations[index]
+        row: Dict[str, Any] = {"run": index, "execution": f"{self.id_prefix}{index}"}
+        for name, value in parameterization.items():
+            row.update(_cells(name, value))
+
+        document = self.protocol.document
+        existing = len(document.objects)
+        start = time.perf_counter()
+        try:
+            ex = self.engine.execute(
+                self.protocol,
+                self.agent,
+                parameter_values=self.parameter_values(parameterization),
+                id=row["execution"],
+                prepared=True,
+            )
+            for pv in ex.parameter_values:
+                row.update(_cells(pv.get_name(), pv.value))
+            row["completed_normally"] = ex.completed_normally
+            row["calls"] = len(ex.executions)
+            row["error"] = None
+        except Exception as e:
+            l.warning(f"Run {index} of the sweep failed: {e}")
+            row["completed_normally"] = False
+            row["error"] = f"{e.__class__.__name__}: {e}"
+        row["seconds"] = time.perf_counter() - start
+
+        # The execution, and the samples and datasets created by the run
+        added = document.objects[existing:]
+        if self.keep_executions:
+            self.executions += [o for o in added if isinstance(o, ProtocolExecution)]
+        elif added:
+            document.remove(added)
+            self.engine.ex = None
+        return row
+
+
+def _copy(value: Any) -> Any:
+    """A copy of an SBOL child object, which each run's ParameterValue will own"""
+    if isinstance(value, sbol3.Identified) and not isinstance(value, sbol3.TopLevel):
+        return copy.deepcopy(value)
+    return value
+
+
+def _run_chunk(indices: List[int]) -> List[Dict[str, Any]]:
+    return _sweep.run_chunk(indices)
@@ -0,0 +1,110 @@
+"""
+Bulk attachment of execution records and flows to a ProtocolExecution.
+
+Appending a child to an SBOL owned-object list (e.g., `ProtocolExecution.flows`)
+scans every sibling of the parent twice: once to mint the next display_id
+counter for the child's type and once to check for duplicate identities.  Trace
+construction appends one child per record and per token, so the scans dominate
+for long executions.  An OwnedObjectAppender (see uml/owned_objects.py)
+attaches a batch of children, keeping the display_id counters between
+batches, and produces the same identities and document as appending children
+one at a time.
+"""
+
+from typing import Dict, Iterable, List
+
+from uml.owned_objects import OwnedObjectAppender
+
+from .transient_token import Token
+
+
+class TraceCommitter(object):
+    """
+    Commits the records and flows created by the ExecutionEngine to the
+    ProtocolExecution trace.
+
+    With `bulk=True`, each batch is attached by an OwnedObjectAppender.  With
+    `bulk=False`, children are appended one at a time through pySBOL3, which is
+    the reference behavior that the bulk path reproduces.
+
+    With `transient_tokens=True`, the engine creates Tokens rather than
+    ActivityEdgeFlows for tokens that do not carry owned objects.  Tokens are
+    materialized and attached when they are consumed, and any tokens still
+    pending are attached by flush().  If `record_flows=False`, tokens are never
+    materialized.
+    """
+
+    def __init__(
+        self,
+        execution: "ProtocolExecution",
+        bulk: bool = True,
+        transient_tokens: bool = False,
+        record_flows: bool = True,
+    ):
+        self.execution = execution
+        self.bulk = bulk
+        self.transient_tokens = transient_tokens
+        self.record_flows = record_flows
+        self._appender = OwnedObjectAppender.of(execution)
+        self._pending: Dict[int, "Token"] = {}  # Unrecorded tokens, in creation order
+
+    def commit_records(
+        self, records: Iterable["ActivityNodeExecution"]
+    ) -> List["ActivityNodeExecution"]:
+        if self.bulk:
+            return self._appender.extend("executions", records)
+        records = list(records)
+        for record in records:
+            self.execution.executions.append(record)
+        return records
+
+    def commit_flows(self, flows: Iterable) -> List:
+        flows = list(flows)
+        if self.transient_tokens:
+            # Tokens wait to be consumed, ActivityEdgeFlows are attached now
+            tokens = [t for t in flows if isinstance(t, Token)]
+            if self.record_flows:
+                self._pending.update((id(t), t) for t in tokens)
+            self._attach_flows([f for f in flows if not isinstance(f, Token)])
+            return flows
+        return self._attach_flows(flows)
+
+    def consume(self, tokens: Iterable) -> List:
+        """
+        Get the flows that a new record will reference for the tokens it
+        consumes.  Transient tokens are materialized and attached to the trace,
+        or passed through unchanged if flows are not recorded.
+        """
+        tokens = list(tokens)
+        if not self.transient_tokens or not self.record_flows:
+            return tokens
+        flows = [t.materialize() if isinstance(t, Token) else t for t in tokens]
+        self._attach_flows(
+            [t.flow for t in tokens if self._pending.pop(id(t), None) is not None]
+        )
+        return flows
+
+    def remove(
+        self,
+        records: Iterable["ActivityNodeExecution"] = (),
+        flows: Iterable["ActivityEdgeFlow"] = (),
+    ):
+        """Remove records and flows from the trace (e.g., compacted loop iterations)"""
+        self._appender.remove("executions", records)
+        self._appender.remove("flows", flows)
+
+    def flush(self) -> List["ActivityEdgeFlow"]:
+        """Materialize and attach the tokens that were never consumed"""
+        tokens = list(self._pending.values())
+        self._pending = {}
+        return self._attach_flows([t.materialize() for t in tokens])
+
+    def _attach_flows(
+        self, flows: Iterable["ActivityEdgeFlow"]
+    ) -> List["ActivityEdgeFlow"]:
+        if self.bulk:
+            return self._appender.extend("flows", flows)
+        flows = list(flows)
+        for flow in flows:
+            self.execution.flows.append(flow)
+        return flows
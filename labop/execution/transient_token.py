@@ -0,0 +1,122 @@
+"""
+Transient tokens for in-flight execution state.
+
+By default, the ExecutionEngine represents each token as an SBOL
+ActivityEdgeFlow that is attached to the ProtocolExecution as soon as it is
+created.  With `ExecutionEngine(transient_tokens=True)`, in-flight tokens are
+Token objects instead: plain Python objects with slots that refer directly to
+their edge and source record.  A Token is only materialized as an
+ActivityEdgeFlow when the trace records it, i.e., when it is consumed by an
+execution record or when the execution finishes with the token still pending.
+
+Control tokens all carry the same value, so Tokens on ControlFlow edges share
+CONTROL_TOKEN_VALUE, and each ActivityEdgeFlow that records one gets a new
+copy of it.
+
+The values of a Token are not owned by any object in the document, so a
+LiteralReference among them could not look up what it refers to.  Tokens
+carry TokenReferences instead, which keep the referenced object.
+"""
+
+from typing import List, Optional
+
+import sbol3
+
+import uml
+from labop.activity_edge_flow import ActivityEdgeFlow
+from labop.protocol import Protocol
+from uml import CallBehaviorAction, InputPin
+
+CONTROL_FLOW = "uml.ControlFlow"
+
+# The value shared by transient control tokens; it is never owned by a flow
+CONTROL_TOKEN_VALUE: List["uml.LiteralSpecification"] = [uml.literal(CONTROL_FLOW)]
+
+
+def control_value() -> List["uml.LiteralSpecification"]:
+    """A new value for a control token"""
+    return [uml.literal(CONTROL_FLOW)]
+
+
+def token_literal(value) -> "uml.LiteralSpecification":
+    """
+    The literal of a value carried by a Token, as
+    uml.literal(value, reference=True) makes for an ActivityEdgeFlow, but with
+    a TokenReference in place of a LiteralReference.
+    """
+    if isinstance(value, uml.LiteralSpecification):
+        value = value.get_value()
+    if isinstance(value, sbol3.Identified) and value.identity is not None:
+        return TokenReference(value=value)
+    return uml.literal(value)
+
+
+class TokenReference(uml.LiteralReference):
+    """
+    A LiteralReference carried by a Token.  Until a flow records the Token and
+    owns the reference, it resolves to the object it was made with.
+    """
+
+    def __init__(self, value: sbol3.Identified, **kwargs):
+        super().__init__(value=value, **kwargs)
+        self.referenced = value
+
+    def get_value(self):
+        if self.document is None:
+            return self.referenced
+        return super().get_value()
+
+
+class Token(object):
+    """A token traversing an ActivityEdge, with the same accessors as ActivityEdgeFlow"""
+
+    __slots__ = ("edge", "token_source", "value", "flow")
+
+    def __init__(
+        self,
+        edge: "uml.ActivityEdge" = None,
+        token_source: "ActivityNodeExecution" = None,
+        value: List["uml.LiteralSpecification"] = None,
+    ):
+        self.edge = edge
+        self.token_source = token_source
+        self.value = value
+        self.flow: Optional[ActivityEdgeFlow] = None
+
+    def get_edge(self) -> "uml.ActivityEdge":
+        return self.edge
+
+    def get_value(self) -> List["uml.LiteralSpecification"]:
+        return self.value
+
+    def get_source(self) -> "ActivityNodeExecution":
+        return self.token_source
+
+    def get_target(self) -> "uml.ActivityNode":
+        """Find the target node of the token, as in ActivityEdgeFlow.get_target()"""
+        if self.edge:
+            return self.edge.get_target()
+        token_source_node = self.token_source.get_node()
+        if isinstance(token_source_node, InputPin):
+            return token_source_node.get_parent()
+        elif isinstance(token_source_node, CallBehaviorAction) and isinstance(
+            token_source_node.get_behavior(), Protocol
+        ):
+            return token_source_node.get_behavior().initial()
+        raise Exception(f"Cannot find the target node of token: {self}")
+
+    def materialize(self) -> ActivityEdgeFlow:
+        """
+        Create the ActivityEdgeFlow recording this token.  The flow takes
+        ownership of the token's value and is created at most once.
+        """
+        if self.flow is None:
+            value = control_value() if self.value is CONTROL_TOKEN_VALUE else self.value
+            self.flow = ActivityEdgeFlow(
+                edge=self.edge, token_source=self.token_source, value=value
+            )
+        return self.flow
+
+    def __repr__(self):
+        edge = self.edge.identity if self.edge else None
+        return f"Token(edge={edge})"
@@ -0,0 +1,313 @@
+"""
+Cached, incremental validation of Documents and Protocols.
+
+`Document.validate()` checks every object of the document and then runs the
+SBOL3 SHACL rules over an RDF graph of the whole document, and
+`Protocol.is_well_formed()` validated the protocol again before checking each
+of its nodes and edges.  Building a protocol, writing it, and executing it
+would therefore validate the same objects several times.
+
+A DocumentValidator keeps the results for each TopLevel object of a document
+with the revision of the object (a fingerprint of its triples) and the
+revisions of the TopLevel objects that it refers to.  A pass only validates
+the objects that were modified since the previous pass, or that refer to a
+modified object.  The SHACL rules are run over the triples of those objects,
+together with the types of every object, which the rules use to check the
+class of referenced objects.  (Triples that pySBOL3 keeps for non-SBOL
+objects in the document are not checked.)  Objects of other documents (e.g., library
+primitives) are assumed not to change.  The well-formedness checks of an
+Activity look up edges and parameters in indexes built once per pass, and
+check each called Behavior once.
+"""
+
+import logging
+import os
+import weakref
+from typing import Dict, List, Optional, Set
+
+import pyshacl
+import rdflib
+import sbol3
+
+from labop.utils.sbol_properties import owned_objects, property_values
+from uml.action import Action
+from uml.activity import Activity
+from uml.final_node import FinalNode
+from uml.initial_node import InitialNode
+from uml.utils import WellFormednessError, WellFormednessIssue
+
+from .reference_resolver import resolved_references
+
+l: logging.Logger = logging.getLogger(__file__)
+
+_shapes: Optional[rdflib.Graph] = None
+
+# The validator of each document, see document_validator()
+_validators: "weakref.WeakKeyDictionary[sbol3.Document, DocumentValidator]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _shacl_shapes() -> rdflib.Graph:
+    """The SBOL3 SHACL rules, parsed once"""
+    global _shapes
+    if _shapes is None:
+        _shapes = rdflib.Graph()
+        _shapes.parse(
+            sbol3.document.data_path(os.path.join("rdf", "sbol3-shapes.ttl")),
+            format="ttl",
+        )
+    return _shapes
+
+
+def _triples(obj: sbol3.Identified, triples: list, subjects: Set[str]):
+    """Collect the triples of an object and its children, as serialized by pySBOL3"""
+    identity = rdflib.URIRef(obj.identity)
+    subjects.add(obj.identity)
+    for prop, items in property_values(obj).items():
+        if items:
+            rdf_prop = rdflib.URIRef(prop)
+            triples.extend((identity, rdf_prop, item) for item in items)
+    for prop, items in owned_objects(obj).items():
+        if items:
+            rdf_prop = rdflib.URIRef(prop)
+            for item in items:
+                triples.append((identity, rdf_prop, rdflib.URIRef(item.identity)))
+                _triples(item, triples, subjects)
+
+
+class _Entry(object):
+    """Validation results for one TopLevel object at one revision"""
+
+    def __init__(self, obj: sbol3.TopLevel, triples: list):
+        self.obj = obj
+        subjects = set()
+        _triples(obj, triples, subjects)
+        self.revision = hash(frozenset(triples))
+        self.subjects = subjects
+        self.references = {
+            str(o)
+            for _, _, o in triples
+            if isinstance(o, rdflib.URIRef) and str(o) not in subjects
+        }
+        self.dependencies: Optional[Dict[str, int]] = None
+        self.report: Optional[sbol3.ValidationReport] = None
+        self.shacl: Optional[sbol3.ValidationReport] = None
+        self.issues: Optional[List[WellFormednessIssue]] = None
+
+    def same_revision(self, other: Optional["_Entry"]) -> bool:
+        return (
+            other is not None
+            and other.obj is self.obj
+            and other.revision == self.revision
+        )
+
+
+class DocumentValidator(object):
+    """
+    Validates a Document, caching the results for each TopLevel object until
+    it, or an object that it refers to, is modified.  Use
+    `document_validator(document)` to share one validator per document.
+    """
+
+    def __init__(self, document: sbol3.Document):
+        # A weak reference, so that document_validator() does not keep the
+        # document alive
+        self._document = weakref.ref(document)
+        self.validated: List[str] = []  # objects validated by the last pass
+        self._entries: Dict[str, _Entry] = {}
+
+    @property
+    def document(self) -> sbol3.Document:
+        return self._document()
+
+    def validate(self, shacl: bool = True) -> sbol3.ValidationReport:
+        """
+        Validate the document, as with `Document.validate()`.  The report
+        lists the errors and warnings of each object, in document order, and
+        then those of the SHACL rules, if `shacl`.
+        """
+        objects = list(self.document.objects)
+        toplevels = {o.identity: o for o in objects}
+        triples = {}
+        for obj in objects:
+            triples[obj.identity] = []
+            self._refresh(obj, triples[obj.identity])
+        for identity in set(self._entries) - set(toplevels):
+            del self._entries[identity]
+        entries = [self._entries[o.identity] for o in objects]
+        self.validated = []
+        for entry in entries:
+            self._update_dependencies(entry, toplevels)
+
+        with resolved_references(self.document):
+            for entry in entries:
+                if entry.report is None:
+                    entry.report = entry.obj.validate(sbol3.ValidationReport())
+                    self.validated.append(entry.obj.identity)
+        if shacl:
+            self._validate_shacl(entries, triples)
+
+        report = sbol3.ValidationReport()
+        reports = [e.report for e in entries]
+        if shacl:
+            reports += [e.shacl for e in entries]
+        for r in reports:
+            report._errors += r.errors
+            report._warnings += r.warnings
+        return report
+
+    def is_well_formed(self, activity: Activity) -> List[WellFormednessIssue]:
+        """
+        An Activity is well formed if:
+        - it has no validation errors or warnings
+        - each ActivityNode is well formed
+        - each ActivityEdge is well formed
+        - has an initial node
+        - has a final node
+        Only the Activity and the objects that it refers to are revalidated.
+        """
+        toplevels = {o.identity: o for o in self.document.objects}
+        entry = self._refresh(activity, [])
+        for dependency in {_owner(r, toplevels) for r in entry.references} - {None}:
+            self._refresh(toplevels[dependency], [])
+        self.validated = []
+        self._update_dependencies(entry, toplevels)
+        if entry.issues is not None:
+            return list(entry.issues)
+
+        with resolved_references(self.document):
+            if entry.report is None:
+                entry.report = activity.validate(sbol3.ValidationReport())
+                self.validated.append(activity.identity)
+            issues = [
+                WellFormednessError(self.document.find(e.object_id), e.message)
+                for e in entry.report.errors + entry.report.warnings
+            ]
+            issues += activity_issues(activity)
+
+        if not any(isinstance(node, InitialNode) for node in activity.nodes):
+            issues += [
+                WellFormednessError(
+                    activity,
+                    f"Protocol does not include an InitialNode",
+                    f"Calling protocol.initial() will add an InitialNode to protocol.",
+                )
+            ]
+        if not any(isinstance(node, FinalNode) for node in activity.nodes):
+            issues += [
+                WellFormednessError(
+                    activity,
+                    f"Protocol does not include an FinalNode",
+                    f"Calling protocol.final() will add an FinalNode to protocol.",
+                )
+            ]
+        entry.issues = issues
+        return list(issues)
+
+    def _refresh(self, obj: sbol3.TopLevel, triples: list) -> _Entry:
+        """Find the revision of an object, keeping its results if it is unmodified"""
+        entry = _Entry(obj, triples)
+        previous = self._entries.get(obj.identity)
+        if entry.same_revision(previous):
+            return previous
+        self._entries[obj.identity] = entry
+        return entry
+
+    def _update_dependencies(self, entry: _Entry, toplevels: Dict[str, sbol3.TopLevel]):
+        """Discard the results of an entry if an object that it refers to changed"""
+        dependencies = {}
+        for reference in entry.references:
+            owner = _owner(reference, toplevels)
+            if owner is not None and owner != entry.obj.identity:
+                dependency = self._entries.get(owner)
+                dependencies[owner] = dependency.revision if dependency else None
+        if dependencies != entry.dependencies:
+            entry.dependencies = dependencies
+            entry.report = None
+            entry.shacl = None
+            entry.issues = None
+
+    def _validate_shacl(self, entries: List[_Entry], triples: Dict[str, list]):
+        """Run the SHACL rules over the objects without SHACL results"""
+        stale = [e for e in entries if e.shacl is None]
+        if not stale:
+            return
+        data_graph = rdflib.Graph()
+        owners = {}
+        for entry in stale:
+            for t in triples[entry.obj.identity]:
+                data_graph.add(t)
+            owners.update((s, entry) for s in entry.subjects)
+            entry.shacl = sbol3.ValidationReport()
+        for entry in entries:
+            if entry.obj.identity not in owners:
+                for t in triples[entry.obj.identity]:
+                    if t[1] == rdflib.RDF.type:
+                        data_graph.add(t)
+        data_graph += _shacl_shapes()
+        conforms, results_graph, _ = pyshacl.validate(
+            data_graph=data_graph,
+            shacl_graph=None,
+            ont_graph=None,
+            inference=None,
+            abort_on_first=False,
+            meta_shacl=False,
+            advanced=True,
+            debug=False,
+        )
+        if conforms:
+            return
+        report = self.document.parse_shacl_graph(
+            results_graph, sbol3.ValidationReport()
+        )
+        for issues, add in [
+            (report.errors, "addError"),
+            (report.warnings, "addWarning"),
+        ]:
+            for issue in issues:
+                entry = owners.get(str(issue.object_id))
+                if entry is not None:
+                    getattr(entry.shacl, add)(
+                        issue.object_id, issue.rule_id, issue.message
+                    )
+
+
+def _owner(identity: str, toplevels: Dict[str, sbol3.TopLevel]) -> Optional[str]:
+    """The identity of the TopLevel object that owns the object with an identity"""
+    while identity not in toplevels:
+        identity, separator, _ = identity.rpartition("/")
+        if not separator:
+            return None
+    return identity
+
+
+def activity_issues(activity: Activity) -> List[WellFormednessIssue]:
+    """
+    Check that each node and edge of an Activity is well formed.  Actions look
+    up the incoming edges of their pins in an index, and check each called
+    Behavior once.
+    """
+    incoming_edges: Dict[str, list] = {}
+    for edge in activity.edges:
+        incoming_edges.setdefault(str(edge.target), []).append(edge)
+    behavior_issues: Dict[str, List[WellFormednessIssue]] = {}
+
+    issues = []
+    for node in activity.nodes:
+        if isinstance(node, Action):
+            issues += node.is_well_formed(incoming_edges, behavior_issues)
+        else:
+            issues += node.is_well_formed()
+    for edge in activity.edges:
+        issues += edge.is_well_formed()
+    return issues
+
+
+def document_validator(document: sbol3.Document) -> DocumentValidator:
+    """The DocumentValidator that caches validation results for a document"""
+    validator = _validators.get(document)
+    if validator is None:
+        validator = DocumentValidator(document)
+        _validators[document] = validator
+    return validator
@@ -64,9 +64,10 @@ doc.add(p)
 print("Library construction complete")
 
 print("Validating library")
-for e in doc.validate().errors:
+report = doc.validate()
+for e in report.errors:
     print(e)
-for w in doc.validate().warnings:
+for w in report.warnings:
     print(w)
 
 filename = LIBRARY_NAME + ".ttl"
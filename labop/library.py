@@ -6,6 +6,21 @@ import sbol3
 loaded_libraries = {}
 
 
+def library_filename(library: str, extension: str = "ttl") -> str:
+    """Find the file for a library, which is either a path or the name of a built-in library
+
+    :param library: path or name of library
+    :param extension: Format of library; defaults to ttl
+    :return: path to the library file
+    """
+    if os.path.isfile(library):
+        return library
+    return posixpath.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        f"lib/{library}.{extension}",
+    )
+
+
 def import_library(library: str, extension: str = "ttl", nickname: str = None):
     """Import a library of primitives and make it available for use in defining a protocol.
 
@@ -19,11 +34,7 @@ def import_library(library: str, extension: str = "ttl", nickname: str = None):
     """
     if not nickname:
         nickname = library
-    if not os.path.isfile(library):
-        library = posixpath.join(
-            os.path.dirname(os.path.realpath(__file__)),
-            f"lib/{library}.{extension}",
-        )
+    library = library_filename(library, extension=extension)
     # read in the library and put the document in the library collection
     lib = sbol3.Document()
     lib.read(library, extension)
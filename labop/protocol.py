@@ -3,8 +3,7 @@ The Protocol class defines the functions corresponding to the dynamically genera
 """
 
 import logging
-from collections import Counter
-from typing import List, Tuple
+from typing import Dict, Iterable, List, Tuple
 
 import sbol3
 
@@ -15,14 +14,12 @@ from uml import (
     ControlFlow,
     ControlNode,
     DecisionNode,
-    FinalNode,
-    InitialNode,
     ObjectFlow,
     ObjectNode,
     ValueSpecification,
 )
 from uml.call_behavior_action import CallBehaviorAction
-from uml.utils import WellFormednessError, WellFormednessIssue
+from uml.utils import WellFormednessIssue
 
 from . import inner
 from .library import import_library
@@ -103,6 +100,39 @@ class Protocol(inner.Protocol, Activity):
         self.last_step = pe  # update the last step
         return pe
 
+    def execute_primitives(
+        self, primitive: Primitive, rows: Iterable[Dict[str, object]]
+    ) -> List[CallBehaviorAction]:
+        """Create and add an execution of a Primitive to a Protocol for each row of a table of inputs
+
+        The primitive and its parameters are resolved once for all of the rows, so that templated
+        workflows (e.g., a measurement for each gain or time point) can be constructed in one pass.
+        :param primitive: Primitive to be invoked (object or string name)
+        :param rows: maps of literal value or ActivityNode to names of Behavior parameters
+        :return: CallBehaviorAction that invokes the Primitive for each row
+        """
+        if isinstance(primitive, str):
+            primitive = Primitive.get_primitive(self.document, primitive)
+        return self.call_behaviors(primitive, rows)
+
+    def primitive_steps(
+        self, primitive: Primitive, rows: Iterable[Dict[str, object]]
+    ) -> List[CallBehaviorAction]:
+        """Use a Primitive as an Action in a Protocol for each row of a table of inputs, each serialized to
+        follow the step before it, as with primitive_step()
+
+        :param primitive: Primitive to be invoked (object or string name)
+        :param rows: maps of literal value or ActivityNode to names of Behavior parameters
+        :return: CallBehaviorAction that invokes the Primitive for each row
+        """
+        steps = self.execute_primitives(primitive, rows)
+        if steps:
+            self.order(self.get_last_step(), steps[0])
+            for source, target in zip(steps, steps[1:]):
+                self.add_edge(ControlFlow(source=source, target=target))
+            self.last_step = steps[-1]  # update the last step
+        return steps
+
     def make_decision_input_activity(
         self,
         decision_input_behavior: Behavior,
@@ -163,25 +193,25 @@ class Protocol(inner.Protocol, Activity):
             decision_input_control = ControlFlow(
                 source=primary_incoming_node, target=decision_input
             )
-            self.edges.append(decision_input_control)
+            self.add_edge(decision_input_control)
         elif decision_input_source is not None:
             decision_input_flow = ObjectFlow(
                 source=decision_input_source, target=decision
             )
-            self.edges.append(decision_input_flow)
+            self.add_edge(decision_input_flow)
 
         decision = DecisionNode(
             decision_input=decision_input_behavior,
             decision_input_flow=decision_input_flow,
         )
-        self.nodes.append(decision)
+        self.add_node(decision)
 
         if decision_input:
             # Link Flow that communicates the return value of the decision_input behavior execution to the decision
             decision_input_to_decision_flow = ObjectFlow(
                 source=decision_input.output_pin("return"), target=decision
             )
-            self.edges.append(decision_input_to_decision_flow)
+            self.add_edge(decision_input_to_decision_flow)
 
         # Control nodes and CallBehaviorAction nodes provide control flow.  ActivityParameterNode and Pins provide object flows
         primary_incoming_flow = (
@@ -190,7 +220,7 @@ class Protocol(inner.Protocol, Activity):
             or isinstance(primary_incoming_node, CallBehaviorAction)
             else ObjectFlow(source=primary_incoming_node)
         )
-        self.edges.append(primary_incoming_flow)
+        self.add_edge(primary_incoming_flow)
 
         # Make edges for outgoing_targets
         if outgoing_targets:
@@ -210,74 +240,55 @@ class Protocol(inner.Protocol, Activity):
     def is_well_formed(self) -> List[WellFormednessIssue]:
         """
         A protocol is well formed if:
+        - it has no validation errors or warnings
         - each ActivityNode is well formed
         - each ActivityEdge is well formed
         - has an initial node
         - has a final node
+        The results are cached by the document's DocumentValidator until the
+        protocol or a behavior that it calls is modified.
         """
-        issues = []
+        from labop.execution.validation import document_validator
 
-        validation_report = self.validate()
-
-        issues += [
-            WellFormednessError(self.document.find(e.object_id), e.message)
-            for e in validation_report.errors
-        ]
-        issues += [
-            WellFormednessError(self.document.find(e.object_id), e.message)
-            for e in validation_report.warnings
-        ]
-
-        for node in self.get_nodes():
-            issues += node.is_well_formed()
-
-        for edge in self.get_edges():
-            issues += edge.is_well_formed()
-
-        if not any([isinstance(node, InitialNode) for node in self.nodes]):
-            issues += [
-                WellFormednessError(
-                    self,
-                    f"Protocol does not include an InitialNode",
-                    f"Calling protocol.initial() will add an InitialNode to protocol.",
-                )
-            ]
-
-        if not any([isinstance(node, FinalNode) for node in self.nodes]):
-            issues += [
-                WellFormednessError(
-                    self,
-                    f"Protocol does not include an FinalNode",
-                    f"Calling protocol.final() will add an FinalNode to protocol.",
-                )
-            ]
-
-        return issues
+        return document_validator(self.document).is_well_formed(self)
 
     def remove_duplicates(self):
         """
         Remove duplicate nodes, preferring to remove those without edges
         """
-        duplicates = {
-            n.identity: set({n1 for n1 in self.nodes if n1.identity == n.identity})
-            for n in self.nodes
-        }
-        for id, dup in duplicates.items():
-            if len(dup) > 1:
-                # Remove nodes that are not connected by an edge
-                targets = Counter(
-                    e.get_target() for e in self.edges if e.get_target() in dup
-                )
-                sources = Counter(
-                    e.get_source() for e in self.edges if e.get_source() in dup
-                )
-                dups_to_remove = [d for d in dup if targets[d] == 0 and sources[d] == 0]
-                for n in dups_to_remove:
+        duplicates = {}
+        for n in self.nodes:
+            duplicates.setdefault(n.identity, []).append(n)
+        duplicates = {id: dup for id, dup in duplicates.items() if len(dup) > 1}
+        if not duplicates:
+            return
+        # Edges refer to duplicates by identity, so find the node that each
+        # of these references resolves to
+        index = self._edge_index()
+        connected = set()
+        for id in duplicates:
+            if id in index["targets"]:
+                connected.add(index["targets"][id][0].get_target())
+            if id in index["sources"]:
+                connected.add(index["sources"][id][0].get_source())
+        for dup in duplicates.values():
+            # Remove nodes that are not connected by an edge
+            for n in dup:
+                if n not in connected:
                     del self.nodes[self.nodes.index(n)]
 
     def auto_advance(self):
         return True
 
+    def to_dot(self, legend=False, ready=[], done=[], nodes=None, depth=None):
+        from labop.execution.reference_resolver import resolved_references
+
+        # Drawing looks up the source and target of every edge
+        with resolved_references(self.document):
+            return super().to_dot(
+                legend=legend, ready=ready, done=done, nodes=nodes, depth=depth
+            )
+
     def get_behaviors(self) -> List[Behavior]:
         activities = [
             n.get_behavior() for n in self.nodes if isinstance(n, ActivityNode)
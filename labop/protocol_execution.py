@@ -6,7 +6,6 @@ import datetime
 import json
 from typing import List
 
-import graphviz
 import sbol3
 
 from uml import (
@@ -17,6 +16,7 @@ from uml import (
     ControlFlow,
     ControlNode,
     DecisionNode,
+    DotStream,
     InitialNode,
     InputPin,
     ObjectFlow,
@@ -75,11 +75,13 @@ class ProtocolExecution(inner.ProtocolExecution, BehaviorExecution):
         ordered_subprotocols = [
             x.identity for x in ordered_behavior_nodes if isinstance(x, Protocol)
         ]
+        # Index the executions of each protocol in one pass over the document
+        executions_by_protocol = {}
+        for o in self.document.objects:
+            if type(o) is ProtocolExecution:
+                executions_by_protocol.setdefault(str(o.protocol), []).append(o)
         ordered_subprotocol_executions = [
-            o
-            for x in ordered_subprotocols
-            for o in self.document.objects
-            if type(o) is ProtocolExecution and o.protocol == x
+            o for x in ordered_subprotocols for o in executions_by_protocol.get(x, [])
         ]
         return ordered_subprotocol_executions
 
@@ -159,30 +161,59 @@ class ProtocolExecution(inner.ProtocolExecution, BehaviorExecution):
         ready: List[ActivityNode] = [],
         done=set([]),
         out_dir="out",
+        nodes=None,
+        depth=None,
     ):
         """
         Create a dot graph that illustrates edge values appearing the execution of the protocol.
         :param self:
         :return: graphviz.Digraph
         """
-        # dot = graphviz.Digraph(
-        #     comment=self.protocol,
-        #     strict=True,
-        #     graph_attr={"rankdir": "TB", "concentrate": "true"},
-        #     node_attr={"ordering": "out"},
-        # )
-
-        dot = graphviz.Digraph(
+        from labop.execution.reference_resolver import resolved_references
+
+        dot = DotStream(
             name=f"cluster_{self.identity}", graph_attr={"label": self.identity}
         )
+        # Drawing looks up the node of every record and the edge of every flow
+        with resolved_references(self.document):
+            self.write_dot(
+                dot,
+                execution_engine=execution_engine,
+                ready=ready,
+                done=done,
+                out_dir=out_dir,
+                nodes=nodes,
+                depth=depth,
+            )
+        return dot.to_digraph()
 
-        # Protocol Invocation
-        execution_context = self.execution_context
-
+    def write_dot(
+        self,
+        dot: DotStream,
+        execution_engine=None,
+        ready: List[ActivityNode] = [],
+        done=set([]),
+        out_dir="out",
+        nodes=None,
+        depth=None,
+    ):
+        """
+        Write the protocol (see Activity.write_dot()), and the records and
+        flows of its execution, to a DotStream.
+        """
         # Protocol graph
         protocol = self.protocol.lookup()
-        protocol_graph = protocol.to_dot(ready=ready, done=done)
-        dot.subgraph(protocol_graph)
+        drawn = set([])
+        with dot.subgraph(name="_root"):
+            protocol.write_dot(
+                dot, ready=ready, done=done, nodes=nodes, depth=depth, drawn=drawn
+            )
+        nodes = set(nodes) if nodes is not None else None
+
+        # Protocol Invocation: the edges between the nodes that invoke the protocol, by target
+        invocation_edges = {}
+        for edge in self.activity_call_edge:
+            invocation_edges.setdefault(str(edge.target), []).append(edge)
 
         if execution_engine and execution_engine.current_node:
             current_node_id = execution_engine.current_node.dot_label(
@@ -209,9 +240,24 @@ class ProtocolExecution(inner.ProtocolExecution, BehaviorExecution):
                 isinstance(execution_node, Pin)
                 and execution_node.get_parent().get_parent() == self
             )
+            if not node_in_outer_context:
+                # Only draw the records of drawn nodes
+                unpinned = execution_node.pin_owner()
+                activity = unpinned.get_parent()
+                if (
+                    activity is None
+                    or activity.identity not in drawn
+                    or (
+                        nodes is not None
+                        and activity == protocol
+                        and unpinned not in nodes
+                    )
+                ):
+                    continue
+
             if node_in_outer_context:
                 # If node is not part of protocol, then its part of the invocation of the protocol and isn't drawn by the protocol to_dot()
-                incoming_edges = execution_context.incoming_edges(execution_node)
+                incoming_edges = invocation_edges.get(execution_node.identity, [])
 
                 # Pins are drawn as part of CallBehaviorAction
                 if not isinstance(execution_node, Pin):
@@ -335,13 +381,17 @@ class ProtocolExecution(inner.ProtocolExecution, BehaviorExecution):
                         reverse=True,
                     )
 
-        return dot
-
     def backtrace(
         self,
         stack=None,
         extractor: "ProtocolExecutionExtractor" = None,
     ):
+        """
+        Walk the execution records (or stack, a list of records) in order.
+
+        Returns the set of executed nodes and the records as extracted by
+        the extractor.
+        """
         from labop.execution.execution_engine_utils import (
             JSONProtocolExecutionExtractor,
         )
@@ -350,15 +400,12 @@ class ProtocolExecution(inner.ProtocolExecution, BehaviorExecution):
             extractor = JSONProtocolExecutionExtractor()
 
         stack = self.executions if stack is None else stack
-        if len(stack) == 0:
-            return set([]), []
-        else:
-            tail = stack[-1]
-            head = stack[:-1]
-            nodes, head = self.backtrace(stack=head)
-            nodes.add(tail.node.lookup())
-            head += [extractor.extract_record(tail)]
-            return nodes, head
+        nodes = set([])
+        records = []
+        for record in stack:
+            nodes.add(record.node.lookup())
+            records.append(extractor.extract_record(record))
+        return nodes, records
 
     def to_json(self):
         """
@@ -0,0 +1,23 @@
+"""
+Access to the stored properties of pySBOL3 objects.
+
+pySBOL3 keeps the values of an object's properties in `_properties` (literals
+and references) and `_owned_objects` (child objects), keyed by property URI,
+and has no public accessor for them.  Code that needs every property of an
+object, e.g., to compare or serialize it without the whole document, uses
+these functions, so that the dependency on pySBOL3 internals is in one place.
+"""
+
+from typing import Dict, List
+
+import sbol3
+
+
+def property_values(obj: sbol3.Identified) -> Dict[str, List]:
+    """The rdflib values of each literal or reference property of the object, by property URI"""
+    return obj._properties
+
+
+def owned_objects(obj: sbol3.Identified) -> Dict[str, List[sbol3.Identified]]:
+    """The child objects of each owned object property of the object, by property URI"""
+    return obj._owned_objects
@@ -1,5 +1,6 @@
 from .autoprotocol import *
 from .behavior_specialization import *
+from .container_ontology_index import *
 from .emeraldcloud import *
 from .markdown import *
 from .opentrons import *
@@ -1,16 +1,23 @@
 import json
 import logging
 import os
+import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Dict, List, Optional
 
 import requests
-import transcriptic
-from requests_html import HTMLSession
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 l = logging.getLogger(__file__)
 l.setLevel(logging.ERROR)
 
+DEFAULT_API_ROOT = "https://secure.transcriptic.com"
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "labop")
+
 
 class StrateosException(Exception):
     pass
@@ -41,6 +48,10 @@ class StrateosConfig:
     def project_id(self) -> str:
         return self._project_id
 
+    @property
+    def api_root(self) -> str:
+        return self._api_root
+
     def __init__(
         self,
         email: str,
@@ -48,17 +59,19 @@ class StrateosConfig:
         user_id: str,
         organization_id: str,
         project_id: str,
+        api_root: str = DEFAULT_API_ROOT,
     ) -> None:
         self._email = email
         self._token = token
         self._user_id = user_id
         self._organization_id = organization_id
         self._project_id = project_id
+        self._api_root = api_root.rstrip("/")
 
     def to_dict(self):
         return {
             "analytics": True,
-            "api_root": "https://secure.transcriptic.com",
+            "api_root": self.api_root,
             "email": self.email,
             "feature_groups": [],
             "organization_id": self.organization_id,
@@ -84,7 +97,8 @@ class StrateosConfig:
             user = get_file_else_error(tx_cfg, "email")
             org = get_file_else_error(tx_cfg, "organization_id")
             project_id = get_file_else_error(tx_cfg, "project_id")
-            return StrateosConfig(email, token, user, org, project_id)
+            api_root = tx_cfg.get("api_root", DEFAULT_API_ROOT)
+            return StrateosConfig(email, token, user, org, project_id, api_root)
 
     @staticmethod
     def from_environment():
@@ -101,7 +115,176 @@ class StrateosConfig:
         user = get_env_else_error("_TRANSCRIPTIC_USER_ID")
         org = get_env_else_error("_TRANSCRIPTIC_ORGANIZATION_ID")
         proj = get_env_else_error("_TRANSCRIPTIC_PROJECT_ID")
-        return StrateosConfig(email, token, user, org, proj)
+        api_root = os.environ.get("_TRANSCRIPTIC_API_ROOT", DEFAULT_API_ROOT)
+        return StrateosConfig(email, token, user, org, proj, api_root)
+
+
+class StrateosClient:
+    """
+    Requests to the Strateos web API, made with one pooled HTTP session.
+    Requests that fail to connect, or that fail with a status that means
+    the server is busy, are retried with exponential backoff.  The responses
+    to GET requests that are made with `cache=True` are kept by URL, and are
+    saved to `cache_path` (if given) so that later sessions do not request
+    them again.
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(
+        self,
+        cfg: StrateosConfig,
+        pool_size: int = 8,
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        timeout: float = 30.0,
+        cache_path: Optional[str] = None,
+    ) -> None:
+        self.cfg = cfg
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.cache_path = cache_path
+
+        self.session = requests.Session()
+        self.session.headers.update(
+            {
+                "X-User-Email": cfg.email,  # user-account-email
+                "X-User-Token": cfg.token,  # Regular-mode API key
+                "Content-Type": "application/json",
+                "Accept": "application/json",
+            }
+        )
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=self.RETRY_STATUSES,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._cache_lock = threading.Lock()
+        self._save_lock = threading.Lock()  # Orders writes of the cache file
+        self._cache: Dict[str, object] = {}
+        if cache_path is not None and os.path.exists(cache_path):
+            try:
+                with open(cache_path, "r") as f:
+                    self._cache = json.load(f)
+            except (OSError, ValueError) as e:
+                l.warning(
+                    f"Ignoring unreadable Strateos response cache {cache_path}: {e}"
+                )
+
+    def url(self, *parts: str, organization: bool = True) -> str:
+        """URL of a route, within the configured organization if `organization`"""
+        prefix = [self.cfg.organization_id] if organization else []
+        return "/".join([self.cfg.api_root] + prefix + list(parts))
+
+    def get(
+        self, url: str, cache: bool = False, refresh: bool = False, save: bool = True
+    ):
+        """
+        The JSON content of a GET request, from the cache if `cache` and not
+        `refresh`.  A new cached response is saved to `cache_path` if `save`.
+        """
+        if cache and not refresh:
+            with self._cache_lock:
+                if url in self._cache:
+                    return self._cache[url]
+        content = self._json(self.session.get(url, timeout=self.timeout))
+        if cache:
+            with self._cache_lock:
+                self._cache[url] = content
+            if save:
+                self._save_cache()
+        return content
+
+    def get_all(self, urls: List[str], cache: bool = False) -> List:
+        """The JSON content of GET requests, made concurrently, saving the cache once"""
+        if len(urls) < 2:
+            return [self.get(url, cache=cache) for url in urls]
+        with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+            contents = list(
+                executor.map(lambda url: self.get(url, cache=cache, save=False), urls)
+            )
+        if cache:
+            self._save_cache()
+        return contents
+
+    def post(self, url: str, data: str):
+        return self._json(self.session.post(url, data=data, timeout=self.timeout))
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._cache = {}
+        self._save_cache()
+
+    def _save_cache(self):
+        """
+        Write the cache to a temporary file that replaces `cache_path`, so
+        that a reader never sees a partly written cache.  Requests may use
+        the cache while it is written.
+        """
+        if self.cache_path is None:
+            return
+        directory = os.path.dirname(os.path.abspath(self.cache_path))
+        os.makedirs(directory, exist_ok=True)
+        with self._save_lock:
+            with self._cache_lock:
+                cache = dict(self._cache)
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(cache, f)
+                os.replace(temp_path, self.cache_path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+
+    def _json(self, response: requests.Response):
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            raise StrateosException(f"{e}: {response.text}")
+        return json.loads(response.content)
+
+    def protocols(self, refresh: bool = False):
+        return self.get(self.url("protocols.json"), cache=True, refresh=refresh)
+
+    def launch_protocol(self, protocol_id: str, launch_request: str):
+        return self.post(self.url("protocols", protocol_id, "launch"), launch_request)
+
+    def get_launch_request(self, protocol_id: str, launch_request_id: str):
+        return self.get(self.url("protocols", protocol_id, "launch", launch_request_id))
+
+    def submit_launch_request(
+        self,
+        launch_request_id: str,
+        protocol_id: str,
+        project_id: str,
+        title: str,
+        test_mode: bool = True,
+    ):
+        data = {
+            "launch_request_id": launch_request_id,
+            "protocol_id": protocol_id,
+            "title": title,
+            "test_mode": test_mode,
+        }
+        return self.post(self.url(project_id, "runs"), json.dumps(data))
+
+    def resources_url(self, query: str) -> str:
+        return (
+            self.url("_commercial", "resources", organization=False)
+            + "?"
+            + requests.compat.urlencode({"q": query, "per_page": 50})
+        )
+
+    def resources(self, queries: List[str]) -> List[Dict]:
+        """The resources matching each query, requested concurrently"""
+        return self.get_all([self.resources_url(q) for q in queries], cache=True)
 
 
 class StrateosProtocol:
@@ -112,16 +295,45 @@ class StrateosProtocol:
 
 
 class StrateosAPI:
+    """
+    Launches Strateos protocols and resolves resources with a StrateosClient.
+
+    After a protocol is launched, the launch request is polled, with a delay
+    that starts at `poll_interval` seconds and doubles up to
+    `max_poll_interval`, until Strateos has finished preparing it or
+    `poll_timeout` seconds have passed.  The protocol list and resource
+    queries are cached in `cache_path` (by default, in ~/.cache/labop).
+    """
+
     @property
     def protocol_make_containers(self) -> StrateosProtocol:
         return self._protocol_make_containers
 
-    def __init__(self, out_dir: str = "./", cfg: StrateosConfig = None) -> None:
+    def __init__(
+        self,
+        out_dir: str = "./",
+        cfg: StrateosConfig = None,
+        client: StrateosClient = None,
+        cache_path: Optional[str] = os.path.join(
+            DEFAULT_CACHE_DIR, "strateos_responses.json"
+        ),
+        poll_interval: float = 1.0,
+        max_poll_interval: float = 16.0,
+        poll_timeout: float = 300.0,
+    ) -> None:
         self.out_dir = out_dir
         if not os.path.exists(self.out_dir):
             os.mkdir(self.out_dir)
 
         self.cfg = StrateosConfig.from_environment() if cfg is None else cfg
+        self.client = (
+            client
+            if client is not None
+            else StrateosClient(self.cfg, cache_path=cache_path)
+        )
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.poll_timeout = poll_timeout
 
         self._protocol_name_map = {}
         ps = self.query_all_protocols()
@@ -137,30 +349,11 @@ class StrateosAPI:
             raise StrateosException(f"Failed to find '{name}' in protocol name map")
         return res
 
-    def _build_headers(self):
-        return {
-            "X-User-Email": self.cfg.email,  # user-account-email
-            "X-User-Token": self.cfg.token,  # Regular-mode API key
-            "Content-Type": "application/json",
-            "Accept": "application/json",
-        }
-
-    def _build_query_protocols(self):
-        return (
-            "https://secure.transcriptic.com/{}/protocols.json".format(
-                self.cfg.organization_id
-            ),
-            self._build_headers(),
-        )
-
-    def query_all_protocols(self):
+    def query_all_protocols(self, refresh: bool = False):
         """
-        Get all protocols
+        Get all protocols, from the cache unless `refresh`
         """
-        (url, headers) = self._build_query_protocols()
-        # l.debug(headers)
-        response = requests.get(url, headers=headers)
-        return json.loads(response.content)
+        return self.client.protocols(refresh=refresh)
 
     # TODO
     def make_containers(self, containers, title="make_containers", test_mode=True):
@@ -177,6 +370,8 @@ class StrateosAPI:
 
     def get_strateos_connection(self):
         """Connect (without validation) to Strateos.com"""
+        import transcriptic
+
         try:
             return transcriptic.Connection(**self.cfg.to_dict())
         except Exception:
@@ -187,31 +382,17 @@ class StrateosAPI:
     ):
         """Submit to Strateos and record response"""
 
-        launch_request_id = None
-        launch_protocol = None
-
-        try:
-            conn = self.get_strateos_connection()
-        except Exception as exc:
-            raise StrateosException(exc)
-
         try:
             launch_request = self._create_launch_request(
                 params, title, test_mode=test_mode
             )
-            try:
-                launch_protocol = conn.launch_protocol(
-                    launch_request, protocol_id=protocol.id
-                )
-            except Exception as exc:
-                raise StrateosException(exc)
+            launch_protocol = self.client.launch_protocol(protocol.id, launch_request)
             launch_request_id = launch_protocol["id"]
         except Exception as exc:
             raise StrateosException(exc)
 
-        # Delay needed because it takes Strateos a few seconds to
-        # complete launch_protocol()
-        time.sleep(30)
+        # It takes Strateos a few seconds to complete launch_protocol()
+        self.wait_for_launch_request(protocol, launch_protocol)
 
         request_response = {}
         try:
@@ -224,9 +405,7 @@ class StrateosAPI:
             # req_title = "{}-{}".format(
             #    robj.get_attr('name'),
             #    arrow.utcnow().format('YYYY-MM-DDThh:mm:ssTZD'))
-            # Retry submission up to timeout, with exponential backoff
             request_response = self.__submit_launch_request(
-                conn,
                 launch_request_id,
                 protocol_id=protocol.id,
                 project_id=self.cfg.project_id,
@@ -238,6 +417,31 @@ class StrateosAPI:
         except Exception as exc:
             raise StrateosException(exc)
 
+    def wait_for_launch_request(self, protocol: StrateosProtocol, launch_request):
+        """Poll a launch request, with backoff, until Strateos has finished preparing it"""
+        delay = self.poll_interval
+        deadline = time.monotonic() + self.poll_timeout
+        while True:
+            errors = launch_request.get("generation_errors")
+            if errors:
+                raise StrateosException(
+                    f"Launch request {launch_request['id']} failed: {errors}"
+                )
+            if launch_request.get("progress", 100) >= 100:
+                return launch_request
+            if time.monotonic() + delay > deadline:
+                raise StrateosException(
+                    f"Launch request {launch_request['id']} was not ready after {self.poll_timeout} seconds"
+                )
+            time.sleep(delay)
+            delay = min(2 * delay, self.max_poll_interval)
+            try:
+                launch_request = self.client.get_launch_request(
+                    protocol.id, launch_request["id"]
+                )
+            except Exception as exc:
+                raise StrateosException(exc)
+
     def _create_launch_request(self, params, local_name, bsl=1, test_mode=True):
         """Creates launch_request from input params"""
         params_dict = dict()
@@ -258,10 +462,8 @@ class StrateosAPI:
             )
         return json.dumps(params_dict)
 
-    # @retry(stop=stop_after_delay(70), wait=wait_exponential(multiplier=1, max=16))
     def __submit_launch_request(
         self,
-        conn,
         launch_request_id,
         protocol_id=None,
         project_id=None,
@@ -274,7 +476,7 @@ class StrateosAPI:
             l.debug("Launching: project_id = " + project_id)
             l.debug("Launching: title = " + title)
             l.debug("Launching: test_mode = " + str(test_mode))
-            lr = conn.submit_launch_request(
+            lr = self.client.submit_launch_request(
                 launch_request_id,
                 protocol_id=protocol_id,
                 project_id=project_id,
@@ -286,22 +488,19 @@ class StrateosAPI:
             raise StrateosException(exc)
 
     def resolve_resource(self, resource):
-        types = resource.types
-        resolutions = {}
-        for type in types:
-            try:
-                session = HTMLSession()
-                response = session.get(type)
-                meta = response.html.find("meta")
-                properties = [
-                    x.attrs for x in response.html.find("meta") if "property" in x.attrs
-                ]
-                [title] = [
-                    x["content"] for x in properties if x["property"] == "og:title"
-                ]
-            except requests.exceptions.RequestException as e:
-                l.debug(e)
-
-        conn = self.get_strateos_connection()
-        results = conn.resources(resource)["results"]
-        return results
+        return self.resolve_resources([resource])[resource.identity]
+
+    def resolve_resources(self, resources) -> Dict[str, List[Dict]]:
+        """
+        The Strateos resources matching the name (or else the display_id) of
+        each resource, by resource identity.  The queries are made
+        concurrently, and their results are cached.
+        """
+        queries = [r.name if r.name else r.display_id for r in resources]
+        try:
+            responses = self.client.resources(queries)
+        except requests.exceptions.RequestException as e:
+            raise StrateosException(e)
+        return {
+            r.identity: response["results"] for r, response in zip(resources, responses)
+        }
@@ -0,0 +1,216 @@
+"""
+A local stand-in for the Strateos web API, for testing and benchmarking the
+autoprotocol path without network access or Strateos credentials.
+
+MockStrateosServer serves the routes used by StrateosClient from a thread
+of the current process:
+
+- GET  /{organization}/protocols.json
+- POST /{organization}/protocols/{protocol_id}/launch
+- GET  /{organization}/protocols/{protocol_id}/launch/{launch_request_id}
+- POST /{organization}/{project_id}/runs
+- GET  /_commercial/resources?q={query}
+
+A launch request is ready (progress 100) after it has been polled
+`launch_polls` times.  A run of MakeContainers has a ref with a new
+container_id for each container of its parameters.  Each response is
+delayed by `latency` seconds, and the first `failures` requests fail with
+status 503, so that retries can be exercised.
+
+    with MockStrateosServer(resources={"water": [{"id": "rs_water"}]}) as server:
+        api = StrateosAPI(cfg=server.config(), cache_path=None)
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from labop_convert.autoprotocol.strateos_api import StrateosConfig
+
+l = logging.getLogger(__file__)
+l.setLevel(logging.ERROR)
+
+
+class MockStrateosServer:
+    EMAIL = "mock@example.com"
+    TOKEN = "mock_token"
+
+    def __init__(
+        self,
+        protocols: List[str] = ["MakeContainers"],
+        resources: Optional[Dict[str, List[Dict]]] = None,
+        launch_polls: int = 1,
+        latency: float = 0.0,
+        failures: int = 0,
+        organization_id: str = "mock_org",
+        project_id: str = "mock_project",
+    ) -> None:
+        self.protocols = [{"id": f"pr_{name}", "name": name} for name in protocols]
+        self.resources = resources if resources else {}
+        self.launch_polls = launch_polls
+        self.latency = latency
+        self.failures = failures
+        self.organization_id = organization_id
+        self.project_id = project_id
+
+        self.requests: Counter = Counter()  # Number of requests to each route
+        self.launch_requests: Dict[str, Dict] = {}
+        self.runs: Dict[str, Dict] = {}
+        self._polls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._containers = 0
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def api_root(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def config(self) -> StrateosConfig:
+        """A configuration for a client of this server"""
+        return StrateosConfig(
+            self.EMAIL,
+            self.TOKEN,
+            self.EMAIL,
+            self.organization_id,
+            self.project_id,
+            api_root=self.api_root,
+        )
+
+    def start(self) -> "MockStrateosServer":
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server._handle(self, "GET")
+
+            def do_POST(self):
+                server._handle(self, "POST")
+
+            def log_message(self, format, *args):
+                l.debug(format % args)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self) -> "MockStrateosServer":
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _handle(self, handler: BaseHTTPRequestHandler, method: str):
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlparse(handler.path)
+        parts = [p for p in url.path.split("/") if p]
+        length = int(handler.headers.get("Content-Length", 0))
+        body = handler.rfile.read(length) if length else b""
+
+        with self._lock:
+            route = self._route(method, parts)
+            self.requests[route] += 1
+            if self.failures > 0:
+                self.failures -= 1
+                status, content = 503, {"error": "Service unavailable"}
+            elif (
+                handler.headers.get("X-User-Email") != self.EMAIL
+                or handler.headers.get("X-User-Token") != self.TOKEN
+            ):
+                status, content = 401, {"error": "Unauthorized"}
+            else:
+                status, content = self._respond(route, parts, url.query, body)
+
+        data = json.dumps(content).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _route(self, method: str, parts: List[str]) -> str:
+        if method == "GET" and parts == ["_commercial", "resources"]:
+            return "resources"
+        if parts[:1] != [self.organization_id]:
+            return "unknown"
+        parts = parts[1:]
+        if method == "GET" and parts == ["protocols.json"]:
+            return "protocols"
+        if len(parts) == 3 and parts[0] == "protocols" and parts[2] == "launch":
+            return "launch" if method == "POST" else "unknown"
+        if len(parts) == 4 and parts[0] == "protocols" and parts[2] == "launch":
+            return "launch_request" if method == "GET" else "unknown"
+        if method == "POST" and parts == [self.project_id, "runs"]:
+            return "runs"
+        return "unknown"
+
+    def _respond(self, route: str, parts: List[str], query: str, body: bytes):
+        if route == "protocols":
+            return 200, self.protocols
+        if route == "resources":
+            q = parse_qs(query).get("q", [""])[0]
+            return 200, {"results": self.resources.get(q, [])}
+        if route == "launch":
+            protocol_id = parts[2]
+            if protocol_id not in [p["id"] for p in self.protocols]:
+                return 404, {"error": f"No protocol {protocol_id}"}
+            launch_request_id = f"lr_{len(self.launch_requests) + 1}"
+            launch_request = {
+                "id": launch_request_id,
+                "protocol_id": protocol_id,
+                "progress": 0 if self.launch_polls > 0 else 100,
+                "generation_errors": [],
+                "launch_request": json.loads(body)["launch_request"],
+            }
+            self.launch_requests[launch_request_id] = launch_request
+            self._polls[launch_request_id] = 0
+            return 200, launch_request
+        if route == "launch_request":
+            launch_request = self.launch_requests.get(parts[4])
+            if launch_request is None:
+                return 404, {"error": f"No launch request {parts[4]}"}
+            self._polls[launch_request["id"]] += 1
+            if self._polls[launch_request["id"]] >= self.launch_polls:
+                launch_request["progress"] = 100
+            return 200, launch_request
+        if route == "runs":
+            request = json.loads(body)
+            launch_request = self.launch_requests.get(request["launch_request_id"])
+            if launch_request is None or launch_request["progress"] < 100:
+                return 422, {"error": "Launch request is not ready"}
+            parameters = launch_request["launch_request"].get("parameters", {})
+            refs = []
+            for container in parameters.get("containers", []):
+                self._containers += 1
+                refs.append(
+                    {
+                        "name": container["name"],
+                        "container_id": f"ct_{self._containers}",
+                    }
+                )
+            run = {
+                "id": f"r_{len(self.runs) + 1}",
+                "title": request["title"],
+                "protocol_id": request["protocol_id"],
+                "test_mode": request["test_mode"],
+                "refs": refs,
+            }
+            self.runs[run["id"]] = run
+            return 201, run
+        return 404, {"error": "Not found"}
@@ -8,6 +8,7 @@ import sbol3
 import tyto
 
 from labop import ContainerSpec
+from labop_convert.container_ontology_index import container_ontology_index
 from uml import CallBehaviorAction
 
 l = logging.getLogger(__file__)
@@ -182,18 +183,18 @@ class BehaviorSpecialization(ABC):
 
         container_uri = validate_spec_query(spec.queryString)
 
-        try:
-            # If a class of container is specified, get all explicit instances
-            possible_container_types = [
-                tyto.URI(c, ContO) for c in container_uri.get_instances()
-            ]
-        except:
+        # If a class of container is specified, get all explicit instances
+        possible_container_types = [
+            tyto.URI(c, ContO)
+            for c in container_ontology_index().get_instances(container_uri)
+        ]
+        if not possible_container_types:
             possible_container_types = [container_uri]
         return possible_container_types
 
     def get_container_typename(self, container_uri: str) -> str:
         # Returns human-readable typename for a container, e.g., '96 well plate'
-        return ContO.get_term_by_uri(container_uri)
+        return container_ontology_index().get_label(container_uri)
 
     def check_lims_inventory(self, matching_containers: list) -> str:
         # Override this method to interface with laboratory lims system
@@ -208,7 +209,7 @@ class BehaviorSpecialization(ABC):
             raise Exception(
                 f"Container specification {container.queryString} is invalid."
             )
-        return ContO.get_term_by_uri(f"{ContO.uri}#{local}")
+        return container_ontology_index().get_label(f"{ContO.uri}#{local}")
 
     def get_instrument_deck(self, instrument: sbol3.Agent) -> str:
         for deck, agent in self.configuration.items():
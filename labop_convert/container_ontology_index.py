@@ -0,0 +1,196 @@
+"""
+A local index over the container ontology (labop/container-ontology.ttl) for
+the lookups made by specializations while resolving containers:
+
+- class -> named individuals (instances) of the class,
+- term (URI) -> label, and label -> term, and
+- instance -> property values, for filtering instances by properties such as
+  availableAt.
+
+The index is built from the ontology file with rdflib the first time it is
+needed and saved as a pickle in the cache directory, keyed by a hash of the
+ontology file, so that later sessions load it without parsing the ontology
+or querying it with SPARQL.  Queries are dictionary lookups.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import re
+from typing import Dict, List, Optional
+
+import rdflib
+
+l = logging.getLogger(__file__)
+l.setLevel(logging.WARN)
+
+CONTAINER_ONTOLOGY_URI = "https://sift.net/container-ontology/container-ontology"
+CONTAINER_ONTOLOGY_PATH = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "../labop/container-ontology.ttl",
+)
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "labop")
+
+OWL_NAMED_INDIVIDUAL = "http://www.w3.org/2002/07/owl#NamedIndividual"
+
+
+def _normalize_label(label: str) -> str:
+    # As tyto's term lookup, treat spaces, hyphens, and underscores alike
+    return re.sub(r"[\-_\s]", " ", label).lower()
+
+
+class ContainerOntologyIndex(object):
+    """Dictionary-based lookups of container ontology terms"""
+
+    # Version of the pickled format, included in the cache key
+    FORMAT = 1
+
+    def __init__(self):
+        self.instances: Dict[str, List[str]] = {}
+        self.labels: Dict[str, str] = {}
+        self.terms: Dict[str, List[str]] = {}  # normalized label -> terms
+        self.subclasses: Dict[str, List[str]] = {}
+        self.properties: Dict[str, Dict[str, List[str]]] = {}
+
+    @classmethod
+    def build(cls, path: str = CONTAINER_ONTOLOGY_PATH) -> "ContainerOntologyIndex":
+        """Build the index by parsing the ontology"""
+        graph = rdflib.Graph()
+        graph.parse(path, format="turtle")
+        index = cls()
+
+        individuals = {
+            str(s)
+            for s in graph.subjects(
+                rdflib.RDF.type, rdflib.URIRef(OWL_NAMED_INDIVIDUAL)
+            )
+        }
+        for s, o in graph.subject_objects(rdflib.RDF.type):
+            if str(s) in individuals and str(o) != OWL_NAMED_INDIVIDUAL:
+                index.instances.setdefault(str(o), []).append(str(s))
+        for instances in index.instances.values():
+            instances.sort()
+
+        for s, o in graph.subject_objects(rdflib.RDFS.subClassOf):
+            if isinstance(s, rdflib.URIRef) and isinstance(o, rdflib.URIRef):
+                index.subclasses.setdefault(str(o), []).append(str(s))
+
+        for s, label in graph.subject_objects(rdflib.RDFS.label):
+            if not isinstance(s, rdflib.URIRef):
+                continue
+            # Prefer English labels, as tyto does
+            if str(s) not in index.labels or getattr(label, "language", None) == "en":
+                index.labels[str(s)] = str(label)
+        for term, label in sorted(index.labels.items()):
+            index.terms.setdefault(_normalize_label(label), []).append(term)
+
+        for s, p, o in graph.triples((None, None, None)):
+            if str(s) in individuals and p not in (rdflib.RDF.type, rdflib.RDFS.label):
+                index.properties.setdefault(str(s), {}).setdefault(str(p), []).append(
+                    str(o)
+                )
+        return index
+
+    @classmethod
+    def load(
+        cls,
+        path: str = CONTAINER_ONTOLOGY_PATH,
+        cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+    ) -> "ContainerOntologyIndex":
+        """
+        Load the index for the ontology from the cache, building and caching
+        it if the ontology has not been indexed.  If cache_dir is None, or the
+        cache cannot be written, the index is only built in memory.
+        """
+        if cache_dir is None:
+            return cls.build(path)
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        cache_file = os.path.join(
+            cache_dir, f"container-ontology-{cls.FORMAT}-{digest}.pickle"
+        )
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file, "rb") as f:
+                    return pickle.load(f)
+            except Exception as e:
+                l.warning(f"Could not load container ontology index {cache_file}: {e}")
+
+        index = cls.build(path)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Write and rename, so that concurrent sessions do not read a partial file
+            tmp_file = f"{cache_file}.{os.getpid()}"
+            with open(tmp_file, "wb") as f:
+                pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            l.warning(f"Could not save container ontology index {cache_file}: {e}")
+        return index
+
+    def get_instances(self, cls: str, transitive: bool = False) -> List[str]:
+        """Named individuals of the class (and of its subclasses, if transitive)"""
+        instances = list(self.instances.get(str(cls), []))
+        if transitive:
+            for subclass in self.subclasses.get(str(cls), []):
+                instances += [
+                    i
+                    for i in self.get_instances(subclass, transitive=True)
+                    if i not in instances
+                ]
+        return instances
+
+    def get_label(self, term: str) -> Optional[str]:
+        return self.labels.get(str(term))
+
+    def get_term(self, label: str) -> Optional[str]:
+        """The term with the label, or None.  Raises if the label is ambiguous."""
+        terms = self.terms.get(_normalize_label(label), [])
+        if len(terms) > 1:
+            # As tyto, resolve an ambiguous label by matching its case
+            terms = [t for t in terms if self.labels[t] == label] or terms
+            if len(terms) > 1:
+                raise ValueError(f"Ambiguous term {label}--found multiple URIs {terms}")
+        return terms[0] if terms else None
+
+    def get_property(self, instance: str, property: str) -> List[str]:
+        return self.properties.get(str(instance), {}).get(self.expand(property), [])
+
+    def filter_instances(self, cls: str, transitive: bool = False, **conditions):
+        """
+        Instances of the class that have each property (given by its local
+        name, e.g., availableAt="...") with the value, or any of the values
+        if a list is given.
+        """
+        instances = self.get_instances(cls, transitive=transitive)
+        for property, values in conditions.items():
+            if not isinstance(values, (list, set, tuple)):
+                values = [values]
+            values = {
+                self.expand(v) if str(v).startswith("cont:") else str(v) for v in values
+            }
+            instances = [
+                i for i in instances if values & set(self.get_property(i, property))
+            ]
+        return instances
+
+    def expand(self, name: str) -> str:
+        """The URI of a local name or `cont:` qname in the container ontology"""
+        name = str(name)
+        if name.startswith("cont:"):
+            name = name[len("cont:") :]
+        if ":" in name:
+            return name
+        return f"{CONTAINER_ONTOLOGY_URI}#{name}"
+
+
+_container_ontology_index = None
+
+
+def container_ontology_index() -> ContainerOntologyIndex:
+    """The (lazily loaded) index of labop/container-ontology.ttl"""
+    global _container_ontology_index
+    if _container_ontology_index is None:
+        _container_ontology_index = ContainerOntologyIndex.load()
+    return _container_ontology_index
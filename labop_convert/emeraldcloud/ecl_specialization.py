@@ -14,6 +14,7 @@ from labop_convert.behavior_specialization import (
     ContO,
     validate_spec_query,
 )
+from labop_convert.container_ontology_index import container_ontology_index
 
 l = logging.getLogger(__file__)
 l.setLevel(logging.INFO)
@@ -588,28 +589,17 @@ def ecl_container(container_type: tyto.URI):
         container = ECLSpecialization.LABWARE_MAP[container_type]
         return container
         # return f'Model[Container, Vessel, "{container}"]'
-    if container_type in ContO[ECLSpecialization.MICROPLATE].get_instances():
-        container = ECLSpecialization.LABWARE_MAP[ContO[ECLSpecialization.MICROPLATE]]
-        return container
-        # return f'Model[Container, Plate, "{container}"]'
-    if container_type in ContO[ECLSpecialization.MICROFUGE].get_instances():
-        container = ECLSpecialization.LABWARE_MAP[ContO[ECLSpecialization.MICROFUGE]]
-        return container
-        # return f'Model[Container, Vessel, "{container}"]'
-    if container_type in ContO[ECLSpecialization.STOCK_REAGENT_15mL].get_instances():
-        container = ECLSpecialization.LABWARE_MAP[
-            ContO[ECLSpecialization.STOCK_REAGENT_15mL]
-        ]
-    if container_type in ContO[ECLSpecialization.STOCK_REAGENT_50mL].get_instances():
-        container = ECLSpecialization.LABWARE_MAP[
-            ContO[ECLSpecialization.STOCK_REAGENT_50mL]
-        ]
-    if container_type in ContO[ECLSpecialization.STOCK_REAGENT_2mL].get_instances():
-        container = ECLSpecialization.LABWARE_MAP[
-            ContO[ECLSpecialization.STOCK_REAGENT_2mL]
-        ]
-
-        # return f'Model[Container, Vessel, "{container}"]'
+    index = container_ontology_index()
+    for term in [
+        ECLSpecialization.MICROPLATE,
+        ECLSpecialization.MICROFUGE,
+        ECLSpecialization.STOCK_REAGENT_15mL,
+        ECLSpecialization.STOCK_REAGENT_50mL,
+        ECLSpecialization.STOCK_REAGENT_2mL,
+    ]:
+        container_class = index.get_term(term)
+        if container_type in index.get_instances(container_class):
+            return ECLSpecialization.LABWARE_MAP[container_class]
     raise Exception(
         f"Load failed. Container {container_type} is not supported labware."
     )
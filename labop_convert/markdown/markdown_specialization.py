@@ -1,7 +1,7 @@
+import copy
 import json
 import logging
 import os
-import subprocess
 from collections.abc import Iterable
 from datetime import datetime
 from typing import List, Union
@@ -18,6 +18,7 @@ from labop.sample_collection import SampleCollection
 from labop.sample_mask import SampleMask
 from labop.strings import Strings
 from labop_convert.behavior_specialization import DefaultBehaviorSpecialization
+from labop_convert.container_ontology_index import container_ontology_index
 from uml import (
     PARAMETER_IN,
     PARAMETER_OUT,
@@ -65,6 +66,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
         self.propagate_objects = propagate_objects
         self.sample_format = sample_format
         self.output_subprotocol_inputs = output_subprotocol_inputs
+        self.sample_contents = {}
 
     def initialize_protocol(self, execution: "ProtocolExecution", out_dir=None):
         super().initialize_protocol(execution, out_dir=out_dir)
@@ -80,6 +82,21 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
         # Contains the final, compiled markdown
         execution.markdown = ""
 
+        # Per-execution cache of de-serialized SampleArray contents, which
+        # many steps look up repeatedly
+        self.sample_contents = {}
+
+    def container_term(self, container_class: str) -> str:
+        return container_ontology_index().get_label(container_class)
+
+    def read_sample_contents(self, sample_array) -> dict:
+        return read_sample_contents(sample_array, cache=self.sample_contents)
+
+    def get_sample_names(self, inputs, error_msg, coordinates=None) -> List[str]:
+        return get_sample_names(
+            inputs, error_msg, coordinates=coordinates, cache=self.sample_contents
+        )
+
     def _init_behavior_func_map(self) -> dict:
         return {
             "https://bioprotocols.org/labop/primitives/sample_arrays/EmptyContainer": self.define_container,
@@ -223,7 +240,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
                 container_class = (
                     ContainerOntology.uri + "#" + container_type.split(":")[-1]
                 )
-                container_str = ContainerOntology.get_term_by_uri(container_class)
+                container_str = self.container_term(container_class)
                 text = f"* {container_str}"
                 if qty > 1:
                     text += f" (x {qty})"
@@ -258,14 +275,12 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
         return f"* `{p.name}`\n"
 
     def _steps_markdown(self, execution: "ProtocolExecution", subprotocol_executions):
-        markdown = "\n\n## Steps\n"
-        markdown = ""
+        fragments = []
         for x in subprotocol_executions:
-            markdown += "\n\n##" + x.header
-            markdown += x.body
+            fragments += ["\n\n##", x.header, x.body]
         for i, step in enumerate(execution.markdown_steps):
-            markdown += str(i + 1) + ". " + step + "\n"
-        return markdown
+            fragments += [str(i + 1), ". ", step, "\n"]
+        return "".join(fragments)
 
     def on_end(self, execution: "ProtocolExecution"):
         protocol = execution.protocol.lookup()
@@ -283,43 +298,36 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
             unbound_output_parameters,
             subprotocol_executions,
         )
+        # The body (used by calling protocols) omits the reporting step, which
+        # is numbered after the other steps in this protocol's markdown
         execution.body = self._steps_markdown(execution, subprotocol_executions)
         execution.markdown_steps += [self.reporting_step(execution)]
-        execution.markdown += execution.header
+        reporting_step = execution.markdown_steps[-1]
 
+        # Assemble the sections and write the markdown once
+        fragments = [execution.header]
         if execution.inputs:
-            execution.markdown += "\n\n## Protocol Inputs:\n"
-            execution.markdown += execution.inputs
-
+            fragments += ["\n\n## Protocol Inputs:\n", execution.inputs]
         if execution.outputs:
-            execution.markdown += "\n\n## Protocol Outputs:\n"
-            execution.markdown += execution.outputs
-
-        execution.markdown += "\n\n## Protocol Materials:\n"
-        execution.markdown += self._materials_markdown(protocol, subprotocol_executions)
-        execution.markdown += "\n\n## Protocol Steps:\n"
-        execution.markdown += self._steps_markdown(execution, subprotocol_executions)
+            fragments += ["\n\n## Protocol Outputs:\n", execution.outputs]
+        fragments += [
+            "\n\n## Protocol Materials:\n",
+            self._materials_markdown(protocol, subprotocol_executions),
+            "\n\n## Protocol Steps:\n",
+            execution.body,
+            f"{len(execution.markdown_steps)}. {reporting_step}\n",
+        ]
 
         # Timestamp the protocol version
-        dt = datetime.now()
-        ts = datetime.timestamp(dt)
-        execution.markdown += f"\n---\nTimestamp: {datetime.fromtimestamp(ts)}"
+        fragments.append(f"\n---\nTimestamp: {datetime.now()}")
 
         # Print document version
         # This is a little bit kludgey, because version is not an official LabOP property
         # of Protocol
-        protocol = execution.protocol.lookup()
         if hasattr(protocol, "version"):
-            execution.markdown += f"\nProtocol version: {protocol.version}"
-        else:
-            try:
-                tag = subprocess.check_output(["git", "describe", "--tags"]).decode(
-                    "utf-8"
-                )
-                execution.markdown += f"\nProtocol version: {tag}"
-            except:
-                pass
-        execution.markdown += "\n"
+            fragments.append(f"\nProtocol version: {protocol.version}")
+        fragments.append("\n")
+        execution.markdown += "".join(fragments)
 
         if self.out_file:
             if not os.path.exists(self.out_dir):
@@ -385,7 +393,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
                 container_class = (
                     ContainerOntology.uri + "#" + spec.queryString.split(":")[-1]
                 )
-                container_str = ContainerOntology.get_term_by_uri(container_class)
+                container_str = self.container_term(container_class)
                 if container_class == f"{ContainerOntology.uri}#StockReagent":
                     text = f"Provision the {container_str} containing `{spec.name}`"
                 else:
@@ -433,7 +441,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
             container_class = (
                 ContainerOntology.uri + "#" + containers.queryString.split(":")[-1]
             )
-            container_str = ContainerOntology.get_term_by_uri(container_class)
+            container_str = self.container_term(container_class)
 
             if quantity > 1:
                 if replicates > 1:
@@ -657,7 +665,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
         container_class = (
             ContainerOntology.uri + "#" + container_spec.queryString.split(":")[-1]
         )
-        container_str = ContainerOntology.get_term_by_uri(container_class)
+        container_str = self.container_term(container_class)
 
         # Add to markdown
         text = f"Discard {measurement_to_text(amount)} from {coordinates}{container_str} `{container_spec.name}`."
@@ -704,7 +712,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
         # if isinstance(source, SampleMask):
         #     source_coordinates = source.mask
         #     source = source.source.lookup()
-        source_contents = read_sample_contents(source)
+        source_contents = self.read_sample_contents(source)
         # if source_coordinates:
         #     source_contents = {source_coordinates: source_contents[source_coordinates]}
 
@@ -739,7 +747,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
                 f"Don't know how to get all source coordinates of source type: {type(source)}"
             )
 
-        # destination_contents = read_sample_contents(destination)
+        # destination_contents = self.read_sample_contents(destination)
         # print('-------')
         # print(destination_coordinates)
         # print('Source contents: ', source_contents)
@@ -760,7 +768,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
             if not container_spec.queryString.startswith(ContainerOntology.uri)
             else container_spec.queryString
         )
-        container_str = ContainerOntology.get_term_by_uri(container_class)
+        container_str = self.container_term(container_class)
 
         destination.name = container_spec.name
 
@@ -774,7 +782,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
                     )
                 else:
                     # Add more samples to a plate that already has contents
-                    initial_contents = read_sample_contents(destination)
+                    initial_contents = self.read_sample_contents(destination)
                     initial_contents[destination_coordinates] = source.identity
                     destination.initial_contents = quote(json.dumps(initial_contents))
                     # destination.initial_contents = write_sample_contents(initial_contents, replicates)
@@ -787,7 +795,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
             else:
                 destination_coordinates_str = f"wells {destination_coordinates} of"
 
-        source_names = get_sample_names(
+        source_names = self.get_sample_names(
             source,
             error_msg="Transfer execution failed. All source Components must specify a name.",
         )
@@ -797,7 +805,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
         elif len(source_names) == 1:
             text = f"Transfer {amount_scalar} {amount_units} of `{source_names[0]}` sample to {destination_coordinates_str} {container_str} `{container_spec.name}`."
         elif len(source_names) > 1:
-            n_source = len(read_sample_contents(source))
+            n_source = len(self.read_sample_contents(source))
             n_destination = n_source * replicates
             replicate_str = f"each of {replicates} replicate" if replicates > 1 else ""
             text = f"Transfer {amount_scalar} {amount_units} of each of {n_source} `{source.name}` samples to {destination_coordinates_str} {replicate_str} {container_str} containers to contain a total of {n_destination} `{container_spec.name}` samples."
@@ -832,8 +840,8 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
             map = json.loads(unquote(plan.values))
 
             # Propagate source details to destination
-            source_contents = read_sample_contents(source)
-            destination_contents = read_sample_contents(destination)
+            source_contents = self.read_sample_contents(source)
+            destination_contents = self.read_sample_contents(destination)
 
             try:
                 for k, v in source_contents.items():
@@ -847,7 +855,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
 
         if source:
             source_container = record.document.find(source.container_type)
-            source_names = get_sample_names(
+            source_names = self.get_sample_names(
                 source,
                 error_msg="Transfer execution failed. All source Components must specify a name.",
             )
@@ -859,7 +867,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
             container_class = (
                 ContainerOntology.uri + "#" + container_spec.queryString.split(":")[-1]
             )
-            container_str = ContainerOntology.get_term_by_uri(container_class)
+            container_str = self.container_term(container_class)
         else:
             container_str = None
             container_spec = None
@@ -916,7 +924,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
 
         # Generate markdown
         container_str = record.document.find(container.container_type).name
-        inocula_names = get_sample_names(
+        inocula_names = self.get_sample_names(
             inocula,
             error_msg="Culture execution failed. All input inoculum Components must specify a name.",
         )
@@ -952,7 +960,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
         shakingFrequency = parameter_value_map["shakingFrequency"]
         temperature = parameter_value_map["temperature"]
 
-        sample_names = get_sample_names(
+        sample_names = self.get_sample_names(
             location,
             error_msg="Hold execution failed. All input locations must have a name specified",
         )
@@ -974,7 +982,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
         location = parameter_value_map["location"]
         temperature = parameter_value_map["temperature"]
 
-        if len(read_sample_contents(location)) > 1:
+        if len(self.read_sample_contents(location)) > 1:
             text = f"Hold all `{location.name}` samples at {measurement_to_text(temperature)}."
         else:
             text = f"Hold `{location.name}` at {measurement_to_text(temperature)}."
@@ -991,7 +999,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
 
         location = parameter_value_map["location"]
 
-        if len(read_sample_contents(location)) > 1:
+        if len(self.read_sample_contents(location)) > 1:
             text = f"Hold all `{location.name}` samples on ice."
         else:
             text = f"Hold `{location.name}` on ice."
@@ -1023,9 +1031,9 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
         container_class = (
             ContainerOntology.uri + "#" + container_spec.queryString.split(":")[-1]
         )
-        container_str = ContainerOntology.get_term_by_uri(container_class)
+        container_str = self.container_term(container_class)
 
-        sample_names = get_sample_names(
+        sample_names = self.get_sample_names(
             source,
             error_msg="Dilute to target OD execution failed. All source Components must specify a name.",
         )
@@ -1033,7 +1041,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
         if len(sample_names) == 1:
             text = f"Back-dilute `{sample_names[0]}` `{source.name}` with {diluent.name} into {container_str} to a target OD of {target_od.value} and final volume of {measurement_to_text(amount)}."
         elif len(sample_names) > 1:
-            text = f"Back-dilute each of {len(read_sample_contents(source))} `{source.name}` samples to a target OD of {target_od.value} using {diluent.name} as diluent to a final volume of {measurement_to_text(amount)}."
+            text = f"Back-dilute each of {len(self.read_sample_contents(source))} `{source.name}` samples to a target OD of {target_od.value} using {diluent.name} as diluent to a final volume of {measurement_to_text(amount)}."
 
         if temperature:
             text += f" Maintain at {measurement_to_text(temperature)} while performing dilutions."
@@ -1070,10 +1078,10 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
         container_class = (
             ContainerOntology.uri + "#" + container_spec.queryString.split(":")[-1]
         )
-        container_text = ContainerOntology.get_term_by_uri(container_class)
+        container_text = self.container_term(container_class)
 
         # Get sample names
-        sample_names = get_sample_names(
+        sample_names = self.get_sample_names(
             source,
             error_msg="Dilute execution failed. All source Components must specify a name.",
         )
@@ -1107,7 +1115,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
             amount_scalar = amount_measure.value
             amount_units = tyto.OM.get_term_by_uri(amount_measure.unit)
 
-        dna_names = get_sample_names(
+        dna_names = self.get_sample_names(
             dna,
             error_msg="Transform execution failed. All input DNA Components must specify a name.",
         )
@@ -1189,14 +1197,14 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
         container_class = (
             ContainerOntology.uri + "#" + container_spec.queryString.split(":")[-1]
         )
-        container_str = ContainerOntology.get_term_by_uri(container_class)
+        container_str = self.container_term(container_class)
 
         if self.propagate_objects:
             # Update samples contents
             samples.initial_contents = samples.initial_contents
 
             # Get sample names
-            sample_names = get_sample_names(
+            sample_names = self.get_sample_names(
                 samples,
                 error_msg="Dilute execution failed. All source Components must specify a name.",
                 coordinates=samples_coordinates,
@@ -1226,7 +1234,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
         container_class = (
             ContainerOntology.uri + "#" + container_spec.queryString.split(":")[-1]
         )
-        container_str = ContainerOntology.get_term_by_uri(container_class)
+        container_str = self.container_term(container_class)
 
         text = f"Cover `{location.name}` samples in {container_str} with your choice of material to prevent evaporation."
         execution.markdown_steps += [text]
@@ -1246,7 +1254,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
         container_class = (
             ContainerOntology.uri + "#" + container_spec.queryString.split(":")[-1]
         )
-        container_str = ContainerOntology.get_term_by_uri(container_class)
+        container_str = self.container_term(container_class)
 
         text = f"Remove the seal from {container_str} containing `{location.name}` samples."
         execution.markdown_steps += [text]
@@ -1263,14 +1271,14 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
         samples = parameter_value_map["samples"]
         destination = parameter_value_map["destination"]
         volume = parameter_value_map["volume"]
-        source_contents = read_sample_contents(source)
+        source_contents = self.read_sample_contents(source)
 
         # Get destination container type
         container_spec = destination.get_container_type()
         container_class = (
             ContainerOntology.uri + "#" + container_spec.queryString.split(":")[-1]
         )
-        container_str = ContainerOntology.get_term_by_uri(container_class)
+        container_str = self.container_term(container_class)
 
         # Condense replicates
         n_samples = len(source_contents)
@@ -1301,7 +1309,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
         container_class = (
             ContainerOntology.uri + "#" + container_spec.queryString.split(":")[-1]
         )
-        container_str = ContainerOntology.get_term_by_uri(container_class)
+        container_str = self.container_term(container_class)
 
         text = f"Perform a brief centrifugation on {container_str} containing `{container_spec.name}` samples."
         text = add_description(record, text)
@@ -1345,7 +1353,7 @@ class MarkdownSpecialization(DefaultBehaviorSpecialization):
         container_uri = (
             ContainerOntology.uri + "#" + container.queryString.split(":")[-1]
         )
-        container_str = ContainerOntology.get_term_by_uri(container_uri)
+        container_str = self.container_term(container_uri)
         samples.name = container.name
 
         execution.markdown_steps += [
@@ -1420,6 +1428,7 @@ def get_sample_names(
     inputs: Union["SampleArray", sbol3.Component],
     error_msg,
     coordinates=None,
+    cache: dict = None,
 ) -> List[str]:
     # Since some behavior inputs may be specified as either a SampleArray or directly as a list
     # of Components, this provides a convenient way to unpack a list of sample names
@@ -1428,7 +1437,7 @@ def get_sample_names(
     input_names = []
     if isinstance(inputs, SampleArray):
         if inputs.initial_contents:
-            initial_contents = read_sample_contents(inputs)
+            initial_contents = read_sample_contents(inputs, cache=cache)
             if coordinates:
                 input_names = {inputs.document.find(initial_contents[coordinates]).name}
             else:
@@ -1490,13 +1499,26 @@ def write_sample_contents(
     return quote(json.dumps(initial_contents))
 
 
-def read_sample_contents(sample_array: Union[sbol3.Component, SampleArray]) -> dict:
+def read_sample_contents(
+    sample_array: Union[sbol3.Component, SampleArray], cache: dict = None
+) -> dict:
     if not isinstance(sample_array, SampleArray):
         return {"1": sample_array.identity}
     if sample_array.initial_contents == "https://github.com/synbiodex/pysbol3#missing":
         return {}
     if not sample_array.initial_contents:
         return {}
+    if cache is None:
+        return _deserialize_sample_contents(sample_array)
+    # Keyed on the serialized contents, so that updated contents are re-read.
+    # Callers may modify the contents, so return a copy.
+    key = (sample_array.identity, sample_array.initial_contents)
+    if key not in cache:
+        cache[key] = _deserialize_sample_contents(sample_array)
+    return copy.copy(cache[key])
+
+
+def _deserialize_sample_contents(sample_array: SampleArray):
     # De-serialize the initial_contents field of a SampleArray
     contents = deserialize_sample_format(sample_array.initial_contents, sample_array)
     if isinstance(contents, xr.DataArray):
@@ -25,6 +25,16 @@ from labop_convert.behavior_specialization import (
     BehaviorSpecialization,
     DefaultBehaviorSpecialization,
 )
+from labop_convert.opentrons.transfer_planner import (
+    NO_ESTIMATE,
+    RobotTimeModel,
+    Transfer,
+    Well,
+    naive_plan,
+    optimized_plan,
+    pipette_channels,
+    pipette_max_volume,
+)
 from uml import CallBehaviorAction, ForkNode, InputPin, LiteralReference, ValuePin
 
 l = logging.getLogger(__file__)
@@ -124,7 +134,11 @@ class OT2Specialization(DefaultBehaviorSpecialization):
     }
 
     def __init__(
-        self, filename, resolutions: Dict[sbol3.Identified, str] = None
+        self,
+        filename,
+        resolutions: Dict[sbol3.Identified, str] = None,
+        optimize_transfers: bool = True,
+        robot_time_model: RobotTimeModel = None,
     ) -> None:
         super().__init__()
         self.resolutions = resolutions
@@ -137,6 +151,15 @@ class OT2Specialization(DefaultBehaviorSpecialization):
         self.configuration = {}
         self.filename = filename
 
+        # Group transfers into multi-dispense and multichannel operations, and
+        # estimate robot time against one transfer per well pair
+        self.optimize_transfers = optimize_transfers
+        self.robot_time_model = (
+            robot_time_model if robot_time_model is not None else RobotTimeModel()
+        )
+        self.transfer_estimate = NO_ESTIMATE
+        self.naive_transfer_estimate = NO_ESTIMATE
+
         # Needed for using container ontology
         self.container_api_addl_conditions = "(cont:availableAt value <https://sift.net/container-ontology/strateos-catalog#Strateos>)"
 
@@ -180,8 +203,15 @@ class OT2Specialization(DefaultBehaviorSpecialization):
             "def run(protocol: protocol_api.ProtocolContext):\n"
         )
         self.data = []
+        self.transfer_estimate = NO_ESTIMATE
+        self.naive_transfer_estimate = NO_ESTIMATE
 
     def on_end(self, ex):
+        if self.naive_transfer_estimate.operations > 0:
+            self.script_steps += [
+                f"# Estimated transfers: {self.transfer_estimate.summary()}",
+                f"# (one transfer per well: {self.naive_transfer_estimate.summary()})",
+            ]
         self.script += self._compile_script()
         self.markdown += self._compile_markdown()
         if self.filename:
@@ -381,6 +411,7 @@ class OT2Specialization(DefaultBehaviorSpecialization):
         for deck, labware in self.configuration.items():
             if labware == source_container:
                 source_name = f"labware{deck}"
+                source_deck = deck
                 break
         if not source_name:
             raise Exception(f"{source_container} is not loaded.")
@@ -397,6 +428,7 @@ class OT2Specialization(DefaultBehaviorSpecialization):
                     labware = labware.configuration[coordinate]
             if labware == destination_container:
                 destination_name = f"labware{deck}"
+                destination_deck = deck
                 break
         if not destination_name:
             raise Exception(f"{destination_container} is not loaded.")
@@ -415,13 +447,19 @@ class OT2Specialization(DefaultBehaviorSpecialization):
             else "# Transfer ActivityNode name is not defined."
         )
 
-        source_str = source.mask
-        destination_str = destination.mask
-        for c_source in source.get_coordinates():
-            for c_destination in destination.get_coordinates():
-                self.script_steps += [
-                    f"{pipette.display_id}.transfer({value}, {source_name}['{c_source}'], {destination_name}['{c_destination}'])  {comment}"
-                ]
+        self._plan_transfers(
+            pipette.display_id,
+            [
+                Transfer(
+                    Well(source_name, source_deck, c_source),
+                    Well(destination_name, destination_deck, c_destination),
+                    value,
+                )
+                for c_source in source.get_coordinates()
+                for c_destination in destination.get_coordinates()
+            ],
+            comment=comment,
+        )
 
     def transfer_by_map(self, record: ActivityNodeExecution, ex: ProtocolExecution):
         results = {}
@@ -454,6 +492,7 @@ class OT2Specialization(DefaultBehaviorSpecialization):
         for deck, labware in self.configuration.items():
             if labware == source_container:
                 source_name = f"labware{deck}"
+                source_deck = deck
                 break
         if not source_name:
             raise Exception(f"{source_container} is not loaded.")
@@ -474,6 +513,7 @@ class OT2Specialization(DefaultBehaviorSpecialization):
         for deck, labware in self.configuration.items():
             if labware == destination_container:
                 destination_name = f"labware{deck}"
+                destination_deck = deck
                 break
         if not destination_name:
             raise Exception(f"{destination_container} is not loaded.")
@@ -485,13 +525,48 @@ class OT2Specialization(DefaultBehaviorSpecialization):
             )
         pipette = self.configuration["left"]
 
-        source_str = source.mask
-        destination_str = destination.mask
-        for c_source in get_sample_list(source.mask):
-            for c_destination in get_sample_list(destination.mask):
-                self.script_steps += [
-                    f"{pipette.display_id}.transfer({value}, {source_name}['{c_source}'], {destination_name}['{c_destination}'])"
-                ]
+        self._plan_transfers(
+            pipette.display_id,
+            [
+                Transfer(
+                    Well(source_name, source_deck, c_source),
+                    Well(destination_name, destination_deck, c_destination),
+                    value,
+                )
+                for c_source in get_sample_list(source.mask)
+                for c_destination in get_sample_list(destination.mask)
+            ],
+        )
+
+    def _plan_transfers(self, pipette: str, transfers, comment: str = ""):
+        """Add the pipetting operations for transfers to the script"""
+        naive = naive_plan(transfers, pipette, comment=comment)
+        # Wells outside of whole columns use a single-channel pipette on the right mount
+        right = self.configuration.get("right")
+        single_channel_pipette = (
+            right.display_id
+            if right is not None
+            and right.display_id in COMPATIBLE_TIPS
+            and pipette_channels(right.display_id) == 1
+            else None
+        )
+        plan = (
+            optimized_plan(
+                transfers,
+                pipette,
+                comment=comment,
+                model=self.robot_time_model,
+                single_channel_pipette=single_channel_pipette,
+            )
+            if self.optimize_transfers
+            else naive
+        )
+        max_volume = pipette_max_volume(pipette)
+        self.naive_transfer_estimate += self.robot_time_model.estimate(
+            naive, max_volume
+        )
+        self.transfer_estimate += self.robot_time_model.estimate(plan, max_volume)
+        self.script_steps += [op.to_script(pipette) for op in plan]
 
     def plate_coordinates(self, record: ActivityNodeExecution, ex: ProtocolExecution):
         # call = record.get_call()
@@ -0,0 +1,394 @@
+"""
+Plan the pipetting operations for a set of liquid transfers on an OT2.
+
+The naive plan performs each (source well, destination well) transfer with a
+new tip and its own aspirate and dispense cycle.  The optimized plan:
+
+- moves whole columns with an 8-channel pipette when every row of a source
+  column is transferred to the same row of a destination column, and moves
+  the other wells with a single-channel pipette, if one is configured,
+- dispenses from one aspiration into several destinations (multi-dispense)
+  when the pipette can hold more than one dispense volume,
+- reuses a tip for all transfers from the same source well, and
+- orders operations to reduce the travel of the pipette across the deck,
+  while keeping the order in which liquids are added to each well.
+
+Transfers are only grouped and reordered if no well is both a source and a
+destination, so that the order of dependent transfers is preserved.
+
+The RobotTimeModel estimates the time and tips used by a plan, so that the
+optimized plan can be compared with the naive plan.
+"""
+
+import math
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+ROWS = "ABCDEFGH"
+
+# Maximum volume (uL) of OT2 pipettes, by the prefix of their API name
+PIPETTE_MAX_VOLUMES = {
+    "p10": 10.0,
+    "p20": 20.0,
+    "p50": 50.0,
+    "p300": 300.0,
+    "p1000": 1000.0,
+}
+
+
+def pipette_max_volume(pipette: str) -> float:
+    return PIPETTE_MAX_VOLUMES.get(pipette.split("_")[0], math.inf)
+
+
+def pipette_channels(pipette: str) -> int:
+    return 8 if "_multi" in pipette else 1
+
+
+class Well(NamedTuple):
+    labware: str  # Variable name of the labware in the script
+    deck: str  # Deck slot of the labware
+    well: str  # e.g., "A1"
+
+    @property
+    def row(self) -> int:
+        return ROWS.index(self.well[0]) if self.well[0] in ROWS else 0
+
+    @property
+    def column(self) -> int:
+        return int(self.well[1:]) if self.well[1:].isdigit() else 1
+
+    @property
+    def position(self) -> Tuple[float, float]:
+        """Approximate (x, y) position in mm on the OT2 deck"""
+        slot = int(self.deck) - 1 if self.deck.isdigit() else 0
+        return (
+            (slot % 3) * 132.5 + (self.column - 1) * 9.0,
+            (slot // 3) * 90.5 + (len(ROWS) - 1 - self.row) * 9.0,
+        )
+
+    def to_script(self) -> str:
+        return f"{self.labware}['{self.well}']"
+
+
+class Transfer(NamedTuple):
+    source: Well
+    destination: Well
+    volume: float
+
+
+class PipetteOperation(object):
+    """
+    Pipetting with one set of tips: from source into each of the
+    destinations, with a pipette of `channels` channels.  Multi-dispense
+    operations dispense into several destinations from each aspiration.
+    An operation with a `pipette` uses that pipette rather than the one the
+    plan is written for.
+    """
+
+    def __init__(
+        self,
+        source: Well,
+        destinations: List[Well],
+        volume: float,
+        channels: int = 1,
+        multi_dispense: bool = False,
+        comment: str = "",
+        pipette: Optional[str] = None,
+    ):
+        self.source = source
+        self.destinations = destinations
+        self.volume = volume
+        self.channels = channels
+        self.multi_dispense = multi_dispense
+        self.comment = comment
+        self.pipette = pipette
+
+    def aspirations(self, max_volume: float) -> int:
+        if self.multi_dispense:
+            return math.ceil(self.volume * len(self.destinations) / max_volume)
+        return len(self.destinations) * math.ceil(self.volume / max_volume)
+
+    def dispenses(self, max_volume: float) -> int:
+        if self.multi_dispense:
+            return len(self.destinations)
+        return len(self.destinations) * math.ceil(self.volume / max_volume)
+
+    def to_script(self, pipette: str) -> str:
+        pipette = self.pipette if self.pipette else pipette
+        comment = f"  {self.comment}" if self.comment else ""
+        if len(self.destinations) == 1:
+            return (
+                f"{pipette}.transfer({self.volume}, {self.source.to_script()}, "
+                f"{self.destinations[0].to_script()}){comment}"
+            )
+        destinations = ", ".join(d.to_script() for d in self.destinations)
+        if self.multi_dispense:
+            return (
+                f"{pipette}.distribute({self.volume}, {self.source.to_script()}, "
+                f"[{destinations}]){comment}"
+            )
+        return (
+            f"{pipette}.transfer({self.volume}, {self.source.to_script()}, "
+            f"[{destinations}], new_tip='once'){comment}"
+        )
+
+
+class RobotTimeEstimate(NamedTuple):
+    operations: int
+    tips: int
+    aspirations: int
+    dispenses: int
+    travel_mm: float
+    seconds: float
+
+    def __add__(self, other: "RobotTimeEstimate") -> "RobotTimeEstimate":
+        return RobotTimeEstimate(*[a + b for a, b in zip(self, other)])
+
+    def summary(self) -> str:
+        return (
+            f"{self.operations} operations, {self.tips} tips, "
+            f"{self.aspirations} aspirations, {self.dispenses} dispenses, "
+            f"~{self.seconds:.0f} s"
+        )
+
+
+NO_ESTIMATE = RobotTimeEstimate(0, 0, 0, 0, 0.0, 0.0)
+
+
+class RobotTimeModel(object):
+    """Approximate OT2 timings, in seconds and mm/s"""
+
+    pick_up_tip = 6.0  # includes the move to the tip rack
+    drop_tip = 5.0  # includes the move to the trash
+    aspirate = 3.0
+    dispense = 2.5
+    move_overhead = 1.0  # raise, move, and lower the pipette
+    speed = 400.0
+
+    def travel(self, a: Well, b: Well) -> float:
+        (x1, y1), (x2, y2) = a.position, b.position
+        return math.hypot(x2 - x1, y2 - y1)
+
+    def estimate(
+        self, plan: List[PipetteOperation], max_volume: float
+    ) -> RobotTimeEstimate:
+        tips = aspirations = dispenses = moves = 0
+        travel = 0.0
+        position: Optional[Well] = None
+        for op in plan:
+            tips += op.channels
+            op_max_volume = pipette_max_volume(op.pipette) if op.pipette else max_volume
+            op_aspirations = op.aspirations(op_max_volume)
+            aspirations += op_aspirations
+            dispenses += op.dispenses(op_max_volume)
+            if position is not None:
+                travel += self.travel(position, op.source)
+            if op.multi_dispense:
+                # Visit each destination in turn, returning to the source to refill
+                path = [op.source] + op.destinations
+                travel += sum(self.travel(a, b) for a, b in zip(path, path[1:]))
+                travel += (op_aspirations - 1) * self.travel(
+                    op.destinations[-1], op.source
+                )
+                moves += len(op.destinations) + op_aspirations
+            else:
+                # Return to the source for each aspiration
+                cycles = op_aspirations // len(op.destinations)
+                for destination in op.destinations:
+                    travel += 2 * cycles * self.travel(op.source, destination)
+                travel -= self.travel(op.source, op.destinations[-1])
+                moves += 2 * op_aspirations
+            position = op.destinations[-1]
+        seconds = (
+            tips * (self.pick_up_tip + self.drop_tip)
+            + aspirations * self.aspirate
+            + dispenses * self.dispense
+            + moves * self.move_overhead
+            + travel / self.speed
+        )
+        return RobotTimeEstimate(
+            len(plan), tips, aspirations, dispenses, travel, seconds
+        )
+
+
+def naive_plan(
+    transfers: List[Transfer], pipette: str, comment: str = ""
+) -> List[PipetteOperation]:
+    """One operation, with a new tip, for each transfer"""
+    channels = pipette_channels(pipette)
+    return [
+        PipetteOperation(
+            t.source, [t.destination], t.volume, channels=channels, comment=comment
+        )
+        for t in transfers
+    ]
+
+
+def _column_transfers(
+    transfers: List[Tuple[int, Transfer]],
+) -> Tuple[List[Tuple[List[int], Transfer]], List[Tuple[List[int], Transfer]]]:
+    """
+    Replace each set of transfers that moves every row of a source column to
+    the same row of a destination column by one transfer between the top
+    wells of the columns.  Transfers are given with their index in the
+    original list, and are returned with the indices of the transfers they
+    replace.  Returns the column transfers and the remaining transfers.
+    """
+    groups: Dict[tuple, Dict[int, Tuple[int, Transfer]]] = {}
+    for i, t in transfers:
+        if t.source.row == t.destination.row:
+            key = (
+                t.source.labware,
+                t.source.deck,
+                t.source.column,
+                t.destination.labware,
+                t.destination.deck,
+                t.destination.column,
+                t.volume,
+            )
+            groups.setdefault(key, {}).setdefault(t.source.row, (i, t))
+    columns = []
+    grouped = set()
+    for key, rows in groups.items():
+        if len(rows) == len(ROWS):
+            t = rows[0][1]
+            indices = [i for i, _ in rows.values()]
+            columns.append(
+                (
+                    indices,
+                    Transfer(
+                        Well(t.source.labware, t.source.deck, f"A{t.source.column}"),
+                        Well(
+                            t.destination.labware,
+                            t.destination.deck,
+                            f"A{t.destination.column}",
+                        ),
+                        t.volume,
+                    ),
+                )
+            )
+            grouped.update(indices)
+    return columns, [([i], t) for i, t in transfers if i not in grouped]
+
+
+def _order_by_travel(
+    plan: List[PipetteOperation],
+    transfers: List[Transfer],
+    transfer_operations: Dict[int, PipetteOperation],
+    model: RobotTimeModel,
+) -> Optional[List[PipetteOperation]]:
+    """
+    Order the operations, and the destinations of each, by greedily visiting
+    the source nearest the last well visited.  An operation that dispenses
+    into a well is only visited after the operations of the transfers into
+    the well that precede it.  Returns None if no order of the operations
+    keeps the order of the transfers into each well.
+    """
+    for op in plan:
+        remaining = list(op.destinations)
+        ordered = []
+        position = op.source
+        while remaining:
+            well = min(remaining, key=lambda w: model.travel(position, w))
+            remaining.remove(well)
+            ordered.append(well)
+            position = well
+        op.destinations = ordered
+
+    # Operations that must precede each operation
+    predecessors: Dict[PipetteOperation, set] = {op: set() for op in plan}
+    last: Dict[Well, PipetteOperation] = {}
+    for i, t in enumerate(transfers):
+        op = transfer_operations[i]
+        previous = last.get(t.destination)
+        if previous is not None and previous is not op:
+            predecessors[op].add(previous)
+        last[t.destination] = op
+
+    ordered = []
+    visited = set()
+    remaining = list(plan)
+    position: Optional[Well] = None
+    while remaining:
+        ready = [op for op in remaining if predecessors[op] <= visited]
+        if not ready:
+            return None
+        op = (
+            ready[0]
+            if position is None
+            else min(ready, key=lambda op: model.travel(position, op.source))
+        )
+        remaining.remove(op)
+        ordered.append(op)
+        visited.add(op)
+        position = op.destinations[-1]
+    return ordered
+
+
+def optimized_plan(
+    transfers: List[Transfer],
+    pipette: str,
+    comment: str = "",
+    model: RobotTimeModel = None,
+    single_channel_pipette: Optional[str] = None,
+) -> List[PipetteOperation]:
+    """
+    Plan the transfers for `pipette`.  If it is a multichannel pipette, the
+    transfers that are not part of a whole column are made with
+    `single_channel_pipette`, if given, and otherwise with the multichannel
+    pipette, which picks up a tip on each channel.
+    """
+    model = model if model is not None else RobotTimeModel()
+    sources = {t.source for t in transfers}
+    destinations = {t.destination for t in transfers}
+    if sources & destinations:
+        # Transfers depend upon each other, so keep their order
+        return naive_plan(transfers, pipette, comment=comment)
+
+    channels = pipette_channels(pipette)
+    max_volume = pipette_max_volume(pipette)
+    indexed = list(enumerate(transfers))
+    if channels == 1:
+        groups = [([([i], t) for i, t in indexed], None, 1)]
+    else:
+        columns, remaining = _column_transfers(indexed)
+        groups = [
+            (columns, None, channels),
+            (
+                remaining,
+                single_channel_pipette,
+                1 if single_channel_pipette else channels,
+            ),
+        ]
+
+    plan = []
+    transfer_operations: Dict[int, PipetteOperation] = {}
+    for group, group_pipette, group_channels in groups:
+        group_max_volume = (
+            pipette_max_volume(group_pipette) if group_pipette else max_volume
+        )
+        # One tip for each source well and volume
+        by_source: Dict[Tuple[Well, float], List[Tuple[List[int], Well]]] = {}
+        for indices, t in group:
+            by_source.setdefault((t.source, t.volume), []).append(
+                (indices, t.destination)
+            )
+        for (source, volume), wells in by_source.items():
+            op = PipetteOperation(
+                source,
+                [w for _, w in wells],
+                volume,
+                channels=group_channels,
+                multi_dispense=len(wells) > 1 and 2 * volume <= group_max_volume,
+                comment=comment,
+                pipette=group_pipette,
+            )
+            plan.append(op)
+            for indices, _ in wells:
+                for i in indices:
+                    transfer_operations[i] = op
+
+    ordered = _order_by_travel(plan, transfers, transfer_operations, model)
+    if ordered is None:
+        # Grouping by source would change the order of liquids in a well
+        return naive_plan(transfers, pipette, comment=comment)
+    return ordered
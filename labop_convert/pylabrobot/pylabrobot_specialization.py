@@ -11,6 +11,12 @@ import labop
 import uml
 from labop.utils.plate_coordinates import get_sample_list
 from labop_convert.behavior_specialization import BehaviorSpecialization
+from labop_convert.pylabrobot.transfer_batching import (
+    WellTransfer,
+    batch_transfers,
+    liquid_handling_sequence,
+    plan_transfers,
+)
 
 l = logging.getLogger(__file__)
 l.setLevel(logging.ERROR)
@@ -139,10 +145,22 @@ LABWARE_MAP = {
 
 REVERSE_LABWARE_MAP = LABWARE_MAP.__class__(map(reversed, LABWARE_MAP.items()))
 
+# Resource type of labware whose container type is not resolved
+DEFAULT_PLATE = "Cos_96_EZWash"
+
+# First rail of each position on the STARLet deck (30 rails), far enough apart
+# for a tip rack or plate
+DECK_RAILS = [1, 7, 13, 19, 25]
+
 
 class PylabrobotSpecialization(BehaviorSpecialization):
     def __init__(
-        self, filename, resolutions: Dict[sbol3.Identified, str] = None
+        self,
+        filename,
+        resolutions: Dict[sbol3.Identified, str] = None,
+        channels: int = 8,
+        tip_rack: str = "tip_rack",
+        tip_racks: int = 2,
     ) -> None:
         super().__init__()
         self.resolutions = resolutions
@@ -154,6 +172,15 @@ class PylabrobotSpecialization(BehaviorSpecialization):
         self.apilevel = "2.11"
         self.configuration = {}
         self.filename = filename
+        # Transfers are batched for a head with this many channels (1, 8, or
+        # 96), and written as liquid_handling_sequence coroutines
+        self.channels = channels
+        # Tips are taken from the racks in order, tip_rack_1, tip_rack_2, ...
+        self.tip_racks = [f"{tip_rack}_{i + 1}" for i in range(tip_racks)]
+        self.sequences = []
+        self.next_tip = 0
+        # The pylabrobot resource type of each labware on the deck, by name
+        self.resources = {}
         # Needed for using container ontology
         self.container_api_addl_conditions = "(cont:availableAt value <https://sift.net/container-ontology/strateos-catalog#Strateos>)"
 
@@ -247,6 +274,7 @@ from pylabrobot.liquid_handling import LiquidHandler
 from pylabrobot.liquid_handling.backends.simulation.simulator_backend import (
     SimulatorBackend,
 )
+from pylabrobot import resources
 from pylabrobot.resources import Cos_96_EZWash, Cos_96_PCR, HTF_L, Coordinate
 from pylabrobot.resources.hamilton import STARLetDeck
 from pylabrobot import MPE
@@ -263,9 +291,13 @@ async def LiquidHandler_setup():
     await lh.setup()
 """
         self.data = []
+        self.sequences = []
+        self.next_tip = 0
+        self.resources = {}
 
     def on_end(self, ex):
         self.script += self._compile_script()
+        self.script += self._compile_sequences()
         self.markdown += self._compile_markdown()
         if self.filename:
             with open(self.filename + ".py", "w") as f:
@@ -280,11 +312,43 @@ async def LiquidHandler_setup():
             self.data = f"# pylabbot Script\n ```python\n{self.script}```\n # Operator Script\n {self.markdown}"
 
     def _compile_script(self):
-        script = ""
+        script = self._compile_resources()
         for step in self.script_steps:
             script += f"    {step}\n"
         return script
 
+    def _compile_resources(self):
+        """
+        Statements that define the tip racks and labware used by the
+        sequences, and assign them to the deck, each on its own set of rails.
+        """
+        resources = {rack: "HTF_L" for rack in self.tip_racks}
+        resources.update(self.resources)
+        if len(resources) > len(DECK_RAILS):
+            raise Exception(
+                f"Cannot place {len(resources)} resources on the deck, which has room for {len(DECK_RAILS)}"
+            )
+        script = ""
+        for (name, resource_type), rails in zip(resources.items(), DECK_RAILS):
+            script += f'    lh.deck.assign_child_resource(resources.{resource_type}(name="{name}"), rails={rails})\n'
+        return script
+
+    def _compile_sequences(self):
+        """
+        The liquid_handling_sequence coroutines, and a main coroutine that
+        awaits them in protocol order.  Each sequence is self-contained, so
+        sequences for independent liquid handlers can be run with
+        asyncio.gather().
+        """
+        script = ""
+        for sequence, _ in self.sequences:
+            script += f"\n\n{sequence}"
+        script += "\n\nasync def main():\n    await LiquidHandler_setup()\n"
+        for _, name in self.sequences:
+            script += f"    await {name}()\n"
+        script += "\n\nasyncio.run(main())\n"
+        return script
+
     def _compile_markdown(self):
         markdown = self._materials()
         markdown += "\n## Steps\n"
@@ -292,10 +356,7 @@ async def LiquidHandler_setup():
             markdown += str(i + 1) + ". " + step + "\n"
         return markdown
 
-        ###################################################
-        # see about def _tipracks object
-        ##################################################
-        # def _materials(self):
+    def _materials(self):
         protocol = self.execution.protocol.lookup()
 
         materials = {
@@ -494,11 +555,11 @@ async def LiquidHandler_setup():
         else:
             raise Exception(f'Invalid input pin "source" for Transfer.')
 
-        # Map the source container to a variable name in the pylabrobot api script
+        # Map the source container to its resource name in the pylabrobot api script
         source_name = None
         for deck, labware in self.configuration.items():
             if labware == source_container:
-                source_name = f"labware{deck}"
+                source_name = self.labware_name(source_container)
                 break
         if not source_name:
             raise Exception(f"{source_container} is not loaded.")
@@ -539,7 +600,7 @@ async def LiquidHandler_setup():
                 if coordinate in labware.configuration:
                     labware = labware.configuration[coordinate]
             if labware == destination_container:
-                destination_name = f"labware{deck}"
+                destination_name = self.labware_name(destination_container)
                 break
         if not destination_name:
             raise Exception(f"{destination_container} is not loaded.")
@@ -558,100 +619,74 @@ async def LiquidHandler_setup():
             else "# Transfer ActivityNode name is not defined."
         )
 
-        source_str = source.mask
-        destination_str = destination.mask
-        for c_source in source.get_coordinates():
-            for c_destination in destination.get_coordinates():
-                self.script_steps += [  # make it a list with 5 elements (pick up, aspirate, dispense, return tips)
-                    f"{pipette.display_id}.transfer({value}, {source_name}['{c_source}'], {destination_name}['{c_destination}'])  {comment}"
-                ]
+        self._add_sequence(
+            [
+                WellTransfer(c_source, c_destination, value)
+                for c_source in source.get_coordinates()
+                for c_destination in destination.get_coordinates()
+            ],
+            source_name,
+            destination_name,
+        )
 
     # write correspondence for transferbymap primitive
     def transfer_by_map(
         self, record: labop.ActivityNodeExecution, ex: labop.ProtocolExecution
     ):
-        results = {}
         call = record.call.lookup()
         parameter_value_map = call.parameter_value_map()
-        destination = parameter_value_map[
-            "destination"
-        ]  # those are gonna be sample arrays
-        source = parameter_value_map["source"]  # those are gonna be sample arrays
+        destination = parameter_value_map["destination"]
+        source = parameter_value_map["source"]
         plan = parameter_value_map["plan"]
-        temperature = parameter_value_map["temperature"]
-        value = parameter_value_map["amount"].value
-        units = parameter_value_map["amount"].unit
-        units = tyto.OM.get_term_by_uri(units)
-        pylabrobot = "left"
-
-        # Trace the "source" pin back to the EmptyContainer to retrieve the
-        # ContainerSpec for the destination container
-        upstream_execution = record.get_token_source("source")
-        behavior_type = get_behavior_type(upstream_execution)
-        if behavior_type == "LoadContainerInRack":
-            upstream_execution = upstream_execution.get_token_source(
-                "slots"
-            )  # EmptyRack
-            parameter_value_map = upstream_execution.call.lookup().parameter_value_map()
-            source_container = parameter_value_map["specification"]
-        else:
-            raise Exception(f'Invalid input pin "source" for Transfer.')
 
-        #############trace the source container to a variable name in the pylabrobot script########
-        source_name = None
-        for deck, labware in self.configuration.items():
-            if labware == source_container:
-                source_name = f"labware{deck}"
-                break
-        if not source_name:
-            raise Exception(f"{source_container} is not loaded.")
-
-        # Trace the "destination" pin back to the EmptyContainer execution
-        # to retrieve the ContainerSpec for the destination container
-        upstream_execution = record.get_token_source("destination")
-        behavior_type = get_behavior_type(upstream_execution)
-        if behavior_type == "PlateCoordinates":
-            upstream_execution = get_token_source(
-                "source", upstream_execution
-            )  # EmptyContainer
-            parameter_value_map = upstream_execution.call.lookup().parameter_value_map()
-            destination_container = parameter_value_map["specification"]
-        else:
-            raise Exception(f'Invalid input pin "destination" for Transfer.')
-        destination_name = None
-        for deck, labware in self.configuration.items():
-            if labware == destination_container:
-                destination_name = f"labware{deck}"
-                break
-        if not destination_name:
-            raise Exception(f"{destination_container} is not loaded.")
+        source_name = self.labware_name(source.get_container_type())
+        destination_name = self.labware_name(destination.get_container_type())
+        transfers = plan_transfers(plan.get_map())
+        name = self._add_sequence(
+            transfers,
+            source_name,
+            destination_name,
+        )
+        self.markdown_steps += [
+            f"Transfer from `{source_name}` to `{destination_name}` ({len(transfers)} transfers, see `{name}`)"
+        ]
 
-        # TODO: automatically choose pipette based on transferred volume
-        if not self.configuration:
-            raise Exception(
-                "Transfer call failed. Use ConfigureInstrument to configure a pipette"
-            )
-        pipette = self.configuration["left"]
+    def labware_name(self, container: labop.ContainerSpec) -> str:
+        """Name of the container's resource on the deck, in the script and the sequences"""
+        return container.name if container.name else container.display_id
 
-        source.container_type
-        destination.container_type
-        source.container_type.lookup
-
-        # make it a list with 5 elements (pick up, aspirate, dispense, return tips) this string when constructed will substitute variables declared by values on the protocol
-        source_str = source.mask
-        destination_str = destination.mask
-        for c_source in get_sample_list(source.mask):
-            for c_destination in get_sample_list(destination.mask):
-                self.script_steps += f"""async def liquid_handling_sequence():
-    await lh.pick_up_tips({primitive_tip_rack}[{source_str}])
-      lh
-    await lh.aspirate({source}[{source_str}],
-        vols={value},
-        flow_rates={100},
-        end_delay=0.5,
-        offsets=Coordinate(1, 2, 3))
-    await lh.dispense({destination}[{destination_str}], vols={value})
-    await lh.return_tips() """
+    def _add_sequence(
+        self,
+        transfers,
+        source_name: str,
+        destination_name: str,
+    ) -> str:
+        """
+        Batch transfers for the head, and add a liquid_handling_sequence for
+        them.  Labware that was not loaded on an instrument is defined as a
+        96 well plate.
+        """
+        for labware in [source_name, destination_name]:
+            self.resources.setdefault(labware, DEFAULT_PLATE)
+        name = f"liquid_handling_sequence_{len(self.sequences) + 1}"
+        # Transfers within one container are only reordered if no well is both
+        # a source and a destination
+        independent = source_name != destination_name or not (
+            {t.source for t in transfers} & {t.destination for t in transfers}
+        )
+        batches = batch_transfers(
+            transfers, channels=self.channels, independent=independent
+        )
+        sequence, self.next_tip = liquid_handling_sequence(
+            name,
+            batches,
+            source_name,
+            destination_name,
+            self.tip_racks,
+            first_tip=self.next_tip,
+        )
+        self.sequences.append((sequence, name))
+        return name
 
     # take information present in the primitive and construct string to be
     # make it a list with 5 elements (pick up, aspirate, dispense, return tips)
@@ -745,13 +780,11 @@ async def LiquidHandler_setup():
         container_str = self.get_container_name(container_spec)
 
         # TODO: need to specify instrument
-        deck = self.get_instrument_deck(instrument)
+        self.get_instrument_deck(instrument)  # Raises if it is not configured
         self.markdown_steps += [
             f"Load {container_str} in {slots} of Deck of pylabrobot instrument"
         ]
-        self.script_steps += [
-            f"labware{deck} = {instrument.display_id}.load_labware('{container_api_name}')"
-        ]
+        self.resources[self.labware_name(container_spec)] = container_api_name
 
         # Keep track of instrument configuration
         if not hasattr(instrument, "configuration"):
@@ -0,0 +1,238 @@
+"""
+Plan channel-parallel batches of well-to-well transfers for a pylabrobot
+LiquidHandler, and write them as a liquid_handling_sequence() coroutine.
+
+A TransferByMap plan (a SampleMap) gives the volume to move from each source
+well to each destination well.  Instead of a pick up, aspirate, dispense, and
+return of tips for each pair of wells, the transfers are grouped into batches
+that the head performs at once:
+
+- with a 96 channel head, a plate-to-plate transfer of every well (in the
+  same position) is one batch,
+- with an 8 channel head, transfers between the same source and destination
+  columns share a batch, one channel per row, if the rows of the
+  destinations are in the same order as the rows of the sources, and
+- with a single channel, each transfer is a batch.
+
+The wells of a batch are written as a rectangle (e.g., "A1:H1") when they are
+contiguous.  The HeadSimulator performs batches and counts the moves of the
+head, so that batched and unbatched plans can be compared.
+"""
+
+from typing import Dict, List, NamedTuple, Tuple
+
+import numpy as np
+import xarray as xr
+
+from labop.strings import Strings
+from labop.utils.plate_coordinates import contiguous_coordinates, coordinate_to_row_col
+
+ROWS = "ABCDEFGH"
+PLATE_WELLS = [f"{r}{c}" for c in range(1, 13) for r in ROWS]  # column order
+
+
+class WellTransfer(NamedTuple):
+    source: str
+    destination: str
+    volume: float
+
+
+class TransferBatch(NamedTuple):
+    """Transfers performed together, ordered by channel"""
+
+    transfers: List[WellTransfer]
+    head96: bool = False
+
+    @property
+    def channels(self) -> List[int]:
+        return list(range(len(self.transfers)))
+
+
+def plan_transfers(sample_map: xr.DataArray) -> List[WellTransfer]:
+    """Transfers with a positive volume in a SampleMap's DataArray"""
+    sample_map = sample_map.isel(
+        {Strings.SOURCE_CONTAINER: 0, Strings.TARGET_CONTAINER: 0}
+    ).transpose(Strings.SOURCE_LOCATION, Strings.TARGET_LOCATION)
+    sources = sample_map[Strings.SOURCE_LOCATION].data.tolist()
+    destinations = sample_map[Strings.TARGET_LOCATION].data.tolist()
+    volumes = np.asarray(sample_map.data, dtype=float)
+    return [
+        WellTransfer(sources[i], destinations[j], float(volumes[i, j]))
+        for i, j in zip(*np.nonzero(np.nan_to_num(volumes) > 0))
+    ]
+
+
+def _is_plate_copy(transfers: List[WellTransfer]) -> bool:
+    """Does every well of a 96 well plate go to the same well of another plate?"""
+    return (
+        len(transfers) == len(PLATE_WELLS)
+        and all(t.source == t.destination for t in transfers)
+        and {t.source for t in transfers} == set(PLATE_WELLS)
+        and len({t.volume for t in transfers}) == 1
+    )
+
+
+def batch_transfers(
+    transfers: List[WellTransfer], channels: int = 8, independent: bool = True
+) -> List[TransferBatch]:
+    """
+    Group transfers into batches for a head with the given number of
+    channels.  If the transfers are not independent (e.g., a well is both a
+    source and a destination), each transfer is its own batch, in order.
+    """
+    if not independent or channels == 1:
+        return [TransferBatch([t]) for t in transfers]
+    if channels >= len(PLATE_WELLS):
+        if _is_plate_copy(transfers):
+            return [TransferBatch(sorted(transfers), head96=True)]
+        channels = 8
+
+    # Group by source and destination column, in the order of first use
+    groups: Dict[tuple, List[WellTransfer]] = {}
+    for t in transfers:
+        source_row, source_col = coordinate_to_row_col(t.source)
+        destination_row, destination_col = coordinate_to_row_col(t.destination)
+        groups.setdefault((source_col, destination_col), []).append(
+            (source_row, destination_row, t)
+        )
+
+    batches = []
+    for group in groups.values():
+        group_batches: List[List[tuple]] = []
+        for source_row, destination_row, t in sorted(group, key=lambda g: g[:2]):
+            for batch in group_batches:
+                if len(batch) < channels and all(
+                    source_row > s and destination_row > d for s, d, _ in batch
+                ):
+                    batch.append((source_row, destination_row, t))
+                    break
+            else:
+                group_batches.append([(source_row, destination_row, t)])
+        batches += [TransferBatch([t for _, _, t in batch]) for batch in group_batches]
+    return batches
+
+
+def wells_expression(variable: str, wells: List[str]) -> str:
+    """pylabrobot expression for the list of wells, as a range if they are contiguous"""
+    coordinates = contiguous_coordinates(wells)
+    if isinstance(coordinates, str):
+        return f'{variable}["{coordinates}"]'
+    return " + ".join(f'{variable}["{w}"]' for w in coordinates)
+
+
+def liquid_handling_sequence(
+    name: str,
+    batches: List[TransferBatch],
+    source: str,
+    destination: str,
+    tip_racks: List[str],
+    first_tip: int = 0,
+) -> Tuple[str, int]:
+    """
+    Python source of a coroutine that performs the batches, and the index of
+    the next unused tip.  Tips are numbered across tip_racks, in column order
+    within each rack, and are taken starting at first_tip.  Each batch uses
+    fresh tips from one column, or a whole unused rack for the 96 head, and a
+    batch that does not fit in the rest of a rack is taken from the next one.
+    """
+    rack_size = len(PLATE_WELLS)
+    lines = [
+        f"async def {name}():",
+        f'    source = lh.deck.get_resource("{source}")',
+        f'    destination = lh.deck.get_resource("{destination}")',
+    ]
+    tip = first_tip
+    rack = None  # Index of the rack held by the tips variable
+    for batch in batches:
+        if batch.head96:
+            n = rack_size
+            # Take a full rack
+            tip += -tip % rack_size
+        else:
+            n = len(batch.transfers)
+            if (tip % len(ROWS)) + n > len(ROWS):
+                # Take the batch's tips from one column
+                tip += len(ROWS) - tip % len(ROWS)
+        if tip + n > len(tip_racks) * rack_size:
+            raise ValueError(
+                f"{name} needs more tips than the {len(tip_racks)} tip rack(s) {tip_racks} hold"
+            )
+        if tip // rack_size != rack:
+            rack = tip // rack_size
+            lines += [f'    tips = lh.deck.get_resource("{tip_racks[rack]}")']
+        position = tip % rack_size
+        tip += n
+        if batch.head96:
+            volume = batch.transfers[0].volume
+            lines += [
+                "    await lh.pick_up_tips96(tips)",
+                f"    await lh.aspirate96(source, volume={volume})",
+                f"    await lh.dispense96(destination, volume={volume})",
+                "    await lh.discard_tips96()",
+            ]
+            continue
+        tip_spots = PLATE_WELLS[position : position + n]
+        channels = batch.channels
+        volumes = [t.volume for t in batch.transfers]
+        lines += [
+            f"    await lh.pick_up_tips({wells_expression('tips', tip_spots)}, use_channels={channels})",
+            f"    await lh.aspirate({wells_expression('source', [t.source for t in batch.transfers])}, vols={volumes}, use_channels={channels})",
+            f"    await lh.dispense({wells_expression('destination', [t.destination for t in batch.transfers])}, vols={volumes}, use_channels={channels})",
+            f"    await lh.discard_tips()",
+        ]
+    return "\n".join(lines) + "\n", tip
+
+
+class HeadSimulator(object):
+    """
+    Performs batches of transfers with a head of the given number of
+    channels, checking that each batch is possible, and counts the moves of
+    the head (picking up tips, aspirating, dispensing, and discarding tips).
+    """
+
+    def __init__(self, channels: int = 8):
+        self.channels = channels
+        self.moves = 0
+        self.tips = 0
+        self.volumes: Dict[str, float] = {}  # net volume change by well
+
+    def move(self):
+        self.moves += 1
+
+    def run(self, batches: List[TransferBatch]) -> "HeadSimulator":
+        for batch in batches:
+            self.check(batch)
+            self.tips += len(PLATE_WELLS) if batch.head96 else len(batch.transfers)
+            self.move()  # pick up tips
+            self.move()  # aspirate
+            for t in batch.transfers:
+                self.volumes[f"source:{t.source}"] = (
+                    self.volumes.get(f"source:{t.source}", 0.0) - t.volume
+                )
+            self.move()  # dispense
+            for t in batch.transfers:
+                self.volumes[f"destination:{t.destination}"] = (
+                    self.volumes.get(f"destination:{t.destination}", 0.0) + t.volume
+                )
+            self.move()  # discard tips
+        return self
+
+    def check(self, batch: TransferBatch):
+        if batch.head96:
+            if self.channels < len(PLATE_WELLS) or not _is_plate_copy(batch.transfers):
+                raise ValueError("The head cannot transfer a whole plate at once")
+            return
+        if len(batch.transfers) > self.channels:
+            raise ValueError(
+                f"A batch of {len(batch.transfers)} transfers needs more than {self.channels} channels"
+            )
+        for wells in [
+            [t.source for t in batch.transfers],
+            [t.destination for t in batch.transfers],
+        ]:
+            rows_cols = [coordinate_to_row_col(w) for w in wells]
+            if len({c for _, c in rows_cols}) > 1:
+                raise ValueError(f"Channels cannot reach wells {wells} at once")
+            rows = [r for r, _ in rows_cols]
+            if rows != sorted(set(rows)):
+                raise ValueError(f"Channels cannot reach wells {wells} in order")
@@ -152,3 +152,8 @@ def And(elements):
     name = "and"  # TODO use a more descriptive name
     ordered_elements = [_orderedPropertyValue(i, e) for i, e in enumerate(elements)]
     return labopt.AndConstraint(constrained_elements=ordered_elements)
+
+
+## Scheduling
+
+from labop_time.scheduler import *
@@ -0,0 +1,477 @@
+"""
+Schedule the steps of a Protocol with a Simple Temporal Network (STN).
+
+Each ActivityNode has a start and an end timepoint.  The network constrains
+the difference between pairs of timepoints:
+
+- a node's duration, from a DurationModel or a DurationConstraint,
+- each ActivityEdge, so that the target starts after the source ends, except
+  for the back-edges of loops (see labop.execution.loop_compaction), so that
+  a loop is scheduled as one iteration,
+- the TimeConstraints in the document (startTime, endTime, duration, and
+  precedes), and
+- the protocol, which starts at or after the origin (time zero) and ends
+  after all of its nodes.
+
+Bounds are computed with a queue-based Bellman-Ford search from the origin,
+which also detects inconsistent constraints (negative cycles).  New
+constraints can be added incrementally, relaxing only the timepoints whose
+bounds change.  All times are in seconds.
+"""
+
+import logging
+import math
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import sbol3
+
+import labop_time as labopt
+import uml
+
+__all__ = [
+    "INFINITY",
+    "DurationModel",
+    "InconsistentConstraints",
+    "ProtocolScheduler",
+    "Schedule",
+    "SimpleTemporalNetwork",
+    "interval_to_seconds",
+    "measure_to_seconds",
+]
+
+l: logging.Logger = logging.getLogger(__file__)
+
+INFINITY = math.inf
+
+OM = "http://www.ontology-of-units-of-measure.org/resource/om-2/"
+SECONDS_PER_UNIT = {
+    f"{OM}millisecond-Time": 0.001,
+    f"{OM}second-Time": 1.0,
+    f"{OM}minute-Time": 60.0,
+    f"{OM}hour": 3600.0,
+    f"{OM}day": 86400.0,
+}
+
+Interval = Tuple[float, float]
+
+
+class InconsistentConstraints(Exception):
+    pass
+
+
+def measure_to_seconds(measure: sbol3.Measure) -> float:
+    unit = str(measure.unit)
+    if unit not in SECONDS_PER_UNIT:
+        raise ValueError(f"Cannot convert {measure.value} {unit} to seconds")
+    return float(measure.value) * SECONDS_PER_UNIT[unit]
+
+
+def interval_to_seconds(interval: uml.Interval) -> Interval:
+    """Seconds for the min and max TimeExpressions of a TimeInterval or DurationInterval"""
+    return tuple(
+        measure_to_seconds(bound.expr.expr) for bound in [interval.min, interval.max]
+    )
+
+
+class SimpleTemporalNetwork(object):
+    """
+    Timepoints and difference constraints lower <= t[j] - t[i] <= upper.
+    Timepoint 0 is the origin.
+    """
+
+    ORIGIN = 0
+
+    def __init__(self):
+        self.names: List[str] = ["origin"]
+        self.successors: List[Dict[int, float]] = [{}]  # i -> j: t[j] - t[i] <= w
+        self.predecessors: List[Dict[int, float]] = [{}]
+        self._upper: Optional[List[float]] = None
+        self._lower_distance: Optional[List[float]] = None
+        self._lower_parent: Optional[List[Optional[int]]] = None
+
+    def add_timepoint(self, name: str) -> int:
+        self.names.append(name)
+        self.successors.append({})
+        self.predecessors.append({})
+        if self._upper is not None:
+            self._upper.append(INFINITY)
+            self._lower_distance.append(INFINITY)
+            self._lower_parent.append(None)
+        return len(self.names) - 1
+
+    def add_constraint(
+        self, i: int, j: int, lower: float = -INFINITY, upper: float = INFINITY
+    ):
+        """Constrain lower <= t[j] - t[i] <= upper"""
+        if upper < INFINITY:
+            self._add_edge(i, j, upper)
+        if lower > -INFINITY:
+            self._add_edge(j, i, -lower)
+
+    def _add_edge(self, i: int, j: int, w: float):
+        if w >= self.successors[i].get(j, INFINITY):
+            return  # An existing constraint is at least as tight
+        self.successors[i][j] = w
+        self.predecessors[j][i] = w
+        if self._upper is not None:
+            # Incremental update: only distances through the new edge can decrease
+            if self._upper[i] + w < self._upper[j]:
+                self._upper[j] = self._upper[i] + w
+                self._relax(self._upper, None, self.successors, deque([j]))
+            if self._lower_distance[j] + w < self._lower_distance[i]:
+                self._lower_distance[i] = self._lower_distance[j] + w
+                self._lower_parent[i] = j
+                self._relax(
+                    self._lower_distance,
+                    self._lower_parent,
+                    self.predecessors,
+                    deque([i]),
+                )
+
+    def _relax(
+        self,
+        distance: List[float],
+        parent: Optional[List[Optional[int]]],
+        edges: List[Dict[int, float]],
+        queue: deque,
+    ):
+        """Queue-based Bellman-Ford from the timepoints in queue"""
+        n = len(distance)
+        queued = [False] * n
+        relaxations = [0] * n
+        for i in queue:
+            queued[i] = True
+        while queue:
+            i = queue.popleft()
+            queued[i] = False
+            d = distance[i]
+            for j, w in edges[i].items():
+                if d + w < distance[j]:
+                    distance[j] = d + w
+                    if parent is not None:
+                        parent[j] = i
+                    if not queued[j]:
+                        relaxations[j] += 1
+                        if relaxations[j] > n:
+                            self._upper = None
+                            raise InconsistentConstraints(
+                                f"Temporal constraints are inconsistent at {self.names[j]}"
+                            )
+                        queued[j] = True
+                        queue.append(j)
+
+    def solve(self):
+        """Compute the bounds of every timepoint relative to the origin"""
+        n = len(self.names)
+        upper = [INFINITY] * n
+        lower_distance = [INFINITY] * n
+        lower_parent: List[Optional[int]] = [None] * n
+        upper[self.ORIGIN] = 0.0
+        lower_distance[self.ORIGIN] = 0.0
+        self._upper = upper
+        self._lower_distance = lower_distance
+        self._lower_parent = lower_parent
+        self._relax(upper, None, self.successors, deque([self.ORIGIN]))
+        self._relax(
+            lower_distance, lower_parent, self.predecessors, deque([self.ORIGIN])
+        )
+        if upper[self.ORIGIN] < 0 or lower_distance[self.ORIGIN] < 0:
+            raise InconsistentConstraints("Temporal constraints are inconsistent")
+
+    def _solved(self):
+        if self._upper is None:
+            self.solve()
+
+    def earliest(self, i: int) -> float:
+        """Least time of timepoint i after the origin"""
+        self._solved()
+        return -self._lower_distance[i]
+
+    def latest(self, i: int) -> float:
+        """Greatest time of timepoint i after the origin"""
+        self._solved()
+        return self._upper[i]
+
+    def binding_predecessor(self, i: int) -> Optional[int]:
+        """The timepoint whose constraint determines the earliest time of i"""
+        self._solved()
+        return self._lower_parent[i]
+
+    def copy(self) -> "SimpleTemporalNetwork":
+        stn = SimpleTemporalNetwork()
+        stn.names = list(self.names)
+        stn.successors = [dict(s) for s in self.successors]
+        stn.predecessors = [dict(p) for p in self.predecessors]
+        if self._upper is not None:
+            stn._upper = list(self._upper)
+            stn._lower_distance = list(self._lower_distance)
+            stn._lower_parent = list(self._lower_parent)
+        return stn
+
+
+DurationFunction = Callable[[uml.CallBehaviorAction], Interval]
+
+
+class DurationModel(object):
+    """
+    Durations, in seconds, of the CallBehaviorActions for each behavior.  A
+    duration is an interval (min, max), or a function of the
+    CallBehaviorAction that returns an interval.  Actions that call a
+    Protocol without a duration take the duration of the Protocol's schedule.
+    """
+
+    def __init__(
+        self,
+        durations: Dict[str, Union[Interval, DurationFunction]] = None,
+        default: Interval = (0.0, 0.0),
+    ):
+        self.durations = durations if durations is not None else {}
+        self.default = default
+
+    def duration(self, node: uml.ActivityNode) -> Optional[Interval]:
+        """Duration of node, or None if it is the duration of a subprotocol"""
+        if not isinstance(node, uml.CallBehaviorAction):
+            return (0.0, 0.0)
+        duration = self.durations.get(str(node.behavior))
+        if duration is None:
+            return None
+        return duration(node) if callable(duration) else duration
+
+
+class Schedule(object):
+    """Earliest and latest start and end times, in seconds, of each node"""
+
+    def __init__(
+        self,
+        protocol: uml.Activity,
+        makespan: float,
+        earliest_start: Dict[str, float],
+        latest_start: Dict[str, float],
+        earliest_end: Dict[str, float],
+        latest_end: Dict[str, float],
+        critical_path: List[uml.ActivityNode],
+    ):
+        self.protocol = protocol
+        self.makespan = makespan
+        self.earliest_start = earliest_start
+        self.latest_start = latest_start
+        self.earliest_end = earliest_end
+        self.latest_end = latest_end
+        self.critical_path = critical_path
+
+    def slack(self, node: uml.ActivityNode) -> float:
+        return self.latest_start[node.identity] - self.earliest_start[node.identity]
+
+    def to_dict(self) -> Dict:
+        return {
+            "protocol": self.protocol.identity,
+            "makespan": self.makespan,
+            "nodes": {
+                n: {
+                    "earliest_start": self.earliest_start[n],
+                    "latest_start": self.latest_start[n],
+                    "earliest_end": self.earliest_end[n],
+                    "latest_end": self.latest_end[n],
+                }
+                for n in sorted(self.earliest_start)
+            },
+            "critical_path": [n.identity for n in self.critical_path],
+        }
+
+
+class ProtocolScheduler(object):
+    """
+    Builds the SimpleTemporalNetwork for a Protocol from its edges, a
+    DurationModel, and the TimeConstraints that refer to the protocol, and
+    computes its Schedule.
+
+    The latest times in the Schedule are those that do not delay the end of
+    the protocol beyond its earliest end.  The critical path is the chain of
+    nodes whose constraints determine the earliest end.
+    """
+
+    def __init__(
+        self,
+        durations: DurationModel = None,
+        time_constraints: List["labopt.TimeConstraints"] = None,
+    ):
+        self.durations = durations if durations is not None else DurationModel()
+        self.time_constraints = time_constraints
+        self._subprotocol_makespans: Dict[str, float] = {}
+
+    def constraints_for(self, protocol: uml.Activity) -> List["labopt.TimeConstraints"]:
+        if self.time_constraints is not None:
+            candidates = self.time_constraints
+        elif protocol.document is not None:
+            candidates = [
+                o
+                for o in protocol.document.objects
+                if isinstance(o, labopt.TimeConstraints)
+            ]
+        else:
+            candidates = []
+        return [
+            tc
+            for tc in candidates
+            if len(tc.protocols) == 0
+            or protocol.identity in [str(p) for p in tc.protocols]
+        ]
+
+    def build(self, protocol: uml.Activity):
+        """
+        The network for protocol, and the start and end timepoints of each node
+        (and of the protocol itself).
+        """
+        stn = SimpleTemporalNetwork()
+        timepoints: Dict[str, Tuple[int, int]] = {}
+        protocol_start = stn.add_timepoint(f"{protocol.identity} start")
+        protocol_end = stn.add_timepoint(f"{protocol.identity} end")
+        timepoints[protocol.identity] = (protocol_start, protocol_end)
+        stn.add_constraint(stn.ORIGIN, protocol_start, lower=0.0)
+        stn.add_constraint(protocol_start, protocol_end, lower=0.0)
+
+        owners: Dict[str, str] = {}  # pin -> action
+        for node in protocol.nodes:
+            start = stn.add_timepoint(f"{node.identity} start")
+            end = stn.add_timepoint(f"{node.identity} end")
+            timepoints[node.identity] = (start, end)
+            stn.add_constraint(protocol_start, start, lower=0.0)
+            stn.add_constraint(end, protocol_end, lower=0.0)
+            duration = self.node_duration(node)
+            stn.add_constraint(start, end, lower=duration[0], upper=duration[1])
+            if isinstance(node, uml.Action):
+                for pin in list(node.inputs) + list(node.outputs):
+                    owners[pin.identity] = node.identity
+
+        # labop must be imported before labop_time, so not by this module
+        from labop.execution.loop_compaction import find_loops
+
+        # A loop's back-edge would constrain its header to start after itself
+        back_edges = {e for loop in find_loops(protocol) for e in loop.back_edges}
+        for edge in protocol.edges:
+            if edge.identity in back_edges:
+                continue
+            source = owners.get(str(edge.source), str(edge.source))
+            target = owners.get(str(edge.target), str(edge.target))
+            if source in timepoints and target in timepoints and source != target:
+                stn.add_constraint(
+                    timepoints[source][1], timepoints[target][0], lower=0.0
+                )
+
+        for tc in self.constraints_for(protocol):
+            for constraint in tc.constraints:
+                self.add_time_constraint(stn, timepoints, constraint, protocol)
+        return stn, timepoints
+
+    def node_duration(self, node: uml.ActivityNode) -> Interval:
+        duration = self.durations.duration(node)
+        if duration is not None:
+            return duration
+        behavior = node.behavior.lookup()
+        if isinstance(behavior, uml.Activity):
+            if behavior.identity not in self._subprotocol_makespans:
+                self._subprotocol_makespans[behavior.identity] = self.schedule(
+                    behavior
+                ).makespan
+            makespan = self._subprotocol_makespans[behavior.identity]
+            return (makespan, makespan)
+        return self.durations.default
+
+    def _element_timepoints(
+        self, timepoints, element: str, protocol: uml.Activity
+    ) -> List[Tuple[int, int]]:
+        """Timepoints of an element: a node, the protocol, or each call of a behavior"""
+        if element in timepoints:
+            return [timepoints[element]]
+        return [
+            timepoints[n.identity]
+            for n in protocol.nodes
+            if isinstance(n, uml.CallBehaviorAction) and str(n.behavior) == element
+        ]
+
+    def add_time_constraint(self, stn, timepoints, constraint, protocol):
+        if isinstance(constraint, labopt.AndConstraint):
+            for c in constraint.constrained_elements:
+                self.add_time_constraint(stn, timepoints, c.property_value, protocol)
+            return
+        if not isinstance(constraint, (uml.TimeConstraint, uml.DurationConstraint)):
+            l.warning(f"Ignoring unsupported time constraint {constraint.identity}")
+            return
+
+        elements = [
+            str(e.property_value)
+            for e in sorted(constraint.constrained_elements, key=lambda e: e.index)
+        ]
+        first_events = constraint.firstEvent
+        if not isinstance(first_events, (list, tuple)) and not hasattr(
+            first_events, "__iter__"
+        ):
+            first_events = [first_events] if first_events is not None else []
+        first = [
+            f.property_value.value for f in sorted(first_events, key=lambda f: f.index)
+        ]
+        lower, upper = interval_to_seconds(constraint.specification)
+
+        if isinstance(constraint, uml.TimeConstraint):
+            # Time of the start (or end) of an element, relative to the origin
+            for start, end in self._element_timepoints(
+                timepoints, elements[0], protocol
+            ):
+                point = start if (first[0] if first else True) else end
+                stn.add_constraint(stn.ORIGIN, point, lower=lower, upper=upper)
+        elif len(elements) == 1:
+            # Duration of an element
+            for start, end in self._element_timepoints(
+                timepoints, elements[0], protocol
+            ):
+                stn.add_constraint(start, end, lower=lower, upper=upper)
+        else:
+            # Duration between events of two elements (e.g., precedes)
+            for s1, e1 in self._element_timepoints(timepoints, elements[0], protocol):
+                for s2, e2 in self._element_timepoints(
+                    timepoints, elements[1], protocol
+                ):
+                    p1 = s1 if first[0] else e1
+                    p2 = s2 if first[1] else e2
+                    stn.add_constraint(p1, p2, lower=lower, upper=upper)
+
+    def schedule(self, protocol: uml.Activity) -> Schedule:
+        stn, timepoints = self.build(protocol)
+        stn.solve()
+        protocol_start, protocol_end = timepoints[protocol.identity]
+        makespan = stn.earliest(protocol_end)
+
+        # Latest times that keep the earliest end of the protocol
+        tight = stn.copy()
+        tight.add_constraint(tight.ORIGIN, protocol_end, upper=makespan)
+
+        nodes = {n.identity: n for n in protocol.nodes}
+        earliest_start, latest_start, earliest_end, latest_end = {}, {}, {}, {}
+        for identity, (start, end) in timepoints.items():
+            earliest_start[identity] = stn.earliest(start)
+            earliest_end[identity] = stn.earliest(end)
+            latest_start[identity] = tight.latest(start)
+            latest_end[identity] = tight.latest(end)
+
+        owner = {tp: identity for identity, tps in timepoints.items() for tp in tps}
+        critical_path = []
+        tp = stn.binding_predecessor(protocol_end)
+        while tp is not None and tp != stn.ORIGIN:
+            node = nodes.get(owner.get(tp))
+            if node is not None and (
+                not critical_path or critical_path[-1] is not node
+            ):
+                critical_path.append(node)
+            tp = stn.binding_predecessor(tp)
+        critical_path.reverse()
+
+        return Schedule(
+            protocol,
+            makespan,
+            earliest_start,
+            latest_start,
+            earliest_end,
+            latest_end,
+            critical_path,
+        )
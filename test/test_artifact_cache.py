@@ -0,0 +1,116 @@
+import os
+import tempfile
+import unittest
+
+import sbol3
+
+import labop
+from labop.execution.artifact_cache import entry_point_digest
+from labop.execution.harness import (
+    ProtocolExecutionNTuples,
+    ProtocolHarness,
+    ProtocolNTuples,
+)
+
+
+def generate_protocol(doc: sbol3.Document, protocol: labop.Protocol) -> labop.Protocol:
+    primitive = labop.Primitive("cache_primitive")
+    doc.add(primitive)
+    protocol.primitive_step(primitive)
+    protocol.primitive_step(primitive)
+    return protocol
+
+
+class TestArtifactCache(unittest.TestCase):
+    def harness(self, output_dir: str, description: str) -> ProtocolHarness:
+        namespace = "http://bbn.com/scratch/"
+        protocol_artifact = ProtocolNTuples(
+            namespace=namespace,
+            protocol_name="cache_protocol",
+            protocol_long_name="cache protocol",
+            protocol_version="1.0",
+            protocol_description=description,
+        )
+        execution_artifact = ProtocolExecutionNTuples(
+            protocol_artifact=protocol_artifact,
+            agent="test_agent",
+            execution_id="test_execution",
+            parameter_values=[],
+            specializations=[],
+            dataset_filename=os.path.join(output_dir, "cache_protocol.data.xslx"),
+            execution_kwargs={"track_samples": False},
+        )
+        return ProtocolHarness(
+            namespace=namespace,
+            protocol_name="cache_protocol",
+            protocol_description=description,
+            base_dir=output_dir,
+            output_dir="artifacts",
+            entry_point=generate_protocol,
+            base_artifacts=[protocol_artifact, execution_artifact],
+            clean_output=True,
+            use_cache=True,
+        )
+
+    def test_unchanged_artifacts_are_not_regenerated(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            first = self.harness(output_dir, "first")
+            first.run()
+            self.assertEqual(first.up_to_date, [])
+            self.assertEqual(len(first.errors()), 0)
+            execution_file = first.base_artifacts[1].filename
+            with open(execution_file) as f:
+                execution_ntuples = f.read()
+
+            second = self.harness(output_dir, "first")
+            second.run()
+            self.assertEqual(
+                second.up_to_date, ["0_ProtocolNTuples", "1_ProtocolExecutionNTuples"]
+            )
+            self.assertIsNone(second.base_artifacts[1].execution)
+            self.assertEqual(
+                [a.status for a in second.base_artifacts],
+                [a.status for a in first.base_artifacts],
+            )
+            with open(execution_file) as f:
+                self.assertEqual(f.read(), execution_ntuples)
+
+            # Missing outputs are regenerated, with the artifacts they depend upon
+            os.remove(execution_file)
+            third = self.harness(output_dir, "first")
+            third.run()
+            self.assertEqual(third.up_to_date, [])
+            self.assertIsNotNone(third.base_artifacts[1].execution)
+            self.assertTrue(os.path.exists(execution_file))
+
+            # Changing the harness inputs regenerates every artifact
+            fourth = self.harness(output_dir, "second")
+            fourth.run()
+            self.assertEqual(fourth.up_to_date, [])
+
+    def test_entry_point_digest_includes_local_imports(self):
+        with tempfile.TemporaryDirectory() as source_dir:
+
+            def write(filename, source):
+                with open(os.path.join(source_dir, filename), "w") as f:
+                    f.write(source)
+
+            write(
+                "cache_entry.py",
+                "def generate_protocol(doc, protocol):\n"
+                "    from cache_helper import steps\n",
+            )
+            write("cache_helper.py", "steps = 2\n")
+            loader = labop.execution.harness.ProtocolLoader(
+                os.path.join(source_dir, "cache_entry.py"), "generate_protocol"
+            )
+            digest = entry_point_digest(loader.generate_protocol)
+            self.assertEqual(entry_point_digest(loader.generate_protocol), digest)
+
+            # Editing an imported module changes the digest
+            write("cache_helper.py", "steps = 3\n")
+            self.assertNotEqual(entry_point_digest(loader.generate_protocol), digest)
+
+
+if __name__ == "__main__":
+    unittest.main()
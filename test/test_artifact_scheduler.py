@@ -0,0 +1,76 @@
+import threading
+import time
+import unittest
+
+from labop.execution.artifact_scheduler import ArtifactScheduler
+
+
+class TestArtifactScheduler(unittest.TestCase):
+    def run_artifacts(self, max_workers, dependencies, exclusive=set()):
+        order = []
+        running = set()
+        overlaps = []
+        lock = threading.Lock()
+
+        def task(artifact):
+            with lock:
+                overlaps.append((artifact, set(running)))
+                running.add(artifact)
+                order.append(artifact)
+            time.sleep(0.02)
+            with lock:
+                running.remove(artifact)
+
+        timings = ArtifactScheduler(max_workers=max_workers).run(
+            list(dependencies.keys()), dependencies, exclusive, task
+        )
+        return order, dict(overlaps), timings
+
+    def test_single_worker_preserves_priority_order(self):
+        dependencies = {"ntuples": [], "diagram": ["ntuples"], "rubric": ["ntuples"]}
+        order, _, timings = self.run_artifacts(1, dependencies)
+        self.assertEqual(order, ["ntuples", "diagram", "rubric"])
+        self.assertEqual(set(timings.keys()), set(dependencies.keys()))
+
+    def test_dependencies_and_exclusive_artifacts(self):
+        dependencies = {
+            "ntuples": [],
+            "diagram": ["ntuples"],
+            "rubric": ["ntuples"],
+            "execution": ["ntuples"],
+            "execution_diagram": ["execution"],
+            "sample_trace": ["execution"],
+        }
+        order, overlaps, _ = self.run_artifacts(
+            4, dependencies, exclusive={"ntuples", "execution"}
+        )
+        for artifact, deps in dependencies.items():
+            for d in deps:
+                self.assertLess(order.index(d), order.index(artifact))
+        self.assertEqual(overlaps["ntuples"], set())
+        self.assertEqual(overlaps["execution"], set())
+        self.assertEqual(overlaps["rubric"], {"diagram"})
+        self.assertEqual(overlaps["sample_trace"], {"execution_diagram"})
+
+    def test_error_stops_scheduling(self):
+        order = []
+
+        def task(artifact):
+            order.append(artifact)
+            if artifact == "diagram":
+                raise RuntimeError(artifact)
+
+        dependencies = {"ntuples": [], "diagram": ["ntuples"], "rubric": ["ntuples"]}
+        with self.assertRaises(RuntimeError):
+            ArtifactScheduler(max_workers=1).run(
+                list(dependencies.keys()), dependencies, set(), task
+            )
+        self.assertEqual(order, ["ntuples", "diagram"])
+
+    def test_unsatisfiable_dependencies(self):
+        with self.assertRaises(ValueError):
+            self.run_artifacts(2, {"a": ["b"], "b": ["a"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
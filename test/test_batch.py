@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+
+from labop.execution.batch import (
+    BatchRunner,
+    ProtocolRunStatus,
+    discover_example_protocols,
+)
+
+PROTOCOL = """
+import sbol3
+
+import labop
+from labop.execution.harness import ProtocolHarness
+
+
+def generate_protocol(doc: sbol3.Document, protocol: labop.Protocol) -> labop.Protocol:
+    primitive = labop.Primitive("batch_primitive")
+    subprotocol = labop.Protocol("{name}_subprotocol")
+    doc.add(primitive)
+    doc.add(subprotocol)
+    protocol.primitive_step(primitive)
+    protocol.primitive_step(subprotocol)
+    return protocol
+
+
+if __name__ == "__main__":
+    harness = ProtocolHarness(
+        namespace="http://bbn.com/scratch/",
+        protocol_name="{name}",
+        entry_point=generate_protocol,
+        execution_id="test_execution",
+        execution_kwargs={{"track_samples": False}},
+    )
+"""
+
+FAILING_PROTOCOL = """
+import labop
+
+protocol = labop.Protocol("failing_protocol")
+raise ValueError("Cannot build protocol")
+"""
+
+
+class TestBatchRunner(unittest.TestCase):
+    def test_batch(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            protocol_dir = os.path.join(tmp, "protocols")
+            os.makedirs(os.path.join(protocol_dir, "nested"))
+            files = {
+                "first.py": PROTOCOL.format(name="first"),
+                "nested/second.py": PROTOCOL.format(name="second"),
+                "failing.py": FAILING_PROTOCOL,
+                "not_a_protocol.py": "x = 1\n",
+            }
+            for name, source in files.items():
+                with open(os.path.join(protocol_dir, name), "w") as f:
+                    f.write(source)
+
+            filenames = sorted(discover_example_protocols(protocol_dir))
+            self.assertEqual(
+                [os.path.relpath(f, protocol_dir) for f in filenames],
+                ["failing.py", "first.py", "nested/second.py"],
+            )
+
+            report = BatchRunner(os.path.join(tmp, "out"), max_workers=2).run(filenames)
+            protocols = {
+                os.path.relpath(p["filename"], protocol_dir): p
+                for p in report["protocols"]
+            }
+            self.assertEqual(protocols["failing.py"]["status"], ProtocolRunStatus.ERROR)
+            self.assertIn("Cannot build protocol", protocols["failing.py"]["exception"])
+
+            second = protocols["nested/second.py"]
+            self.assertGreater(second["seconds"], 0)
+            self.assertTrue(
+                second["output_dir"].endswith(os.path.join("nested", "second"))
+            )
+            harness = second["harnesses"]["harness"]
+            self.assertEqual(harness["protocol_name"], "second")
+            statuses = {a["artifact"]: a["status"] for a in harness["artifacts"]}
+            self.assertEqual(statuses["ProtocolNTuples"], ProtocolRunStatus.PASS)
+            self.assertEqual(
+                statuses["ProtocolExecutionNTuples"], ProtocolRunStatus.PASS
+            )
+            self.assertTrue(
+                os.path.exists(os.path.join(harness["output_dir"], "second.nt"))
+            )
+            self.assertEqual(sum(report["summary"].values()), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
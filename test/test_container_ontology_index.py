@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+
+import tyto
+
+import labop
+from labop_convert.behavior_specialization import ContO, DefaultBehaviorSpecialization
+from labop_convert.container_ontology_index import ContainerOntologyIndex
+
+PLATE_CLASS = f"{ContO.uri}#Corning96WellPlate360uLFlat"
+
+
+class TestContainerOntologyIndex(unittest.TestCase):
+    def test_matches_ontology_queries(self):
+        index = ContainerOntologyIndex.build()
+        for term in list(index.instances) + list(index.labels):
+            try:
+                instances = sorted(tyto.URI(term, ContO).get_instances())
+            except Exception:
+                instances = []
+            assert index.get_instances(term) == instances, term
+        for term, label in index.labels.items():
+            assert label == ContO.get_term_by_uri(term), term
+        assert index.get_term("96 well microplate") == str(ContO["96 well microplate"])
+
+    def test_filter_instances(self):
+        index = ContainerOntologyIndex.build()
+        plates = index.get_instances(f"{ContO.uri}#ThermoFisher_EnduraPlate_96Well")
+        red = index.filter_instances(
+            f"{ContO.uri}#ThermoFisher_EnduraPlate_96Well", hasColor="cont:red"
+        )
+        assert len(plates) == 5
+        assert red == [f"{ContO.uri}#EnduraPlate_96Well_Red"]
+        assert index.get_property(red[0], "hasCatalogEntry") == [
+            f"{ContO.uri}#tf4483350"
+        ]
+
+    def test_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        index = ContainerOntologyIndex.load(cache_dir=cache_dir)
+        cached = os.listdir(cache_dir)
+        assert len(cached) == 1 and cached[0].endswith(".pickle")
+        loaded = ContainerOntologyIndex.load(cache_dir=cache_dir)
+        assert loaded.instances == index.instances
+        assert loaded.labels == index.labels
+
+    def test_resolve_container_spec(self):
+        specialization = DefaultBehaviorSpecialization()
+        spec = labop.ContainerSpec(
+            "plate", queryString="cont:Corning96WellPlate360uLFlat"
+        )
+        assert specialization.resolve_container_spec(spec) == [PLATE_CLASS]
+        assert (
+            specialization.get_container_typename(PLATE_CLASS)
+            == "Corning 96 Well Plate 360 uL Flat"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,12 +7,14 @@ import sbol3
 
 # from labop.utils.helpers import file_diff
 import labop
+from labop.execution.execution_engine import ExecutionEngine
 from labop.execution.harness import (
     ProtocolExecutionRubric,
     ProtocolHarness,
     ProtocolLoader,
 )
-from uml import ActivityParameterNode, CallBehaviorAction, InputPin
+from uml import ActivityParameterNode, CallBehaviorAction, InputPin, literal
+from uml.strings import DECISION_ELSE
 
 # OUT_DIR = os.path.join(os.path.dirname(__file__), "out")
 # if not os.path.exists(OUT_DIR):
@@ -226,5 +228,64 @@ class TestProtocolEndToEnd(unittest.TestCase):
         )
 
 
+class TestDecisionDispatch(unittest.TestCase):
+    def branch_protocol(self, choice: str):
+        """A decision on the value of Choose, with branches for "a", "b", and else"""
+        protocol, doc = labop.Protocol.initialize_protocol()
+        choose = labop.Primitive("Choose")
+        choose.add_output("return", "http://www.w3.org/2001/XMLSchema#string")
+        doc.add(choose)
+        choose.compute_output = (
+            lambda inputs, parameter, sample_format, record_hash, engine: choice
+        )
+
+        decision = protocol.make_decision_node(
+            protocol.initial(), decision_input_behavior=choose
+        )
+        for guard in ["a", "b", DECISION_ELSE]:
+            branch = labop.Primitive(f"Branch_{guard.split('#')[-1]}")
+            doc.add(branch)
+            action = CallBehaviorAction(behavior=branch)
+            protocol.nodes.append(action)
+            decision.add_decision_output(protocol, guard, action)
+        return protocol, decision
+
+    def executed_branches(self, choice: str, **engine_args):
+        protocol, _ = self.branch_protocol(choice)
+        ee = ExecutionEngine(
+            use_ordinal_time=True,
+            track_samples=False,
+            failsafe=False,
+            evaluate_guards=True,
+            **engine_args,
+        )
+        ex = ee.execute(protocol, sbol3.Agent("test_agent"), parameter_values=[])
+        behaviors = [
+            r.get_node().get_behavior().display_id
+            for r in ex.executions
+            if isinstance(r.get_node(), CallBehaviorAction)
+        ]
+        return sorted(b for b in behaviors if b.startswith("Branch_"))
+
+    def test_compiled_guards(self):
+        protocol, decision = self.branch_protocol("b")
+        dispatch = decision.compile_dispatch()
+        assert dispatch.has_decision_input
+        assert sorted(dispatch.roles.values()) == ["decision_input", "primary"]
+        assert (
+            dispatch.select(literal("a")).get_target().get_behavior().display_id
+            == "Branch_a"
+        )
+        assert dispatch.select(literal("z")) == dispatch.else_edge
+
+        for choice, branch in [
+            ("a", "Branch_a"),
+            ("b", "Branch_b"),
+            ("z", "Branch_else"),
+        ]:
+            assert self.executed_branches(choice) == [branch]
+            assert self.executed_branches(choice, compile_decisions=False) == [branch]
+
+
 if __name__ == "__main__":
     unittest.main()
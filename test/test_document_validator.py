@@ -0,0 +1,114 @@
+import gc
+import unittest
+import weakref
+
+import labop
+from labop.execution.validation import DocumentValidator, document_validator
+from uml import Action, ActivityParameterNode, ObjectFlow
+
+INTEGER = "http://www.w3.org/2001/XMLSchema#integer"
+
+
+def validated_protocol():
+    """A protocol with a primitive in its document, and validation warnings"""
+    protocol, doc = labop.Protocol.initialize_protocol(
+        display_id="validated",
+        name="validated",
+        namespace="https://bbn.com/scratch/",
+    )
+    produce = labop.Primitive("Produce")
+    produce.add_output("value", INTEGER)
+    doc.add(produce)
+    consume = labop.Primitive("Consume")
+    consume.add_input("value", INTEGER)
+    doc.add(consume)
+
+    source = protocol.primitive_step(produce)
+    for _ in range(2):
+        target = protocol.primitive_step(consume)
+        protocol.edges.append(
+            ObjectFlow(
+                source=source.output_pin("value"),
+                target=target.input_pin("value"),
+            )
+        )
+    protocol.nodes.append(ActivityParameterNode())
+    return protocol, doc, consume
+
+
+class TestDocumentValidator(unittest.TestCase):
+    def test_matches_document_validate(self):
+        doc = validated_protocol()[1]
+        expected = sorted(str(e) for e in doc.validate())
+        assert len(expected) > 0
+        report = DocumentValidator(doc).validate()
+        assert sorted(str(e) for e in report) == expected
+        assert len(report.errors) == len(doc.validate().errors)
+
+    def test_revalidates_modified_objects(self):
+        protocol, doc, consume = validated_protocol()
+        validator = DocumentValidator(doc)
+        validator.validate()
+        assert len(validator.validated) == len(doc.objects)
+
+        report = validator.validate()
+        assert validator.validated == []
+        issues = len(report)
+
+        # Only the modified protocol is validated again
+        protocol.order(protocol.final(), protocol.initial())
+        report = validator.validate()
+        assert validator.validated == [protocol.identity]
+        assert len(report) == issues + 1
+        assert sorted(str(e) for e in report) == sorted(str(e) for e in doc.validate())
+
+        # The protocol calls the modified primitive
+        consume.add_input("volume", INTEGER, optional=True)
+        validator.validate()
+        assert sorted(validator.validated) == sorted(
+            [protocol.identity, consume.identity]
+        )
+
+    def test_well_formedness(self):
+        protocol, doc, consume = validated_protocol()
+        validator = document_validator(doc)
+        assert document_validator(doc) is validator
+
+        issues = [str(i) for i in protocol.is_well_formed()]
+        assert validator.validated == [protocol.identity]
+        assert [str(i) for i in protocol.is_well_formed()] == issues
+        assert validator.validated == []
+
+        # A call without a value for a required input
+        protocol.primitive_step(consume)
+        missing = [str(i) for i in protocol.is_well_formed()]
+        assert validator.validated == [protocol.identity]
+        assert len(missing) == len(issues) + 1
+        assert any(
+            "InputPin must have an incoming ObjectFlow" in i
+            for i in set(missing) - set(issues)
+        )
+
+        # Actions find the same issues with the edge index of the Activity
+        incoming_edges = {}
+        for edge in protocol.edges:
+            incoming_edges.setdefault(str(edge.target), []).append(edge)
+        for node in protocol.nodes:
+            if isinstance(node, Action):
+                assert [str(i) for i in node.is_well_formed(incoming_edges, {})] == [
+                    str(i) for i in node.is_well_formed()
+                ]
+
+    def test_validator_does_not_keep_document(self):
+        doc = validated_protocol()[1]
+        validator = document_validator(doc)
+        assert "_labop_validator" not in doc.__dict__
+        reference = weakref.ref(doc)
+        del doc
+        gc.collect()
+        assert reference() is None
+        assert validator.document is None
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+
+import graphviz
+import sbol3
+import tyto
+
+import labop
+import uml
+from labop.execution.execution_engine import ExecutionEngine
+
+
+def nested_protocol():
+    """A protocol that calls a subprotocol twice and a primitive once"""
+    protocol, doc = labop.Protocol.initialize_protocol()
+    subprotocol = labop.Protocol.create_protocol(display_id="sub", name="sub")
+    doc.add(subprotocol)
+    primitive = labop.Primitive("primitive1")
+    doc.add(primitive)
+    subprotocol.primitive_step(primitive)
+
+    first = protocol.primitive_step(subprotocol)
+    step = protocol.primitive_step(primitive)
+    second = protocol.primitive_step(subprotocol)
+    protocol.order(first, step)
+    protocol.order(step, second)
+    return protocol, subprotocol, [first, step, second]
+
+
+class TestDotStream(unittest.TestCase):
+    def test_matches_digraph(self):
+        stream = uml.DotStream(name="cluster_x", graph_attr={"label": "x"})
+        digraph = graphviz.Digraph(name="cluster_x", graph_attr={"label": "x"})
+        for dot in [stream, digraph]:
+            dot.attr(compound="true")
+            dot.node("a:b", label="<<b>a</b>>", shape="none")
+            dot.edge("a:node", "c", "label", _attributes={"color": "red"})
+            with dot.subgraph(name="cluster_y", graph_attr={"label": "y"}) as sub:
+                sub.node("d")
+                with sub.subgraph(name="_root") as inner:
+                    inner.edge("d", "e")
+            dot.subgraph(graphviz.Digraph(name="cluster_z", body=["\tf\n"]))
+        self.assertEqual(stream.to_digraph().source, digraph.source)
+        self.assertEqual(stream.to_source().source, digraph.source)
+        self.assertEqual(stream.to_digraph().source, digraph.source)
+
+    def test_subprotocols_drawn_once(self):
+        protocol, subprotocol, _ = nested_protocol()
+        source = protocol.to_dot().source
+        # to_dot() still returns a Digraph, which can be drawn in another graph
+        dot = protocol.to_dot()
+        assert isinstance(dot, graphviz.Digraph)
+        parent = graphviz.Digraph()
+        parent.subgraph(dot)
+        assert f"subgraph cluster_{protocol.display_id}" in parent.source
+        sub_cluster = f"subgraph cluster_{subprotocol.display_id}"
+        assert source.count(sub_cluster) == 1
+        assert source.count(f"subgraph cluster_{protocol.display_id}") == 1
+
+    def test_depth_limit(self):
+        protocol, subprotocol, _ = nested_protocol()
+        source = protocol.to_dot(depth=0).source
+        assert f"subgraph cluster_{protocol.display_id}" in source
+        assert f"subgraph cluster_{subprotocol.display_id}" not in source
+
+    def test_node_view(self):
+        protocol, _, calls = nested_protocol()
+        source = protocol.to_dot(nodes=calls[:2], depth=0).source
+        labels = [c.label(namespace=protocol.namespace) for c in calls]
+        assert labels[0] in source and labels[1] in source
+        assert labels[2] not in source
+
+    def test_pin_owner(self):
+        protocol, doc = labop.Protocol.initialize_protocol()
+        primitive = labop.Primitive("primitive2")
+        primitive.add_input("x", sbol3.OM_MEASURE)
+        doc.add(primitive)
+        step = protocol.primitive_step(primitive, x=sbol3.Measure(1, tyto.OM.hour))
+        pin = step.input_pin("x")
+        # Views are drawn by Action, while unpin() (used by validate()) is unchanged
+        assert pin.pin_owner() is step
+        assert step.pin_owner() is step
+        assert pin.unpin() is pin
+
+    def test_execution(self):
+        protocol, subprotocol, calls = nested_protocol()
+        ee = ExecutionEngine(use_ordinal_time=True, track_samples=False)
+        ex = ee.execute(protocol, sbol3.Agent("test_agent"), parameter_values=[])
+
+        source = ex.to_dot().source
+        assert source.startswith(f'digraph "cluster_{ex.identity}"')
+        assert source.count(f"subgraph cluster_{subprotocol.display_id}") == 1
+        # Each call is labeled with its start and end time
+        for call in calls:
+            node = f'{call.label(namespace=ex.namespace)}:"node"'
+            assert f"{node} -> {node}" in source
+
+        shallow = ex.to_dot(depth=0).source
+        assert f"subgraph cluster_{subprotocol.display_id}" not in shallow
+        assert len(shallow) < len(source)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,16 +1,14 @@
-import glob
 import logging
 import os
-import re
 import unittest
 from importlib.machinery import SourceFileLoader
 from importlib.util import module_from_spec, spec_from_loader
 from types import ModuleType
-from typing import List
 
 from parameterized import parameterized
 
 from labop.execution import ProtocolHarness
+from labop.execution.batch import discover_example_protocols
 
 l = logging.Logger(__file__)
 l.setLevel(logging.INFO)
@@ -25,21 +23,6 @@ def load_protocol(testfile_path) -> ModuleType:
     return module
 
 
-def discover_example_protocols(example_directory: str) -> List[str]:
-    candidate_protocols = glob.glob(f"{example_directory}/**/*py", recursive=True)
-    actual_protocols = []
-    for p in candidate_protocols:
-        with open(p, "r") as f:
-            lines = f.readlines()
-            try:
-                if next(l for l in lines if re.match(".*Protocol\(.*\)", l)):
-                    actual_protocols.append(p)
-            except:
-                # Cannot find a Protocol
-                continue
-    return actual_protocols
-
-
 example_directory = os.path.join(os.path.dirname(__file__), f"../examples/")
 test_files = discover_example_protocols(example_directory)
 expected_failures = {
@@ -0,0 +1,83 @@
+import hashlib
+import threading
+import unittest
+import uuid
+
+import sbol3
+
+from labop.execution.id_allocator import UUID_SEED, IdAllocator, UUIDAllocator
+
+
+class TestIdAllocator(unittest.TestCase):
+    def test_sequential_ids(self):
+        allocator = IdAllocator("execute", block_size=4)
+        ids = [allocator.next_display_id() for _ in range(10)]
+        assert ids == [f"execute_{i}" for i in range(10)], ids
+
+    def test_for_document(self):
+        doc = sbol3.Document()
+        sbol3.set_namespace("https://bioprotocols.org/demo/")
+        assert IdAllocator.for_document("execute", doc).next_display_id() == "execute_0"
+        for display_id in ["execute_0", "execute_4", "execute_x", "var_7"]:
+            doc.add(sbol3.Collection(display_id))
+        assert IdAllocator.for_document("execute", doc).next_display_id() == "execute_5"
+        assert IdAllocator.for_document("var", doc).next_display_id() == "var_8"
+
+    def test_ids_per_execution(self):
+        # A reused engine names the records of each new document from 0
+        import labop
+        from labop.execution.execution_engine import ExecutionEngine
+
+        def call_ids(ee: ExecutionEngine) -> list:
+            protocol, _ = labop.Protocol.initialize_protocol(display_id="ids")
+            protocol.primitive_step(
+                "EmptyContainer", specification=labop.ContainerSpec("plate")
+            )
+            ex = ee.execute(
+                protocol, sbol3.Agent("agent"), id="ex", parameter_values=[]
+            )
+            return [
+                e.call.lookup().display_id for e in ex.executions if hasattr(e, "call")
+            ]
+
+        ee = ExecutionEngine(track_samples=False)
+        ids = call_ids(ee)
+        assert ids and ids == call_ids(ee) == call_ids(
+            ExecutionEngine(track_samples=False)
+        )
+
+    def test_invalid_prefix(self):
+        with self.assertRaises(ValueError):
+            IdAllocator("1execute")
+
+    def test_threads_do_not_collide(self):
+        allocator = IdAllocator("var", block_size=16)
+        allocated = []
+        lock = threading.Lock()
+
+        def worker():
+            ids = [allocator.next_index() for _ in range(1000)]
+            with lock:
+                allocated.extend(ids)
+
+        workers = [threading.Thread(target=worker) for _ in range(8)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        assert len(allocated) == len(set(allocated)) == 8000
+
+    def test_uuid_sequence(self):
+        # Matches the historical execution id sequence: md5 of the seed repeated n times
+        allocator = UUIDAllocator()
+        for n in range(1, 4):
+            expected = uuid.UUID(
+                hashlib.md5((UUID_SEED * n).encode("utf-8")).hexdigest()
+            )
+            assert allocator.next_uuid() == expected
+        display_id = allocator.next_display_id()
+        assert display_id.startswith("execution_") and "-" not in display_id
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import json
+import os
+import tempfile
+import tracemalloc
+import unittest
+
+import sbol3
+
+import labop
+from labop.execution.execution_engine import ExecutionEngine
+from labop.execution.harness import ProtocolExecutionProfile, ProtocolHarness
+from labop.execution.instrumentation import ExecutionInstrument, ExecutionProfiler
+
+
+def generate_protocol(doc: sbol3.Document, protocol: labop.Protocol) -> labop.Protocol:
+    primitive = labop.Primitive("profiled_primitive")
+    doc.add(primitive)
+    protocol.primitive_step(primitive)
+    protocol.primitive_step(primitive)
+    return protocol
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_profiler(self):
+        sbol3.set_namespace("https://bbn.com/scratch/")
+        doc = sbol3.Document()
+        protocol = labop.Protocol("profiled_protocol")
+        doc.add(protocol)
+        generate_protocol(doc, protocol)
+        primitive_uri = "https://bbn.com/scratch/profiled_primitive"
+
+        profiler = ExecutionProfiler()
+        ee = ExecutionEngine(
+            use_ordinal_time=True, track_samples=False, instruments=[profiler]
+        )
+        ee.execute(
+            protocol,
+            sbol3.Agent("test_agent"),
+            id="test_execution",
+            parameter_values=[],
+        )
+
+        report = profiler.report()
+        phases = report["phases"]
+        for phase in [
+            "execute_node",
+            "consume_tokens",
+            "next_tokens",
+            "check_next_tokens",
+            "post_process",
+            "specialization.DefaultBehaviorSpecialization",
+        ]:
+            self.assertEqual(phases[phase][primitive_uri]["count"], 2, phase)
+        self.assertIn("InitialNode", phases["execute_node"])
+        node_stats = phases["execute_node"][primitive_uri]
+        self.assertGreaterEqual(node_stats["seconds"], node_stats["self_seconds"])
+        self.assertGreater(report["peak_bytes"], 0)
+
+        stacks = profiler.folded_stacks()
+        self.assertIn(
+            f"execute_node[{primitive_uri}];post_process;specialization.DefaultBehaviorSpecialization",
+            [s.rsplit(" ", 1)[0] for s in stacks],
+        )
+        self.assertTrue(all(s.rsplit(" ", 1)[1].isdigit() for s in stacks))
+
+    def test_failed_execution_stops_tracing(self):
+        class FailingInstrument(ExecutionInstrument):
+            def on_begin(self, execution):
+                raise RuntimeError("on_begin failed")
+
+        sbol3.set_namespace("https://bbn.com/scratch/")
+        doc = sbol3.Document()
+        protocol = labop.Protocol("profiled_protocol")
+        doc.add(protocol)
+        generate_protocol(doc, protocol)
+
+        ee = ExecutionEngine(
+            use_ordinal_time=True,
+            track_samples=False,
+            instruments=[ExecutionProfiler(), FailingInstrument()],
+        )
+        self.assertFalse(tracemalloc.is_tracing())
+        with self.assertRaises(RuntimeError):
+            ee.execute(protocol, sbol3.Agent("test_agent"), parameter_values=[])
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_profile_artifact(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            harness = ProtocolHarness(
+                namespace="https://bbn.com/scratch/",
+                protocol_name="profiled_protocol",
+                base_dir=output_dir,
+                entry_point=generate_protocol,
+                execution_id="test_execution",
+                execution_kwargs={"track_samples": False},
+                artifacts=[ProtocolExecutionProfile(trace_memory=False)],
+            )
+            harness.run()
+            profile = harness.artifacts_of_type(ProtocolExecutionProfile)[0]
+            self.assertEqual(profile.status, "pass")
+            with open(profile.filename) as f:
+                report = json.load(f)
+            self.assertIn("execute_node", report["phases"])
+            self.assertTrue(os.path.exists(profile.outputs()[1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
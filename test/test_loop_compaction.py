@@ -0,0 +1,118 @@
+import unittest
+
+import sbol3
+
+import labop
+import uml
+from labop.execution.execution_engine import ExecutionEngine
+from labop.execution.loop_compaction import find_loops
+
+
+def loop_protocol(iterations: int):
+    """A protocol that loops through a MergeNode until LoopDone is True"""
+    protocol, doc = labop.Protocol.initialize_protocol()
+    count = {"iterations": 0}
+
+    loop_done = labop.Primitive("LoopDone")
+    loop_done.add_output("return", "http://www.w3.org/2001/XMLSchema#boolean")
+    doc.add(loop_done)
+
+    def loop_done_compute_output(inputs, parameter, sample_format, record_hash, engine):
+        count["iterations"] += 1
+        return count["iterations"] >= iterations
+
+    loop_done.compute_output = loop_done_compute_output
+
+    merge = uml.MergeNode()
+    protocol.nodes.append(merge)
+    protocol.edges.append(uml.ControlFlow(source=protocol.initial(), target=merge))
+    decision = protocol.make_decision_node(merge, decision_input_behavior=loop_done)
+    decision.add_decision_output(protocol, True, protocol.final())
+    decision.add_decision_output(protocol, False, merge)
+    return protocol, merge, count
+
+
+def execute_loop(iterations: int, **engine_args):
+    protocol, _, count = loop_protocol(iterations)
+    ee = ExecutionEngine(
+        use_ordinal_time=True,
+        track_samples=False,
+        failsafe=False,
+        evaluate_guards=True,
+        **engine_args,
+    )
+    ex = ee.execute(protocol, sbol3.Agent("test_agent"), parameter_values=[], id="ex")
+    assert count["iterations"] == iterations
+    return ee, ex
+
+
+class TestLoopCompaction(unittest.TestCase):
+    def test_find_loops(self):
+        protocol, merge, _ = loop_protocol(1)
+        loops = find_loops(protocol)
+        assert len(loops) == 1
+        assert loops[0].header == merge.identity
+        assert len(loops[0].back_edges) == 1
+        back_edge = next(e for e in protocol.edges if e.identity in loops[0].back_edges)
+        assert back_edge.get_target() == merge
+        assert protocol.final().identity not in loops[0].body
+
+    def test_loop_requires_guards(self):
+        protocol, _, _ = loop_protocol(1)
+        ee = ExecutionEngine(
+            use_ordinal_time=True,
+            track_samples=False,
+            failsafe=False,
+            evaluate_guards=False,
+        )
+        with self.assertRaises(Exception):
+            ee.execute(protocol, sbol3.Agent("test_agent"), parameter_values=[])
+        assert ExecutionEngine(
+            compact_loops=True, evaluate_guards=False
+        ).evaluate_guards
+
+    def test_uncompacted_trace_grows(self):
+        _, short = execute_loop(3)
+        _, long = execute_loop(6)
+        assert len(long.executions) > len(short.executions)
+
+    def test_compacted_trace_is_bounded(self):
+        sizes = []
+        for iterations in [5, 20]:
+            ee, ex = execute_loop(iterations, compact_loops=True)
+            sizes.append((len(ex.executions), len(ex.flows)))
+
+            summaries = ee.loop_compactor.summaries()
+            assert len(summaries) == 1
+            assert summaries[0].iterations == iterations
+            assert summaries[0].retained == [1, iterations]
+            assert summaries[0].compacted == iterations - 2
+            assert all(r.document is ex.document for r in summaries[0].last_records)
+
+            # The retained records are still connected by flows
+            for flow in ex.flows:
+                assert flow.token_source.lookup() in ex.executions
+            for record in ex.executions:
+                assert all(f.lookup() in ex.flows for f in record.incoming_flows)
+        assert sizes[0] == sizes[1]
+
+    def test_sampled_iterations(self):
+        ee, ex = execute_loop(12, compact_loops=True, loop_sample_every=5)
+        summary = ee.loop_compactor.summaries()[0]
+        assert summary.retained == [1, 5, 10, 12]
+
+        _, unsampled = execute_loop(12, compact_loops=True)
+        assert len(ex.executions) > len(unsampled.executions)
+
+    def test_transient_tokens(self):
+        sizes = []
+        for iterations in [5, 20]:
+            _, ex = execute_loop(iterations, compact_loops=True, transient_tokens=True)
+            sizes.append((len(ex.executions), len(ex.flows)))
+            for flow in ex.flows:
+                assert flow.token_source.lookup() in ex.executions
+        assert sizes[0] == sizes[1]
+
+
+if __name__ == "__main__":
+    unittest.main()
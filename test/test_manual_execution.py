@@ -0,0 +1,84 @@
+import sys
+import unittest
+
+import sbol3
+
+import labop
+from labop.execution.execution_engine import ManualExecutionEngine
+
+
+def manual_protocol(steps: int):
+    """A protocol of steps that each need a value read by hand"""
+    protocol, doc = labop.Protocol.initialize_protocol()
+    read_value = labop.Primitive("ReadValue")
+    read_value.add_output("value", "http://www.w3.org/2001/XMLSchema#integer")
+    doc.add(read_value)
+
+    calls = [protocol.primitive_step(read_value) for _ in range(steps)]
+    for previous, following in zip(calls, calls[1:]):
+        protocol.order(previous, following)
+    protocol.designate_output(
+        "value",
+        "http://www.w3.org/2001/XMLSchema#integer",
+        source=calls[-1].output_pin("value"),
+    )
+    return protocol, calls
+
+
+def start(protocol: labop.Protocol, **engine_args):
+    ee = ManualExecutionEngine(
+        use_ordinal_time=True, track_samples=False, failsafe=False, **engine_args
+    )
+    ee.initialize(protocol, sbol3.Agent("test_agent"), id="ex", parameter_values=[])
+    return ee, ee.run(protocol)
+
+
+class TestManualExecution(unittest.TestCase):
+    def test_step_through_protocol(self):
+        protocol, calls = manual_protocol(3)
+        ee, (ready, choices, _) = start(protocol)
+        for i, call in enumerate(calls):
+            assert ready == [call]
+            assert call.identity in choices
+            ready, choices, _ = ee.next(ready[0], node_output=lambda n, p: i)
+            assert ee.done == ee.ex.backtrace()[0]
+            assert call in ee.done
+        assert ready == []
+        assert list(ee.ready_rows) == []
+
+        ee.finalize(protocol, ee.execution_contexts[0])
+        assert [pv.value.get_value() for pv in ee.ex.parameter_values] == [2]
+
+    def test_frontier_graph(self):
+        protocol, calls = manual_protocol(5)
+        ee, (ready, _, graph) = start(protocol)
+        frontier = ee.frontier(ready)[protocol]
+        assert calls[0] in frontier and calls[1] in frontier
+        assert calls[2] not in frontier
+        assert calls[0].label(namespace=protocol.namespace) in graph.source
+        assert calls[2].label(namespace=protocol.namespace) not in graph.source
+
+        ready, _, graph = ee.next(ready[0], node_output=lambda n, p: 0)
+        assert calls[2].label(namespace=protocol.namespace) in graph.source
+        assert calls[3].label(namespace=protocol.namespace) not in graph.source
+
+    def test_whole_execution_graph(self):
+        protocol, calls = manual_protocol(5)
+        _, (_, _, graph) = start(protocol, frontier_radius=None)
+        for call in calls:
+            assert call.label(namespace=protocol.namespace) in graph.source
+
+    def test_backtrace_is_iterative(self):
+        protocol, calls = manual_protocol(2)
+        ee, (ready, _, _) = start(protocol)
+        while ready:
+            ready, _, _ = ee.next(ready[0], node_output=lambda n, p: 0)
+        records = list(ee.ex.executions)
+        stack = records * (sys.getrecursionlimit() // len(records) + 1)
+        nodes, extracted = ee.ex.backtrace(stack=stack)
+        assert nodes == {r.node.lookup() for r in records}
+        assert len(extracted) == len(stack)
+
+
+if __name__ == "__main__":
+    unittest.main()
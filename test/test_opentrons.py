@@ -12,6 +12,13 @@ from labop.execution.harness import ProtocolSpecialization
 from labop.utils.helpers import file_diff
 from labop_convert.opentrons import opentrons_specialization
 from labop_convert.opentrons.opentrons_specialization import OT2Specialization
+from labop_convert.opentrons.transfer_planner import (
+    RobotTimeModel,
+    Transfer,
+    Well,
+    naive_plan,
+    optimized_plan,
+)
 
 # Save testfiles as artifacts when running in CI environment,
 # else save them to a local temp directory
@@ -87,5 +94,91 @@ class TestProtocolEndToEnd(unittest.TestCase):
         )
 
 
+class TestTransferPlanner(unittest.TestCase):
+    def transfers(self, sources, destinations, volume):
+        return [
+            Transfer(Well("labware1", "1", s), Well("labware2", "2", d), volume)
+            for s in sources
+            for d in destinations
+        ]
+
+    def test_multi_dispense(self):
+        # Each source well to every destination well
+        transfers = self.transfers(["A1", "B1"], [f"C{c}" for c in range(1, 7)], 20)
+        naive = naive_plan(transfers, "p300_single")
+        plan = optimized_plan(transfers, "p300_single")
+        assert len(naive) == 12
+        assert len(plan) == 2
+        assert all(op.multi_dispense for op in plan)
+        assert (
+            plan[0]
+            .to_script("p300_single")
+            .startswith("p300_single.distribute(20, labware1['A1'], [labware2['C1'], ")
+        )
+
+        model = RobotTimeModel()
+        naive_estimate = model.estimate(naive, 300)
+        estimate = model.estimate(plan, 300)
+        assert naive_estimate.tips == 12 and estimate.tips == 2
+        assert estimate.aspirations == 2 and estimate.dispenses == 12
+        assert estimate.seconds < naive_estimate.seconds
+
+        # Volumes too large to multi-dispense reuse the tip for each source
+        transfers = self.transfers(["A1"], ["C1", "C2"], 200)
+        plan = optimized_plan(transfers, "p300_single")
+        assert len(plan) == 1 and not plan[0].multi_dispense
+        assert plan[0].to_script("p300_single").endswith("new_tip='once')")
+
+    def test_multichannel(self):
+        # Every row of column 1 to the same row of column 2
+        transfers = [
+            Transfer(Well("labware1", "1", f"{r}1"), Well("labware2", "2", f"{r}2"), 10)
+            for r in "ABCDEFGH"
+        ]
+        plan = optimized_plan(transfers, "p300_multi")
+        assert [op.to_script("p300_multi") for op in plan] == [
+            "p300_multi.transfer(10, labware1['A1'], labware2['A2'])"
+        ]
+        model = RobotTimeModel()
+        assert model.estimate(plan, 300).tips == 8
+        assert model.estimate(naive_plan(transfers, "p300_multi"), 300).tips == 64
+
+    def test_multichannel_with_single_wells(self):
+        # A whole column, and one more well that the single-channel pipette moves
+        transfers = [
+            Transfer(Well("labware1", "1", f"{r}1"), Well("labware2", "2", f"{r}2"), 10)
+            for r in "ABCDEFGH"
+        ] + [Transfer(Well("labware1", "1", "B3"), Well("labware2", "2", "C4"), 10)]
+        plan = optimized_plan(
+            transfers, "p300_multi", single_channel_pipette="p20_single"
+        )
+        assert sorted(op.to_script("p300_multi") for op in plan) == [
+            "p20_single.transfer(10, labware1['B3'], labware2['C4'])",
+            "p300_multi.transfer(10, labware1['A1'], labware2['A2'])",
+        ]
+        assert RobotTimeModel().estimate(plan, 300).tips == 9
+
+    def test_order_of_liquids_in_a_well(self):
+        # The source nearest the first destination adds its liquid to D2 last
+        d1, d2 = Well("labware2", "2", "A1"), Well("labware2", "2", "A2")
+        transfers = [
+            Transfer(Well("labware1", "1", "A6"), d1, 10),
+            Transfer(Well("labware1", "1", "A1"), d2, 10),
+            Transfer(Well("labware1", "1", "A12"), d2, 10),
+        ]
+        plan = optimized_plan(transfers, "p300_single")
+        assert [op.source.well for op in plan] == ["A6", "A1", "A12"]
+
+    def test_dependent_transfers(self):
+        # A well that is both a source and a destination keeps the naive order
+        transfers = self.transfers(["A1"], ["A2"], 10) + [
+            Transfer(Well("labware2", "2", "A2"), Well("labware2", "2", "A3"), 10)
+        ]
+        plan = optimized_plan(transfers, "p300_single")
+        assert [(op.source, op.destinations) for op in plan] == [
+            (t.source, [t.destination]) for t in transfers
+        ]
+
+
 if __name__ == "__main__":
     unittest.main()
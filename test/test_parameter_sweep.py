@@ -0,0 +1,191 @@
+import unittest
+from collections import Counter
+
+import sbol3
+import tyto
+
+import labop
+from labop.execution.execution_engine import ExecutionEngine
+from labop.execution.sweep import ParameterSweep, parameter_grid
+
+
+def absorbance_protocol():
+    """A protocol that provisions a volume into a plate and measures it at a wavelength"""
+    protocol, doc = labop.Protocol.initialize_protocol(display_id="sweep")
+    volume = protocol.input_value("volume", sbol3.OM_MEASURE)
+    wavelength = protocol.input_value("wavelength", sbol3.OM_MEASURE)
+    plate = protocol.primitive_step(
+        "EmptyContainer",
+        specification=labop.ContainerSpec(
+            "plate",
+            name="plate",
+            queryString="cont:Plate96Well",
+            prefixMap={
+                "cont": "https://sift.net/container-ontology/container-ontology#"
+            },
+        ),
+    )
+    wells = protocol.primitive_step(
+        "PlateCoordinates", source=plate.output_pin("samples"), coordinates="A1:B12"
+    )
+    water = sbol3.Component("water", sbol3.SBO_DNA)
+    doc.add(water)
+    protocol.primitive_step(
+        "Provision",
+        resource=water,
+        destination=wells.output_pin("samples"),
+        amount=volume,
+    )
+    measure = protocol.primitive_step(
+        "MeasureAbsorbance", samples=wells.output_pin("samples"), wavelength=wavelength
+    )
+    protocol.designate_output(
+        "absorbance",
+        "http://bioprotocols.org/labop#Dataset",
+        measure.output_pin("measurements"),
+    )
+    return protocol, doc
+
+
+def volumes_and_wavelengths():
+    return parameter_grid(
+        volume=[sbol3.Measure(v, tyto.OM.microliter) for v in [10, 20, 30]],
+        wavelength=[sbol3.Measure(w, tyto.OM.nanometer) for w in [600, 700]],
+    )
+
+
+def records_by_node(ex: labop.ProtocolExecution) -> Counter:
+    """The number of records of each node, with the nodes of the invocation named without the execution"""
+    return Counter(e.node.replace(ex.identity, "") for e in ex.executions)
+
+
+def call_values(ex: labop.ProtocolExecution, primitive: str, parameter: str) -> list:
+    """The values of a parameter of each call of a primitive"""
+    return [
+        pv.value.get_value().value
+        for e in ex.executions
+        if isinstance(e, labop.CallBehaviorExecution)
+        and e.node.lookup().behavior.endswith(f"/{primitive}")
+        for pv in e.call.lookup().parameter_values
+        if pv.parameter.lookup().property_value.name == parameter
+    ]
+
+
+class TestParameterSweep(unittest.TestCase):
+    def test_parameter_grid(self):
+        grid = parameter_grid(a=[1, 2], b=["x", "y", "z"])
+        assert len(grid) == 6
+        assert grid[0] == {"a": 1, "b": "x"}
+        assert grid[1] == {"a": 1, "b": "y"}
+        assert grid[-1] == {"a": 2, "b": "z"}
+
+    def test_sweep_columns(self):
+        protocol, doc = absorbance_protocol()
+        objects = len(doc.objects)
+        grid = volumes_and_wavelengths()
+        results = ParameterSweep(protocol).run(grid)
+
+        assert len(results) == len(grid)
+        assert results.columns["run"] == list(range(len(grid)))
+        assert results.columns["volume"] == [10, 10, 20, 20, 30, 30]
+        assert results.columns["wavelength"] == [600, 700] * 3
+        assert set(results.columns["volume_unit"]) == {tyto.OM.microliter}
+        assert all(results.columns["completed_normally"])
+        assert results.columns["error"] == [None] * len(grid)
+        assert len(set(results.columns["calls"])) == 1
+        assert results.rows()[3]["execution"] == "sweep_3"
+        # The executions are removed from the document after each run
+        assert len(doc.objects) == objects
+
+    def test_sweep_matches_execute(self):
+        protocol, doc = absorbance_protocol()
+        engine = ExecutionEngine(use_ordinal_time=True, track_samples=False)
+        parameterization = volumes_and_wavelengths()[0]
+        sweep = ParameterSweep(protocol, engine=engine, keep_executions=True)
+        sweep.run([parameterization])
+        swept = sweep.executions[0]
+
+        # Execute a copy of the protocol in its own document
+        protocol, _ = absorbance_protocol()
+        ex = ExecutionEngine(use_ordinal_time=True, track_samples=False).execute(
+            protocol,
+            sbol3.Agent("agent"),
+            parameter_values=ParameterSweep(protocol).parameter_values(
+                parameterization
+            ),
+            id="executed",
+        )
+        assert swept.completed_normally and ex.completed_normally
+        assert records_by_node(swept) == records_by_node(ex)
+        assert call_values(swept, "Provision", "amount") == call_values(
+            ex, "Provision", "amount"
+        )
+
+    def test_swept_values_reach_steps(self):
+        protocol, _ = absorbance_protocol()
+        grid = volumes_and_wavelengths()
+        sweep = ParameterSweep(protocol, keep_executions=True)
+        results = sweep.run(grid)
+
+        assert all(results.columns["completed_normally"])
+        for parameterization, ex in zip(grid, sweep.executions):
+            assert call_values(ex, "Provision", "amount") == [
+                parameterization["volume"].value
+            ]
+            assert call_values(ex, "MeasureAbsorbance", "wavelength") == [
+                parameterization["wavelength"].value
+            ]
+
+    def test_parameter_values_reach_their_steps(self):
+        protocol, doc = absorbance_protocol()
+        # A second Provision step, with its own volume
+        second_volume = protocol.input_value("second_volume", sbol3.OM_MEASURE)
+        plate = protocol.primitive_step(
+            "EmptyContainer",
+            specification=labop.ContainerSpec(
+                "second_plate",
+                name="second plate",
+                queryString="cont:Plate96Well",
+                prefixMap={
+                    "cont": "https://sift.net/container-ontology/container-ontology#"
+                },
+            ),
+        )
+        protocol.primitive_step(
+            "Provision",
+            resource=doc.find("water"),
+            destination=plate.output_pin("samples"),
+            amount=second_volume,
+        )
+        parameterization = {
+            "wavelength": sbol3.Measure(600, tyto.OM.nanometer),
+            "second_volume": sbol3.Measure(50, tyto.OM.microliter),
+            "volume": sbol3.Measure(10, tyto.OM.microliter),
+        }
+        ex = ExecutionEngine(use_ordinal_time=True, track_samples=False).execute(
+            protocol,
+            sbol3.Agent("agent"),
+            parameter_values=ParameterSweep(protocol).parameter_values(
+                parameterization
+            ),
+            id="executed",
+        )
+        assert ex.completed_normally
+        assert sorted(call_values(ex, "Provision", "amount")) == [10, 50]
+        assert call_values(ex, "MeasureAbsorbance", "wavelength") == [600]
+
+    def test_keep_executions(self):
+        protocol, doc = absorbance_protocol()
+        sweep = ParameterSweep(protocol, keep_executions=True, id_prefix="plan_")
+        sweep.run(volumes_and_wavelengths()[:2])
+        assert [e.display_id for e in sweep.executions] == ["plan_0", "plan_1"]
+        assert all(e.document is doc for e in sweep.executions)
+
+    def test_unknown_parameter(self):
+        protocol, _ = absorbance_protocol()
+        with self.assertRaises(ValueError):
+            ParameterSweep(protocol).run([{"volumes": 1}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+
+import sbol3
+import tyto
+
+import labop
+import uml
+
+INTEGER = "http://www.w3.org/2001/XMLSchema#integer"
+
+
+def chained_protocol(steps: int):
+    """A protocol of steps that each use the value of the previous step"""
+    protocol, doc = labop.Protocol.initialize_protocol()
+    compute = labop.Primitive("Compute")
+    compute.add_input("value", INTEGER, optional=True)
+    compute.add_output("value", INTEGER)
+    doc.add(compute)
+
+    calls = [protocol.primitive_step(compute)]
+    for _ in range(steps - 1):
+        calls.append(
+            protocol.primitive_step(compute, value=calls[-1].output_pin("value"))
+        )
+    return protocol, compute, calls
+
+
+def templated_protocol(rows, bulk: bool):
+    """A protocol that measures the output of a step with each row of inputs"""
+    protocol, doc = labop.Protocol.initialize_protocol()
+    measure = labop.Primitive("Measure")
+    measure.add_input("samples", INTEGER)
+    measure.add_input("gain", sbol3.OM_MEASURE, optional=True)
+    measure.add_input("name", "http://www.w3.org/2001/XMLSchema#string", optional=True)
+    measure.add_output("value", INTEGER)
+    doc.add(measure)
+
+    source = protocol.primitive_step(measure)
+    rows = [dict(row, samples=source.output_pin("value")) for row in rows]
+    if bulk:
+        calls = protocol.primitive_steps("Measure", rows)
+    else:
+        calls = [protocol.primitive_step("Measure", **row) for row in rows]
+    protocol.primitive_step(measure, samples=calls[-1].output_pin("value"))
+    return doc, calls
+
+
+def scanned_edges(protocol: labop.Protocol, node: uml.ActivityNode, end: str):
+    return {e for e in protocol.edges if str(getattr(e, end)) == node.identity}
+
+
+class TestProtocolConstruction(unittest.TestCase):
+    def test_edge_index_follows_forks(self):
+        protocol, compute, calls = chained_protocol(3)
+        source = calls[0].output_pin("value")
+        for _ in range(2):
+            protocol.primitive_step(compute, value=source)
+
+        forks = protocol.get_nodes(node_type=uml.ForkNode)
+        assert len(forks) == 1
+        assert [e.get_target() for e in protocol.outgoing_edges(source)] == forks
+        assert len(protocol.outgoing_edges(forks[0])) == 3
+        nodes = list(protocol.nodes) + [source]
+        for node in nodes:
+            assert protocol.outgoing_edges(node) == scanned_edges(
+                protocol, node, "source"
+            )
+            assert protocol.incoming_edges(node) == scanned_edges(
+                protocol, node, "target"
+            )
+
+    def test_edge_index_follows_reassigned_ends(self):
+        protocol, compute, calls = chained_protocol(3)
+        edge = next(iter(protocol.incoming_edges(calls[1].input_pin("value"))))
+        protocol.outgoing_edges(calls[0])  # Build the index
+        edge.source = calls[1].output_pin("value")
+        edge.target = calls[2].input_pin("value")
+        nodes = list(protocol.nodes) + [
+            pin for call in calls for pin in list(call.inputs) + list(call.outputs)
+        ]
+        for node in nodes:
+            assert protocol.outgoing_edges(node) == scanned_edges(
+                protocol, node, "source"
+            )
+            assert protocol.incoming_edges(node) == scanned_edges(
+                protocol, node, "target"
+            )
+
+    def test_children_numbered_as_pysbol(self):
+        protocol, compute, calls = chained_protocol(3)
+        protocol.edges.remove(protocol.edges[-1])
+        protocol.primitive_step(compute, value=calls[-1].output_pin("value"))
+        for type_name in ["CallBehaviorAction", "ObjectFlow", "ControlFlow"]:
+            assert protocol.counter_value(type_name) == sbol3.Identified.counter_value(
+                protocol, type_name
+            )
+        identities = [e.identity for e in protocol.edges]
+        assert len(set(identities)) == len(identities)
+
+    def test_membership(self):
+        protocol, _, calls = chained_protocol(2)
+        other, _, other_calls = chained_protocol(1)
+        assert protocol.has_node(calls[0])
+        assert not protocol.has_node(calls[0].output_pin("value"))
+        assert protocol.owns(calls[0].output_pin("value"))
+        assert not protocol.owns(other_calls[0])
+        with self.assertRaises(ValueError):
+            protocol.order(calls[0], other_calls[0])
+        with self.assertRaises(ValueError):
+            protocol.use_value(other_calls[0].output_pin("value"), calls[0])
+
+    def test_bulk_steps_match_per_step(self):
+        def rows():
+            return [
+                {"gain": sbol3.Measure(g, tyto.OM.number), "name": f"{t}h"}
+                for t in [1, 3]
+                for g in [0.1, 0.2]
+            ] + [{}]
+
+        per_step, _ = templated_protocol(rows(), bulk=False)
+        bulk, calls = templated_protocol(rows(), bulk=True)
+        assert len(calls) == 5
+        assert sorted(per_step.write_string(sbol3.SORTED_NTRIPLES).splitlines()) == (
+            sorted(bulk.write_string(sbol3.SORTED_NTRIPLES).splitlines())
+        )
+
+    def test_bulk_steps_check_inputs(self):
+        with self.assertRaises(ValueError):
+            templated_protocol(
+                [{"gain": sbol3.Measure(1, tyto.OM.number)}, {"gian": 1}], bulk=True
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+import os
+import tempfile
+import unittest
+
+import sbol3
+import tyto
+import xarray as xr
+
+import labop
+from labop import ContainerSpec, SampleMap, Strings, serialize_sample_format
+from labop.constants import PREFIX_MAP
+from labop.execution.execution_engine import ExecutionEngine
+from labop.utils.plate_coordinates import get_sample_list
+from labop_convert.pylabrobot.pylabrobot_specialization import PylabrobotSpecialization
+from labop_convert.pylabrobot.transfer_batching import (
+    HeadSimulator,
+    WellTransfer,
+    batch_transfers,
+    liquid_handling_sequence,
+    plan_transfers,
+)
+
+WELLS = get_sample_list("A1:H12")
+PLATE = (
+    "https://sift.net/container-ontology/container-ontology#Corning96WellPlate360uLFlat"
+)
+
+
+def plate_copy_map(source_name, target_name, volume=10.0):
+    """A SampleMap array moving volume from each well to the same well of another plate"""
+    return xr.DataArray(
+        [[[[volume if s == t else 0.0 for t in WELLS]] for s in WELLS]],
+        dims=(
+            Strings.SOURCE_CONTAINER,
+            Strings.SOURCE_LOCATION,
+            Strings.TARGET_CONTAINER,
+            Strings.TARGET_LOCATION,
+        ),
+        coords={
+            Strings.SOURCE_CONTAINER: [source_name],
+            Strings.SOURCE_LOCATION: WELLS,
+            Strings.TARGET_CONTAINER: [target_name],
+            Strings.TARGET_LOCATION: WELLS,
+        },
+    )
+
+
+class TestTransferBatching(unittest.TestCase):
+    def test_head_moves(self):
+        transfers = plan_transfers(plate_copy_map("source", "target"))
+        assert len(transfers) == 96
+
+        moves = {}
+        for channels in [1, 8, 96]:
+            batches = batch_transfers(transfers, channels=channels)
+            simulator = HeadSimulator(channels).run(batches)
+            moves[channels] = simulator.moves
+            assert simulator.volumes == {
+                **{f"source:{w}": -10.0 for w in WELLS},
+                **{f"destination:{w}": 10.0 for w in WELLS},
+            }
+        # pick up, aspirate, dispense, and discard for each batch
+        assert moves == {1: 4 * 96, 8: 4 * 12, 96: 4}
+
+    def test_column_order(self):
+        # Rows in reverse order cannot share a batch
+        transfers = [
+            WellTransfer("A1", "B2", 5.0),
+            WellTransfer("B1", "A2", 5.0),
+            WellTransfer("C1", "C3", 5.0),
+        ]
+        batches = batch_transfers(transfers, channels=8)
+        assert [len(b.transfers) for b in batches] == [1, 1, 1]
+        HeadSimulator(8).run(batches)
+
+        transfers = [WellTransfer(f"{r}1", f"{r}2", 5.0) for r in "ABCD"]
+        batches = batch_transfers(transfers, channels=8)
+        sequence, next_tip = liquid_handling_sequence(
+            "sequence", batches, "source", "target", ["tips"]
+        )
+        assert 'lh.aspirate(source["A1:D1"], vols=[5.0, 5.0, 5.0, 5.0]' in sequence
+        assert 'await lh.dispense(destination["A2:D2"]' in sequence
+        assert next_tip == 4
+
+    def test_tip_racks(self):
+        transfers = plan_transfers(plate_copy_map("source", "target"))
+
+        # Columns of tips roll over to the next rack
+        batches = batch_transfers(transfers, channels=8)
+        sequence, next_tip = liquid_handling_sequence(
+            "sequence", batches, "source", "target", ["rack1", "rack2"], first_tip=82
+        )
+        assert next_tip == 96 + 88
+        assert sequence.index('get_resource("rack1")') < sequence.index(
+            'get_resource("rack2")'
+        )
+        # Each batch takes its tips from one column
+        assert 'lh.pick_up_tips(tips["A12:H12"]' in sequence
+        assert 'lh.pick_up_tips(tips["A1:H1"]' in sequence
+        assert 'lh.pick_up_tips(tips["C11:H11"]' not in sequence
+        with self.assertRaises(ValueError):
+            liquid_handling_sequence(
+                "sequence", batches, "source", "target", ["rack1"], first_tip=8
+            )
+
+        # The 96 head takes a full rack
+        batches = batch_transfers(transfers, channels=96)
+        sequence, next_tip = liquid_handling_sequence(
+            "sequence", batches, "source", "target", ["rack1", "rack2"], first_tip=4
+        )
+        assert next_tip == 2 * 96
+        assert 'get_resource("rack1")' not in sequence
+        assert 'tips = lh.deck.get_resource("rack2")' in sequence
+        assert "lh.pick_up_tips96(tips)" in sequence
+        with self.assertRaises(ValueError):
+            liquid_handling_sequence(
+                "sequence", batches, "source", "target", ["rack1"], first_tip=4
+            )
+
+    def test_dependent_transfers(self):
+        transfers = [WellTransfer("A1", "B1", 5.0), WellTransfer("B1", "C1", 5.0)]
+        batches = batch_transfers(transfers, channels=8, independent=False)
+        assert [b.transfers for b in batches] == [[transfers[0]], [transfers[1]]]
+
+
+class TestPylabrobotSpecialization(unittest.TestCase):
+    def test_transfer_by_map(self):
+        protocol, doc = labop.Protocol.initialize_protocol()
+        source_spec = ContainerSpec(
+            "source_plate",
+            name="source_plate",
+            queryString=PLATE,
+            prefixMap=PREFIX_MAP,
+        )
+        target_spec = ContainerSpec(
+            "target_plate",
+            name="target_plate",
+            queryString=PLATE,
+            prefixMap=PREFIX_MAP,
+        )
+        create_source = protocol.primitive_step(
+            "EmptyContainer", specification=source_spec
+        )
+        create_target = protocol.primitive_step(
+            "EmptyContainer", specification=target_spec
+        )
+        plan = SampleMap(
+            sources=[create_source.output_pin("samples")],
+            targets=[create_target.output_pin("samples")],
+            values=serialize_sample_format(
+                plate_copy_map(source_spec.name, target_spec.name)
+            ),
+        )
+        protocol.primitive_step(
+            "TransferByMap",
+            source=create_source.output_pin("samples"),
+            destination=create_target.output_pin("samples"),
+            plan=plan,
+            amount=sbol3.Measure(0, tyto.OM.milliliter),
+            temperature=sbol3.Measure(30, tyto.OM.degree_Celsius),
+        )
+
+        filename = os.path.join(tempfile.mkdtemp(), "pylabrobot_transfer")
+        specialization = PylabrobotSpecialization(filename)
+        ee = ExecutionEngine(
+            specializations=[specialization],
+            use_ordinal_time=True,
+            track_samples=False,
+            failsafe=False,
+        )
+        ee.execute(
+            protocol, sbol3.Agent("test_agent"), parameter_values=[], id="execution"
+        )
+
+        with open(filename + ".py") as f:
+            script = f.read()
+        compile(script, filename + ".py", "exec")
+        assert "async def liquid_handling_sequence_1():" in script
+        assert script.count("await lh.aspirate(") == 12
+        assert 'await lh.aspirate(source["A1:H1"]' in script
+        assert "    await liquid_handling_sequence_1()" in script
+        # The sequence's labware and tip racks are defined on the deck
+        for name in ["source_plate", "target_plate", "tip_rack_1"]:
+            assert f'(name="{name}")' in script
+            assert f'lh.deck.get_resource("{name}")' in script
+
+
+if __name__ == "__main__":
+    unittest.main()
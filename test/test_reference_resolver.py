@@ -0,0 +1,129 @@
+import unittest
+
+import sbol3
+
+import labop
+from labop.execution.execution_engine import ExecutionEngine
+from labop.execution.instrumentation import ExecutionInstrument
+from labop.execution.reference_resolver import ReferenceResolver
+
+
+def execute_protocol(cache_references: bool) -> sbol3.Document:
+    sbol3.set_namespace("https://bbn.com/scratch/")
+    doc = sbol3.Document()
+    protocol = labop.Protocol("resolver_protocol")
+    subprotocol = labop.Protocol.create_protocol(display_id="sub1", name="sub1")
+    primitive = labop.Primitive("primitive1")
+    doc.add(protocol)
+    doc.add(subprotocol)
+    doc.add(primitive)
+    protocol.primitive_step(primitive)
+    protocol.primitive_step(subprotocol)
+    protocol.primitive_step(primitive)
+
+    ee = ExecutionEngine(
+        use_ordinal_time=True, track_samples=False, cache_references=cache_references
+    )
+    ee.execute(
+        protocol,
+        sbol3.Agent("test_agent"),
+        id="test_execution",
+        parameter_values=[],
+    )
+    return doc
+
+
+class TestReferenceResolver(unittest.TestCase):
+    def test_cached_execution_matches_uncached_execution(self):
+        cached = execute_protocol(cache_references=True)
+        uncached = execute_protocol(cache_references=False)
+        self.assertIsNone(cached.__dict__.get("find"))  # resolver is detached
+        self.assertEqual(
+            cached.write_string(sbol3.SORTED_NTRIPLES),
+            uncached.write_string(sbol3.SORTED_NTRIPLES),
+        )
+
+    def test_find(self):
+        sbol3.set_namespace("https://bbn.com/scratch/")
+        doc = sbol3.Document()
+        protocol = labop.Protocol("resolver_protocol")
+        doc.add(protocol)
+        initial = protocol.initial()
+
+        with ReferenceResolver(doc) as resolver:
+            self.assertIs(doc.find(initial.identity), initial)
+            self.assertIs(doc.find(initial.identity), initial)
+            self.assertEqual((resolver.hits, resolver.misses), (1, 1))
+
+            # Objects removed from the document are not returned from the cache
+            doc.remove([protocol])
+            self.assertIsNone(doc.find(protocol.identity))
+
+            record = labop.BehaviorExecution("execute_0")
+            doc.add(record)
+            resolver.register(record)
+            self.assertIs(doc.find(record.identity), record)
+        self.assertNotIn("find", doc.__dict__)
+
+    def test_removed_objects_are_forgotten(self):
+        sbol3.set_namespace("https://bbn.com/scratch/")
+        doc = sbol3.Document()
+        protocol = labop.Protocol("resolver_protocol")
+        doc.add(protocol)
+        initial = protocol.initial()
+
+        with ReferenceResolver(doc) as resolver:
+            resolver.register(protocol)
+            # pySBOL3's remove_object() leaves the children in the document
+            doc.remove_object(protocol)
+            self.assertIsNone(doc.find(initial.identity))
+            self.assertNotIn(initial.identity, resolver._objects)
+        self.assertNotIn("remove_object", doc.__dict__)
+
+    def test_detached_when_initialize_fails(self):
+        class FailingInstrument(ExecutionInstrument):
+            def on_begin(self, execution):
+                raise RuntimeError("on_begin failed")
+
+        sbol3.set_namespace("https://bbn.com/scratch/")
+        doc = sbol3.Document()
+        protocol = labop.Protocol("resolver_protocol")
+        doc.add(protocol)
+        ee = ExecutionEngine(
+            use_ordinal_time=True,
+            track_samples=False,
+            instruments=[FailingInstrument()],
+        )
+        with self.assertRaises(RuntimeError):
+            ee.execute(protocol, sbol3.Agent("test_agent"), parameter_values=[])
+        self.assertNotIn("find", doc.__dict__)
+
+    def test_overwritten_execution_is_not_cached(self):
+        sbol3.set_namespace("https://bbn.com/scratch/")
+        doc = sbol3.Document()
+        protocol = labop.Protocol("resolver_protocol")
+        doc.add(protocol)
+        agent = sbol3.Agent("test_agent")
+        ee = ExecutionEngine(use_ordinal_time=True, track_samples=False)
+        ee.prepare(protocol)
+        try:
+            ex = ee.execute(
+                protocol, agent, id="run", parameter_values=[], prepared=True
+            )
+            self.assertIs(doc.find(ex.identity), ex)
+            # The old execution is removed from the document, but still refers to it
+            ee.execute(
+                protocol,
+                agent,
+                id="other_run",
+                parameter_values=[],
+                prepared=True,
+                overwrite_execution=True,
+            )
+            self.assertIsNone(doc.find(ex.identity))
+        finally:
+            ee.release()
+
+
+if __name__ == "__main__":
+    unittest.main()
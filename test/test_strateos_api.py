@@ -0,0 +1,121 @@
+import os
+import tempfile
+import time
+import unittest
+
+import sbol3
+
+import labop
+from labop_convert.autoprotocol.strateos_api import StrateosAPI, StrateosException
+from labop_convert.autoprotocol.strateos_mock import MockStrateosServer
+
+
+def resource(display_id: str, name: str = None) -> sbol3.Component:
+    component = sbol3.Component(
+        f"https://bioprotocols.org/demo/{display_id}", sbol3.SBO_DNA
+    )
+    component.name = name
+    return component
+
+
+class TestStrateosAPI(unittest.TestCase):
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.out_dir, "strateos_responses.json")
+
+    def api(self, server: MockStrateosServer, **kwargs) -> StrateosAPI:
+        return StrateosAPI(
+            out_dir=self.out_dir,
+            cfg=server.config(),
+            cache_path=self.cache_path,
+            poll_interval=0.01,
+            **kwargs,
+        )
+
+    def test_make_containers(self):
+        with MockStrateosServer(launch_polls=3) as server:
+            api = self.api(server)
+            start = time.perf_counter()
+            container_ids = api.make_containers(
+                [
+                    {"name": "plate", "cont_type": "96-flat"},
+                    {"name": "tube", "cont_type": "micro-1.5"},
+                ]
+            )
+            assert time.perf_counter() - start < 5
+            assert container_ids == {"plate": "ct_1", "tube": "ct_2"}
+            # The launch request is polled until it is ready, then submitted
+            assert server.requests["launch"] == 1
+            assert server.requests["launch_request"] == 3
+            assert server.requests["runs"] == 1
+            assert os.path.exists(
+                os.path.join(self.out_dir, "launch_request_make_containers.json")
+            )
+
+    def test_launch_timeout(self):
+        with MockStrateosServer(launch_polls=1000) as server:
+            api = self.api(server, poll_timeout=0.1)
+            with self.assertRaises(StrateosException):
+                api.make_containers([{"name": "plate", "cont_type": "96-flat"}])
+            assert server.requests["runs"] == 0
+
+    def test_protocols_cached(self):
+        with MockStrateosServer() as server:
+            self.api(server)
+            self.api(server)
+            assert server.requests["protocols"] == 1
+            api = self.api(server)
+            api.query_all_protocols(refresh=True)
+            assert server.requests["protocols"] == 2
+        with MockStrateosServer(protocols=[]) as server:
+            with self.assertRaises(StrateosException):
+                StrateosAPI(out_dir=self.out_dir, cfg=server.config(), cache_path=None)
+
+    def test_resolve_resources(self):
+        resources = {
+            "water": [{"id": "rs_water"}],
+            "LUDOX": [{"id": "rs_ludox"}],
+        }
+        with MockStrateosServer(resources=resources) as server:
+            api = self.api(server)
+            water = resource("ddH2O", "water")
+            ludox = resource("LUDOX")
+            unknown = resource("unknown", "unknown")
+            resolutions = api.resolve_resources([water, ludox, unknown])
+            assert resolutions == {
+                water.identity: [{"id": "rs_water"}],
+                ludox.identity: [{"id": "rs_ludox"}],
+                unknown.identity: [],
+            }
+            assert server.requests["resources"] == 3
+            assert api.resolve_resource(water) == [{"id": "rs_water"}]
+            assert server.requests["resources"] == 3
+
+    def test_resources_cache_saved_once(self):
+        names = [f"reagent{i}" for i in range(5)]
+        with MockStrateosServer(
+            resources={name: [{"id": f"rs_{name}"}] for name in names}
+        ) as server:
+            api = self.api(server)
+            saves = []
+            save_cache = api.client._save_cache
+            api.client._save_cache = lambda: saves.append(save_cache())
+            api.resolve_resources([resource(name) for name in names])
+            assert server.requests["resources"] == len(names)
+            # The cache is written once for the batch, without leaving a temporary file
+            assert len(saves) == 1
+            assert not [f for f in os.listdir(self.out_dir) if f.endswith(".tmp")]
+
+            api = self.api(server)
+            api.resolve_resources([resource(name) for name in names])
+            assert server.requests["resources"] == len(names)
+
+    def test_retries(self):
+        with MockStrateosServer(failures=2) as server:
+            api = self.api(server)
+            assert server.requests["protocols"] == 3
+            assert api.protocol_make_containers.name == "MakeContainers"
+
+
+if __name__ == "__main__":
+    unittest.main()
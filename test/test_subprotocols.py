@@ -4,6 +4,9 @@ import unittest
 import sbol3
 
 import labop
+import uml
+from labop.execution.activity_template import activity_template
+from labop.execution.execution_engine import ExecutionEngine
 from labop.execution.harness import ProtocolExecutionNTuples
 
 
@@ -73,6 +76,44 @@ class TestSubprotocols(unittest.TestCase):
                 subprotocols,
             )
 
+    def test_repeated_subprotocol(self):
+        protocol, doc = labop.Protocol.initialize_protocol(display_id="repeated")
+        subprotocol = labop.Protocol.create_protocol(display_id="sub", name="sub")
+        primitive = labop.Primitive("primitive1")
+        doc.add(subprotocol)
+        doc.add(primitive)
+        for _ in range(2):
+            subprotocol.primitive_step(primitive)
+        calls = [protocol.primitive_step(subprotocol) for _ in range(3)]
+
+        ee = ExecutionEngine(use_ordinal_time=True, track_samples=False)
+        ex = ee.execute(protocol, sbol3.Agent("agent"), id="ex", parameter_values=[])
+        edges = len(subprotocol.edges)
+        template = activity_template(subprotocol)
+
+        # Each call executes every step of the subprotocol
+        executed = [e.get_node() for e in ex.get_ordered_executions()]
+        for call in calls:
+            assert call in executed
+        for step in subprotocol.nodes:
+            assert executed.count(step) == len(calls)
+
+        # The template is reused, and invocations do not add edges
+        ee.execute(protocol, sbol3.Agent("agent"), id="ex2", parameter_values=[])
+        assert activity_template(subprotocol) is template
+        assert len(subprotocol.edges) == edges
+
+        # Pins added to an existing step, or new steps, rebuild the template
+        step = next(
+            n for n in subprotocol.nodes if isinstance(n, uml.CallBehaviorAction)
+        )
+        step.inputs.append(uml.InputPin(name="extra"))
+        rebuilt = activity_template(subprotocol)
+        assert rebuilt is not template
+        assert activity_template(subprotocol) is rebuilt
+        subprotocol.primitive_step(primitive)
+        assert activity_template(subprotocol) is not rebuilt
+
 
 if __name__ == "__main__":
     unittest.main()
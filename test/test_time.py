@@ -9,6 +9,7 @@ import tyto
 
 import labop
 import labop_time as labopt
+import uml
 from uml import Duration, DurationObservation, Expression
 
 # from labop_check.labop_check import check_doc, get_minimum_duration
@@ -312,5 +313,113 @@ class TestTime(unittest.TestCase):
         # doc.write('timed_protocol.ttl', 'turtle')
 
 
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.doc = sbol3.Document()
+        sbol3.set_namespace("https://bbn.com/scratch/")
+        self.a = labop.Primitive("a")
+        self.b = labop.Primitive("b")
+        self.c = labop.Primitive("c")
+        for primitive in [self.a, self.b, self.c]:
+            self.doc.add(primitive)
+        self.protocol = labop.Protocol("scheduled_protocol")
+        self.doc.add(self.protocol)
+        # a and b in sequence, c in parallel with both
+        self.step_a = self.protocol.primitive_step(self.a)
+        self.step_b = self.protocol.primitive_step(self.b)
+        self.step_c = self.protocol.execute_primitive(self.c)
+        self.protocol.order(self.protocol.initial(), self.step_c)
+        self.protocol.order(self.step_b, self.protocol.final())
+        self.protocol.order(self.step_c, self.protocol.final())
+        self.durations = labopt.DurationModel(
+            {
+                self.a.identity: (60, 60),
+                self.b.identity: (120, 180),
+                self.c.identity: lambda node: (30, 30),
+            }
+        )
+
+    def add_constraints(self, *constraints):
+        self.doc.add(
+            labopt.TimeConstraints(
+                "scheduled_protocol_constraints",
+                constraints=[labopt.And(list(constraints))],
+                protocols=[self.protocol],
+            )
+        )
+
+    def test_schedule(self):
+        # b starts 10 - 15 minutes after a ends
+        self.add_constraints(
+            labopt.precedes(self.step_a, [10, 15], self.step_b, units=tyto.OM.minute)
+        )
+        schedule = labopt.ProtocolScheduler(self.durations).schedule(self.protocol)
+
+        assert schedule.makespan == 60 + 600 + 120
+        assert schedule.earliest_start[self.step_a.identity] == 0
+        assert schedule.earliest_start[self.step_b.identity] == 660
+        assert schedule.latest_start[self.step_b.identity] == 660
+        assert schedule.slack(self.step_b) == 0
+        assert schedule.slack(self.step_c) == 780 - 30
+        assert [
+            n for n in schedule.critical_path if isinstance(n, labop.CallBehaviorAction)
+        ] == [self.step_a, self.step_b]
+
+    def test_behavior_constraints(self):
+        # Constraints on a behavior apply to each call of the behavior
+        self.add_constraints(
+            labopt.startTime(self.c, [1, 2], units=tyto.OM.minute),
+            labopt.duration(self.b, 150),
+        )
+        schedule = labopt.ProtocolScheduler(self.durations).schedule(self.protocol)
+        assert schedule.earliest_start[self.step_c.identity] == 60
+        assert schedule.latest_start[self.step_c.identity] == 120
+        assert schedule.earliest_end[self.step_b.identity] == 60 + 150
+        assert schedule.makespan == 60 + 150
+
+    def test_inconsistent(self):
+        self.add_constraints(
+            labopt.duration(self.protocol, [0, 1], units=tyto.OM.minute)
+        )
+        with self.assertRaises(labopt.InconsistentConstraints):
+            labopt.ProtocolScheduler(self.durations).schedule(self.protocol)
+
+    def test_loop(self):
+        # a runs in a loop until d returns True; the loop is scheduled once
+        loop_protocol = labop.Protocol("looped_protocol")
+        self.doc.add(loop_protocol)
+        d = labop.Primitive("d")
+        d.add_output("return", "http://www.w3.org/2001/XMLSchema#boolean")
+        self.doc.add(d)
+        merge = uml.MergeNode()
+        loop_protocol.nodes.append(merge)
+        loop_protocol.order(loop_protocol.initial(), merge)
+        step_a = loop_protocol.execute_primitive(self.a)
+        loop_protocol.order(merge, step_a)
+        decision = loop_protocol.make_decision_node(step_a, decision_input_behavior=d)
+        decision.add_decision_output(loop_protocol, True, loop_protocol.final())
+        decision.add_decision_output(loop_protocol, False, merge)
+
+        schedule = labopt.ProtocolScheduler(self.durations).schedule(loop_protocol)
+        assert schedule.earliest_start[step_a.identity] == 0
+        assert schedule.makespan == 60
+
+    def test_incremental(self):
+        n = 5000
+        stn = labopt.SimpleTemporalNetwork()
+        points = [stn.add_timepoint(str(i)) for i in range(n)]
+        stn.add_constraint(stn.ORIGIN, points[0], lower=0, upper=0)
+        for i, j in zip(points, points[1:]):
+            stn.add_constraint(i, j, lower=1, upper=2)
+        stn.solve()
+        assert stn.earliest(points[-1]) == n - 1
+        assert stn.latest(points[-1]) == 2 * (n - 1)
+        stn.add_constraint(points[0], points[-1], upper=n)
+        assert stn.latest(points[-1]) == n
+        assert stn.latest(points[1]) == 2
+        with self.assertRaises(labopt.InconsistentConstraints):
+            stn.add_constraint(points[0], points[-1], upper=n - 2)
+
+
 if __name__ == "__main__":
     unittest.main()
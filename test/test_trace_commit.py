@@ -0,0 +1,211 @@
+import unittest
+
+import sbol3
+import tyto
+
+import labop
+import uml
+from labop.execution.execution_engine import ExecutionEngine
+from labop.execution.transient_token import token_literal
+from uml.owned_objects import OwnedObjectAppender
+
+labop.import_library("sample_arrays")
+labop.import_library("spectrophotometry")
+
+
+def execute_protocol(bulk_commit: bool = True, **engine_args) -> sbol3.Document:
+    sbol3.set_namespace("https://bbn.com/scratch/")
+    doc = sbol3.Document()
+    protocol = labop.Protocol("trace_commit_protocol")
+    doc.add(protocol)
+
+    plate_spec = labop.ContainerSpec(
+        "trace_commit_plate",
+        name="trace commit plate",
+        queryString="cont:Plate96Well",
+        prefixMap={"cont": "https://sift.net/container-ontology/container-ontology#"},
+    )
+    plate = protocol.primitive_step("EmptyContainer", specification=plate_spec)
+    wells = protocol.primitive_step(
+        "PlateCoordinates", source=plate.output_pin("samples"), coordinates="A1:B2"
+    )
+    measure = protocol.primitive_step(
+        "MeasureAbsorbance",
+        samples=wells.output_pin("samples"),
+        wavelength=sbol3.Measure(600, tyto.OM.nanometer),
+    )
+    protocol.designate_output(
+        "measurements",
+        "http://bioprotocols.org/labop#SampleData",
+        source=measure.output_pin("measurements"),
+    )
+
+    ee = ExecutionEngine(
+        use_ordinal_time=True,
+        track_samples=False,
+        bulk_commit=bulk_commit,
+        **engine_args,
+    )
+    ee.execute(
+        protocol,
+        sbol3.Agent("test_agent"),
+        id="test_execution",
+        parameter_values=[],
+    )
+    return doc
+
+
+class TestTraceCommit(unittest.TestCase):
+    def test_bulk_commit_matches_per_item_commit(self):
+        bulk = execute_protocol(bulk_commit=True)
+        per_item = execute_protocol(bulk_commit=False)
+        bulk_nt = bulk.write_string(sbol3.SORTED_NTRIPLES)
+        per_item_nt = per_item.write_string(sbol3.SORTED_NTRIPLES)
+        self.assertGreater(len(bulk_nt), 0)
+        self.assertEqual(bulk_nt, per_item_nt)
+
+    def test_transient_tokens_record_the_same_trace(self):
+        eager = execute_protocol()
+        transient = execute_protocol(transient_tokens=True)
+        eager_ex = eager.find("test_execution")
+        transient_ex = transient.find("test_execution")
+        self.assertEqual(len(transient_ex.flows), len(eager_ex.flows))
+        self.assertListEqual(
+            sorted((str(f.edge), str(f.token_source)) for f in transient_ex.flows),
+            sorted((str(f.edge), str(f.token_source)) for f in eager_ex.flows),
+        )
+        self.assertListEqual(
+            [(str(x.node), len(x.incoming_flows)) for x in transient_ex.executions],
+            [(str(x.node), len(x.incoming_flows)) for x in eager_ex.executions],
+        )
+
+    def test_unrecorded_trace(self):
+        eager = execute_protocol()
+        doc = execute_protocol(record_trace=False)
+        ex = doc.find("test_execution")
+        # Only flows that own computed objects are recorded
+        self.assertLess(len(ex.flows), len(eager.find("test_execution").flows))
+        self.assertTrue(
+            all(isinstance(v, uml.LiteralIdentified) for f in ex.flows for v in f.value)
+        )
+        self.assertEqual(
+            len(ex.executions), len(eager.find("test_execution").executions)
+        )
+        self.assertTrue(all(len(x.incoming_flows) == 0 for x in ex.executions))
+        # Outputs are still computed from the tokens held by the records
+        self.assertEqual(len(ex.parameter_values), 1)
+        self.assertIsInstance(
+            ex.parameter_values[0].value.value.lookup(), labop.Dataset
+        )
+
+    def test_token_references(self):
+        sbol3.set_namespace("https://bbn.com/scratch/")
+        doc = sbol3.Document()
+        component = sbol3.Component("token_component", sbol3.SBO_DNA)
+        doc.add(component)
+        reference = token_literal(component)
+        self.assertIsInstance(reference, uml.LiteralReference)
+        self.assertIsNone(reference.document)
+        self.assertIs(reference.get_value(), component)
+        self.assertIs(token_literal(reference).get_value(), component)
+        self.assertEqual(token_literal("value").get_value(), "value")
+
+        # Once a flow owns the reference, it resolves through the document
+        ex = labop.ProtocolExecution("token_execution")
+        doc.add(ex)
+        ex.flows.append(labop.ActivityEdgeFlow(value=[reference]))
+        self.assertIs(reference.document, doc)
+        self.assertIs(reference.get_value(), component)
+
+    def test_appender_continues_existing_counters(self):
+        sbol3.set_namespace("https://bbn.com/scratch/")
+        doc = sbol3.Document()
+        ex = labop.ProtocolExecution("appender_execution")
+        doc.add(ex)
+        ex.flows.append(labop.ActivityEdgeFlow())
+        ex.flows.append(labop.ActivityEdgeFlow())
+
+        appender = OwnedObjectAppender.of(ex)
+        appender.extend("flows", [labop.ActivityEdgeFlow(), labop.ActivityEdgeFlow()])
+        # A child added outside the appender is counted by the next name
+        ex.flows.append(labop.ActivityEdgeFlow())
+        appender.extend("flows", [labop.ActivityEdgeFlow()])
+
+        self.assertListEqual(
+            [f.display_id for f in ex.flows],
+            [f"ActivityEdgeFlow{i}" for i in range(1, 7)],
+        )
+        self.assertTrue(all(f.document is doc for f in ex.flows))
+        self.assertEqual(doc.find(ex.flows[5].identity), ex.flows[5])
+
+    def test_appender_keeps_counters(self):
+        sbol3.set_namespace("https://bbn.com/scratch/")
+        doc = sbol3.Document()
+        ex = labop.ProtocolExecution("sibling_execution")
+        doc.add(ex)
+        appender = OwnedObjectAppender.of(ex)
+
+        counted = []
+
+        def counter_value(type_name, counter_value=ex.counter_value):
+            counted.append(type_name)
+            return counter_value(type_name)
+
+        ex.counter_value = counter_value
+        for _ in range(3):
+            appender.extend("executions", [labop.ActivityNodeExecution()])
+            appender.extend(
+                "flows", [labop.ActivityEdgeFlow(), labop.ActivityEdgeFlow()]
+            )
+        appender.remove("flows", [ex.flows[2]])
+        appender.extend("flows", [labop.ActivityEdgeFlow()])
+
+        # pySBOL3 never rescans, and removed identities are not reused
+        self.assertListEqual(counted, [])
+        self.assertListEqual(
+            [f.display_id for f in ex.flows],
+            [f"ActivityEdgeFlow{i}" for i in [1, 2, 4, 5, 6, 7]],
+        )
+
+    def test_appender_detects_outside_remove_and_add(self):
+        sbol3.set_namespace("https://bbn.com/scratch/")
+        doc = sbol3.Document()
+        ex = labop.ProtocolExecution("outside_execution")
+        doc.add(ex)
+        appender = OwnedObjectAppender.of(ex)
+        appender.extend("flows", [labop.ActivityEdgeFlow() for _ in range(3)])
+        # The same number of children, but not the same children
+        ex.flows.remove(ex.flows[2])
+        ex.flows.append(labop.ActivityEdgeFlow())
+        ex.flows.remove(ex.flows[0])
+        ex.flows.append(labop.ActivityEdgeFlow())
+        appender.extend("flows", [labop.ActivityEdgeFlow()])
+        self.assertListEqual(
+            [f.display_id for f in ex.flows],
+            [f"ActivityEdgeFlow{i}" for i in [2, 3, 4, 5]],
+        )
+
+    def test_appender_ignores_other_display_ids(self):
+        sbol3.set_namespace("https://bbn.com/scratch/")
+        doc = sbol3.Document()
+        ex = labop.ProtocolExecution("display_id_execution")
+        doc.add(ex)
+        ex.flows.append(labop.ActivityEdgeFlow())
+        # Display ids that are not `<Type><n>`, e.g., from another tool
+        doc = sbol3.Document()
+        doc.read_string(
+            ex.document.write_string(sbol3.SORTED_NTRIPLES).replace(
+                "ActivityEdgeFlow1", "ActivityEdgeFlow_input"
+            ),
+            sbol3.SORTED_NTRIPLES,
+        )
+        ex = doc.find("display_id_execution")
+        OwnedObjectAppender.of(ex).extend("flows", [labop.ActivityEdgeFlow()])
+        self.assertListEqual(
+            [f.display_id for f in ex.flows],
+            ["ActivityEdgeFlow_input", "ActivityEdgeFlow1"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,8 +3,11 @@ import unittest
 import sbol3
 
 from uml import (
+    PARAMETER_OUT,
+    Activity,
     Behavior,
     Constraint,
+    InputPin,
     LiteralInteger,
     LiteralNull,
     OrderedPropertyValue,
@@ -67,3 +70,76 @@ class TestUML(unittest.TestCase):
         assert not v.errors and not v.warnings, "".join(
             str(e) for e in doc.validate().errors
         )
+
+    def test_cached_parameters_follow_added_parameters(self):
+        sbol3.set_namespace("https://bbn.com/scratch/")
+        behavior = Behavior("b")
+        behavior.add_input("x", sbol3.OM_MEASURE)
+        self.assertListEqual([p.name for p in behavior.get_parameters()], ["x"])
+        behavior.add_input("y", sbol3.OM_MEASURE, optional=True)
+        behavior.add_output("z", sbol3.OM_MEASURE)
+        self.assertListEqual(
+            [p.name for p in behavior.get_parameters(input_only=True)], ["x", "y"]
+        )
+        self.assertListEqual(
+            [p.name for p in behavior.get_parameters(required=True)], ["x", "z"]
+        )
+
+    def test_cached_pins_follow_added_pins(self):
+        sbol3.set_namespace("https://bbn.com/scratch/")
+        doc = sbol3.Document()
+        behavior = Behavior("b")
+        behavior.add_input("x", sbol3.OM_MEASURE)
+        behavior.add_input("y", sbol3.OM_MEASURE, optional=True)
+        behavior.add_output("z", sbol3.OM_MEASURE)
+        activity = Activity("a")
+        doc.add(behavior)
+        doc.add(activity)
+        action = activity.call_behavior(behavior)
+
+        self.assertEqual(action.input_pin("x").name, "x")
+        self.assertEqual(action.get_parameter("y").name, "y")
+        self.assertListEqual([p.name for p in action.required_inputs()], ["x"])
+        self.assertListEqual([p.name for p in action.required_outputs()], ["z"])
+
+        # A second pin for "x" must be visible to the cached pin index
+        action.inputs.append(InputPin(name="x", is_ordered=True, is_unique=True))
+        self.assertEqual(len(action.input_pins("x")), 2)
+        self.assertRaises(ValueError, action.input_pin, "x")
+        self.assertListEqual([p.name for p in action.required_inputs()], ["x", "x"])
+        self.assertRaises(ValueError, action.output_pin, "x")
+
+    def test_cached_pins_follow_renamed_pins_and_parameters(self):
+        sbol3.set_namespace("https://bbn.com/scratch/")
+        doc = sbol3.Document()
+        behavior = Behavior("b")
+        behavior.add_input("x", sbol3.OM_MEASURE)
+        behavior.add_output("z", sbol3.OM_MEASURE)
+        activity = Activity("a")
+        doc.add(behavior)
+        doc.add(activity)
+        action = activity.call_behavior(behavior)
+        self.assertEqual(action.get_parameter("x").name, "x")
+        self.assertListEqual(
+            [p.name for p in behavior.get_parameters(input_only=True)], ["x"]
+        )
+
+        # Renaming a parameter and its pin is visible to the cached maps
+        behavior.parameters[0].property_value.name = "w"
+        action.input_pin("x").name = "w"
+        self.assertEqual(action.get_parameter("w").name, "w")
+        self.assertRaises(ValueError, action.input_pin, "x")
+
+        # So is replacing a parameter with one of another direction
+        replacement = Parameter(
+            name="w",
+            type=sbol3.OM_MEASURE,
+            direction=PARAMETER_OUT,
+            is_ordered=True,
+            is_unique=True,
+        )
+        behavior.parameters[0].property_value = replacement
+        self.assertListEqual(
+            [p.name for p in behavior.get_parameters(output_only=True)], ["w", "z"]
+        )
+        self.assertListEqual(behavior.get_parameters(input_only=True), [])
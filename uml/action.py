@@ -2,7 +2,7 @@
 The Action class defines the functions corresponding to the dynamically generated labop class Action
 """
 
-from typing import Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 import sbol3
 
@@ -10,12 +10,13 @@ from uml.behavior import Behavior
 from uml.input_pin import InputPin
 
 from . import inner
+from .activity_node import ActivityNode
 from .executable_node import ExecutableNode
 from .literal_specification import LiteralSpecification
 from .output_pin import OutputPin
 from .parameter import Parameter
 from .pin import Pin
-from .utils import WellFormednessError, WellFormednessIssue
+from .utils import NameIndexedMixin, WellFormednessError, WellFormednessIssue
 from .value_pin import ValuePin
 
 
@@ -24,45 +25,74 @@ class Action(inner.Action, ExecutableNode):
         super(Action, self).__init__(*args, **kwargs)
         self._where_defined = self.get_where_defined()
 
+    def __setattr__(self, name, value):
+        if name in ("behavior", "inputs", "outputs"):
+            self._pins_changed()
+        super().__setattr__(name, value)
+
+    def counter_value(self, type_name: str) -> int:
+        # pySBOL3 numbers each child (i.e., pin) appended to the action
+        self._pins_changed()
+        return super().counter_value(type_name)
+
+    def _pins_changed(self):
+        self.__dict__["_pins_revision"] = self.__dict__.get("_pins_revision", 0) + 1
+        ActivityNode.structure_revision += 1
+
+    def _pin_index(self) -> Dict[str, Any]:
+        """Pins grouped by name, cached until pins are added, removed, replaced,
+        or renamed, or the behavior changes.
+        """
+        revision = (
+            self.__dict__.get("_pins_revision", 0),
+            NameIndexedMixin.revision,
+            len(self.inputs),
+            len(self.outputs),
+        )
+        if getattr(self, "_pin_index_revision", None) != revision:
+            inputs = {}
+            for i in self.inputs:
+                inputs.setdefault(i.name, []).append(i)
+            outputs = {}
+            for o in self.outputs:
+                outputs.setdefault(o.name, []).append(o)
+            self._pin_index_entries = {"inputs": inputs, "outputs": outputs}
+            self._pin_index_revision = revision
+            # Parameter maps are keyed by pin name and must be rebuilt, too
+            if hasattr(self, "pin_ordered_parameters"):
+                del self.pin_ordered_parameters
+        return self._pin_index_entries
+
     def initialize_parameter_maps(self):
         self.pin_parameters = {}
         self.pin_ordered_parameters = {}
         behavior = self.get_behavior()
         # parameters = behavior.get_parameters()
-        ordered_parameters = list(behavior.get_parameters(ordered=True))
-        for i in self.inputs:
-            if i.name not in self.pin_parameters:
-                self.pin_parameters[i.name] = []
-            if i.name not in self.pin_ordered_parameters:
-                self.pin_ordered_parameters[i.name] = []
-
-            self.pin_ordered_parameters[i.name] += [
-                p
-                for p in ordered_parameters
-                if p.property_value.name == i.name and p.property_value.is_input()
-            ]
-            self.pin_parameters[i.name] += [
-                p.property_value
-                for p in ordered_parameters
-                if p.property_value.name == i.name and p.property_value.is_input()
-            ]
-
-        for o in self.outputs:
-            if o.name not in self.pin_parameters:
-                self.pin_parameters[o.name] = []
-            if o.name not in self.pin_ordered_parameters:
-                self.pin_ordered_parameters[o.name] = []
-
-            self.pin_parameters[o.name] += [
-                p.property_value
-                for p in ordered_parameters
-                if p.property_value.name == o.name and p.property_value.is_output()
-            ]
-            self.pin_ordered_parameters[o.name] += [
-                p
-                for p in ordered_parameters
-                if p.property_value.name == o.name and p.property_value.is_output()
-            ]
+        self._parameter_maps_behavior = behavior
+        self._parameter_maps_revision = behavior.parameter_revision()
+
+        # Index the ordered parameters by name and direction in one pass
+        input_parameters = {}
+        output_parameters = {}
+        for p in behavior.get_parameters(ordered=True):
+            if p.property_value.is_input():
+                input_parameters.setdefault(p.property_value.name, []).append(p)
+            if p.property_value.is_output():
+                output_parameters.setdefault(p.property_value.name, []).append(p)
+
+        pin_index = self._pin_index()
+        for pins, parameters in [
+            (pin_index["inputs"], input_parameters),
+            (pin_index["outputs"], output_parameters),
+        ]:
+            for name in pins:
+                if name not in self.pin_parameters:
+                    self.pin_parameters[name] = []
+                if name not in self.pin_ordered_parameters:
+                    self.pin_ordered_parameters[name] = []
+                matching = parameters.get(name, [])
+                self.pin_ordered_parameters[name] += matching
+                self.pin_parameters[name] += [p.property_value for p in matching]
 
         self.pin_parameters = {k: list(set(v)) for k, v in self.pin_parameters.items()}
         self.pin_ordered_parameters = {
@@ -94,11 +124,7 @@ class Action(inner.Action, ExecutableNode):
         :param pin_name:
         :return: Pin with specified name
         """
-        pin_set = {x for x in self.get_inputs() if x.name == pin_name}
-        if len(pin_set) == 0:
-            raise ValueError(
-                f"Could not find input pin named {pin_name} for Primitive {self.behavior.lookup().display_id}"
-            )
+        pin_set = self.input_pins(pin_name)
         if len(pin_set) > 1:
             raise ValueError(
                 f"Found more than one input pin named {pin_name} for Primitive {self.behavior.lookup().display_id}"
@@ -111,7 +137,7 @@ class Action(inner.Action, ExecutableNode):
         :param pin_name:
         :return: Pin with specified name
         """
-        pin_set = {x for x in self.get_inputs() if x.name == pin_name}
+        pin_set = set(self._pin_index()["inputs"].get(pin_name, []))
         if len(pin_set) == 0:
             raise ValueError(
                 f"Could not find input pin named {pin_name} for Primitive {self.behavior.lookup().display_id}"
@@ -124,7 +150,7 @@ class Action(inner.Action, ExecutableNode):
         :param pin_name:
         :return: Pin with specified name
         """
-        pin_set = {x for x in self.get_outputs() if x.name == pin_name}
+        pin_set = set(self._pin_index()["outputs"].get(pin_name, []))
         if len(pin_set) == 0:
             raise ValueError(f"Could not find output pin named {pin_name}")
         if len(pin_set) > 1:
@@ -142,6 +168,13 @@ class Action(inner.Action, ExecutableNode):
         """
         if name is None:
             return None
+        self._pin_index()  # discards the parameter maps if the pins changed
+        if (
+            hasattr(self, "pin_ordered_parameters")
+            and self._parameter_maps_behavior.parameter_revision()
+            != self._parameter_maps_revision
+        ):
+            del self.pin_ordered_parameters
         if not hasattr(self, "pin_ordered_parameters"):
             self.initialize_parameter_maps()
         if name in self.pin_ordered_parameters:
@@ -152,7 +185,7 @@ class Action(inner.Action, ExecutableNode):
             )
             if len(params) > 1:
                 raise ValueError(
-                    f"Primitive {behavior.display_id} has multiple Parameters with the same name"
+                    f"Primitive {self.get_behavior().display_id} has multiple Parameters with the same name"
                 )
             elif len(params) == 0:
                 raise ValueError(
@@ -164,13 +197,21 @@ class Action(inner.Action, ExecutableNode):
                 f"Invalid parameter {name} provided for Primitive {self.get_behavior().display_id}"
             )
 
-    def is_well_formed(self) -> List[WellFormednessIssue]:
+    def is_well_formed(
+        self,
+        incoming_edges: Optional[Dict[str, List["ActivityEdge"]]] = None,
+        behavior_issues: Optional[Dict[str, List[WellFormednessIssue]]] = None,
+    ) -> List[WellFormednessIssue]:
         """
         A CallBehaviorAction is well formed if:
         - the behavior is well formed
         - there is exactly one pin per required parameter
         - required parameters either have a default value or either correspond to a ValuePin with a value or an InputPin with an incoming edge
         - each pin is well formed
+        When checking every node of an Activity, `incoming_edges` (the incoming
+        edges of each pin, by pin identity) and `behavior_issues` (the issues
+        of each Behavior already checked, by identity) avoid searching the
+        Activity and checking a Behavior for each Action.
         """
         pins: List[Pin] = []
         pins += self.get_inputs()
@@ -179,23 +220,33 @@ class Action(inner.Action, ExecutableNode):
 
         issues = []
 
-        issues += behavior.is_well_formed()
+        if behavior_issues is None:
+            issues += behavior.is_well_formed()
+        else:
+            if behavior.identity not in behavior_issues:
+                behavior_issues[behavior.identity] = behavior.is_well_formed()
+            issues += behavior_issues[behavior.identity]
 
         required_parameters: List[Parameter] = []
         required_parameters += behavior.get_parameters(ordered=False, required=True)
 
         all_parameters = behavior.get_parameters(ordered=False)
 
+        # Pins and parameters match by name and direction
+        parameter_keys = set()
+        for param in all_parameters:
+            if param.is_input():
+                parameter_keys.add((param.name, InputPin))
+            if param.is_output():
+                parameter_keys.add((param.name, OutputPin))
+        pins_by_key: Dict[Tuple[str, type], Pin] = {}
         for pin in pins:
-            matching_parameter = None
-            for param in all_parameters:
-                if pin.name == param.name and (
-                    (param.is_input() and isinstance(pin, InputPin))
-                    or (param.is_output() and isinstance(pin, OutputPin))
-                ):
-                    matching_parameter = param
-                    break
-            if matching_parameter is None:
+            pin_class = next(
+                (c for c in [InputPin, OutputPin] if isinstance(pin, c)), None
+            )
+            key = (pin.name, pin_class)
+            pins_by_key.setdefault(key, pin)
+            if key not in parameter_keys:
                 issues += [
                     WellFormednessError(
                         self,
@@ -204,14 +255,9 @@ class Action(inner.Action, ExecutableNode):
                 ]
 
         for param in required_parameters:
-            matching_pin = None
-            for pin in pins:
-                if pin.name == param.name and (
-                    (param.is_input() and isinstance(pin, InputPin))
-                    or (param.is_output() and isinstance(pin, OutputPin))
-                ):
-                    matching_pin = pin
-                    break
+            matching_pin = pins_by_key.get(
+                (param.name, InputPin if param.is_input() else OutputPin)
+            )
             if matching_pin is None:
                 issues += [
                     WellFormednessError(
@@ -219,6 +265,14 @@ class Action(inner.Action, ExecutableNode):
                         f"Action does not have a pin for required parameter {param}.",
                     )
                 ]
+            elif (
+                incoming_edges is not None
+                and isinstance(matching_pin, InputPin)
+                and not isinstance(matching_pin, ValuePin)
+            ):
+                issues += matching_pin.is_well_formed(
+                    incoming_edges.get(matching_pin.identity, [])
+                )
             else:
                 issues += matching_pin.is_well_formed()
 
@@ -5,13 +5,24 @@ The Activity class defines the functions corresponding to the dynamically genera
 import html
 import logging
 from collections import Counter
-from typing import Iterable, List, Set, Type
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+)
 
 import graphviz
 import sbol3
 import tyto
 
 from . import inner
+from .action import Action
 from .activity_edge import ActivityEdge
 from .activity_node import ActivityNode
 from .activity_parameter_node import ActivityParameterNode
@@ -31,9 +42,11 @@ from .merge_node import MergeNode
 from .object_flow import ObjectFlow
 from .object_node import ObjectNode
 from .output_pin import OutputPin
+from .owned_objects import OwnedObjectAppender
 from .parameter import Parameter
 from .pin import Pin
 from .strings import PARAMETER_IN
+from .uml_graphviz import DotStream
 from .utils import id_sort, literal
 from .value_pin import ValuePin
 from .value_specification import ValueSpecification
@@ -61,7 +74,7 @@ class Activity(inner.Activity, Behavior):
         initial = [a for a in self.nodes if isinstance(a, InitialNode)]
         if not initial:
             self._initial = InitialNode()
-            self.nodes.append(self._initial)
+            self.add_node(self._initial)
             return self._initial
         elif len(initial) == 1:
             return initial[0]
@@ -82,7 +95,7 @@ class Activity(inner.Activity, Behavior):
         final = [a for a in self.nodes if isinstance(a, FinalNode)]
         if not final:
             self._final = FinalNode()
-            self.nodes.append(self._final)
+            self.add_node(self._final)
             return self._final
         elif len(final) == 1:
             return final[0]
@@ -114,7 +127,7 @@ class Activity(inner.Activity, Behavior):
             default_value=default_value,
         )
         node = ActivityParameterNode(parameter=parameter, name=parameter.name)
-        self.nodes.append(node)
+        self.add_node(node)
         return node
 
     def designate_output(
@@ -130,7 +143,7 @@ class Activity(inner.Activity, Behavior):
         """
         parameter = self.add_output(name=name, param_type=param_type)
         node = ActivityParameterNode(parameter=parameter, name=parameter.name)
-        self.nodes.append(node)
+        self.add_node(node)
         if source:
             self.use_value(source, node)
         else:
@@ -173,9 +186,7 @@ class Activity(inner.Activity, Behavior):
         -------
         Set of ActivityEdges with node as a target
         """
-        return {
-            e for e in self.edges if e.target == node.identity
-        }  # TODO: change to pointer lookup after pySBOL #237
+        return set(self._edge_index()["targets"].get(node.identity, []))
 
     def outgoing_edges(self, node: ActivityNode) -> Set[ActivityEdge]:
         """Find the edges that have the designated node as a source
@@ -188,9 +199,114 @@ class Activity(inner.Activity, Behavior):
         -------
         Set of ActivityEdges with node as a source
         """
-        return {
-            e for e in self.edges if e.source == node.identity
-        }  # TODO: change to pointer lookup after pySBOL #237
+        return set(self._edge_index()["sources"].get(node.identity, []))
+
+    def _appended_index(
+        self,
+        attribute: str,
+        add: Callable[[Dict, sbol3.Identified], None],
+        key: str = None,
+        new: Callable[[], Dict] = dict,
+    ) -> Dict:
+        """An index of the children in an owned-object property, which are
+        added to the `new` index with `add`.  Children appended since the last
+        call are added to the index, which is rebuilt if children were removed
+        or replaced, or if the activity was renamed.
+        """
+        key = key if key else attribute
+        children = getattr(self, attribute)
+        count = len(children)
+        indexes = self.__dict__.setdefault("_appended_indexes", {})
+        index, indexed, last, identity = indexes.get(key, (None, 0, None, None))
+        if (
+            index is None
+            or identity != self.identity
+            or indexed > count
+            or (indexed and children[indexed - 1] is not last)
+        ):
+            index, indexed = new(), 0
+        for child in children[indexed:]:
+            add(index, child)
+        last = children[count - 1] if count else None
+        indexes[key] = (index, count, last, self.identity)
+        return index
+
+    def _children_by_identity(self, attribute: str) -> Dict[str, List]:
+        return self._appended_index(
+            attribute, lambda index, c: index.setdefault(c.identity, []).append(c)
+        )
+
+    def _edge_index(self) -> Dict[str, Dict[str, List[ActivityEdge]]]:
+        """Edges grouped by source and by target identity"""
+
+        def add(index, edge: ActivityEdge):
+            index["sources"].setdefault(str(edge.source), []).append(edge)
+            index["targets"].setdefault(str(edge.target), []).append(edge)
+            edge.index_ends(index)  # Moved if the source or target changes
+
+        return self._appended_index(
+            "edges", add, key="edge_ends", new=lambda: {"sources": {}, "targets": {}}
+        )
+
+    def owns(self, node: ActivityNode) -> bool:
+        """Whether the node, or the action of a pin, is one of the nodes of the
+        activity.  Children are named within the identity of their parent, so
+        this does not need to look up the parents of the node.
+        """
+        return (
+            node.document is self.document
+            and node.identity is not None
+            and node.identity.startswith(self.identity + "/")
+        )
+
+    def _node(self, identity: str) -> Optional[ActivityNode]:
+        """The node of the activity with an identity, without searching the document"""
+        nodes = self._children_by_identity("nodes").get(identity)
+        return nodes[0] if nodes else None
+
+    def has_node(self, node: ActivityNode) -> bool:
+        """Whether the node is one of the nodes of the activity"""
+        nodes = self._children_by_identity("nodes")
+        return any(n is node for n in nodes.get(node.identity, []))
+
+    def add_node(self, node: ActivityNode) -> ActivityNode:
+        """Add a node to the activity, as with `self.nodes.append(node)`"""
+        return self._append_child("nodes", node)
+
+    def add_edge(self, edge: ActivityEdge) -> ActivityEdge:
+        """Add an edge to the activity, as with `self.edges.append(edge)`"""
+        return self._append_child("edges", edge)
+
+    def _append_child(self, attribute: str, child: sbol3.Identified):
+        """
+        Append a child as pySBOL3 does, but check that its identity is new
+        with an index of the children rather than by comparing it with every
+        sibling.
+        """
+        OwnedObjectAppender.of(self).extend(
+            attribute, [child], identities=self._children_by_identity(attribute)
+        )
+        return child
+
+    def counter_value(self, type_name: str) -> int:
+        """pySBOL3 numbers new children by rescanning every child of the
+        activity.  The OwnedObjectAppender of the activity keeps the largest
+        number of each type instead.
+        """
+        self._parameters_changed()
+        return OwnedObjectAppender.of(self).counter_value(type_name)
+
+    def _node_index(self) -> Dict[str, Tuple[ActivityNode, ActivityNode]]:
+        """The nodes of the activity, and the pins of its actions, by identity,
+        each with the node that it unpins to
+        """
+        nodes = {}
+        for n in self.nodes:
+            nodes[n.identity] = (n, n)
+            if isinstance(n, Action):
+                for pin in list(n.inputs) + list(n.outputs):
+                    nodes[pin.identity] = (pin, n)
+        return nodes
 
     def deconflict_objectflow_sources(self, source: ActivityNode) -> ActivityNode:
         """Avoid nondeterminism in ObjectFlows by injecting ForkNode objects where necessary
@@ -208,23 +324,23 @@ class Activity(inner.Activity, Behavior):
         if isinstance(source, ForkNode) or isinstance(source, DecisionNode):
             return source
         # Otherwise, find out what targets currently attach:
-        current_outflows = [e for e in self.edges if e.get_source() is source]
+        current_outflows = list(self._edge_index()["sources"].get(source.identity, []))
         # Use original if nothing is attached to it
         if len(current_outflows) == 0:
             # print(f'No prior use of {source.identity}, connecting directly')
             return source
         # If the flow goes to a single ForkNode, connect to that ForkNode
         elif len(current_outflows) == 1 and isinstance(
-            current_outflows[0].get_target(), ForkNode
+            self._node(str(current_outflows[0].target)), ForkNode
         ):
             # print(f'Found an existing fork from {source.identity}, reusing')
-            return current_outflows[0].get_target()
+            return self._node(str(current_outflows[0].target))
         # Otherwise, inject a ForkNode and connect all current flows to that instead
         else:
             # print(f'Found no existing fork from {source.identity}, injecting one')
             fork = ForkNode()
-            self.nodes.append(fork)
-            self.edges.append(ObjectFlow(source=source, target=fork))
+            self.add_node(fork)
+            self.add_edge(ObjectFlow(source=source, target=fork))
             for f in current_outflows:
                 f.source = fork  # change over the existing flows
             return fork
@@ -236,7 +352,33 @@ class Activity(inner.Activity, Behavior):
         :param input_pin_map: literal value or ActivityNode mapped to names of Behavior parameters
         :return: CallBehaviorAction that invokes the Behavior
         """
+        parameters = _call_parameters(behavior)
+        return self._call_behavior(behavior, parameters, input_pin_map, set())
+
+    def call_behaviors(
+        self, behavior: Behavior, rows: Iterable[Dict[str, object]]
+    ) -> List[CallBehaviorAction]:
+        """Call a Behavior as an Action in an Activity once for each row of a table of inputs
+
+        The parameters of the Behavior are looked up once for all of the rows,
+        and the keys of the rows are checked once for each distinct set of keys.
+        The Actions, pins and flows are the same as those of calling
+        call_behavior() with each row in turn.
+        :param behavior: Behavior to be invoked
+        :param rows: maps of literal values or ActivityNodes to names of Behavior parameters
+        :return: CallBehaviorAction for each row
+        """
+        parameters = _call_parameters(behavior)
+        checked = set()
+        return [self._call_behavior(behavior, parameters, row, checked) for row in rows]
 
+    def _call_behavior(
+        self,
+        behavior: Behavior,
+        parameters: "_CallParameters",
+        input_pin_map: Dict[str, object],
+        checked: Set[frozenset],
+    ) -> CallBehaviorAction:
         # Any ActivityNode in the pin map will be withheld for connecting via object flows instead
         activity_inputs = {
             k: v
@@ -247,7 +389,11 @@ class Activity(inner.Activity, Behavior):
         non_activity_inputs = {
             k: v for k, v in input_pin_map.items() if k not in activity_inputs
         }
-        cba = self.add_call_behavior_action(behavior, **non_activity_inputs)
+        keys = frozenset(non_activity_inputs)
+        if keys not in checked:
+            _check_inputs(behavior, parameters, keys)
+            checked.add(keys)
+        cba = self._add_call_behavior_action(behavior, parameters, non_activity_inputs)
         # add flows for activities being connected implicitly
         for name, source in id_sort(activity_inputs.items()):
             sources = source if isinstance(source, list) else [source]
@@ -264,16 +410,16 @@ class Activity(inner.Activity, Behavior):
         :param target: ActivityNode that is the target of the control flow
         :return: ControlFlow created between source and target
         """
-        if source not in self.nodes:
+        if not self.has_node(source):
             raise ValueError(
                 f"Source node {source.identity} is not a member of activity {self.identity}"
             )
-        if target not in self.nodes:
+        if not self.has_node(target):
             raise ValueError(
                 f"Target node {target.identity} is not a member of activity {self.identity}"
             )
         flow = ControlFlow(source=source, target=target)
-        self.edges.append(flow)
+        self.add_edge(flow)
         return flow
 
     def use_value(self, source: ActivityNode, target: ActivityNode) -> ObjectFlow:
@@ -284,19 +430,18 @@ class Activity(inner.Activity, Behavior):
         :param target: ActivityNode that receives the value
         :return: ObjectFlow created between source and target
         """
-        if (
-            source.get_toplevel() is not self
-        ):  # check via toplevel, because pins are not directly in the node list
+        # check via identity, because pins are not directly in the node list
+        if not self.owns(source):
             raise ValueError(
                 f"Source node {source.identity} is not a member of activity {self.identity}"
             )
-        if target.get_toplevel() is not self:
+        if not self.owns(target):
             raise ValueError(
                 f"Target node {target.identity} is not a member of activity {self.identity}"
             )
         source = self.deconflict_objectflow_sources(source)
         flow = ObjectFlow(source=source, target=target)
-        self.edges.append(flow)
+        self.add_edge(flow)
         return flow
 
     def use_values(
@@ -312,30 +457,26 @@ class Activity(inner.Activity, Behavior):
         :param input_pin_literals: map of literal values to be assigned to specific pins
         :return: newly constructed
         """
+        parameters = _call_parameters(behavior)
         # first, make sure that all of the keyword arguments are in the inputs of the behavior
-        unmatched_keys = [
-            key
-            for key in input_pin_literals.keys()
-            if key
-            not in (
-                i.property_value.name
-                for i in behavior.get_parameters(ordered=True, input_only=True)
-            )
-        ]
-        if unmatched_keys:
-            raise ValueError(
-                f'Specification for "{behavior.display_id}" does not have inputs: {unmatched_keys}'
-            )
+        _check_inputs(behavior, parameters, input_pin_literals)
+        return self._add_call_behavior_action(behavior, parameters, input_pin_literals)
 
+    def _add_call_behavior_action(
+        self,
+        behavior: Behavior,
+        parameters: "_CallParameters",
+        input_pin_literals: Dict[str, object],
+    ) -> CallBehaviorAction:
         # create action
         action = CallBehaviorAction(behavior=behavior)
-        self.nodes.append(action)
+        self.add_node(action)
 
         # Instantiate input pins
-        for i in id_sort(behavior.get_parameters(ordered=True, input_only=True)):
-            if i.property_value.name in input_pin_literals:
+        for name, is_ordered, is_unique in parameters.inputs:
+            if name in input_pin_literals:
                 # input values might be a collection or singleton
-                values = input_pin_literals[i.property_value.name]
+                values = input_pin_literals[name]
                 # TODO: type check relationship between value and parameter type specification
 
                 # If the value is a singleton, then wrap it in an iterable
@@ -347,32 +488,32 @@ class Activity(inner.Activity, Behavior):
                     if isinstance(value, sbol3.TopLevel) and not value.document:
                         self.document.add(value)
                     value_pin = ValuePin(
-                        name=i.property_value.name,
-                        is_ordered=i.property_value.is_ordered,
-                        is_unique=i.property_value.is_unique,
+                        name=name,
+                        is_ordered=is_ordered,
+                        is_unique=is_unique,
                         value=literal(value),
                     )
                     action.get_inputs().append(value_pin)
-                    self.edges.append(ObjectFlow(source=value_pin, target=action))
+                    self.add_edge(ObjectFlow(source=value_pin, target=action))
 
             else:  # if not a constant, then just a generic InputPin
                 input_pin = InputPin(
-                    name=i.property_value.name,
-                    is_ordered=i.property_value.is_ordered,
-                    is_unique=i.property_value.is_unique,
+                    name=name,
+                    is_ordered=is_ordered,
+                    is_unique=is_unique,
                 )
                 action.get_inputs().append(input_pin)
-                self.edges.append(ObjectFlow(source=input_pin, target=action))
+                self.add_edge(ObjectFlow(source=input_pin, target=action))
 
         # Instantiate output pins
-        for o in id_sort(behavior.get_parameters(ordered=True, output_only=True)):
+        for name, is_ordered, is_unique in parameters.outputs:
             output_pin = OutputPin(
-                name=o.property_value.name,
-                is_ordered=o.property_value.is_ordered,
-                is_unique=o.property_value.is_unique,
+                name=name,
+                is_ordered=is_ordered,
+                is_unique=is_unique,
             )
             action.get_outputs().append(output_pin)
-            self.edges.append(ObjectFlow(source=action, target=output_pin))
+            self.add_edge(ObjectFlow(source=action, target=output_pin))
         return action
 
     def validate(self, report: sbol3.ValidationReport = None) -> sbol3.ValidationReport:
@@ -388,35 +529,37 @@ class Activity(inner.Activity, Behavior):
         """
         report = super(Activity, self).validate(report)
 
+        index = self._edge_index()
+        nodes = self._node_index()
+
+        def end_node(identity: str, edges: List[ActivityEdge], end: str, unpin=False):
+            if identity in nodes:
+                return nodes[identity][1 if unpin else 0]
+            node = getattr(edges[0], end)()
+            return node.unpin() if unpin and isinstance(node, ActivityNode) else node
+
         # Check for objects with multiple outgoing ObjectFlow edges that are not of type ForkNode or DecisionNode
-        source_counts = Counter(
-            [e.get_source() for e in self.edges if isinstance(e, ObjectFlow)]
-        )
-        multi_targets = {
-            n: c
-            for n, c in source_counts.items()
-            if c > 1
-            and not (
-                isinstance(n, ForkNode)
-                or isinstance(n, DecisionNode)
-                or isinstance(n, CallBehaviorAction)
-            )
-        }
-        for n, c in multi_targets.items():
-            report.addWarning(
-                n.identity,
-                None,
-                f"ActivityNode has {c} outgoing edges: multi-edges can cause nondeterministic flow",
-            )
+        for source, edges in index["sources"].items():
+            c = sum(1 for e in edges if isinstance(e, ObjectFlow))
+            if c > 1:
+                n = end_node(source, edges, "get_source")
+                if not (
+                    isinstance(n, ForkNode)
+                    or isinstance(n, DecisionNode)
+                    or isinstance(n, CallBehaviorAction)
+                ):
+                    report.addWarning(
+                        n.identity,
+                        None,
+                        f"ActivityNode has {c} outgoing edges: multi-edges can cause nondeterministic flow",
+                    )
 
         # Check that incoming flow counts obey constraints:
-        target_counts = Counter(
-            [
-                e.get_target().unpin()
-                for e in self.edges
-                if isinstance(e.get_target(), ActivityNode)
-            ]
-        )
+        target_counts = Counter()
+        for target, edges in index["targets"].items():
+            n = end_node(target, edges, "get_target", unpin=True)
+            if isinstance(n, ActivityNode):
+                target_counts[n] += len(edges)
         # No InitialNode should have an incoming flow (though an ActivityParameterNode may)
         initial_with_inflow = {
             n: c for n, c in target_counts.items() if isinstance(n, InitialNode)
@@ -442,7 +585,37 @@ class Activity(inner.Activity, Behavior):
 
         return report
 
-    def to_dot(self, legend=False, ready=[], done=[]):
+    def to_dot(self, legend=False, ready=[], done=[], nodes=None, depth=None):
+        """
+        Draw the Activity, and the Activities that it calls, as a graphviz.Digraph.
+        See write_dot().
+        """
+        dot = DotStream(name="_root")
+        try:
+            self.write_dot(
+                dot, legend=legend, ready=ready, done=done, nodes=nodes, depth=depth
+            )
+        except Exception as e:
+            print(f"Cannot translate to graphviz: {e}")
+        return dot.to_digraph()
+
+    def write_dot(
+        self,
+        dot: DotStream,
+        legend=False,
+        ready=[],
+        done=[],
+        nodes=None,
+        depth=None,
+        drawn: Set[str] = None,
+    ):
+        """
+        Write the Activity to a DotStream, followed by the Activities that it
+        calls, up to depth calls deep (all of them if depth is None).  Each
+        Activity is drawn once.  If nodes is given, only those nodes (and the
+        edges between them, or between their pins) are drawn.
+        """
+
         def _gv_sanitize(id: str):
             return html.escape(id.replace(":", "_"))
 
@@ -617,38 +790,67 @@ class Activity(inner.Activity, Behavior):
                 color = "black"
             return color
 
-        parent = None
-        try:
-            parent = graphviz.Digraph(name="_root")
-            parent.attr(compound="true")
-            subname = _gv_sanitize(self.identity.replace(self.namespace, ""))
-            dot = graphviz.Digraph(
-                name=f"cluster_{subname}",
-                graph_attr={"label": self.name, "shape": "box"},
-            )
+        ready = set(ready)
+        done = set(done)
+        drawn = set([]) if drawn is None else drawn
+        drawn.add(self.identity)
+
+        # Edges by target, rather than a scan of the edges for each node
+        incoming_edges = {}
+        for edge in self.edges:
+            incoming_edges.setdefault(str(edge.target), []).append(edge)
+
+        if nodes is not None:
+            nodes = set(nodes)
+            drawn_edges = [
+                e
+                for e in self.edges
+                if e.get_source().pin_owner() in nodes
+                and e.get_target().pin_owner() in nodes
+            ]
+            drawn_nodes = [n for n in self.nodes if n in nodes]
+        else:
+            drawn_edges = self.edges
+            drawn_nodes = self.nodes
+
+        called = []
+        dot.attr(compound="true")
+        subname = _gv_sanitize(self.identity.replace(self.namespace, ""))
+        with dot.subgraph(
+            name=f"cluster_{subname}",
+            graph_attr={"label": self.name, "shape": "box"},
+        ):
             if legend:
                 dot.subgraph(_legend())
 
-            for edge in [e for e in self.edges if e.dot_plottable()]:
+            for edge in [e for e in drawn_edges if e.dot_plottable()]:
                 edge.to_dot(dot, namespace=self.namespace)
 
-            for node in self.nodes:
+            for node in drawn_nodes:
                 color = _fill_color(node, ready, done)
-                subgraph = node.to_dot(
+                activity = node.to_dot(
                     dot,
                     color=color,
-                    incoming_edges=self.incoming_edges(node),
+                    incoming_edges=incoming_edges.get(node.identity, []),
                     done=done,
                     ready=ready,
                     namespace=self.namespace,
                 )
-                if subgraph:
-                    parent.subgraph(subgraph)
-            parent.subgraph(dot)
-        except Exception as e:
-            print(f"Cannot translate to graphviz: {e}")
-
-        return parent
+                if activity is not None:
+                    called.append(activity)
+
+        if depth is not None and depth <= 0:
+            return
+        for activity in called:
+            if activity.identity not in drawn:
+                with dot.subgraph(name="_root"):
+                    activity.write_dot(
+                        dot,
+                        ready=ready,
+                        done=done,
+                        depth=None if depth is None else depth - 1,
+                        drawn=drawn,
+                    )
 
     def get_nodes(self, name: str = None, node_type: Type = None) -> List[ActivityNode]:
         return [
@@ -668,3 +870,36 @@ class Activity(inner.Activity, Behavior):
 
     def auto_advance(self) -> bool:
         return len(self.get_outputs()) == 0
+
+
+class _CallParameters(NamedTuple):
+    """The (name, is_ordered, is_unique) of the input and output parameters of a Behavior, in pin order"""
+
+    inputs: List[Tuple[str, bool, bool]]
+    outputs: List[Tuple[str, bool, bool]]
+
+
+def _call_parameters(behavior: Behavior) -> _CallParameters:
+    def table(parameters):
+        return [
+            (
+                p.property_value.name,
+                p.property_value.is_ordered,
+                p.property_value.is_unique,
+            )
+            for p in id_sort(parameters)
+        ]
+
+    return _CallParameters(
+        table(behavior.get_parameters(ordered=True, input_only=True)),
+        table(behavior.get_parameters(ordered=True, output_only=True)),
+    )
+
+
+def _check_inputs(behavior: Behavior, parameters: _CallParameters, keys: Iterable[str]):
+    names = {name for name, _, _ in parameters.inputs}
+    unmatched_keys = [key for key in keys if key not in names]
+    if unmatched_keys:
+        raise ValueError(
+            f'Specification for "{behavior.display_id}" does not have inputs: {unmatched_keys}'
+        )
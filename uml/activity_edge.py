@@ -3,7 +3,7 @@ The ActivityEdge class defines the functions corresponding to the dynamically ge
 """
 
 import html
-from typing import List
+from typing import Dict, List
 
 import graphviz
 
@@ -23,6 +23,26 @@ class ActivityEdge(inner.ActivityEdge, WhereDefinedMixin):
         super().__init__(*args, **kwargs)
         self._where_defined = self.get_where_defined()
 
+    def index_ends(self, index: Dict[str, Dict[str, List["ActivityEdge"]]]):
+        """
+        Keep this edge under its current source and target in the edge index
+        of its activity (see Activity._edge_index()), when they are reassigned.
+        """
+        self.__dict__["_ends_index"] = index
+
+    def __setattr__(self, name, value):
+        if name == "source" or name == "target":
+            index = self.__dict__.get("_ends_index")
+            if index is not None:
+                ends = index["sources" if name == "source" else "targets"]
+                edges = ends.get(str(getattr(self, name)), [])
+                edges[:] = [e for e in edges if e is not self]
+                super().__setattr__(name, value)
+                ends.setdefault(str(getattr(self, name)), []).append(self)
+                ActivityNode.structure_revision += 1
+                return
+        super().__setattr__(name, value)
+
     def get_source(self) -> ActivityNode:
         return self.source.lookup() if self.source else self.source
 
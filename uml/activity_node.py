@@ -17,6 +17,11 @@ l.setLevel(logging.ERROR)
 
 
 class ActivityNode(inner.ActivityNode, WhereDefinedMixin):
+    # Incremented when the pins or behavior of an Action, or the source or
+    # target of an edge of an Activity, change.  Structures compiled from an
+    # Activity (e.g., execution templates) compare it to tell if they are stale.
+    structure_revision = 0
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._where_defined = self.get_where_defined()
@@ -82,6 +87,10 @@ class ActivityNode(inner.ActivityNode, WhereDefinedMixin):
         """
         return self
 
+    def pin_owner(self):
+        """The Action that owns the node if it is a Pin, otherwise the node itself"""
+        return self
+
     def dot_attrs(self, incoming_edges: Dict["InputPin", List["ActivityEdge"]] = None):
         return {"label": "", "shape": "circle"}
 
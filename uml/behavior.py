@@ -2,13 +2,13 @@
 The Behavior class defines the functions corresponding to the dynamically generated labop class Behavior
 """
 
-from typing import Iterable, List, Union
+from typing import Dict, Iterable, List, Tuple, Union
 
 from . import inner
 from .ordered_property_value import OrderedPropertyValue
 from .parameter import Parameter
 from .strings import PARAMETER_IN, PARAMETER_OUT
-from .utils import WellFormednessIssue, WhereDefinedMixin, literal
+from .utils import NameIndexedMixin, WellFormednessIssue, WhereDefinedMixin, literal
 from .value_specification import ValueSpecification
 
 
@@ -58,6 +58,7 @@ class Behavior(inner.Behavior, WhereDefinedMixin):
             param.lower_value = literal(1)
         if default_value:
             param.default_value = default_value
+        self.clear_parameter_cache()
         return ordered_param
 
     def add_input(
@@ -164,14 +165,54 @@ class Behavior(inner.Behavior, WhereDefinedMixin):
     ) -> Iterable[Union[Parameter, OrderedPropertyValue]]:
         # return [p.property_value for p in self.parameters]
         assert not (input_only and output_only)
+        # Results are cached per query until a parameter is added, removed,
+        # replaced, renamed, or changes direction.  Whether a parameter is
+        # required can change after it is added, so that filter is not cached.
+        cache = self._parameter_cache()
+        key = (input_only, output_only)
+        if key not in cache:
+            cache[key] = [
+                p
+                for p in self.parameters
+                if (not input_only or p.property_value.direction == PARAMETER_IN)
+                and (not output_only or p.property_value.direction == PARAMETER_OUT)
+            ]
         return [
             (p if ordered else p.property_value)
-            for p in self.parameters
-            if (not input_only or p.property_value.direction == PARAMETER_IN)
-            and (not output_only or p.property_value.direction == PARAMETER_OUT)
-            and (not required or p.property_value.required())
+            for p in cache[key]
+            if (not required or p.property_value.required())
         ]
 
+    def counter_value(self, type_name: str) -> int:
+        # pySBOL3 numbers each child (e.g., parameter) appended to the behavior
+        self._parameters_changed()
+        return super().counter_value(type_name)
+
+    def _parameters_changed(self):
+        self.__dict__["_parameters_revision"] = (
+            self.__dict__.get("_parameters_revision", 0) + 1
+        )
+
+    def parameter_revision(self) -> Tuple[int, int, int]:
+        """Changes when parameters are added, removed, replaced, renamed, or
+        change direction"""
+        return (
+            self.__dict__.get("_parameters_revision", 0),
+            NameIndexedMixin.revision,
+            len(self.parameters),
+        )
+
+    def _parameter_cache(self) -> Dict[Tuple[bool, bool], List]:
+        revision = self.parameter_revision()
+        if getattr(self, "_parameter_cache_revision", None) != revision:
+            self._parameter_cache_revision = revision
+            self._parameter_cache_entries = {}
+        return self._parameter_cache_entries
+
+    def clear_parameter_cache(self):
+        """Discard cached get_parameters() results, e.g., after modifying a Parameter"""
+        self._parameters_changed()
+
     def get_ordered_parameters(self) -> List[Parameter]:
         return self.parameters
 
@@ -43,6 +43,7 @@ class CallBehaviorAction(inner.CallBehaviorAction, CallAction):
         ready=None,
         namespace=None,
     ):
+        """Draw the node, and return the Activity that it calls, if any, for Activity.write_dot() to draw"""
         from .activity import Activity
 
         ActivityNode.to_dot(
@@ -55,10 +56,7 @@ class CallBehaviorAction(inner.CallBehaviorAction, CallAction):
             namespace=namespace,
         )
         behavior = self.get_behavior()
-        subgraph = None
-        if isinstance(behavior, Activity):
-            subgraph = behavior.to_dot(done=done, ready=ready)
-        return subgraph
+        return behavior if isinstance(behavior, Activity) else None
 
     def dot_attrs(self, incoming_edges: List["ActivityEdge"]):
         port_row = '  <tr><td><table border="0" cellspacing="-2"><tr><td> </td>{}<td> </td></tr></table></td></tr>\n'
@@ -2,7 +2,7 @@
 The DecisionNode class defines the functions corresponding to the dynamically generated labop class DecisionNode
 """
 
-from typing import Callable, Dict, List
+from typing import Callable, Dict, List, Optional, Tuple
 
 from uml.activity_edge import ActivityEdge
 
@@ -46,7 +46,7 @@ class DecisionNode(inner.DecisionNode, ControlNode):
             else ControlFlow
         )
         outgoing_edge = incoming_flow_type(**kwargs)
-        protocol.edges.append(outgoing_edge)
+        protocol.add_edge(outgoing_edge)
 
     def is_primary_incoming_flow(self, edge: "ActivityEdge") -> bool:
         """
@@ -101,11 +101,22 @@ class DecisionNode(inner.DecisionNode, ControlNode):
             and source.get_parent().behavior == self.decision_input
         )
 
+    def compile_dispatch(self) -> "DecisionDispatch":
+        """Resolve the roles of the incoming edges and index the guards of the outgoing edges"""
+        activity = self.get_parent()
+        return DecisionDispatch(
+            self, activity.incoming_edges(self), activity.outgoing_edges(self)
+        )
+
     def enabled(
         self,
         tokens: Dict["ActivityEdge", List[LiteralSpecification]],
         engine: "ExecutionEngine",
     ):
+        dispatch = engine.decision_dispatch(self) if engine is not None else None
+        if dispatch is not None:
+            return dispatch.enabled(tokens)
+
         # Cases:
         # - primary is control, input_flow, no decision_input
         # - primary is control, decision_input flow,
@@ -164,28 +175,33 @@ class DecisionNode(inner.DecisionNode, ControlNode):
         out_edges: List["ActivityEdge"],
         node_outputs: Callable,
     ) -> List["ActivityEdgeFlow"]:
+        # Tokens are held by the record if the trace does not record them
+        incoming_tokens = source.get_incoming_flows()
+
+        dispatch = engine.decision_dispatch(self) if engine is not None else None
+        if dispatch is not None:
+            active_edge, primary_input_value = dispatch.decide(incoming_tokens)
+            return [(active_edge, source, literal(primary_input_value))]
+
         try:
             decision_input_flow_token = next(
                 t
-                for t in source.incoming_flows
-                if t.lookup().edge == self.decision_input_flow
-            ).lookup()
-            decision_input_flow = decision_input_flow_token.edge.lookup()
-            decision_input_value = decision_input_flow_token.value
+                for t in incoming_tokens
+                if self.decision_input_flow
+                and t.get_edge().identity == str(self.decision_input_flow)
+            )
+            decision_input_flow = decision_input_flow_token.get_edge()
+            decision_input_value = _token_value(decision_input_flow_token)
         except StopIteration as e:
             decision_input_flow_token = None
             decision_input_value = None
             decision_input_flow = None
         try:
             decision_input_return_token = next(
-                t
-                for t in source.incoming_flows
-                if isinstance(t.lookup().edge.lookup().get_source(), OutputPin)
-                and t.lookup().token_source.lookup().node.lookup().behavior
-                == self.decision_input
-            ).lookup()
-            decision_input_return_flow = decision_input_return_token.edge.lookup()
-            decision_input_return_value = decision_input_return_token.value
+                t for t in incoming_tokens if self.is_decision_input_edge(t.get_edge())
+            )
+            decision_input_return_flow = decision_input_return_token.get_edge()
+            decision_input_return_value = _token_value(decision_input_return_token)
         except StopIteration as e:
             decision_input_return_token = None
             decision_input_return_value = None
@@ -194,13 +210,14 @@ class DecisionNode(inner.DecisionNode, ControlNode):
         try:
             primary_input_flow_token = next(
                 t
-                for t in source.incoming_flows
-                if t.lookup() != decision_input_flow_token
-                and t.lookup() != decision_input_return_token
-            ).lookup()
-            primary_input_flow = primary_input_flow_token.edge.lookup()
-            primary_input_value = primary_input_flow_token.value
+                for t in incoming_tokens
+                if t is not decision_input_flow_token
+                and t is not decision_input_return_token
+            )
+            primary_input_flow = primary_input_flow_token.get_edge()
+            primary_input_value = _token_value(primary_input_flow_token)
         except StopIteration as e:
+            primary_input_flow = None
             primary_input_value = None
 
         # Cases to evaluate guards of decision node:
@@ -221,7 +238,9 @@ class DecisionNode(inner.DecisionNode, ControlNode):
 
         try:
             else_edge = next(
-                edge for edge in out_edges if edge.guard.value == DECISION_ELSE
+                edge
+                for edge in out_edges
+                if edge.guard is not None and edge.guard.get_value() == DECISION_ELSE
             )
         except StopIteration as e:
             else_edge = None
@@ -257,7 +276,7 @@ class DecisionNode(inner.DecisionNode, ControlNode):
                 active_edges = [
                     edge
                     for edge in non_else_edges
-                    if satisfy_guard(decision_input_flow_token.value, edge.guard)
+                    if satisfy_guard(decision_input_value, edge.guard)
                 ]
 
             elif primary_input_flow and isinstance(primary_input_flow, ObjectFlow):
@@ -268,7 +287,7 @@ class DecisionNode(inner.DecisionNode, ControlNode):
                 active_edges = [
                     edge
                     for edge in non_else_edges
-                    if satisfy_guard(primary_input_flow_token.value, edge.guard)
+                    if satisfy_guard(primary_input_value, edge.guard)
                 ]
             else:
                 raise Exception(
@@ -292,3 +311,138 @@ class DecisionNode(inner.DecisionNode, ControlNode):
             )
         ]
         return edge_tokens
+
+
+class DecisionDispatch(object):
+    """
+    A DecisionNode's incoming edges by role (primary, decision input flow, or
+    decision input behavior return), and its outgoing edges by guard value,
+    so that checking whether the node is enabled and choosing an outgoing
+    edge are dictionary lookups rather than scans of edges and tokens.
+    Edges are chosen as in DecisionNode.next_tokens_callback(): the first
+    edge (by identity) whose guard the value satisfies, else the "else" edge.
+    """
+
+    PRIMARY = "primary"
+    DECISION_INPUT_FLOW = "decision_input_flow"
+    DECISION_INPUT = "decision_input"
+
+    def __init__(
+        self,
+        node: DecisionNode,
+        incoming_edges: List["ActivityEdge"],
+        outgoing_edges: List["ActivityEdge"],
+    ):
+        self.node = node
+        self.has_decision_input = bool(
+            hasattr(node, "decision_input") and node.decision_input
+        )
+
+        self.roles: Dict[str, str] = {}
+        self.object_flows = set()
+        for edge in incoming_edges:
+            if node.decision_input_flow and edge.identity == str(
+                node.decision_input_flow
+            ):
+                self.roles[edge.identity] = self.DECISION_INPUT_FLOW
+            elif node.is_decision_input_edge(edge):
+                self.roles[edge.identity] = self.DECISION_INPUT
+            else:
+                self.roles[edge.identity] = self.PRIMARY
+            if isinstance(edge, ObjectFlow):
+                self.object_flows.add(edge.identity)
+
+        self.else_edge = None
+        self.null_edge = None  # First edge with a null guard
+        self.by_value: Dict[object, "ActivityEdge"] = {}
+        self.by_string: Dict[str, "ActivityEdge"] = {}
+        self.unhashable: List[Tuple[object, "ActivityEdge"]] = []
+        for edge in sorted(outgoing_edges, key=lambda e: e.identity):
+            guard = edge.guard
+            if guard is None or isinstance(guard, LiteralNull):
+                self.null_edge = self.null_edge or edge
+            elif guard.value == DECISION_ELSE and self.else_edge is None:
+                self.else_edge = edge
+            else:
+                self.by_string.setdefault(str(guard.value), edge)
+                try:
+                    self.by_value.setdefault(guard.value, edge)
+                except TypeError:
+                    self.unhashable.append((guard.value, edge))
+
+    def role(self, edge_identity: str) -> str:
+        return self.roles.get(edge_identity, self.PRIMARY)
+
+    def enabled(self, tokens: Dict["ActivityEdge", List[LiteralSpecification]]):
+        """Same cases as DecisionNode.enabled()"""
+        present = {self.role(edge.identity) for edge, ts in tokens.items() if ts}
+        primary_edge = next(
+            (
+                edge
+                for edge, ts in tokens.items()
+                if ts and self.role(edge.identity) == self.PRIMARY
+            ),
+            None,
+        )
+        if primary_edge is not None and primary_edge.identity not in self.object_flows:
+            if self.has_decision_input:
+                return self.DECISION_INPUT in present
+            return self.DECISION_INPUT_FLOW in present
+        if self.has_decision_input:
+            return self.DECISION_INPUT in present
+        return primary_edge is not None
+
+    def decide(self, incoming_tokens: List) -> Tuple["ActivityEdge", object]:
+        """The outgoing edge for the tokens consumed by the node, and the value of the primary token"""
+        tokens = {}
+        for token in incoming_tokens:
+            tokens.setdefault(self.role(_token_edge_identity(token)), token)
+        primary = tokens.get(self.PRIMARY)
+        primary_value = _token_value(primary) if primary is not None else None
+
+        if self.has_decision_input:
+            value = _token_value(tokens.get(self.DECISION_INPUT))
+        elif self.DECISION_INPUT_FLOW in tokens:
+            value = _token_value(tokens[self.DECISION_INPUT_FLOW])
+        elif primary is not None and _token_edge_identity(primary) in self.object_flows:
+            value = primary_value
+        else:
+            raise Exception(
+                "ERROR: Cannot evaluate DecisionNode with no decision_input, no decision_input_flow, and a None or ControlFlow primary_input"
+            )
+        return self.select(value), primary_value
+
+    def select(self, value: Optional[LiteralSpecification]) -> "ActivityEdge":
+        """The outgoing edge with a guard satisfied by the value, or the else edge"""
+        if value is None or isinstance(value, LiteralNull):
+            edge = self.null_edge
+        elif isinstance(value.value, str):
+            edge = self.by_string.get(value.value)
+        else:
+            try:
+                edge = self.by_value.get(value.value)
+            except TypeError:
+                edge = None
+            if edge is None:
+                edge = next(
+                    (e for guard, e in self.unhashable if value.value == guard), None
+                )
+        edge = edge or self.else_edge
+        assert edge is not None
+        return edge
+
+
+def _token_edge_identity(token) -> Optional[str]:
+    # Transient Tokens refer to their edge, ActivityEdgeFlows to its identity
+    edge = token.edge
+    if edge is None:
+        return None
+    return str(edge) if isinstance(edge, str) else edge.identity
+
+
+def _token_value(token) -> Optional[LiteralSpecification]:
+    if token is None:
+        return None
+    values = token.get_value()
+    values = list(values) if values is not None else []
+    return values[0] if len(values) > 0 else None
@@ -2,7 +2,7 @@
 The InputPin class defines the functions corresponding to the dynamically generated labop class InputPin
 """
 
-from typing import Callable, Dict, List
+from typing import Callable, Dict, Iterable, List, Optional
 
 import sbol3
 
@@ -57,19 +57,23 @@ class InputPin(inner.InputPin, Pin):
         edge_tokens = [(None, source, pin_value) for pin_value in pin_values]
         return edge_tokens
 
-    def is_well_formed(self) -> List[WellFormednessIssue]:
+    def is_well_formed(
+        self, incoming_edges: Optional[Iterable["ActivityEdge"]] = None
+    ) -> List[WellFormednessIssue]:
         """
         An InputPin is well formed if:
         - super.is_well_formed()
         - it has an incoming ObjectFlow
+        The incoming edges are found in the Activity, unless given.
         """
         from .object_flow import ObjectFlow
 
         issues = Pin.is_well_formed(self)
 
-        action = self.get_parent()
-        activity = action.get_parent()
-        incoming_edges = activity.incoming_edges(self)
+        if incoming_edges is None:
+            action = self.get_parent()
+            activity = action.get_parent()
+            incoming_edges = activity.incoming_edges(self)
 
         if not any([e for e in incoming_edges if isinstance(e, ObjectFlow)]):
             issues += [
@@ -25,7 +25,5 @@ class MergeNode(inner.MergeNode, ControlNode):
         edge_values: Dict["ActivityEdge", List[LiteralSpecification]],
         engine: "ExecutionEngine",
     ):
-        protocol = self.protocol()
-        return {t.edge.lookup() for t in tokens if t.edge} == protocol.incoming_edges(
-            self
-        )
+        # A MergeNode passes on a token from any of its incoming edges
+        return any(len(values) > 0 for values in edge_values.values())
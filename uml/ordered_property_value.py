@@ -3,8 +3,11 @@ The OrderedPropertyValue class defines the functions corresponding to the dynami
 """
 
 from . import inner
+from .utils import NameIndexedMixin
 
 
-class OrderedPropertyValue(inner.OrderedPropertyValue):
+class OrderedPropertyValue(NameIndexedMixin, inner.OrderedPropertyValue):
+    indexed_attributes = ("property_value",)
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
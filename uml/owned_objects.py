@@ -0,0 +1,145 @@
+"""
+Naming and attaching the children of SBOL objects without rescanning their
+siblings.
+
+pySBOL3 names a new child `<Type><n>`, with n one more than the largest
+number of any child whose display_id starts with `<Type>`, by scanning every
+child of the parent (sbol3.Identified.counter_value()).  When a parent has
+many children (e.g., the nodes of a generated Activity, or the records and
+flows of a ProtocolExecution), the scans dominate construction.  An
+OwnedObjectAppender keeps the counters of one parent, and updates them from
+the children appended since it last looked.  The pySBOL3 internals that
+naming and attaching a child need are used only here.
+"""
+
+import posixpath
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import sbol3
+from sbol3.utils import parse_class_name
+
+
+class OwnedObjectAppender(object):
+    """
+    Names and attaches the children of one SBOL object, as pySBOL3 does when
+    they are appended one at a time.
+
+    Each owned-object property of the owner is remembered by its length and
+    its last child.  Children appended by other means are scanned when the
+    next name is made.  If a property otherwise changed (e.g., a child was
+    removed or replaced by other means), the counters are recomputed from
+    every child, so names are never duplicated.  Children removed with
+    remove() keep the counters, so their names are not reused.
+    """
+
+    def __init__(self, owner: sbol3.Identified):
+        self.owner = owner
+        self._counters: Dict[str, int] = {}
+        self._patterns: Dict[str, re.Pattern] = {}
+        self._scanned: Dict[str, Tuple[int, Optional[sbol3.Identified]]] = {}
+
+    @staticmethod
+    def of(owner: sbol3.Identified) -> "OwnedObjectAppender":
+        """The appender of an object, shared by everything that appends to it"""
+        appender = owner.__dict__.get("_owned_object_appender")
+        if appender is None:
+            appender = OwnedObjectAppender(owner)
+            owner.__dict__["_owned_object_appender"] = appender
+        return appender
+
+    def counter_value(self, type_name: str) -> int:
+        """The number of the next child of a type, as in sbol3.Identified.counter_value()"""
+        self._sync()
+        if type_name not in self._counters:
+            self._counters[type_name] = max(
+                [
+                    self._number(type_name, child.display_id)
+                    for objects in self.owner._owned_objects.values()
+                    for child in objects
+                ],
+                default=0,
+            )
+        return self._counters[type_name] + 1
+
+    def extend(
+        self,
+        attribute: str,
+        items: Iterable[sbol3.Identified],
+        identities: Optional[Dict[str, object]] = None,
+    ) -> List[sbol3.Identified]:
+        """
+        Name the items and append them to an owned-object list property of the
+        owner.  If `identities` (the identities of existing children) is
+        given, a name that is already used raises a ValueError.
+        """
+        items = list(items)
+        prop = getattr(self.owner, attribute)
+        if not self.owner.identity_is_url() or any(item.display_id for item in items):
+            # Items with preset identities need pySBOL3's duplicate checks
+            for item in items:
+                prop.append(item)
+            return items
+
+        storage = prop._storage()[prop.property_uri]
+        document = self.owner.document
+        for item in items:
+            type_name = parse_class_name(item.type_uri)
+            display_id = f"{type_name}{self.counter_value(type_name)}"
+            identity = posixpath.join(self.owner.identity, display_id)
+            if identities is not None and identity in identities:
+                raise ValueError(f"Duplicate URI: {identity}")
+            storage.append(prop.from_user(item))
+            item.document = document
+            item._update_identity(identity, display_id)
+        return items
+
+    def remove(
+        self, attribute: str, items: Iterable[sbol3.Identified]
+    ) -> List[sbol3.Identified]:
+        """Detach children from the owner, keeping the counters"""
+        removed = {id(item) for item in items}
+        if len(removed) == 0:
+            return []
+        self._sync()
+        prop = getattr(self.owner, attribute)
+        storage = prop._storage()[prop.property_uri]
+        kept = [item for item in storage if id(item) not in removed]
+        removed = [item for item in storage if id(item) in removed]
+        storage[:] = kept
+        for item in removed:
+            item.traverse(lambda o: setattr(o, "document", None))
+        self._scanned[prop.property_uri] = (len(kept), kept[-1] if kept else None)
+        return removed
+
+    def _number(self, type_name: str, display_id: Optional[str]) -> int:
+        """The number of a `<type_name><n>` display_id, or else 0"""
+        if not display_id or not display_id.startswith(type_name):
+            return 0
+        pattern = self._patterns.get(type_name)
+        if pattern is None:
+            pattern = re.compile(re.escape(type_name) + r"(\d+)")
+            self._patterns[type_name] = pattern
+        match = pattern.fullmatch(display_id)
+        return int(match.group(1)) if match else 0
+
+    def _sync(self):
+        """Update the counters from the children added since the last call"""
+        owned = self.owner._owned_objects
+        for prop, objects in owned.items():
+            count, last = self._scanned.get(prop, (0, None))
+            if count > len(objects) or (count and objects[count - 1] is not last):
+                self._counters = {}
+                self._scanned = {}
+                break
+        for prop, objects in owned.items():
+            count, _ = self._scanned.get(prop, (0, None))
+            for child in objects[count:]:
+                if not child.display_id:
+                    break  # Named after this call, so scanned by the next call
+                for type_name, counter in self._counters.items():
+                    self._counters[type_name] = max(
+                        counter, self._number(type_name, child.display_id)
+                    )
+                count += 1
+            self._scanned[prop] = (count, objects[count - 1] if count else None)
@@ -9,6 +9,7 @@ from uml import PARAMETER_IN, PARAMETER_OUT
 
 from . import inner
 from .utils import (
+    NameIndexedMixin,
     WellFormednessInfo,
     WellFormednessIssue,
     WhereDefinedMixin,
@@ -16,7 +17,9 @@ from .utils import (
 )
 
 
-class Parameter(inner.Parameter, WhereDefinedMixin):
+class Parameter(NameIndexedMixin, inner.Parameter, WhereDefinedMixin):
+    indexed_attributes = ("name", "direction")
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._where_defined = self.get_where_defined()
@@ -10,10 +10,10 @@ from uml.behavior import Behavior
 from . import inner
 from .object_node import ObjectNode
 from .parameter import Parameter
-from .utils import WellFormednessError, WellFormednessIssue
+from .utils import NameIndexedMixin, WellFormednessError, WellFormednessIssue
 
 
-class Pin(inner.Pin, ObjectNode):
+class Pin(NameIndexedMixin, inner.Pin, ObjectNode):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -22,6 +22,9 @@ class Pin(inner.Pin, ObjectNode):
         parameter = action.get_parameter(name=self.name, ordered=ordered)
         return parameter
 
+    def pin_owner(self):
+        return self.get_parent()
+
     def dot_attrs(
         self,
         incoming_edges: Dict["InputPin", List["ActivityEdge"]] = None,
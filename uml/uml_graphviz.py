@@ -1,7 +1,12 @@
+import contextlib
 import html
+import io
+from typing import Dict, Optional, TextIO
 
+import graphviz
 import sbol3
 import tyto
+from graphviz import quoting
 
 
 def _gv_sanitize(id: str):
@@ -35,3 +40,113 @@ def identified_str(self):
 
 
 sbol3.Identified.__str__ = identified_str
+
+
+class DotStream(quoting.Quote):
+    """
+    Write a DOT digraph to a text stream, statement by statement.
+
+    DotStream has the node(), edge(), attr(), and subgraph() methods of
+    graphviz.Digraph, so the to_dot() methods of nodes, edges, and values can
+    draw into it.  Unlike graphviz.Digraph, which copies the lines of each
+    subgraph into its parent, a subgraph opened with
+    `with dot.subgraph(name=...):` is written in place.  to_source() closes
+    the graph and returns a graphviz.Source for rendering, and to_digraph()
+    returns a graphviz.Digraph with the same DOT, which can be extended or
+    drawn as a subgraph of another graph.
+    """
+
+    def __init__(
+        self,
+        name: Optional[str] = None,
+        graph_attr: Optional[Dict[str, str]] = None,
+        stream: Optional[TextIO] = None,
+    ):
+        self.name = name
+        self.stream = stream if stream is not None else io.StringIO()
+        self.depth = 0  # Number of open subgraphs
+        self.closed = False
+        self.stream.write(f"digraph {self._quote(name) + ' ' if name else ''}{{\n")
+        self._graph_attr(graph_attr)
+
+    def _write(self, line: str):
+        self.stream.write("\t" * self.depth + line)
+
+    def _graph_attr(self, graph_attr: Optional[Dict[str, str]]):
+        if graph_attr:
+            self._write(f"\tgraph{self._attr_list(None, kwargs=graph_attr)}\n")
+
+    def node(self, name: str, label: Optional[str] = None, _attributes=None, **attrs):
+        attr_list = self._attr_list(label, kwargs=attrs, attributes=_attributes)
+        self._write(f"\t{self._quote(name)}{attr_list}\n")
+
+    def edge(
+        self,
+        tail_name: str,
+        head_name: str,
+        label: Optional[str] = None,
+        _attributes=None,
+        **attrs,
+    ):
+        attr_list = self._attr_list(label, kwargs=attrs, attributes=_attributes)
+        self._write(
+            f"\t{self._quote_edge(tail_name)} -> {self._quote_edge(head_name)}{attr_list}\n"
+        )
+
+    def attr(self, kw: Optional[str] = None, _attributes=None, **attrs):
+        if attrs or _attributes:
+            if kw is None:
+                line = self._a_list(None, kwargs=attrs, attributes=_attributes)
+            else:
+                line = (
+                    f"{kw}{self._attr_list(None, kwargs=attrs, attributes=_attributes)}"
+                )
+            self._write(f"\t{line}\n")
+
+    def subgraph(
+        self,
+        graph: Optional[graphviz.Digraph] = None,
+        name: Optional[str] = None,
+        graph_attr: Optional[Dict[str, str]] = None,
+    ):
+        """
+        Write a graphviz.Digraph as a subgraph, or, without a graph, return a
+        context manager that writes the statements made within it to a
+        subgraph.
+        """
+        if graph is not None:
+            for line in graph.__iter__(subgraph=True):
+                self._write(f"\t{line}")
+            return None
+        return self._subgraph(name, graph_attr)
+
+    @contextlib.contextmanager
+    def _subgraph(self, name: Optional[str], graph_attr: Optional[Dict[str, str]]):
+        self._write(f"\tsubgraph {self._quote(name) + ' ' if name else ''}{{\n")
+        self.depth += 1
+        self._graph_attr(graph_attr)
+        try:
+            yield self
+        finally:
+            self.depth -= 1
+            self._write("\t}\n")
+
+    def close(self):
+        if not self.closed:
+            self.stream.write("}\n")
+            self.closed = True
+
+    @property
+    def source(self) -> str:
+        """The DOT written so far, if written to the default in-memory stream"""
+        return self.stream.getvalue() + ("" if self.closed else "}\n")
+
+    def to_source(self) -> graphviz.Source:
+        self.close()
+        return graphviz.Source(self.source)
+
+    def to_digraph(self) -> graphviz.Digraph:
+        """The DOT written so far as a graphviz.Digraph, if written to the default in-memory stream"""
+        lines = self.stream.getvalue().splitlines(keepends=True)
+        body = lines[1:-1] if self.closed else lines[1:]
+        return graphviz.Digraph(name=self.name, body=body)
@@ -57,7 +57,7 @@ def literal(
     """
     if isinstance(value, LiteralReference):
         return literal(
-            value.value.lookup(), reference
+            value.get_value(), reference
         )  # if it's a reference, make co-reference
     elif isinstance(value, LiteralNull):
         return LiteralNull()
@@ -193,6 +193,28 @@ class WellFormednessInfo(WellFormednessIssue):
         self.level = WellformednessLevels.INFO
 
 
+class NameIndexedMixin(object):
+    """
+    A child that its parent indexes by name (e.g., a pin or a parameter).
+    Changing one of its `indexed_attributes` once set increments
+    `NameIndexedMixin.revision`, which the indexes compare to decide whether
+    they must be rebuilt (see Action._pin_index() and
+    Behavior.parameter_revision()).
+    """
+
+    indexed_attributes = ("name",)
+    revision = 0
+
+    def __setattr__(self, name, value):
+        if (
+            name in self.indexed_attributes
+            and name in self.__dict__
+            and getattr(self, name) is not None
+        ):
+            NameIndexedMixin.revision += 1
+        super().__setattr__(name, value)
+
+
 class WhereDefinedMixin(object):
     labop_packages = ["labop/labop", "labop/uml"]
 
@@ -200,8 +222,9 @@ class WhereDefinedMixin(object):
         super().__init__(*args, **kwargs)
 
     def is_in_labop(self, cf):
-        frameinfo = getframeinfo(cf)
-        return any(p in frameinfo.filename for p in self.labop_packages)
+        # The code's filename, without reading the source as getframeinfo() does
+        filename = cf.f_code.co_filename
+        return any(p in filename for p in self.labop_packages)
 
     def get_defn_stack(self, cf, last=False):
         parent_frame_info = []